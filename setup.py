@@ -42,6 +42,7 @@ setup(
     keywords="aws-encryption-sdk aws kms encryption cli command line",
     license="Apache License 2.0",
     install_requires=get_requirements(),
+    extras_require={"fast-json": ["orjson"]},
     classifiers=[
         "Development Status :: 5 - Production/Stable",
         "Intended Audience :: Developers",
@@ -13,25 +13,40 @@
 """AWS Encryption SDK CLI."""
 import copy
 import glob
+import itertools
+import json
 import logging
 import os
+import sys
 import traceback
 from argparse import Namespace  # noqa pylint: disable=unused-import
 
 import aws_encryption_sdk
+import six
+from aws_encryption_sdk.key_providers.base import MasterKeyProvider  # noqa pylint: disable=unused-import
 from aws_encryption_sdk.materials_managers import CommitmentPolicy
 from aws_encryption_sdk.materials_managers.base import CryptoMaterialsManager  # noqa pylint: disable=unused-import
 
 from aws_encryption_sdk_cli.exceptions import AWSEncryptionSDKCLIError, BadUserArgumentError
 from aws_encryption_sdk_cli.internal.arg_parsing import CommitmentPolicyArgs, parse_args
 from aws_encryption_sdk_cli.internal.identifiers import __version__  # noqa
-from aws_encryption_sdk_cli.internal.io_handling import IOHandler, output_filename
+from aws_encryption_sdk_cli.internal.inspection import inspect_headers
+from aws_encryption_sdk_cli.internal.io_handling import IOHandler, _stdin, output_filename
+from aws_encryption_sdk_cli.internal.journal import Journal  # noqa pylint: disable=unused-import
 from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME, setup_logger
-from aws_encryption_sdk_cli.internal.master_key_parsing import build_crypto_materials_manager_from_args
+from aws_encryption_sdk_cli.internal.master_key_parsing import (
+    build_crypto_materials_manager_from_args,
+    build_master_key_provider_from_args,
+)
 from aws_encryption_sdk_cli.internal.metadata import MetadataWriter  # noqa pylint: disable=unused-import
+from aws_encryption_sdk_cli.internal.planning import build_plan
+from aws_encryption_sdk_cli.internal.state_index import StateIndex  # noqa pylint: disable=unused-import
+from aws_encryption_sdk_cli.internal.tracing import clock
+from aws_encryption_sdk_cli.internal.verification import verify
+from aws_encryption_sdk_cli.internal.watching import watch
 
 try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
-    from typing import List, Optional, Union  # noqa pylint: disable=unused-import
+    from typing import IO, Iterable, Iterator, List, Optional, Union  # noqa pylint: disable=unused-import
 
     from aws_encryption_sdk_cli.internal.mypy_types import STREAM_KWARGS  # noqa pylint: disable=unused-import
 except ImportError:  # pragma: no cover
@@ -42,21 +57,116 @@ __all__ = ("cli", "process_cli_request", "stream_kwargs_from_args")
 _LOGGER = logging.getLogger(LOGGER_NAME)
 
 
+#: Number of bytes to read from a source list at a time.
+_SOURCE_LIST_CHUNK_SIZE = 65536
+
+
 def _expand_sources(source):
-    # type: (str) -> List[str]
-    """Expands source using pathname patterns.
+    # type: (str) -> Iterator[str]
+    """Lazily expands source using pathname patterns.
     https://docs.python.org/3/library/glob.html
 
     :param str source: Source pattern
-    :returns: List of source paths
-    :rtype: list
+    :returns: Iterator of source paths
+    :raises BadUserArgumentError: if source does not match any paths
     """
-    all_sources = glob.glob(source)
-    if not all_sources:
+    all_sources = glob.iglob(source)
+    try:
+        first_source = next(all_sources)
+    except StopIteration:
         raise BadUserArgumentError("Invalid source.  Must be a valid pathname pattern or stdin (-)")
     _LOGGER.debug("Requested source: %s", source)
-    _LOGGER.debug("Expanded source: %s", all_sources)
-    return all_sources
+    return itertools.chain((first_source,), all_sources)
+
+
+def _split_source_list(source_list):
+    # type: (IO) -> Iterator[str]
+    """Splits a stream of NUL-delimited or newline-delimited paths into individual paths.
+
+    The delimiter is NUL if the stream contains a NUL before its first newline-delimited path ends,
+    so the output of ``find -print0`` and of ``find -print`` are both accepted.
+
+    :param source_list: Binary stream from which to read paths
+    :returns: Iterator of paths
+    """
+    delimiter = None
+    buffer = b""
+    while True:
+        chunk = source_list.read(_SOURCE_LIST_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+        if delimiter is None:
+            if b"\0" in buffer:
+                delimiter = b"\0"
+            elif b"\n" in buffer:
+                delimiter = b"\n"
+            else:
+                continue
+        paths = buffer.split(delimiter)
+        buffer = paths.pop()
+        for path in paths:
+            if path:
+                yield _decode_path(path, delimiter)
+    if buffer:
+        yield _decode_path(buffer, delimiter)
+
+
+def _decode_path(path, delimiter):
+    # type: (bytes, Optional[bytes]) -> str
+    """Converts a path read from a source list to a native string.
+
+    :param bytes path: Raw path
+    :param bytes delimiter: Delimiter used in the source list
+    :rtype: str
+    """
+    if delimiter != b"\0":
+        path = path.rstrip(b"\r")
+    if six.PY2:
+        return path
+    return os.fsdecode(path)
+
+
+def _listed_sources(input_from):
+    # type: (str) -> Iterator[str]
+    """Lazily reads source paths from a source list.
+
+    :param str input_from: Path to file containing source paths, or ``-`` for stdin
+    :returns: Iterator of source paths
+    """
+    if input_from == "-":
+        for source in _split_source_list(_stdin()):
+            yield source
+        return
+
+    with open(input_from, "rb") as source_list:
+        for source in _split_source_list(source_list):
+            yield source
+
+
+def _validated_sources(parsed_args):
+    # type: (Namespace) -> Iterable[str]
+    """Lazily collects all requested sources, validating the request before any are processed.
+
+    :param args: Parsed arguments from argparse
+    :type args: argparse.Namespace
+    :returns: Iterable of source paths
+    :raises BadUserArgumentError: if no sources are listed
+    """
+    if parsed_args.input is None:
+        all_sources = _listed_sources(parsed_args.input_from)
+    else:
+        all_sources = _expand_sources(parsed_args.input)
+
+    # The first two sources are all that the validation needs,
+    # so there is no need to collect every source before starting.
+    first_sources = list(itertools.islice(all_sources, 2))
+    if not first_sources:
+        raise BadUserArgumentError("Source list does not contain any paths")
+    if parsed_args.output is not None:
+        # Verification has no destination
+        _catch_bad_file_and_directory_requests(first_sources, parsed_args.output)
+    return itertools.chain(first_sources, all_sources)
 
 
 def _catch_bad_destination_requests(destination):
@@ -111,7 +221,7 @@ def _catch_bad_file_and_directory_requests(expanded_sources, destination):
 
 
 def _catch_bad_metadata_file_requests(metadata_output, source, destination):
-    # type: (MetadataWriter, str, str) -> None
+    # type: (MetadataWriter, str, Optional[str]) -> None
     """Catches bad requests based on characteristics of source, destination, and metadata
     output target.
 
@@ -135,7 +245,7 @@ def _catch_bad_metadata_file_requests(metadata_output, source, destination):
         return
 
     real_source = os.path.realpath(source)
-    real_destination = os.path.realpath(destination)
+    real_destination = None if destination is None else os.path.realpath(destination)
     real_metadata = os.path.realpath(metadata_output.output_file)
 
     if os.path.isdir(real_metadata):
@@ -144,13 +254,103 @@ def _catch_bad_metadata_file_requests(metadata_output, source, destination):
     if real_metadata in (real_source, real_destination):
         raise BadUserArgumentError("Metadata output file cannot be the input or output")
 
-    if os.path.isdir(real_destination) and real_metadata.startswith(real_destination):
+    if real_destination is not None and os.path.isdir(real_destination) and real_metadata.startswith(real_destination):
         raise BadUserArgumentError("Metadata output file cannot be in the output directory")
 
     if os.path.isdir(real_source) and real_metadata.startswith(real_source):
         raise BadUserArgumentError("Metadata output file cannot be in the input directory")
 
 
+def _catch_bad_state_file_requests(filename, description, source, destination):
+    # type: (str, str, Optional[str], str) -> None
+    """Catches bad requests based on characteristics of source, destination, and a file in which
+    the CLI keeps state across runs.
+
+    :param str filename: Path to state file
+    :param str description: Description of state file to use in error messages
+    :param str source: Identifier for the source (filesystem path or ``-`` for stdin), if any
+    :param str destination: Identifier for the destination (filesystem path or ``-`` for stdout)
+    :raises BadUserArgumentError: if state file is a directory
+    :raises BadUserArgumentError: if state file would overwrite input or output file
+    :raises BadUserArgumentError: if input is a directory and contains state file
+    """
+    real_filename = os.path.realpath(filename)
+    if os.path.isdir(real_filename):
+        raise BadUserArgumentError("{} cannot be a directory".format(description))
+
+    real_paths = [os.path.realpath(path) for path in (source, destination) if path not in (None, "-")]
+    if real_filename in real_paths:
+        raise BadUserArgumentError("{} file cannot be the input or output".format(description))
+
+    if source not in (None, "-") and os.path.isdir(source):
+        if real_filename.startswith(os.path.join(os.path.realpath(source), "")):
+            raise BadUserArgumentError("{} file cannot be in the input directory".format(description))
+
+
+def _catch_bad_state_index_requests(state_index, source, destination):
+    # type: (Optional[StateIndex], Optional[str], str) -> None
+    """Catches bad requests based on characteristics of source, destination, and state index file.
+
+    :param state_index: Requested state index, if any
+    :type state_index: aws_encryption_sdk_cli.internal.state_index.StateIndex
+    :param str source: Identifier for the source (filesystem path or ``-`` for stdin), if any
+    :param str destination: Identifier for the destination (filesystem path or ``-`` for stdout)
+    :raises BadUserArgumentError: if state index file is a directory
+    :raises BadUserArgumentError: if state index file would overwrite input or output file
+    :raises BadUserArgumentError: if input is a directory and contains state index file
+    """
+    if state_index is not None:
+        _catch_bad_state_file_requests(state_index.filename, "State index", source, destination)
+
+
+def _catch_bad_journal_requests(journal, source, destination):
+    # type: (Optional[Journal], Optional[str], str) -> None
+    """Catches bad requests based on characteristics of source, destination, and resume journal file.
+
+    :param journal: Requested resume journal, if any
+    :type journal: aws_encryption_sdk_cli.internal.journal.Journal
+    :param str source: Identifier for the source (filesystem path or ``-`` for stdin), if any
+    :param str destination: Identifier for the destination (filesystem path or ``-`` for stdout)
+    :raises BadUserArgumentError: if resume journal file is a directory
+    :raises BadUserArgumentError: if resume journal file would overwrite input or output file
+    :raises BadUserArgumentError: if input is a directory and contains resume journal file
+    """
+    if journal is not None:
+        _catch_bad_state_file_requests(journal.filename, "Resume journal", source, destination)
+
+
+def _process_dry_run_request(handler, stream_args, parsed_args):
+    # type: (IOHandler, STREAM_KWARGS, Namespace) -> None
+    """Plans all operations for a request and writes the plan to stdout as JSON without
+    reading any source contents or writing any output.
+
+    :param handler: IOHandler that would perform the operations
+    :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
+    :param args: Parsed arguments from argparse
+    :type args: argparse.Namespace
+    """
+    if parsed_args.input == "-":
+        expanded_sources = [parsed_args.input]  # type: Iterable[str]
+    else:
+        expanded_sources = _validated_sources(parsed_args)
+
+    plan = build_plan(
+        handler=handler,
+        stream_args=stream_args,
+        sources=expanded_sources,
+        destination=parsed_args.output,
+        recursive=parsed_args.recursive,
+        suffix=parsed_args.suffix,
+        key_ids=[
+            str(key_id)
+            for config in (parsed_args.new_wrapping_keys or parsed_args.wrapping_keys)
+            for key_id in config.get("key", [])
+        ],
+        caching_config=parsed_args.caching,
+    )
+    sys.stdout.write(json.dumps(plan.to_dict(), sort_keys=True, indent=4) + os.linesep)
+
+
 def process_cli_request(stream_args, parsed_args):  # noqa: C901
     # type: (STREAM_KWARGS, Namespace) -> None
     """Maps the operation request to the appropriate function based on the type of input and output provided.
@@ -159,11 +359,23 @@ def process_cli_request(stream_args, parsed_args):  # noqa: C901
     :param args: Parsed arguments from argparse
     :type args: argparse.Namespace
     """
-    _catch_bad_destination_requests(parsed_args.output)
-    _catch_bad_metadata_file_requests(
-        metadata_output=parsed_args.metadata_output, source=parsed_args.input, destination=parsed_args.output
+    if parsed_args.output is not None:
+        # Verification has no destination
+        _catch_bad_destination_requests(parsed_args.output)
+    if parsed_args.input is None:
+        _catch_bad_metadata_file_requests(
+            metadata_output=parsed_args.metadata_output, source=parsed_args.input_from, destination=parsed_args.output
+        )
+    else:
+        _catch_bad_metadata_file_requests(
+            metadata_output=parsed_args.metadata_output, source=parsed_args.input, destination=parsed_args.output
+        )
+        if parsed_args.output is not None:
+            _catch_bad_stdin_stdout_requests(parsed_args.input, parsed_args.output)
+    _catch_bad_state_index_requests(
+        state_index=parsed_args.state_index, source=parsed_args.input, destination=parsed_args.output
     )
-    _catch_bad_stdin_stdout_requests(parsed_args.input, parsed_args.output)
+    _catch_bad_journal_requests(journal=parsed_args.resume, source=parsed_args.input, destination=parsed_args.output)
 
     if not parsed_args.commitment_policy:
         commitment_policy = CommitmentPolicy.REQUIRE_ENCRYPT_REQUIRE_DECRYPT
@@ -185,8 +397,144 @@ def process_cli_request(stream_args, parsed_args):  # noqa: C901
         required_encryption_context=parsed_args.encryption_context,
         required_encryption_context_keys=parsed_args.required_encryption_context_keys,
         commitment_policy=commitment_policy,
+        source_filter=parsed_args.source_filter,
+        state_index=parsed_args.state_index,
+        sync=parsed_args.sync,
+        journal=parsed_args.resume,
+        durability=parsed_args.durability,
+        timing=parsed_args.metadata_timing,
+        statistics=parsed_args.stats,
+        profiler=parsed_args.profile,
     )
 
+    if parsed_args.dry_run:
+        # Planning reads no sources and writes no outputs, so the metadata output is never opened
+        try:
+            _process_dry_run_request(handler=handler, stream_args=stream_args, parsed_args=parsed_args)
+        finally:
+            handler.close()
+        return
+
+    if parsed_args.stats is not None:
+        parsed_args.stats.start()
+    if parsed_args.metrics_file is not None:
+        parsed_args.metrics_file.start(dict(metadata=parsed_args.metadata_output.queue_depth))
+    # Hold the metadata output open for the whole run, rather than reopening it for each operation
+    with parsed_args.metadata_output:
+        try:
+            _process_sources(handler=handler, stream_args=stream_args, parsed_args=parsed_args)
+        finally:
+            handler.close()
+            _finish_statistics(parsed_args)
+
+
+def _finish_statistics(parsed_args):
+    # type: (Namespace) -> None
+    """Reports the run statistics and writes the final metrics, if they were requested.
+
+    Called even when the run fails, so that the operations that did complete are accounted for.
+
+    :param parsed_args: Parsed arguments from argparse
+    :type parsed_args: argparse.Namespace
+    """
+    if parsed_args.stats is not None:
+        parsed_args.stats.finish()
+    if parsed_args.metrics_file is not None:
+        parsed_args.metrics_file.stop()
+
+
+def _process_watch_request(handler, stream_args, parsed_args):
+    # type: (IOHandler, STREAM_KWARGS, Namespace) -> None
+    """Processes a source directory and then keeps processing files as they are written to it.
+
+    :param handler: IOHandler that performs the operations
+    :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
+    :param args: Parsed arguments from argparse
+    :type args: argparse.Namespace
+    :raises BadUserArgumentError: if source is not a single directory
+    :raises BadUserArgumentError: if destination is inside source
+    """
+    if not os.path.isdir(parsed_args.input):
+        raise BadUserArgumentError("If watching a source, it must be a single existing directory")
+    _catch_bad_file_and_directory_requests([parsed_args.input], parsed_args.output)
+    source_root = os.path.join(os.path.realpath(parsed_args.input), "")
+    if os.path.join(os.path.realpath(parsed_args.output), "").startswith(source_root):
+        # Outputs moved into place would be reported as new files and processed again
+        raise BadUserArgumentError("If watching a source, destination cannot be inside it")
+
+    watch(
+        handler=handler,
+        stream_args=stream_args,
+        source=parsed_args.input,
+        destination=parsed_args.output,
+        suffix=parsed_args.suffix,
+    )
+
+
+def _process_scan_request(handler, stream_args, parsed_args):
+    # type: (IOHandler, STREAM_KWARGS, Namespace) -> None
+    """Verifies or inspects all requested sources without writing any output other than metadata.
+
+    :param handler: IOHandler that holds the configuration for the operations
+    :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
+    :param args: Parsed arguments from argparse
+    :type args: argparse.Namespace
+    """
+    sources = [parsed_args.input] if parsed_args.input == "-" else _validated_sources(parsed_args)
+    if parsed_args.action == "verify":
+        verify(
+            handler=handler,
+            stream_args=stream_args,
+            sources=sources,
+            recursive=parsed_args.recursive,
+            jobs=parsed_args.jobs,
+        )
+    else:
+        inspect_headers(
+            handler=handler,
+            sources=sources,
+            recursive=parsed_args.recursive,
+            jobs=parsed_args.jobs,
+            catalog=parsed_args.catalog,
+        )
+
+
+def _process_catalog_query(parsed_args):
+    # type: (Namespace) -> None
+    """Writes the paths of all cataloged files that match the requested conditions to stdout, one per line.
+
+    :param args: Parsed arguments from argparse
+    :type args: argparse.Namespace
+    """
+    try:
+        paths = parsed_args.catalog.find(
+            key_info=parsed_args.wrapped_by,
+            encryption_context=parsed_args.encryption_context,
+            encryption_context_keys=parsed_args.required_encryption_context_keys,
+        )
+    finally:
+        parsed_args.catalog.close()
+    for path in paths:
+        sys.stdout.write(path + os.linesep)
+
+
+def _process_sources(handler, stream_args, parsed_args):
+    # type: (IOHandler, STREAM_KWARGS, Namespace) -> None
+    """Processes all requested sources using the provided handler.
+
+    :param handler: IOHandler that performs the operations
+    :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
+    :param args: Parsed arguments from argparse
+    :type args: argparse.Namespace
+    """
+    if parsed_args.action in ("verify", "inspect"):
+        _process_scan_request(handler=handler, stream_args=stream_args, parsed_args=parsed_args)
+        return
+
+    if parsed_args.watch:
+        _process_watch_request(handler=handler, stream_args=stream_args, parsed_args=parsed_args)
+        return
+
     if parsed_args.input == "-":
         # read from stdin
         handler.process_single_operation(
@@ -194,10 +542,7 @@ def process_cli_request(stream_args, parsed_args):  # noqa: C901
         )
         return
 
-    expanded_sources = _expand_sources(parsed_args.input)
-    _catch_bad_file_and_directory_requests(expanded_sources, parsed_args.output)
-
-    for _source in expanded_sources:
+    for _source in _validated_sources(parsed_args):
         _destination = copy.copy(parsed_args.output)
 
         if os.path.isdir(_source):
@@ -221,9 +566,33 @@ def process_cli_request(stream_args, parsed_args):  # noqa: C901
             # write to file
             handler.process_single_file(stream_args=stream_args, source=_source, destination=_destination)
 
+        else:
+            _LOGGER.warning("Skipping %s because it does not exist", _source)
+
+
+def _new_message_kwargs(args):
+    # type: (Namespace) -> STREAM_KWARGS
+    """Builds the kwargs for aws_encryption_sdk.stream that only apply when writing new messages.
 
-def stream_kwargs_from_args(args, crypto_materials_manager):
-    # type: (Namespace, CryptoMaterialsManager) -> STREAM_KWARGS
+    :param args: Parsed arguments from argparse
+    :type args: argparse.Namespace
+    :rtype: dict
+    """
+    new_message_args = {}  # type: STREAM_KWARGS
+    if args.algorithm is not None:
+        new_message_args["algorithm"] = getattr(aws_encryption_sdk.Algorithm, args.algorithm)
+    if args.frame_length is not None:
+        new_message_args["frame_length"] = args.frame_length
+    return new_message_args
+
+
+def stream_kwargs_from_args(
+    args,  # type: Namespace
+    crypto_materials_manager,  # type: CryptoMaterialsManager
+    reencrypt_materials_manager=None,  # type: Optional[CryptoMaterialsManager]
+    rewrap_key_provider=None,  # type: Optional[MasterKeyProvider]
+):
+    # type: (...) -> STREAM_KWARGS
     """Builds kwargs object for aws_encryption_sdk.stream based on argparse
     arguments and existing CryptoMaterialsManager.
 
@@ -231,6 +600,10 @@ def stream_kwargs_from_args(args, crypto_materials_manager):
     :type args: argparse.Namespace
     :param crypto_materials_manager: Existing CryptoMaterialsManager
     :type crypto_materials_manager: aws_encryption_sdk.materials_manager.base.CryptoMaterialsManager
+    :param reencrypt_materials_manager: CryptoMaterialsManager for new messages when re-encrypting (optional)
+    :type reencrypt_materials_manager: aws_encryption_sdk.materials_manager.base.CryptoMaterialsManager
+    :param rewrap_key_provider: MasterKeyProvider for new wrapping keys when re-wrapping (optional)
+    :type rewrap_key_provider: aws_encryption_sdk.key_providers.base.MasterKeyProvider
     :returns: Translated kwargs object for aws_encryption_sdk.stream
     :rtype: dict
     """
@@ -238,10 +611,15 @@ def stream_kwargs_from_args(args, crypto_materials_manager):
     # Look for additional arguments only if encrypting
     if args.action == "encrypt":
         stream_args["encryption_context"] = args.encryption_context
-        if args.algorithm is not None:
-            stream_args["algorithm"] = getattr(aws_encryption_sdk.Algorithm, args.algorithm)
-        if args.frame_length is not None:
-            stream_args["frame_length"] = args.frame_length
+        stream_args.update(_new_message_kwargs(args))
+    elif args.action == "reencrypt":
+        # New messages keep the encryption context of the messages they replace
+        reencrypt_args = _new_message_kwargs(args)
+        reencrypt_args["materials_manager"] = reencrypt_materials_manager
+        stream_args["reencrypt_args"] = reencrypt_args
+    elif args.action == "rewrap":
+        # Data keys are re-wrapped as they are, so each message keeps its algorithm and framing
+        stream_args["key_provider"] = rewrap_key_provider
 
     if args.commitment_policy is None:
         stream_args["commitment_policy"] = CommitmentPolicy.REQUIRE_ENCRYPT_REQUIRE_DECRYPT
@@ -257,31 +635,83 @@ def stream_kwargs_from_args(args, crypto_materials_manager):
     return stream_args
 
 
-def cli(raw_args=None):
-    # type: (List[str]) -> Union[str, None]
-    """CLI entry point.  Processes arguments, sets up the key provider, and processes requested action.
+def _run(args):
+    # type: (Namespace) -> None
+    """Sets up the key provider and processes the requested action.
 
-    :returns: Execution return value intended for ``sys.exit()``
+    :param args: Parsed arguments
+    :type args: argparse.Namespace
     """
-    try:
-        args = parse_args(raw_args)
-
-        setup_logger(args.verbosity, args.quiet)
-
-        _LOGGER.debug("Encryption mode: %s", args.action)
-        _LOGGER.debug("Encryption source: %s", args.input)
-        _LOGGER.debug("Encryption destination: %s", args.output)
-        _LOGGER.debug("Wrapping key provider configuration: %s", args.wrapping_keys)
-        _LOGGER.debug("Discovery mode: %r", args.discovery)
-        _LOGGER.debug("Suffix requested: %s", args.suffix)
+    setup_logger(args.verbosity, args.quiet)
+
+    _LOGGER.debug("Encryption mode: %s", args.action)
+    _LOGGER.debug("Encryption source: %s", args.input)
+    _LOGGER.debug("Encryption source list: %s", args.input_from)
+    _LOGGER.debug("Encryption destination: %s", args.output)
+    _LOGGER.debug("Wrapping key provider configuration: %s", args.wrapping_keys)
+    _LOGGER.debug("Discovery mode: %r", args.discovery)
+    _LOGGER.debug("Suffix requested: %s", args.suffix)
+
+    if args.action == "query":
+        _process_catalog_query(args)
+        return
 
+    crypto_materials_manager = None  # type: Optional[CryptoMaterialsManager]
+    if args.action != "inspect":
+        # Inspection reads only message headers, so it needs no wrapping keys
         crypto_materials_manager = build_crypto_materials_manager_from_args(
             key_providers_config=args.wrapping_keys, caching_config=args.caching
         )
 
-        stream_args = stream_kwargs_from_args(args, crypto_materials_manager)
+    reencrypt_materials_manager = None
+    rewrap_key_provider = None
+    if args.action == "reencrypt":
+        _LOGGER.debug("New wrapping key provider configuration: %s", args.new_wrapping_keys)
+        reencrypt_materials_manager = build_crypto_materials_manager_from_args(
+            key_providers_config=args.new_wrapping_keys, caching_config=args.caching
+        )
+    elif args.action == "rewrap":
+        _LOGGER.debug("New wrapping key provider configuration: %s", args.new_wrapping_keys)
+        rewrap_key_provider = build_master_key_provider_from_args(args.new_wrapping_keys)
+
+    stream_args = stream_kwargs_from_args(
+        args, crypto_materials_manager, reencrypt_materials_manager, rewrap_key_provider
+    )
 
-        process_cli_request(stream_args, args)
+    process_cli_request(stream_args, args)
+
+
+def _profiled_run(args):
+    # type: (Namespace) -> None
+    """Runs the requested action, profiling it if requested.
+
+    :param args: Parsed arguments
+    :type args: argparse.Namespace
+    """
+    if args.profile is None:
+        _run(args)
+    else:
+        with args.profile:
+            _run(args)
+
+
+def cli(raw_args=None):
+    # type: (List[str]) -> Union[str, None]
+    """CLI entry point.  Processes arguments, sets up the key provider, and processes requested action.
+
+    :returns: Execution return value intended for ``sys.exit()``
+    """
+    try:
+        parse_started = clock()
+        args = parse_args(raw_args)
+        parse_finished = clock()
+
+        if args.trace is None:
+            _profiled_run(args)
+        else:
+            with args.trace:
+                args.trace.add_span("parse_args", parse_started, parse_finished)
+                _profiled_run(args)
 
         return None
     except AWSEncryptionSDKCLIError as error:
@@ -16,17 +16,29 @@ import copy
 import logging
 import os
 import platform
+import re
 import shlex
+import time
 from collections import OrderedDict, defaultdict
+from datetime import datetime
 from enum import Enum
 
 import aws_encryption_sdk
 import six
 
 from aws_encryption_sdk_cli.exceptions import ParameterParseError
+from aws_encryption_sdk_cli.internal.catalog import Catalog
+from aws_encryption_sdk_cli.internal.durability import Durability
 from aws_encryption_sdk_cli.internal.identifiers import ALGORITHM_NAMES, DEFAULT_MASTER_KEY_PROVIDER, __version__
+from aws_encryption_sdk_cli.internal.journal import Journal
 from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
 from aws_encryption_sdk_cli.internal.metadata import MetadataWriter
+from aws_encryption_sdk_cli.internal.metrics import DEFAULT_INTERVAL, MetricsExporter
+from aws_encryption_sdk_cli.internal.profiling import PROFILERS, Profiler  # noqa pylint: disable=unused-import
+from aws_encryption_sdk_cli.internal.state_index import StateIndex
+from aws_encryption_sdk_cli.internal.stats import RunStatistics
+from aws_encryption_sdk_cli.internal.tracing import TRACERS, Tracer  # noqa pylint: disable=unused-import
+from aws_encryption_sdk_cli.internal.traversal import SourceFilter
 
 try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
     from typing import Any, Dict, List, Optional, Sequence, Tuple, Union  # noqa pylint: disable=unused-import
@@ -45,6 +57,9 @@ except ImportError:  # pragma: no cover
 
 __all__ = ("parse_args",)
 _LOGGER = logging.getLogger(LOGGER_NAME)
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+_AGE_UNITS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
+_TIMESTAMP_FORMATS = ("%Y-%m-%d", "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S")
 
 
 class CommentIgnoringArgumentParser(argparse.ArgumentParser):
@@ -192,10 +207,66 @@ def _build_parser():
         "-d", "--decrypt", dest="action", action="store_const", const="decrypt", help="Decrypt data"
     )
     parser.add_dummy_redirect_argument("--decrypt")
+    operating_action.add_argument(
+        "--reencrypt",
+        dest="action",
+        action="store_const",
+        const="reencrypt",
+        help=(
+            "Decrypt data and encrypt it under new wrapping keys in a single pass, without writing the plaintext "
+            "anywhere (requires --new-wrapping-keys)"
+        ),
+    )
+    parser.add_dummy_redirect_argument("--reencrypt")
+    operating_action.add_argument(
+        "--rewrap",
+        dest="action",
+        action="store_const",
+        const="rewrap",
+        help=(
+            "Re-wrap the data key of encrypted data under new wrapping keys, rewriting only the message header and "
+            "copying the encrypted body through unchanged (requires --new-wrapping-keys)"
+        ),
+    )
+    parser.add_dummy_redirect_argument("--rewrap")
+    operating_action.add_argument(
+        "--verify",
+        dest="action",
+        action="store_const",
+        const="verify",
+        help=(
+            "Authenticate encrypted data, including every frame and any signature, and discard the plaintext "
+            "without writing any output"
+        ),
+    )
+    parser.add_dummy_redirect_argument("--verify")
+    operating_action.add_argument(
+        "--inspect",
+        dest="action",
+        action="store_const",
+        const="inspect",
+        help=(
+            "Read only the header of encrypted data and report its wrapping keys, encryption context, and "
+            "algorithm as metadata, without decrypting anything or writing any output"
+        ),
+    )
+    parser.add_dummy_redirect_argument("--inspect")
+    operating_action.add_argument(
+        "--query-catalog",
+        dest="action",
+        action="store_const",
+        const="query",
+        help=(
+            "List the files in a catalog built by --inspect --catalog that match every condition given by "
+            "--wrapped-by and -c/--encryption-context, without reading any of them (requires --catalog)"
+        ),
+    )
+    parser.add_dummy_redirect_argument("--query-catalog")
 
     # For each argument added to this group, a dummy redirect argument must
     # be added to the parent parser for each long form option string.
-    metadata_group = parser.add_mutually_exclusive_group(required=True)
+    # Metadata output is required for every action except --query-catalog: see _validate_io_args
+    metadata_group = parser.add_mutually_exclusive_group()
 
     metadata_group.add_argument(
         "-S",
@@ -208,7 +279,9 @@ def _build_parser():
     parser.add_dummy_redirect_argument("--suppress-metadata")
 
     metadata_group.add_argument(
-        "--metadata-output", type=MetadataWriter(), help="File to which to write metadata records"
+        "--metadata-output",
+        type=MetadataWriter(),
+        help="File to which to write metadata records, or sqlite:PATH to write them to a SQLite database",
     )
     parser.add_dummy_redirect_argument("--metadata-output")
 
@@ -217,6 +290,64 @@ def _build_parser():
         action="store_true",
         help="Force metadata output to overwrite contents of file rather than appending to file",
     )
+    parser.add_argument(
+        "--compact-metadata",
+        action="store_true",
+        help=(
+            "Write the message header fields that messages share, such as encryption context and algorithm, "
+            "once in a separate record, and refer to that record from each operation"
+        ),
+    )
+    parser.add_argument(
+        "--stats",
+        nargs="?",
+        const="-",
+        help=(
+            "At the end of the run, report the number of operations by result, the bytes processed, AWS KMS "
+            "calls and their latency, and data key cache hits and misses. Written as JSON to the named file, "
+            "or as a summary to stderr if no file is named"
+        ),
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help=(
+            "Write the run statistics as Prometheus metrics to this file, such as a .prom file in the node "
+            "exporter textfile collector directory. The file is replaced atomically when the run starts, "
+            "periodically while it runs, and when it finishes"
+        ),
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        help="Seconds between updates of --metrics-file (default: {:.0f})".format(DEFAULT_INTERVAL),
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="KIND:PATH",
+        help=(
+            "Profile the run and write the profile to PATH when it finishes. cpu:PATH writes cProfile data "
+            "that can be read with pstats. mem:PATH writes, as JSON, the peak memory and top allocation sites "
+            "of each operation, traced with tracemalloc"
+        ),
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FORMAT:PATH",
+        help=(
+            "Trace where the wall time of the run goes and write each span to PATH as it ends: argument "
+            "parsing, setting up the wrapping keys, and for each file the operation, its header, body and "
+            "metadata, and each AWS KMS call. jsonl:PATH writes a line of JSON per span. chrome:PATH writes "
+            "the Chrome trace event format, which can be loaded into chrome://tracing or Perfetto"
+        ),
+    )
+    parser.add_argument(
+        "--metadata-timing",
+        action="store_true",
+        help=(
+            "Add timing and throughput fields to the metadata record of each encrypt and decrypt operation. "
+            "Records are then written once each operation finishes"
+        ),
+    )
 
     parser.add_argument(
         "-w",
@@ -233,6 +364,19 @@ def _build_parser():
         ),
     )
 
+    parser.add_argument(
+        "--new-wrapping-keys",
+        nargs="+",
+        dest="new_wrapping_keys",
+        action="append",
+        required=False,
+        help=(
+            "Identifying information for a wrapping key provider and wrapping keys under which to encrypt the new "
+            "message (re-encryption and re-wrapping only). Takes the same values as --wrapping-keys, which "
+            "identifies the wrapping keys used to decrypt the original message."
+        ),
+    )
+
     parser.add_argument(
         "--commitment-policy",
         type=CommitmentPolicyArgs,
@@ -258,19 +402,37 @@ def _build_parser():
         ),
     )
 
-    parser.add_argument(
+    # For each argument added to this group, a dummy redirect argument must
+    # be added to the parent parser for each long form option string.
+    # An input is required for every action except --query-catalog: see _validate_io_args
+    input_group = parser.add_mutually_exclusive_group()
+
+    input_group.add_argument(
         "-i",
         "--input",
-        required=True,
         action=UniqueStoreAction,
         help='Input file or directory for encrypt/decrypt operation, or "-" for stdin.',
     )
+    parser.add_dummy_redirect_argument("--input")
+
+    input_group.add_argument(
+        "--input-from",
+        action=UniqueStoreAction,
+        help=(
+            'File containing NUL-delimited or newline-delimited input paths, or "-" for stdin. '
+            "ex: "
+            "find . -type f -print0 | aws-encryption-cli --input-from - ..."
+        ),
+    )
+    parser.add_dummy_redirect_argument("--input-from")
     parser.add_argument(
         "-o",
         "--output",
-        required=True,
         action=UniqueStoreAction,
-        help="Output file or directory for encrypt/decrypt operation, or - for stdout.",
+        help=(
+            "Output file or directory for encrypt/decrypt operation, or - for stdout "
+            "(not used with --verify, --inspect, or --query-catalog)."
+        ),
     )
 
     parser.add_argument("--encode", action="store_true", help="Base64-encode output after processing")
@@ -284,7 +446,8 @@ def _build_parser():
         help=(
             'key-value pair encryption context values (encryption only). Must a set of "key=value" pairs. '
             "ex: "
-            "-c key1=value1 key2=value2"
+            "-c key1=value1 key2=value2. "
+            "With --query-catalog, only files whose encryption context contains every pair and key are listed."
         ),
     )
 
@@ -360,6 +523,139 @@ def _build_parser():
 
     parser.add_argument("-r", "-R", "--recursive", action="store_true", help="Allow operation on directories as input")
 
+    parser.add_argument(
+        "--include",
+        action="append",
+        help=(
+            "Only process files in source directories whose name or relative path matches this pathname pattern. "
+            "May be specified multiple times. "
+            "ex: "
+            "--include '*.csv'"
+        ),
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        help=(
+            "Skip files and directories in source directories whose name or relative path matches this "
+            "pathname pattern. May be specified multiple times. Takes precedence over --include. "
+            "ex: "
+            "--exclude '*.encrypted'"
+        ),
+    )
+    parser.add_argument(
+        "--min-size",
+        action=UniqueStoreAction,
+        help="Only process files in source directories of at least this size. Accepts K, M, G, and T suffixes.",
+    )
+    parser.add_argument(
+        "--max-size",
+        action=UniqueStoreAction,
+        help="Only process files in source directories of at most this size. Accepts K, M, G, and T suffixes.",
+    )
+    parser.add_argument(
+        "--newer-than",
+        action=UniqueStoreAction,
+        help=(
+            "Only process files in source directories modified after this local time (YYYY-MM-DD[THH:MM[:SS]]) "
+            "or within this age (a number followed by s, m, h, d, or w). "
+            "ex: "
+            "--newer-than 7d"
+        ),
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action=UniqueStoreAction,
+        help=(
+            "State index file recording completed operations. Source files that are unchanged since they were last "
+            "processed to the same output are skipped without being read. Created if it does not exist."
+        ),
+    )
+    parser.add_argument(
+        "--incremental-hash",
+        action="store_true",
+        help=(
+            "Also record a SHA-256 digest of each source file and treat a file whose attributes changed "
+            "but whose contents did not as unchanged (only with --incremental)"
+        ),
+    )
+
+    parser.add_argument(
+        "--resume",
+        action=UniqueStoreAction,
+        help=(
+            "Journal file recording each completed operation with a checksum of its output. Operations that the "
+            "journal shows were completed, and whose output is intact, are skipped. Created if it does not exist."
+        ),
+    )
+
+    parser.add_argument(
+        "--durability",
+        type=Durability,
+        choices=list(Durability),
+        default=Durability.none,
+        help=(
+            "When to sync outputs to disk. Outputs are always written to a temporary file and renamed into place "
+            "once complete. none: leave syncing to the operating system; file: sync each output before renaming it; "
+            "batch: sync groups of outputs together before renaming them (default: none)"
+        ),
+    )
+
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help=(
+            "Keep the output directory in step with the input directory: move the outputs of renamed files "
+            "rather than processing them again and delete the outputs of deleted files "
+            "(requires --incremental and --recursive)"
+        ),
+    )
+
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help=(
+            "After processing the input directory, keep running and process each file written to it as soon as "
+            "it is closed, until interrupted (requires a single input directory and --recursive)"
+        ),
+    )
+
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of messages to verify or inspect in parallel (verification and inspection only, default: 1)",
+    )
+
+    parser.add_argument(
+        "--catalog",
+        action=UniqueStoreAction,
+        help=(
+            "Catalog file indexing the wrapping keys and encryption context of messages. With --inspect, the header "
+            "of each message inspected is recorded in it. Created if it does not exist. With --query-catalog, the "
+            "catalog to query."
+        ),
+    )
+    parser.add_argument(
+        "--wrapped-by",
+        action=UniqueStoreAction,
+        help=(
+            "Only list files with a data key wrapped by this wrapping key, identified by the key info recorded in "
+            "the message header (for AWS KMS, the key ARN) (only with --query-catalog)"
+        ),
+    )
+
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help=(
+            "Plan all operations without performing them and write the plan to stdout as JSON: "
+            "source to destination mapping, overwrite and skip decisions, total and projected bytes, "
+            "and estimated AWS KMS calls"
+        ),
+    )
+
     parser.add_argument(
         "-v",
         dest="verbosity",
@@ -455,6 +751,321 @@ def _process_encryption_context(
     return encryption_context, required_keys
 
 
+def _process_size(raw_size):
+    # type: (str) -> int
+    """Converts a size with an optional binary unit suffix into a number of bytes.
+
+    :param str raw_size: Unprocessed size (ex: ``512``, ``10K``, ``1.5G``)
+    :returns: Size in bytes
+    :rtype: int
+    :raises ParameterParseError: if size is not valid
+    """
+    match = re.match(r"^(\d+(?:\.\d+)?)([KMGT]?)B?$", raw_size.strip().upper())
+    if match is None:
+        raise ParameterParseError('Invalid size: "{}"'.format(raw_size))
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+def _process_newer_than(raw_newer_than):
+    # type: (str) -> float
+    """Converts a local time or an age into the POSIX timestamp after which files must have been modified.
+
+    :param str raw_newer_than: Unprocessed time (ex: ``2017-10-01``, ``2017-10-01T12:00``) or age (ex: ``12h``)
+    :returns: POSIX timestamp
+    :rtype: float
+    :raises ParameterParseError: if value is not a valid time or age
+    """
+    match = re.match(r"^(\d+(?:\.\d+)?)([smhdw])$", raw_newer_than.strip())
+    if match is not None:
+        return time.time() - float(match.group(1)) * _AGE_UNITS[match.group(2)]
+
+    for timestamp_format in _TIMESTAMP_FORMATS:
+        try:
+            return time.mktime(datetime.strptime(raw_newer_than.strip(), timestamp_format).timetuple())
+        except ValueError:
+            continue
+    raise ParameterParseError('Invalid time or age: "{}"'.format(raw_newer_than))
+
+
+def _process_source_filter(parsed_args):
+    # type: (argparse.Namespace) -> Optional[SourceFilter]
+    """Builds the filter selecting which files in source directories to process.
+
+    :param parsed_args: Parsed arguments from argparse
+    :type parsed_args: argparse.Namespace
+    :returns: Source filter, or None if no filtering was requested
+    :rtype: aws_encryption_sdk_cli.internal.traversal.SourceFilter
+    :raises ParameterParseError: if minimum size is greater than maximum size
+    """
+    filter_args = (
+        parsed_args.include,
+        parsed_args.exclude,
+        parsed_args.min_size,
+        parsed_args.max_size,
+        parsed_args.newer_than,
+    )
+    if all(arg is None for arg in filter_args):
+        return None
+
+    min_size = max_size = None  # type: Optional[int]
+    if parsed_args.min_size is not None:
+        min_size = _process_size(parsed_args.min_size)
+    if parsed_args.max_size is not None:
+        max_size = _process_size(parsed_args.max_size)
+    if min_size is not None and max_size is not None and min_size > max_size:
+        raise ParameterParseError("--min-size cannot be greater than --max-size")
+
+    newer_than = None  # type: Optional[float]
+    if parsed_args.newer_than is not None:
+        newer_than = _process_newer_than(parsed_args.newer_than)
+
+    return SourceFilter(
+        include=parsed_args.include,
+        exclude=parsed_args.exclude,
+        min_size=min_size,
+        max_size=max_size,
+        newer_than=newer_than,
+    )
+
+
+def _process_state_index(parsed_args):
+    # type: (argparse.Namespace) -> Optional[StateIndex]
+    """Builds the state index used for incremental operations.
+
+    :param parsed_args: Parsed arguments from argparse
+    :type parsed_args: argparse.Namespace
+    :returns: State index, or None if incremental operation was not requested
+    :rtype: aws_encryption_sdk_cli.internal.state_index.StateIndex
+    :raises ParameterParseError: if content hashing or sync is requested without a state index
+    :raises ParameterParseError: if sync is requested without recursive
+    """
+    if parsed_args.sync and not parsed_args.recursive:
+        raise ParameterParseError("--sync can only be used with --recursive")
+    if parsed_args.incremental is None:
+        if parsed_args.incremental_hash:
+            raise ParameterParseError("--incremental-hash can only be used with --incremental")
+        if parsed_args.sync:
+            raise ParameterParseError("--sync can only be used with --incremental")
+        return None
+    return StateIndex(parsed_args.incremental, hash_content=parsed_args.incremental_hash)
+
+
+def _validate_watch_args(parsed_args):
+    # type: (argparse.Namespace) -> None
+    """Checks that watch mode is only requested along with compatible arguments.
+
+    :param parsed_args: Parsed arguments from argparse
+    :type parsed_args: argparse.Namespace
+    :raises ParameterParseError: if watch mode is requested without recursive
+    :raises ParameterParseError: if watch mode is requested with a source list or a dry run
+    """
+    if not parsed_args.watch:
+        return
+    if not parsed_args.recursive:
+        raise ParameterParseError("--watch can only be used with --recursive")
+    if parsed_args.input is None or parsed_args.dry_run:
+        raise ParameterParseError("--watch cannot be used with --input-from or --dry-run")
+
+
+def _validate_dry_run_args(parsed_args):
+    # type: (argparse.Namespace) -> None
+    """Checks that a dry run is only requested along with compatible arguments.
+
+    A dry run only plans the operations, so there is nothing for statistics, metrics, profiles, or traces to measure.
+
+    :param parsed_args: Parsed arguments from argparse
+    :type parsed_args: argparse.Namespace
+    :raises ParameterParseError: if a dry run is requested with statistics, metrics, a profile, or a trace
+    """
+    if not parsed_args.dry_run:
+        return
+    if any(
+        value is not None
+        for value in (parsed_args.stats, parsed_args.metrics_file, parsed_args.profile, parsed_args.trace)
+    ):
+        raise ParameterParseError("--dry-run cannot be used with --stats, --metrics-file, --profile, or --trace")
+
+
+def _validate_io_args(parsed_args):
+    # type: (argparse.Namespace) -> None
+    """Checks that the input, output, and metadata output that the action needs are requested.
+
+    :param parsed_args: Parsed arguments from argparse
+    :type parsed_args: argparse.Namespace
+    :raises ParameterParseError: if an input, output, or metadata output is missing
+    :raises ParameterParseError: if an input or output is requested when querying a catalog
+    """
+    if parsed_args.action == "query":
+        if parsed_args.input is not None or parsed_args.input_from is not None or parsed_args.output is not None:
+            raise ParameterParseError(
+                "--query-catalog reads only the catalog: -i/--input, --input-from, and -o/--output cannot be used"
+            )
+        return
+
+    if parsed_args.input is None and parsed_args.input_from is None:
+        raise ParameterParseError("one of the arguments -i/--input --input-from is required")
+    if parsed_args.metadata_output is None:
+        raise ParameterParseError("one of the arguments -S/--suppress-metadata --metadata-output is required")
+    if parsed_args.output is None and parsed_args.action not in ("verify", "inspect"):
+        raise ParameterParseError("the following arguments are required: -o/--output")
+
+
+def _validate_scan_args(parsed_args):
+    # type: (argparse.Namespace) -> None
+    """Checks that verification and inspection are only requested along with compatible arguments.
+
+    :param parsed_args: Parsed arguments from argparse
+    :type parsed_args: argparse.Namespace
+    :raises ParameterParseError: if an output is requested when verifying or inspecting
+    :raises ParameterParseError: if parallel jobs are requested when not verifying or inspecting
+    :raises ParameterParseError: if verification or inspection is requested with arguments that only apply to outputs
+    """
+    if parsed_args.action not in ("verify", "inspect"):
+        if parsed_args.jobs != 1:
+            raise ParameterParseError("--jobs can only be used with --verify or --inspect")
+        return
+
+    if parsed_args.output is not None:
+        raise ParameterParseError(
+            "--{} does not write any output: -o/--output cannot be used".format(parsed_args.action)
+        )
+    if parsed_args.jobs < 1:
+        raise ParameterParseError("--jobs must be at least 1")
+    if parsed_args.watch or parsed_args.dry_run or parsed_args.incremental is not None or parsed_args.resume:
+        raise ParameterParseError(
+            "--{} cannot be used with --watch, --dry-run, --incremental, or --resume".format(parsed_args.action)
+        )
+
+
+def _process_catalog(parsed_args):
+    # type: (argparse.Namespace) -> Optional[Catalog]
+    """Builds the catalog to record message headers in or to query.
+
+    :param parsed_args: Parsed arguments from argparse
+    :type parsed_args: argparse.Namespace
+    :returns: Catalog, or None if no catalog was requested
+    :rtype: aws_encryption_sdk_cli.internal.catalog.Catalog
+    :raises ParameterParseError: if a catalog or catalog query is requested with an action that does not use it
+    :raises ParameterParseError: if a catalog query is requested without a catalog, or the catalog does not exist
+    """
+    if parsed_args.action != "query" and parsed_args.wrapped_by is not None:
+        raise ParameterParseError("--wrapped-by can only be used with --query-catalog")
+    if parsed_args.catalog is None:
+        if parsed_args.action == "query":
+            raise ParameterParseError("--query-catalog requires --catalog")
+        return None
+    if parsed_args.action not in ("inspect", "query"):
+        raise ParameterParseError("--catalog can only be used with --inspect or --query-catalog")
+    if parsed_args.action == "query" and not os.path.isfile(parsed_args.catalog):
+        raise ParameterParseError('Catalog "{}" does not exist'.format(parsed_args.catalog))
+    return Catalog(parsed_args.catalog)
+
+
+def _process_stats(parsed_args):
+    # type: (argparse.Namespace) -> Optional[RunStatistics]
+    """Builds the run statistics to collect.
+
+    :param parsed_args: Parsed arguments from argparse
+    :type parsed_args: argparse.Namespace
+    :returns: Run statistics, or None if no statistics or metrics were requested
+    :rtype: aws_encryption_sdk_cli.internal.stats.RunStatistics
+    :raises ParameterParseError: if statistics are requested for a catalog query
+    """
+    if parsed_args.action == "query" and parsed_args.stats is not None:
+        raise ParameterParseError("--stats cannot be used with --query-catalog")
+    if parsed_args.stats is not None:
+        return RunStatistics(parsed_args.stats)
+    if parsed_args.metrics_file is not None and parsed_args.action != "query":
+        # Collected only to be exported
+        return RunStatistics(None)
+    return None
+
+
+def _process_metrics(parsed_args):
+    # type: (argparse.Namespace) -> Optional[MetricsExporter]
+    """Builds the exporter of run statistics as metrics.
+
+    :param parsed_args: Parsed arguments from argparse, with run statistics already built
+    :type parsed_args: argparse.Namespace
+    :returns: Metrics exporter, or None if no metrics were requested
+    :rtype: aws_encryption_sdk_cli.internal.metrics.MetricsExporter
+    :raises ParameterParseError: if metrics are requested for a catalog query
+    :raises ParameterParseError: if an interval is requested without metrics, or is not positive
+    """
+    if parsed_args.metrics_file is None:
+        if parsed_args.metrics_interval is not None:
+            raise ParameterParseError("--metrics-interval can only be used with --metrics-file")
+        return None
+    if parsed_args.action == "query":
+        raise ParameterParseError("--metrics-file cannot be used with --query-catalog")
+    if parsed_args.metrics_interval is None:
+        return MetricsExporter(parsed_args.metrics_file, parsed_args.stats)
+    if parsed_args.metrics_interval <= 0:
+        raise ParameterParseError("--metrics-interval must be greater than 0")
+    return MetricsExporter(parsed_args.metrics_file, parsed_args.stats, parsed_args.metrics_interval)
+
+
+def _process_profile(parsed_args):
+    # type: (argparse.Namespace) -> Optional[Profiler]
+    """Builds the requested profiler.
+
+    :param parsed_args: Parsed arguments from argparse
+    :type parsed_args: argparse.Namespace
+    :returns: Profiler, or None if no profile was requested
+    :rtype: aws_encryption_sdk_cli.internal.profiling.Profiler
+    :raises ParameterParseError: if the profile is not of a known kind or has no file
+    """
+    if parsed_args.profile is None:
+        return None
+    kind, _, output_file = parsed_args.profile.partition(":")
+    if kind not in PROFILERS or not output_file:
+        raise ParameterParseError('--profile must be "cpu:PATH" or "mem:PATH"')
+    return PROFILERS[kind](output_file)
+
+
+def _process_trace(parsed_args):
+    # type: (argparse.Namespace) -> Optional[Tracer]
+    """Builds the requested tracer.
+
+    :param parsed_args: Parsed arguments from argparse
+    :type parsed_args: argparse.Namespace
+    :returns: Tracer, or None if no trace was requested
+    :rtype: aws_encryption_sdk_cli.internal.tracing.Tracer
+    :raises ParameterParseError: if the trace is not of a known format or has no file
+    """
+    if parsed_args.trace is None:
+        return None
+    trace_format, _, output_file = parsed_args.trace.partition(":")
+    if trace_format not in TRACERS or not output_file:
+        raise ParameterParseError('--trace must be "jsonl:PATH" or "chrome:PATH"')
+    return TRACERS[trace_format](output_file)
+
+
+def _process_reencrypt_args(parsed_args):
+    # type: (argparse.Namespace) -> Optional[List[MASTER_KEY_PROVIDER_CONFIG]]
+    """Applies additional processing to prepare the wrapping key provider configuration for the new
+    messages written by re-encryption or re-wrapping.
+
+    :param parsed_args: Parsed arguments
+    :type parsed_args: argparse.Namespace
+    :returns: Processed wrapping key provider configurations, or None if not re-encrypting or re-wrapping
+    :rtype: list of dicts
+    :raises ParameterParseError: if re-encrypting or re-wrapping without new wrapping keys
+    :raises ParameterParseError: if new wrapping keys are provided when not re-encrypting or re-wrapping
+    :raises ParameterParseError: if an algorithm or frame length is requested when re-wrapping
+    """
+    if parsed_args.action not in ("reencrypt", "rewrap"):
+        if parsed_args.new_wrapping_keys is not None:
+            raise ParameterParseError("--new-wrapping-keys can only be used with --reencrypt or --rewrap")
+        return None
+
+    if parsed_args.new_wrapping_keys is None:
+        raise ParameterParseError("--{} requires --new-wrapping-keys".format(parsed_args.action))
+    if parsed_args.action == "rewrap" and (parsed_args.algorithm is not None or parsed_args.frame_length is not None):
+        raise ParameterParseError("--rewrap keeps the algorithm and frame length of each message")
+    return _process_wrapping_key_provider_configs(parsed_args.new_wrapping_keys, "encrypt")
+
+
 def _process_caching_config(raw_caching_config):
     # type: (RAW_CONFIG) -> CACHING_CONFIG
     """Applies additional processing to prepare the caching configuration.
@@ -497,7 +1108,13 @@ def _process_wrapping_key_provider_configs(  # noqa: C901
     :rtype: list of dicts
     :raises ParameterParseError: if exactly one provider value is not provided
     :raises ParameterParseError: if no key values are provided
+    :raises ParameterParseError: if any wrapping key provider configuration is provided when inspecting or querying
     """
+    if action in ("inspect", "query"):
+        if raw_keys is not None:
+            raise ParameterParseError("--inspect and --query-catalog do not use wrapping keys")
+        return []
+
     if raw_keys is None:
         if action == "decrypt":
             # We allow not defining any wrapping key provider configuration if decrypting with aws-kms.
@@ -614,19 +1231,27 @@ def parse_args(raw_args=None):
             raise ParameterParseError(
                 'Found invalid argument "{actual}". Did you mean "-{actual}"?'.format(actual=parsed_args.dummy_redirect)
             )
+        _validate_io_args(parsed_args)
 
-        if parsed_args.action == "decrypt" and parsed_args.discovery is None:
+        # Re-encryption and re-wrapping decrypt using --wrapping-keys and encrypt using --new-wrapping-keys
+        decrypting = parsed_args.action in ("decrypt", "reencrypt", "rewrap", "verify")
+        if decrypting and parsed_args.discovery is None:
             raise ParameterParseError("Discovery must be set to True or False.")
         discovery_filter = _process_discovery_args(parsed_args)
 
         if parsed_args.required_encryption_context_keys is not None:
             raise ParameterParseError("--required-encryption-context-keys cannot be manually provided.")
 
-        if parsed_args.overwrite_metadata:
+        if parsed_args.overwrite_metadata and parsed_args.metadata_output is not None:
             parsed_args.metadata_output.force_overwrite()
+        if parsed_args.compact_metadata and parsed_args.metadata_output is not None:
+            parsed_args.metadata_output.compact_headers()
 
         parsed_args.wrapping_keys = _process_wrapping_key_provider_configs(
-            parsed_args.wrapping_keys, parsed_args.action, parsed_args.discovery, discovery_filter
+            parsed_args.wrapping_keys,
+            "decrypt" if decrypting else parsed_args.action,
+            parsed_args.discovery,
+            discovery_filter,
         )
 
         # mypy does not appear to understand nargs="+" behavior
@@ -638,6 +1263,21 @@ def parse_args(raw_args=None):
 
         if parsed_args.caching is not None:
             parsed_args.caching = _process_caching_config(parsed_args.caching)
+
+        parsed_args.new_wrapping_keys = _process_reencrypt_args(parsed_args)
+        _validate_watch_args(parsed_args)
+        _validate_scan_args(parsed_args)
+        _validate_dry_run_args(parsed_args)
+        parsed_args.source_filter = _process_source_filter(parsed_args)
+        parsed_args.state_index = _process_state_index(parsed_args)
+        parsed_args.catalog = _process_catalog(parsed_args)
+
+        if parsed_args.resume is not None:
+            parsed_args.resume = Journal(parsed_args.resume)
+        parsed_args.stats = _process_stats(parsed_args)
+        parsed_args.metrics_file = _process_metrics(parsed_args)
+        parsed_args.profile = _process_profile(parsed_args)
+        parsed_args.trace = _process_trace(parsed_args)
     except ParameterParseError as error:
         parser.error(*error.args)
 
@@ -0,0 +1,208 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Local catalog of message headers used to find the files that depend on a wrapping key or encryption context."""
+import base64
+import logging
+import os
+import sqlite3
+import time
+
+import attr
+import six
+
+from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import Any, Dict, Iterable, List, Optional, Text, Union  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("Catalog",)
+_LOGGER = logging.getLogger(LOGGER_NAME)
+#: Number of messages to write before committing them to the catalog.
+_COMMIT_INTERVAL = 1000
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    path TEXT PRIMARY KEY,
+    message_id TEXT NOT NULL,
+    algorithm TEXT NOT NULL,
+    cataloged REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS data_keys (
+    path TEXT NOT NULL,
+    provider_id TEXT NOT NULL,
+    key_info BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS data_keys_key ON data_keys (key_info, provider_id);
+CREATE INDEX IF NOT EXISTS data_keys_path ON data_keys (path);
+CREATE TABLE IF NOT EXISTS encryption_context (
+    path TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS encryption_context_pair ON encryption_context (key, value);
+CREATE INDEX IF NOT EXISTS encryption_context_path ON encryption_context (path);
+"""
+
+
+@attr.s(hash=False, init=False)
+class Catalog(object):
+    """SQLite-backed catalog of message headers, keyed on message path.
+
+    For each message, the catalog records its message ID and algorithm, the provider ID and key
+    info of each of its encrypted data keys, and each of its encryption context pairs. Data keys
+    and encryption context pairs are indexed so that the messages that depend on a wrapping key,
+    or that carry an encryption context pair, are found without reading every message.
+
+    Messages are committed in batches, so if the process is interrupted, only the most recent
+    messages are lost and they are cataloged again on the next run.
+
+    :param str filename: Path to catalog file
+    """
+
+    filename = attr.ib(validator=attr.validators.instance_of(six.string_types))
+    _connection = None  # type: Optional[sqlite3.Connection]
+    _pending = 0  # type: int
+
+    def __init__(self, filename):
+        # type: (str) -> None
+        """Workaround pending resolution of attrs/mypy interaction.
+        https://github.com/python/mypy/issues/2088
+        https://github.com/python-attrs/attrs/issues/215
+        """
+        self.filename = os.path.abspath(filename)
+        attr.validate(self)
+
+        if not os.path.isdir(os.path.dirname(self.filename)):
+            raise BadUserArgumentError("Parent directory for requested catalog file does not exist.")
+
+    def _open(self):
+        # type: () -> sqlite3.Connection
+        """Opens the catalog, creating it if necessary.
+
+        :rtype: sqlite3.Connection
+        """
+        if self._connection is None:
+            try:
+                self._connection = sqlite3.connect(self.filename)
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.execute("PRAGMA synchronous=NORMAL")
+                self._connection.executescript(_SCHEMA)
+            except sqlite3.DatabaseError as error:
+                raise BadUserArgumentError('Unable to open catalog "{}": {}'.format(self.filename, error))
+        return self._connection
+
+    def _delete(self, path):
+        # type: (str) -> None
+        """Deletes everything recorded for a message.
+
+        :param str path: Full file path to message
+        """
+        connection = self._open()
+        for table in ("messages", "data_keys", "encryption_context"):
+            connection.execute("DELETE FROM {} WHERE path = ?".format(table), (path,))
+
+    def _written(self):
+        # type: () -> None
+        """Counts a change to the catalog, committing once enough changes are pending."""
+        self._pending += 1
+        if self._pending >= _COMMIT_INTERVAL:
+            self.commit()
+
+    def record(self, path, header):
+        # type: (str, Dict[str, Any]) -> None
+        """Records the header of a message, replacing anything previously recorded for it.
+
+        :param str path: Full file path to message
+        :param dict header: Message header, as returned by
+            :func:`aws_encryption_sdk_cli.internal.metadata.json_ready_header`
+        """
+        path = os.path.abspath(path)
+        self._delete(path)
+        connection = self._open()
+        connection.execute(
+            "INSERT INTO messages VALUES (?, ?, ?, ?)", (path, header["message_id"], header["algorithm"], time.time())
+        )
+        connection.executemany(
+            "INSERT INTO data_keys VALUES (?, ?, ?)",
+            [
+                (
+                    path,
+                    base64.b64decode(data_key["key_provider"]["provider_id"]).decode("utf-8"),
+                    sqlite3.Binary(base64.b64decode(data_key["key_provider"]["key_info"])),
+                )
+                for data_key in header["encrypted_data_keys"]
+            ],
+        )
+        connection.executemany(
+            "INSERT INTO encryption_context VALUES (?, ?, ?)",
+            [(path, key, value) for key, value in header["encryption_context"].items()],
+        )
+        self._written()
+
+    def remove(self, path):
+        # type: (str) -> None
+        """Removes a message from the catalog.
+
+        :param str path: Full file path to message
+        """
+        self._delete(os.path.abspath(path))
+        self._written()
+
+    def find(self, key_info=None, encryption_context=None, encryption_context_keys=None):
+        # type: (Optional[Union[bytes, Text]], Optional[Dict[str, str]], Optional[Iterable[str]]) -> List[Text]
+        """Finds the messages that match all of the requested conditions.
+
+        :param key_info: Key info of a wrapping key that must wrap a data key of each message (optional)
+        :type key_info: bytes or str
+        :param dict encryption_context: Pairs that must be in the encryption context of each message (optional)
+        :param encryption_context_keys: Keys that must be in the encryption context of each message (optional)
+        :returns: Sorted paths of matching messages
+        :rtype: list of str
+        """
+        # Each condition is a separate query that uses its own index. Their intersection is the result.
+        queries = []  # type: List[str]
+        parameters = []  # type: List[Any]
+        if key_info is not None:
+            queries.append("SELECT path FROM data_keys WHERE key_info = ?")
+            if isinstance(key_info, six.text_type):
+                key_info = key_info.encode("utf-8")
+            parameters.append(sqlite3.Binary(key_info))
+        for key, value in sorted((encryption_context or {}).items()):
+            queries.append("SELECT path FROM encryption_context WHERE key = ? AND value = ?")
+            parameters.extend((key, value))
+        for key in sorted(set(encryption_context_keys or ())):
+            queries.append("SELECT path FROM encryption_context WHERE key = ?")
+            parameters.append(key)
+        if not queries:
+            queries.append("SELECT path FROM messages")
+
+        cursor = self._open().execute(" INTERSECT ".join(queries) + " ORDER BY path", parameters)
+        return [path for (path,) in cursor.fetchall()]
+
+    def commit(self):
+        # type: () -> None
+        """Commits all pending messages."""
+        if self._connection is not None and self._pending:
+            self._connection.commit()
+            self._pending = 0
+
+    def close(self):
+        # type: () -> None
+        """Commits all pending messages and closes the catalog."""
+        if self._connection is not None:
+            self.commit()
+            self._connection.close()
+            self._connection = None
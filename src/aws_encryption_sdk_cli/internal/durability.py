@@ -0,0 +1,272 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Atomic output files and the policies that control when they are synced to disk."""
+import binascii
+import io
+import logging
+import os
+import stat
+import threading
+import time
+from enum import Enum
+
+import attr
+
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import IO, Any, Callable, List, Optional, Tuple  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("Durability", "AtomicOutput", "OutputCommitter")
+_LOGGER = logging.getLogger(LOGGER_NAME)
+#: Maximum number of outputs to hold in a batch before syncing and renaming them.
+_BATCH_FILES = 256
+#: Maximum number of seconds to hold outputs in a batch before syncing and renaming them.
+_BATCH_SECONDS = 1.0
+# os.replace is not available before Python 3.3
+_replace = getattr(os, "replace", os.rename)
+
+
+class Durability(Enum):
+    """Defines the possible values for a durability policy."""
+
+    none = "none"
+    file = "file"
+    batch = "batch"
+
+    def __str__(self):
+        """Returns the string value for the durability policy"""
+        return self.value
+
+
+def _fsync_path(path):
+    # type: (str) -> None
+    """Syncs the contents of a file to disk.
+
+    :param str path: Full path to file
+    """
+    file_descriptor = os.open(path, os.O_RDWR | getattr(os, "O_BINARY", 0))
+    try:
+        getattr(os, "fdatasync", os.fsync)(file_descriptor)
+    finally:
+        os.close(file_descriptor)
+
+
+def _fsync_dir(path):
+    # type: (str) -> None
+    """Syncs the entries of a directory to disk, where the platform supports it.
+
+    :param str path: Full path to directory
+    """
+    try:
+        file_descriptor = os.open(path, os.O_RDONLY)
+    except OSError as error:
+        # Directories cannot be opened on all platforms
+        _LOGGER.debug("Unable to sync directory %s: %s", path, error)
+        return
+    try:
+        os.fsync(file_descriptor)
+    except OSError as error:
+        _LOGGER.debug("Unable to sync directory %s: %s", path, error)
+    finally:
+        os.close(file_descriptor)
+
+
+class AtomicOutput(object):
+    """Writable file that is written to a temporary file in the same directory as its destination
+    and only replaces the destination once it is complete, so that readers never see a partial file.
+
+    The ``name`` of this file is its final destination. All other attributes are passed through
+    to the temporary file.
+
+    :param str destination: Full path to destination file
+    :param bool replace_existing: Should the permissions of an existing destination file be kept (default: False)
+    """
+
+    def __init__(self, destination, replace_existing=False):
+        # type: (str, bool) -> None
+        """Creates the temporary file."""
+        self.name = destination
+        directory, filename = os.path.split(os.path.abspath(destination))
+        self.temp_name = os.path.join(
+            directory, ".{}.{}.tmp".format(filename, binascii.hexlify(os.urandom(4)).decode("ascii"))
+        )
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+        self.__wrapped = io.open(os.open(self.temp_name, flags, 0o666), "wb")
+        if replace_existing:
+            try:
+                os.chmod(self.temp_name, stat.S_IMODE(os.stat(destination).st_mode))
+            except OSError as error:
+                _LOGGER.debug("Unable to copy permissions from %s: %s", destination, error)
+
+    def __getattr__(self, name):
+        # type: (str) -> Any
+        """Passes through all other attributes to the temporary file."""
+        return getattr(self.__wrapped, name)
+
+    def __enter__(self):
+        # type: () -> AtomicOutput
+        """Returns self so that the destination is still identified within a ``with`` block."""
+        self.__wrapped.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # type: (Any, Any, Any) -> Any
+        """Passes through context manager exit to the temporary file."""
+        return self.__wrapped.__exit__(exc_type, exc_value, traceback)
+
+    def rename(self):
+        # type: () -> None
+        """Replaces the destination with the completed temporary file."""
+        _replace(self.temp_name, self.name)
+
+    def discard(self):
+        # type: () -> None
+        """Closes and deletes the temporary file, leaving the destination untouched."""
+        self.__wrapped.close()
+        try:
+            os.remove(self.temp_name)
+        except OSError:
+            # if the file doesn't exist that's ok too
+            pass
+
+
+@attr.s(hash=False, init=False)
+class OutputCommitter(object):
+    """Moves completed outputs into place according to a durability policy.
+
+    * ``none``: outputs are renamed into place without being synced to disk.
+    * ``file``: each output is synced to disk before it is renamed into place, and its directory is
+      synced afterwards.
+    * ``batch``: completed outputs are held until a batch is full or has been open for a short time.
+      All held outputs are then synced together, renamed into place, and each of their directories
+      is synced once, so that many small outputs share the cost of waiting for the disk. A background
+      timer flushes a batch that is still open once its time is up, so that outputs are not held while
+      a slow operation runs or while no more operations are started.
+
+    A callback passed along with an output is called once that output is in place and synced as the
+    policy requires. Callbacks for outputs moved into place by the background timer are deferred
+    until the next commit or flush, so that they are always called from the committing thread.
+
+    :param durability: Durability policy
+    :type durability: Durability
+    """
+
+    durability = attr.ib(validator=attr.validators.instance_of(Durability))
+
+    def __init__(self, durability=Durability.none):
+        # type: (Durability) -> None
+        """Workaround pending resolution of attrs/mypy interaction.
+        https://github.com/python/mypy/issues/2088
+        https://github.com/python-attrs/attrs/issues/215
+        """
+        self.durability = durability
+        attr.validate(self)
+        self._pending = []  # type: List[Tuple[AtomicOutput, Optional[Callable[[], None]]]]
+        self._committed = []  # type: List[Callable[[], None]]
+        self._batch_started = 0.0
+        self._lock = threading.Lock()
+        self._timer = None  # type: Optional[threading.Timer]
+        self._timer_error = None  # type: Optional[Exception]
+
+    def commit(self, output, on_committed=None):
+        # type: (AtomicOutput, Optional[Callable[[], None]]) -> None
+        """Moves a completed output into place, or holds it for the current batch.
+
+        :param output: Completed output
+        :type output: AtomicOutput
+        :param callable on_committed: Callable to call once the output is in place (optional)
+        :raises Exception: if the background timer failed to flush an earlier batch
+        """
+        output.close()
+        self._run_committed()
+        if self.durability is Durability.batch:
+            with self._lock:
+                if not self._pending:
+                    self._batch_started = time.time()
+                    self._timer = threading.Timer(_BATCH_SECONDS, self._flush_on_timer)
+                    self._timer.daemon = True
+                    self._timer.start()
+                self._pending.append((output, on_committed))
+                batch_done = len(self._pending) >= _BATCH_FILES or time.time() - self._batch_started >= _BATCH_SECONDS
+            if batch_done:
+                self.flush()
+            return
+
+        if self.durability is Durability.file:
+            _fsync_path(output.temp_name)
+        output.rename()
+        if self.durability is Durability.file:
+            _fsync_dir(os.path.dirname(os.path.abspath(output.name)))
+        if on_committed is not None:
+            on_committed()
+
+    def _raise_timer_error(self):
+        # type: () -> None
+        """Raises any error encountered by the background timer.
+
+        :raises Exception: if the background timer failed to flush a batch
+        """
+        error, self._timer_error = self._timer_error, None
+        if error is not None:
+            raise error  # pylint: disable=raising-bad-type
+
+    def _flush_pending(self):
+        # type: () -> None
+        """Syncs and moves into place all outputs held for the current batch."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            _LOGGER.debug("Syncing %d outputs", len(pending))
+            for output, _on_committed in pending:
+                _fsync_path(output.temp_name)
+            directories = set()
+            for output, _on_committed in pending:
+                output.rename()
+                directories.add(os.path.dirname(os.path.abspath(output.name)))
+            for directory in sorted(directories):
+                _fsync_dir(directory)
+            self._committed.extend(on_committed for _output, on_committed in pending if on_committed is not None)
+
+    def _run_committed(self):
+        # type: () -> None
+        """Calls the callbacks for all outputs that have been moved into place."""
+        with self._lock:
+            committed, self._committed = self._committed, []
+        for on_committed in committed:
+            on_committed()
+
+    def _flush_on_timer(self):
+        # type: () -> None
+        """Flushes the current batch once it has been open for too long, keeping any error to raise later."""
+        try:
+            self._flush_pending()
+        except Exception as error:  # pylint: disable=broad-except
+            self._timer_error = error
+
+    def flush(self):
+        # type: () -> None
+        """Syncs and moves into place all outputs held for the current batch.
+
+        :raises Exception: if the background timer failed to flush an earlier batch
+        """
+        self._flush_pending()
+        self._run_committed()
+        self._raise_timer_error()
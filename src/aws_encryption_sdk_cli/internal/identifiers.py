@@ -34,7 +34,12 @@ __all__ = (
 __version__ = "2.0.0"  # type: str
 
 #: Suffix added to output files if specific output filename is not specified.
-OUTPUT_SUFFIX = {"encrypt": ".encrypted", "decrypt": ".decrypted"}  # type: Dict[str, str]
+OUTPUT_SUFFIX = {
+    "encrypt": ".encrypted",
+    "decrypt": ".decrypted",
+    "reencrypt": "",
+    "rewrap": "",
+}  # type: Dict[str, str]
 
 ALGORITHM_NAMES = {
     alg for alg in dir(aws_encryption_sdk.Algorithm) if not alg.startswith("_")
@@ -49,14 +54,16 @@ class OperationResult(Enum):
     """Identifies the resulting state of an operation.
 
     :param bool needs_cleanup: If true, the output file needs to be deleted
+    :param bool wrote_output: If true, the output was written
     """
 
-    FAILED = (True,)
-    SUCCESS = (False,)
-    SKIPPED = (False,)
-    FAILED_VALIDATION = (True,)
+    FAILED = (True, False)
+    SUCCESS = (False, True)
+    SKIPPED = (False, False)
+    FAILED_VALIDATION = (True, False)
 
-    def __init__(self, needs_cleanup):
-        # type: (bool) -> None
+    def __init__(self, needs_cleanup, wrote_output):
+        # type: (bool, bool) -> None
         """Prepares new OperationResult."""
         self.needs_cleanup = needs_cleanup
+        self.wrote_output = wrote_output
@@ -0,0 +1,122 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Inventory of encrypted messages from their headers alone."""
+import logging
+import os
+
+from aws_encryption_sdk.internal.formatting.deserialize import deserialize_header
+
+from aws_encryption_sdk_cli.exceptions import AWSEncryptionSDKCLIError
+from aws_encryption_sdk_cli.internal.catalog import Catalog  # noqa pylint: disable=unused-import
+from aws_encryption_sdk_cli.internal.io_handling import IOHandler  # noqa pylint: disable=unused-import
+from aws_encryption_sdk_cli.internal.io_handling import _encoder, _stdin
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+from aws_encryption_sdk_cli.internal.metadata import json_ready_header
+from aws_encryption_sdk_cli.internal.scanning import error_description, scan
+from aws_encryption_sdk_cli.internal.tracing import span
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import IO, Any, Dict, Iterable, Optional  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("inspect_headers",)
+_LOGGER = logging.getLogger(LOGGER_NAME)
+#: Size of read buffer for source files. Most headers fit in a single read.
+_READ_SIZE = 4096
+
+
+def _read_header(handler, source):
+    # type: (IOHandler, IO) -> Dict[str, Any]
+    """Reads and parses only the header of a message.
+
+    :param handler: IOHandler that holds the configuration for the operation
+    :param source: Stream from which to read the message
+    :type source: file-like object
+    :returns: JSON-serializable representation of the message header
+    :rtype: dict
+    """
+    with _encoder(source, handler.decode_input) as _source, span("header"):
+        header, _raw_header = deserialize_header(_source)
+    return json_ready_header(header)
+
+
+def _inspect_message(handler, source):
+    # type: (IOHandler, str) -> Dict[str, Any]
+    """Inspects the header of a single message, recording the error rather than raising if it cannot be parsed.
+
+    :param handler: IOHandler that holds the configuration for the operation
+    :param str source: Full file path to source file, or ``-`` for stdin
+    :returns: Metadata for the operation
+    :rtype: dict
+    """
+    _LOGGER.debug("inspecting file %s", source)
+    record = dict(mode="inspect", input=source)  # type: Dict[str, Any]
+    with span("operation", input=source):
+        try:
+            if source == "-":
+                record["header"] = _read_header(handler, _stdin())
+            else:
+                with open(os.path.abspath(source), "rb", _READ_SIZE) as source_reader:
+                    record["header"] = _read_header(handler, source_reader)
+        except Exception as error:  # pylint: disable=broad-except
+            # Files that are not messages are reported, but do not stop the inventory
+            record["error"] = error_description(error)
+            _LOGGER.warning("Unable to read message header from %s: %s", source, record["error"])
+    return record
+
+
+def inspect_headers(handler, sources, recursive, jobs=1, catalog=None):
+    # type: (IOHandler, Iterable[str], bool, int, Optional[Catalog]) -> None
+    """Writes a metadata record containing the header of every message in the requested sources.
+
+    Only the header of each message is read. Data keys are not decrypted, so no wrapping keys
+    are used, and the header authentication is not checked: the header is reported as it is
+    stored. Messages are inspected by ``jobs`` worker threads. Records are written in source
+    order, whatever order the workers finish in.
+
+    If a catalog is provided, the header of each message is also recorded in it. Files whose
+    header cannot be read are removed from it.
+
+    :param handler: IOHandler that holds the configuration for the operations
+    :param sources: Source paths, or ``-`` for stdin
+    :param bool recursive: Should source directories be inspected
+    :param int jobs: Number of messages to inspect in parallel (default: 1)
+    :param catalog: Catalog in which to record message headers (optional)
+    :type catalog: aws_encryption_sdk_cli.internal.catalog.Catalog
+    :raises AWSEncryptionSDKCLIError: if the header of any message could not be read
+    """
+
+    def _inspect(source):
+        # type: (str) -> Dict[str, Any]
+        return _inspect_message(handler, source)
+
+    def _catalog(record):
+        # type: (Dict[str, Any]) -> None
+        if record["input"] == "-":
+            # Messages read from stdin have no path to catalog
+            return
+        if "header" in record:
+            catalog.record(record["input"], record["header"])  # type: ignore
+        else:
+            catalog.remove(record["input"])  # type: ignore
+
+    try:
+        total, failed = scan(handler, _inspect, sources, recursive, jobs, None if catalog is None else _catalog)
+    finally:
+        if catalog is not None:
+            catalog.close()
+    _LOGGER.info("Inspected %d messages: %d failed", total, failed)
+    if failed:
+        raise AWSEncryptionSDKCLIError("Unable to read the message header of {} of {} files".format(failed, total))
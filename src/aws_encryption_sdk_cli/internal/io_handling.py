@@ -14,22 +14,57 @@
 from __future__ import division
 
 import copy
+import functools
+import io
 import logging
 import os
+import stat
 import sys
 
 import attr
 import aws_encryption_sdk
 import six
+from aws_encryption_sdk.internal.defaults import ENCODED_SIGNER_KEY
 from aws_encryption_sdk.materials_managers import CommitmentPolicy  # noqa pylint: disable=unused-import
+from aws_encryption_sdk.structures import MessageHeader  # noqa pylint: disable=unused-import
 from base64io import Base64IO
 
+from aws_encryption_sdk_cli.internal.durability import AtomicOutput, Durability, OutputCommitter
 from aws_encryption_sdk_cli.internal.identifiers import OUTPUT_SUFFIX, OperationResult
+from aws_encryption_sdk_cli.internal.journal import DigestingWriter, Journal
 from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
-from aws_encryption_sdk_cli.internal.metadata import MetadataWriter, json_ready_header, json_ready_header_auth
+from aws_encryption_sdk_cli.internal.metadata import (
+    LazyValue,
+    MetadataWriter,
+    json_ready_header,
+    json_ready_header_auth,
+    unicode_b64_encode,
+)
+from aws_encryption_sdk_cli.internal.profiling import Profiler
+from aws_encryption_sdk_cli.internal.rewrap import MessageRewrapper
+from aws_encryption_sdk_cli.internal.sizing import ciphertext_length, encoded_length
+from aws_encryption_sdk_cli.internal.state_index import StateIndex, content_hash
+from aws_encryption_sdk_cli.internal.stats import FAILED, SKIPPED, SUCCEEDED, RunStatistics
+from aws_encryption_sdk_cli.internal.timing import OperationTimer, frame_count, stream_position, stream_size
+from aws_encryption_sdk_cli.internal.tracing import span
+from aws_encryption_sdk_cli.internal.traversal import SourceFilter, walk
 
 try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
-    from typing import IO, Dict, List, Type, Union, cast  # noqa pylint: disable=unused-import
+    from typing import (  # noqa pylint: disable=unused-import
+        IO,
+        Any,
+        Callable,
+        Dict,
+        Iterator,
+        List,
+        Optional,
+        Set,
+        Text,
+        Tuple,
+        Type,
+        Union,
+        cast,
+    )
 
     from aws_encryption_sdk_cli.internal.mypy_types import SOURCE, STREAM_KWARGS  # noqa pylint: disable=unused-import
 except ImportError:  # pragma: no cover
@@ -37,7 +72,7 @@ except ImportError:  # pragma: no cover
     IO = None  # type: ignore
     # We only actually need the other imports when running the mypy checks
 
-__all__ = ("IOHandler", "output_filename")
+__all__ = ("IOHandler", "deleted_outputs", "output_filename")
 _LOGGER = logging.getLogger(LOGGER_NAME)
 
 
@@ -93,6 +128,44 @@ def _ensure_dir_exists(filename):
         _LOGGER.info("Created directory: %s", dest_final_dir)
 
 
+def _stat(filename):
+    # type: (str) -> Optional[os.stat_result]
+    """Collects the status of a file, if it exists.
+
+    :param str filename: Full path to file
+    :returns: Status of file or None if file does not exist
+    :rtype: os.stat_result
+    """
+    try:
+        return os.stat(filename)
+    except OSError:
+        return None
+
+
+def _preallocate(stream, length):
+    # type: (IO, int) -> bool
+    """Attempts to reserve ``length`` bytes of disk space for a file, starting at the current position.
+
+    Reserving the full output size up front allows the filesystem to allocate contiguous extents
+    rather than growing the file one write at a time.
+
+    .. note::
+        Preallocation extends the file, so the caller must truncate it at the final write position.
+
+    :param stream: File to which to write
+    :type stream: file-like object
+    :param int length: Number of bytes to reserve
+    :returns: True if space was reserved, False if preallocation is not supported for this stream
+    :rtype: bool
+    """
+    try:
+        os.posix_fallocate(stream.fileno(), stream.tell(), length)  # type: ignore # not available on all platforms
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation) as error:
+        _LOGGER.debug("Unable to preallocate output file: %s", error)
+        return False
+    return True
+
+
 def _encoder(stream, should_base64):
     # type: (IO, bool) -> Union[IO, Base64IO]
     """Wraps a stream in either a Base64IO transformer or results stream if wrapping is not requested.
@@ -142,6 +215,47 @@ def _output_dir(source_root, destination_root, source_dir):
     return os.path.join(destination_root, suffix)
 
 
+def deleted_outputs(state_index, source_root, destination_root, mode, seen_sources):
+    # type: (StateIndex, str, str, str, Set[str]) -> Iterator[Tuple[Text, Text]]
+    """Finds outputs in a destination directory tree whose sources have been deleted.
+
+    :param state_index: Index of completed operations
+    :type state_index: aws_encryption_sdk_cli.internal.state_index.StateIndex
+    :param str source_root: Root of source directory
+    :param str destination_root: Root of destination directory
+    :param str mode: Operating mode (encrypt/decrypt)
+    :param set seen_sources: Absolute paths of all sources found in the source directory tree
+    :returns: Iterator of tuples of recorded source path and output path
+    """
+    output_prefix = os.path.join(os.path.abspath(destination_root), "")
+    for source, output in state_index.records_under(source_root, mode):
+        if source in seen_sources or not output.startswith(output_prefix):
+            continue
+        if os.path.lexists(source):
+            # Source still exists but was not selected, for example because of a filter
+            continue
+        yield source, output
+
+
+def _remove_empty_dirs(directory, root):
+    # type: (str, str) -> None
+    """Removes a directory and each of its parents that are empty, up to but not including a root directory.
+
+    :param str directory: Full path to directory
+    :param str root: Full path to root directory
+    """
+    root = os.path.abspath(root)
+    directory = os.path.abspath(directory)
+    while directory != root and directory.startswith(os.path.join(root, "")):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            # Not empty
+            return
+        _LOGGER.info("Removed empty directory: %s", directory)
+        directory = os.path.dirname(directory)
+
+
 @attr.s(hash=False, init=False)
 class IOHandler(object):
     """Common handler for all IO operations. Holds common configuration values used for all
@@ -155,6 +269,23 @@ class IOHandler(object):
     :param bool encode_output: Should output be base64 encoded after operation
     :param dict required_encryption_context: Encryption context key-value pairs to require
     :param list required_encryption_context_keys: Encryption context keys to require
+    :param source_filter: Filter selecting which files in source directories to process (optional)
+    :type source_filter: aws_encryption_sdk_cli.internal.traversal.SourceFilter
+    :param state_index: Index of completed operations used to skip unchanged source files (optional)
+    :type state_index: aws_encryption_sdk_cli.internal.state_index.StateIndex
+    :param bool sync: Should renamed sources have their outputs moved rather than processed again,
+        and deleted sources have their outputs deleted, when processing directories with a state index
+        (default: False)
+    :param journal: Journal of completed operations used to resume interrupted runs (optional)
+    :type journal: aws_encryption_sdk_cli.internal.journal.Journal
+    :param durability: Policy controlling when outputs are synced to disk (default: none)
+    :type durability: aws_encryption_sdk_cli.internal.durability.Durability
+    :param bool timing: Should encrypt and decrypt metadata records include timing and throughput
+        fields (default: False)
+    :param statistics: Statistics in which to record the result of each operation (optional)
+    :type statistics: aws_encryption_sdk_cli.internal.stats.RunStatistics
+    :param profiler: Profiler to which to report the start and end of each operation (optional)
+    :type profiler: aws_encryption_sdk_cli.internal.profiling.Profiler
     """
 
     metadata_writer = attr.ib(validator=attr.validators.instance_of(MetadataWriter))
@@ -166,6 +297,16 @@ class IOHandler(object):
     required_encryption_context_keys = attr.ib(
         validator=attr.validators.instance_of(list)
     )  # noqa pylint: disable=invalid-name
+    source_filter = attr.ib(validator=attr.validators.optional(attr.validators.instance_of(SourceFilter)))
+    state_index = attr.ib(validator=attr.validators.optional(attr.validators.instance_of(StateIndex)))
+    sync = attr.ib(validator=attr.validators.instance_of(bool))
+    journal = attr.ib(validator=attr.validators.optional(attr.validators.instance_of(Journal)))
+    durability = attr.ib(validator=attr.validators.instance_of(Durability))
+    timing = attr.ib(validator=attr.validators.instance_of(bool))
+    statistics = attr.ib(validator=attr.validators.optional(attr.validators.instance_of(RunStatistics)))
+    profiler = attr.ib(validator=attr.validators.optional(attr.validators.instance_of(Profiler)))
+    _last_header = None  # type: Optional[MessageHeader]
+    _last_output = None  # type: Optional[DigestingWriter]
 
     def __init__(
         self,
@@ -177,6 +318,14 @@ class IOHandler(object):
         required_encryption_context,  # type: Dict[str, str]
         required_encryption_context_keys,  # type: List[str]
         commitment_policy,  # type: CommitmentPolicy
+        source_filter=None,  # type: Optional[SourceFilter]
+        state_index=None,  # type: Optional[StateIndex]
+        sync=False,  # type: bool
+        journal=None,  # type: Optional[Journal]
+        durability=Durability.none,  # type: Durability
+        timing=False,  # type: bool
+        statistics=None,  # type: Optional[RunStatistics]
+        profiler=None,  # type: Optional[Profiler]
     ):
         # type: (...) -> None
         """Workaround pending resolution of attrs/mypy interaction.
@@ -190,13 +339,297 @@ class IOHandler(object):
         self.encode_output = encode_output
         self.required_encryption_context = required_encryption_context
         self.required_encryption_context_keys = required_encryption_context_keys  # pylint: disable=invalid-name
+        self.source_filter = source_filter
+        self.state_index = state_index
+        self.sync = sync
+        self.journal = journal
+        self.durability = durability
+        self.timing = timing
+        self.statistics = statistics
+        self.profiler = profiler
         self.client = aws_encryption_sdk.EncryptionSDKClient(commitment_policy=commitment_policy)
+        self._known_dirs = set()  # type: Set[str]
+        self._vacated_dirs = set()  # type: Set[str]
+        self._committer = OutputCommitter(durability)
         attr.validate(self)
 
+    def _ensure_destination_dir_exists(self, filename):
+        # type: (str) -> None
+        """Creates the directory tree for a destination file unless this handler already has.
+
+        :param str filename: Full path to file in destination directory
+        """
+        dest_final_dir = filename.rsplit(os.sep, 1)[0]
+        if dest_final_dir in self._known_dirs:
+            return
+        _ensure_dir_exists(filename)
+        self._known_dirs.add(dest_final_dir)
+
+    def _already_processed(self, source, source_stat, destination, destination_stat, stream_args):
+        # pylint: disable=too-many-arguments
+        # type: (str, os.stat_result, str, Optional[os.stat_result], STREAM_KWARGS) -> bool
+        """Determines whether the resume journal or state index shows that a source file does not need to be
+        processed again, moving the output of a renamed source into place if syncing.
+
+        :param str source: Full file path to source file
+        :param source_stat: Status of source file
+        :type source_stat: os.stat_result
+        :param str destination: Full file path to destination file
+        :param destination_stat: Status of destination file, if it exists
+        :type destination_stat: os.stat_result
+        :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
+        :rtype: bool
+        """
+        mode = str(stream_args["mode"])
+        if self.journal is not None and self.journal.is_complete(source, source_stat, destination, mode):
+            _LOGGER.info("Skipping because the source (%s) was already processed to %s", source, destination)
+            return True
+        if self.state_index is None:
+            return False
+        if self.state_index.is_unchanged(source, source_stat, destination, mode):
+            _LOGGER.info("Skipping because the source (%s) is unchanged since it was last processed", source)
+            return True
+        return self.sync and destination_stat is None and self._move_renamed_output(
+            source, source_stat, destination, mode
+        )
+
+    def _move_renamed_output(self, source, source_stat, destination, mode):
+        # type: (str, os.stat_result, str, str) -> bool
+        """Moves the output of a previously processed source that has since been renamed, rather than
+        processing it again.
+
+        :param str source: Full file path to source file at its new path
+        :param source_stat: Status of source file
+        :type source_stat: os.stat_result
+        :param str destination: Full file path to destination file, which must not exist
+        :param str mode: Operating mode (encrypt/decrypt)
+        :returns: True if an output was moved, False otherwise
+        :rtype: bool
+        """
+        moved = self.state_index.find_moved(source, source_stat, mode)
+        if moved is None:
+            return False
+
+        old_source, old_output, message_id, source_hash = moved
+        _LOGGER.info(
+            "Moving output file %s to %s because the source was renamed to %s", old_output, destination, source
+        )
+        self._ensure_destination_dir_exists(destination)
+        os.rename(old_output, destination)
+        self._vacated_dirs.add(os.path.dirname(old_output))
+        self.state_index.remove(old_source)
+        self.state_index.record(
+            source=source,
+            source_stat=source_stat,
+            destination=destination,
+            mode=mode,
+            message_id=message_id,
+            source_hash=source_hash,
+        )
+        return True
+
+    def _remove_deleted_outputs(self, source, destination, mode, seen_sources):
+        # type: (str, str, str, Set[str]) -> None
+        """Deletes all outputs in a destination directory tree whose sources have been deleted.
+
+        :param str source: Full file path to source directory root
+        :param str destination: Full file path to destination directory root
+        :param str mode: Operating mode (encrypt/decrypt)
+        :param set seen_sources: Absolute paths of all sources found in the source directory tree
+        """
+        for old_source, output in deleted_outputs(self.state_index, source, destination, mode, seen_sources):
+            _LOGGER.info("Deleting output file %s because the source %s no longer exists", output, old_source)
+            try:
+                os.remove(output)
+            except OSError as error:
+                if os.path.lexists(output):
+                    raise
+                _LOGGER.debug("Output file was already removed: %s", error)
+            self._vacated_dirs.add(os.path.dirname(output))
+            self.state_index.remove(old_source)
+
+        for directory in sorted(self._vacated_dirs, reverse=True):
+            _remove_empty_dirs(directory, destination)
+            self._known_dirs.discard(directory)
+        self._vacated_dirs.clear()
+
+    def flush(self):
+        # type: () -> None
+        """Moves all held outputs into place and persists all pending records of completed operations."""
+        self._committer.flush()
+        self.metadata_writer.flush()
+        if self.state_index is not None:
+            self.state_index.commit()
+        if self.journal is not None:
+            self.journal.flush()
+
+    def close(self):
+        # type: () -> None
+        """Flushes and closes any resources held across operations."""
+        try:
+            self._committer.flush()
+        finally:
+            try:
+                if self.state_index is not None:
+                    self.state_index.close()
+            finally:
+                if self.journal is not None:
+                    self.journal.close()
+
+    def _has_required_context(self, header, metadata_kwargs):
+        # type: (MessageHeader, Dict[str, Any]) -> bool
+        """Determines whether a message's encryption context contains all required elements,
+        recording any that are missing in the metadata for the operation.
+
+        :param header: Header of message being decrypted
+        :type header: aws_encryption_sdk.structures.MessageHeader
+        :param dict metadata_kwargs: Metadata for the operation
+        :rtype: bool
+        """
+        discovered_ec = header.encryption_context
+        missing_keys = set(self.required_encryption_context_keys).difference(set(discovered_ec.keys()))
+        missing_pairs = set(self.required_encryption_context.items()).difference(set(discovered_ec.items()))
+        if not (missing_keys or missing_pairs):
+            return True
+
+        _LOGGER.warning("Skipping decrypt because discovered encryption context did not match required elements.")
+        metadata_kwargs.update(
+            dict(
+                skipped=True,
+                reason="Missing encryption context key or value",
+                missing_encryption_context_keys=list(missing_keys),
+                missing_encryption_context_pairs=list(missing_pairs),
+            )
+        )
+        return False
+
+    def _single_io_reencrypt(self, stream_args, source, destination_writer):
+        # type: (STREAM_KWARGS, IO, IO) -> OperationResult
+        """Decrypts a message and encrypts its plaintext under new wrapping keys in a single streaming pass,
+        without the plaintext ever being written anywhere.
+
+        The new message keeps the encryption context of the original message. Any message signature
+        is verified when the last of the plaintext is read, before the new message is complete.
+
+        :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`, with the kwargs for the
+            new message in ``reencrypt_args``
+        :param source: source to write
+        :type source: file-like object
+        :param destination_writer: destination object to which to write
+        :type destination_writer: file-like object
+        :returns: OperationResult stating whether the file was written
+        :rtype: aws_encryption_sdk_cli.internal.identifiers.OperationResult
+        """
+        decrypt_args = {key: value for key, value in stream_args.items() if key != "reencrypt_args"}
+        decrypt_args["mode"] = "decrypt"
+        encrypt_args = copy.copy(stream_args["reencrypt_args"])  # type: Dict[str, Any]  # type: ignore
+        encrypt_args["mode"] = "encrypt"
+
+        with _encoder(source, self.decode_input) as _source, _encoder(
+            destination_writer, self.encode_output
+        ) as _destination:
+            with self.client.stream(source=_source, **decrypt_args) as decryptor, self.metadata_writer as metadata:
+                with span("source_header"):
+                    source_header = decryptor.header
+                metadata_kwargs = dict(
+                    mode="reencrypt",
+                    input=source.name,
+                    output=destination_writer.name,
+                    source_header=LazyValue(json_ready_header, source_header),
+                    source_header_auth=LazyValue(json_ready_header_auth, decryptor.header_auth),
+                )
+                if not self._has_required_context(decryptor.header, metadata_kwargs):
+                    metadata.write_metadata(**metadata_kwargs)
+                    return OperationResult.FAILED_VALIDATION
+
+                # The signing key of the original message is replaced by one for the new message
+                encrypt_args["encryption_context"] = {
+                    key: value
+                    for key, value in decryptor.header.encryption_context.items()
+                    if key != ENCODED_SIGNER_KEY
+                }
+                with self.client.stream(source=decryptor, **encrypt_args) as encryptor:
+                    with span("header"):
+                        self._last_header = encryptor.header
+                    metadata_kwargs["header"] = LazyValue(json_ready_header, encryptor.header)
+                    metadata.write_metadata(**metadata_kwargs)
+
+                    with span("body"):
+                        for chunk in encryptor:
+                            _destination.write(chunk)
+                            _destination.flush()
+        return OperationResult.SUCCESS
+
+    def _single_io_rewrap(self, stream_args, source, destination_writer):
+        # type: (STREAM_KWARGS, IO, IO) -> OperationResult
+        """Re-wraps the data key of a message under new wrapping keys, rewriting only the message header
+        and copying the encrypted body through unchanged.
+
+        :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`, with the master key
+            provider for the new wrapping keys in ``key_provider``
+        :param source: source to write
+        :type source: file-like object
+        :param destination_writer: destination object to which to write
+        :type destination_writer: file-like object
+        :returns: OperationResult stating whether the file was written
+        :rtype: aws_encryption_sdk_cli.internal.identifiers.OperationResult
+        """
+        with _encoder(source, self.decode_input) as _source, _encoder(
+            destination_writer, self.encode_output
+        ) as _destination, self.metadata_writer as metadata:
+            rewrapper = MessageRewrapper(
+                source=_source,
+                commitment_policy=self.client.config.commitment_policy,
+                max_body_length=stream_args.get("max_body_length"),
+            )
+            metadata_kwargs = dict(
+                mode="rewrap",
+                input=source.name,
+                output=destination_writer.name,
+                source_header=LazyValue(json_ready_header, rewrapper.header),
+            )
+            # Check before decrypting the data key, so that no wrapping key is used for a skipped message
+            if not self._has_required_context(rewrapper.header, metadata_kwargs):
+                metadata.write_metadata(**metadata_kwargs)
+                return OperationResult.FAILED_VALIDATION
+
+            with span("header"):
+                rewrapper.unwrap(stream_args["materials_manager"])
+                self._last_header = rewrapper.wrap(stream_args["key_provider"])
+            metadata_kwargs["source_header_auth"] = LazyValue(json_ready_header_auth, rewrapper.header_auth)
+            metadata_kwargs["header"] = LazyValue(json_ready_header, self._last_header)
+            metadata.write_metadata(**metadata_kwargs)
+
+            # Encoding or digesting the output requires every byte to pass through this process
+            fast_copy = not (self.decode_input or self.encode_output or self.journal is not None)
+            with span("body"):
+                rewrapper.write(_destination, fast_copy=fast_copy)
+        return OperationResult.SUCCESS
+
+    def _timing_fields(self, timer, source, handler):
+        # type: (OperationTimer, IO, Any) -> Dict[str, Any]
+        """Builds the timing fields of the metadata record for an encrypt or decrypt operation.
+
+        :param timer: Timer that measured the operation
+        :param source: Source of the operation
+        :type source: file-like object
+        :param handler: Stream that performed the operation
+        :returns: Timing and throughput fields
+        :rtype: dict
+        """
+        output_bytes = timer.output_bytes
+        if self.encode_output:
+            output_bytes = encoded_length(output_bytes)
+        return timer.fields(input_bytes=stream_position(source), output_bytes=output_bytes, frames=frame_count(handler))
+
     def _single_io_write(self, stream_args, source, destination_writer):
         # type: (STREAM_KWARGS, IO, IO) -> OperationResult
         """Performs the actual write operations for a single operation.
 
+        If timing is enabled, the metadata record of an encrypt or decrypt operation is written
+        once the operation finishes, including when it fails, rather than as soon as the header
+        is ready.
+
         :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
         :param source: source to write
         :type source: file-like object
@@ -205,15 +638,24 @@ class IOHandler(object):
         :returns: OperationResult stating whether the file was written
         :rtype: aws_encryption_sdk_cli.internal.identifiers.OperationResult
         """
+        if stream_args["mode"] in ("reencrypt", "rewrap"):
+            rotate = self._single_io_reencrypt if stream_args["mode"] == "reencrypt" else self._single_io_rewrap
+            return rotate(stream_args=stream_args, source=source, destination_writer=destination_writer)
+
+        timer = OperationTimer() if self.timing else None
         with _encoder(source, self.decode_input) as _source, _encoder(
             destination_writer, self.encode_output
         ) as _destination:  # noqa pylint: disable=line-too-long
             with self.client.stream(source=_source, **stream_args) as handler, self.metadata_writer as metadata:
+                with span("header"):
+                    self._last_header = handler.header
+                if timer is not None:
+                    timer.header_ready()
                 metadata_kwargs = dict(
                     mode=stream_args["mode"],
                     input=source.name,
                     output=destination_writer.name,
-                    header=json_ready_header(handler.header),
+                    header=LazyValue(json_ready_header, handler.header),
                 )
                 try:
                     header_auth = handler.header_auth
@@ -221,70 +663,161 @@ class IOHandler(object):
                     # EncryptStream doesn't expose the header auth at this time
                     pass
                 else:
-                    metadata_kwargs["header_auth"] = json_ready_header_auth(header_auth)
-
-                if stream_args["mode"] == "decrypt":
-                    discovered_ec = handler.header.encryption_context
-                    missing_keys = set(self.required_encryption_context_keys).difference(set(discovered_ec.keys()))
-                    missing_pairs = set(self.required_encryption_context.items()).difference(set(discovered_ec.items()))
-                    if missing_keys or missing_pairs:
-                        _LOGGER.warning(
-                            "Skipping decrypt because discovered encryption context did not match required elements."
-                        )
-                        metadata_kwargs.update(
-                            dict(
-                                skipped=True,
-                                reason="Missing encryption context key or value",
-                                missing_encryption_context_keys=list(missing_keys),
-                                missing_encryption_context_pairs=list(missing_pairs),
-                            )
-                        )
-                        metadata.write_metadata(**metadata_kwargs)
-                        return OperationResult.FAILED_VALIDATION
+                    metadata_kwargs["header_auth"] = LazyValue(json_ready_header_auth, header_auth)
 
-                metadata.write_metadata(**metadata_kwargs)
-                for chunk in handler:
-                    _destination.write(chunk)
-                    _destination.flush()
+                if stream_args["mode"] == "decrypt" and not self._has_required_context(handler.header, metadata_kwargs):
+                    metadata.write_metadata(**metadata_kwargs)
+                    return OperationResult.FAILED_VALIDATION
+
+                if timer is None:
+                    metadata.write_metadata(**metadata_kwargs)
+                    self._write_body(stream_args, handler, destination_writer, _destination)
+                    return OperationResult.SUCCESS
+
+                try:
+                    self._write_body(stream_args, handler, destination_writer, _destination, timer)
+                finally:
+                    metadata_kwargs["timing"] = self._timing_fields(timer, source, handler)
+                    metadata.write_metadata(**metadata_kwargs)
         return OperationResult.SUCCESS
 
-    def process_single_operation(self, stream_args, source, destination):
-        # type: (STREAM_KWARGS, SOURCE, str) -> OperationResult
+    def _write_body(self, stream_args, handler, destination_writer, destination, timer=None):
+        # pylint: disable=too-many-arguments
+        # type: (STREAM_KWARGS, Any, IO, IO, Optional[OperationTimer]) -> None
+        """Writes the output of an encrypt or decrypt stream.
+
+        :param dict stream_args: kwargs passed to `aws_encryption_sdk.stream`
+        :param handler: Stream that performs the operation
+        :param destination_writer: destination object to which to write
+        :type destination_writer: file-like object
+        :param destination: destination_writer, wrapped to encode output if requested
+        :type destination: file-like object
+        :param timer: Timer measuring the operation (optional)
+        :type timer: aws_encryption_sdk_cli.internal.timing.OperationTimer
+        """
+        preallocated = False
+        if stream_args["mode"] == "encrypt" and "source_length" in stream_args and destination_writer is not _stdout():
+            output_length = ciphertext_length(handler.header, cast(int, stream_args["source_length"]))
+            if self.encode_output:
+                output_length = encoded_length(output_length)
+            preallocated = _preallocate(destination_writer, output_length)
+
+        with span("body"):
+            for chunk in handler:
+                destination.write(chunk)
+                destination.flush()
+                if timer is not None:
+                    timer.wrote(chunk)
+
+        if preallocated:
+            if destination is not destination_writer:
+                # Write out any bytes still buffered by the encoder before truncating.
+                destination.close()
+            # source_length is only an estimate when decoding input: drop anything past what was written.
+            destination_writer.truncate()
+
+    def process_single_operation(self, stream_args, source, destination, destination_exists=None, on_committed=None):
+        # pylint: disable=too-many-arguments
+        # type: (STREAM_KWARGS, SOURCE, str, Optional[bool], Optional[Callable[..., None]]) -> OperationResult
         """Processes a single encrypt/decrypt operation given a pre-loaded source.
 
         :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
         :param source: source to write
         :type source: str or file-like object
         :param str destination: destination identifier
+        :param bool destination_exists: Whether destination is known to be an existing file (optional)
+        :param callable on_committed: Callable to call with the message header once a written output
+            is in place (optional)
         :returns: OperationResult stating whether the file was written
         :rtype: aws_encryption_sdk_cli.internal.identifiers.OperationResult
         """
+        output = None  # type: Optional[AtomicOutput]
         if destination == "-":
             destination_writer = _stdout()
         else:
-            if not self._should_write_file(destination):
+            if not self._should_write_file(destination, file_exists=destination_exists):
+                self._record_result(SKIPPED)
                 return OperationResult.SKIPPED
-            _ensure_dir_exists(destination)
-            destination_writer = open(os.path.abspath(destination), "wb")
+            self._ensure_destination_dir_exists(destination)
+            if destination_exists is None and os.path.exists(destination) and not os.path.isfile(destination):
+                # Devices and pipes must be written in place
+                destination_writer = open(os.path.abspath(destination), "wb")
+            else:
+                output = AtomicOutput(destination, replace_existing=destination_exists is not False)
+                destination_writer = output
+            if self.journal is not None:
+                destination_writer = self._last_output = DigestingWriter(destination_writer)
 
         if source == "-":
             source = _stdin()
 
-        try:
-            return self._single_io_write(
-                stream_args=stream_args, source=cast(IO, source), destination_writer=destination_writer
-            )
-        finally:
-            destination_writer.close()
+        # The source and destination are closed by the time the operation finishes
+        input_bytes = stream_size(cast(IO, source)) if self.statistics is not None else None
+        operation_result = OperationResult.FAILED
+        if self.profiler is not None:
+            self.profiler.begin_operation()
+        with span("operation", input=cast(IO, source).name, output=destination):
+            try:
+                operation_result = self._single_io_write(
+                    stream_args=stream_args, source=cast(IO, source), destination_writer=destination_writer
+                )
+                return operation_result
+            except Exception as error:
+                if self.statistics is not None:
+                    self.statistics.record_error(error.__class__.__name__)
+                raise
+            finally:
+                if operation_result.needs_cleanup:
+                    outcome = FAILED
+                else:
+                    outcome = SUCCEEDED if operation_result.wrote_output else SKIPPED
+                self._record_result(outcome, input_bytes, output)
+                if operation_result.needs_cleanup:
+                    self.metadata_writer.record_failure(destination_writer.name)
+                if self.profiler is not None:
+                    self.profiler.end_operation(str(stream_args["mode"]), cast(IO, source).name, destination)
+                if on_committed is not None and operation_result.wrote_output:
+                    on_committed = functools.partial(on_committed, self._last_header)
+                else:
+                    on_committed = None
+                if output is None:
+                    destination_writer.close()
+                    if on_committed is not None:
+                        on_committed()
+                elif operation_result.needs_cleanup:
+                    _LOGGER.warning("Operation failed: discarding output for: %s", destination)
+                    output.discard()
+                else:
+                    self._committer.commit(output, on_committed)
+
+    def _record_result(self, outcome, input_bytes=None, output=None):
+        # type: (str, Optional[int], Optional[AtomicOutput]) -> None
+        """Records the outcome of an operation in the run statistics, if they are being collected.
+
+        :param str outcome: Outcome of the operation, one of those in ``stats.OUTCOMES``
+        :param int input_bytes: Size of the source of the operation, if known (optional)
+        :param output: Output of the operation, if it was written to a file and not yet moved into place (optional)
+        :type output: aws_encryption_sdk_cli.internal.durability.AtomicOutput
+        """
+        if self.statistics is None:
+            return
+        output_stat = None if output is None else _stat(output.temp_name)
+        self.statistics.record_operation(
+            outcome, input_bytes=input_bytes, output_bytes=None if output_stat is None else output_stat.st_size
+        )
 
-    def _should_write_file(self, filepath):
-        # type: (str) -> bool
+    def _should_write_file(self, filepath, file_exists=None):
+        # type: (str, Optional[bool]) -> bool
         """Determines whether a specific file should be written.
 
         :param str filepath: Full file path to file in question
+        :param bool file_exists: Whether the file is known to exist (optional)
         :rtype: bool
         """
-        if not os.path.isfile(filepath):
+        if file_exists is None:
+            file_exists = os.path.isfile(filepath)
+
+        if not file_exists:
             # The file does not exist, nothing to overwrite
             return True
 
@@ -312,47 +845,102 @@ class IOHandler(object):
         _LOGGER.warning("Overwriting existing output file because no action was specified otherwise: %s", filepath)
         return True
 
-    def process_single_file(self, stream_args, source, destination):
-        # type: (STREAM_KWARGS, str, str) -> None
+    def process_single_file(self, stream_args, source, destination, source_stat=None):
+        # type: (STREAM_KWARGS, str, str, Optional[os.stat_result]) -> None
         """Processes a single encrypt/decrypt operation on a source file.
 
         :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
         :param str source: Full file path to source file
         :param str destination: Full file path to destination file
+        :param source_stat: Already collected status of source file (optional)
+        :type source_stat: os.stat_result
         """
-        if os.path.realpath(source) == os.path.realpath(destination):
+        if source_stat is None or not source_stat.st_ino:
+            # os.DirEntry.stat does not identify the file on all platforms
+            source_stat = os.stat(source)
+        destination_stat = _stat(destination)
+
+        if destination_stat is not None and os.path.samestat(source_stat, destination_stat):
             # File source, directory destination, empty suffix:
             _LOGGER.warning("Skipping because the source (%s) and destination (%s) are the same", source, destination)
+            self._record_result(SKIPPED)
             return
 
+        if destination != "-" and self._already_processed(
+            source, source_stat, destination, destination_stat, stream_args
+        ):
+            self._record_result(SKIPPED)
+            return
+        use_index = self.state_index is not None and destination != "-"
+        use_journal = self.journal is not None and destination != "-"
+        source_hash = None
+        if use_index and self.state_index.hash_content:
+            source_hash = content_hash(source)
+
         _LOGGER.info("%sing file %s to %s", stream_args["mode"], source, destination)
 
         _stream_args = copy.copy(stream_args)
         # Because we can actually know size for files and Base64IO does not support seeking,
         # set the source length manually for files. This allows enables data key caching when
         # Base64-decoding a source file.
-        source_file_size = os.path.getsize(source)
+        source_file_size = source_stat.st_size
         if self.decode_input and not self.encode_output:
             _stream_args["source_length"] = int(source_file_size * (3 / 4))
         else:
             _stream_args["source_length"] = source_file_size
 
-        try:
-            with open(os.path.abspath(source), "rb") as source_reader:
-                operation_result = self.process_single_operation(
-                    stream_args=_stream_args, source=source_reader, destination=destination
-                )
-        except Exception:  # pylint: disable=broad-except
-            operation_result = OperationResult.FAILED
-            raise
-        finally:
-            if operation_result.needs_cleanup and destination != "-":
-                _LOGGER.warning("Operation failed: deleting output file: %s", destination)
-                try:
-                    os.remove(destination)
-                except OSError:
-                    # if the file doesn't exist that's ok too
-                    pass
+        destination_exists = False  # type: Optional[bool]
+        if destination_stat is not None:
+            # Let process_single_operation decide how to handle anything that is not a regular file
+            destination_exists = True if stat.S_ISREG(destination_stat.st_mode) else None
+        on_committed = None
+        if use_index:
+            # The index must not claim an output that might not be in place yet
+            on_committed = functools.partial(
+                self._record_in_index, source, source_stat, destination, str(stream_args["mode"]), source_hash
+            )
+        with open(os.path.abspath(source), "rb") as source_reader:
+            # Outputs are only moved into place once complete, so a failed operation leaves nothing to clean up
+            operation_result = self.process_single_operation(
+                stream_args=_stream_args,
+                source=source_reader,
+                destination=destination,
+                destination_exists=destination_exists,
+                on_committed=on_committed,
+            )
+
+        if use_journal and operation_result.wrote_output:
+            self.journal.record(
+                source=source,
+                source_stat=source_stat,
+                destination=destination,
+                mode=str(stream_args["mode"]),
+                output_size=self._last_output.length,
+                output_digest=self._last_output.hexdigest(),
+            )
+
+    def _record_in_index(self, source, source_stat, destination, mode, source_hash, header):
+        # pylint: disable=too-many-arguments
+        # type: (str, os.stat_result, str, str, Optional[str], MessageHeader) -> None
+        """Records a completed operation in the state index once its output is in place.
+
+        :param str source: Full file path to source file
+        :param source_stat: Status of source file when the operation started
+        :type source_stat: os.stat_result
+        :param str destination: Full file path to destination file
+        :param str mode: Operating mode
+        :param str source_hash: Content hash of the source, if the index compares contents
+        :param header: Header of the message that was written or read
+        :type header: aws_encryption_sdk.structures.MessageHeader
+        """
+        self.state_index.record(
+            source=source,
+            source_stat=source_stat,
+            destination=destination,
+            mode=mode,
+            message_id=unicode_b64_encode(header.message_id),
+            source_hash=source_hash,
+        )
 
     def process_dir(self, stream_args, source, destination, suffix):
         # type: (STREAM_KWARGS, str, str, str) -> None
@@ -364,16 +952,25 @@ class IOHandler(object):
         :param str suffix: Suffix to append to output filename
         """
         _LOGGER.debug("%sing directory %s to %s", stream_args["mode"], source, destination)
-        for base_dir, _dirs, files in os.walk(source):
-            for filename in files:
-                source_filename = os.path.join(base_dir, filename)
-                destination_dir = _output_dir(source_root=source, destination_root=destination, source_dir=base_dir)
+        sync = self.sync and self.state_index is not None
+        seen_sources = set()  # type: Set[str]
+        for base_dir, entries in walk(source, self.source_filter):
+            destination_dir = _output_dir(source_root=source, destination_root=destination, source_dir=base_dir)
+            for entry in entries:
+                if sync:
+                    seen_sources.add(os.path.abspath(entry.path))
                 destination_filename = output_filename(
-                    source_filename=source_filename,
+                    source_filename=entry.path,
                     destination_dir=destination_dir,
                     mode=str(stream_args["mode"]),
                     suffix=suffix,
                 )
                 self.process_single_file(
-                    stream_args=stream_args, source=source_filename, destination=destination_filename
+                    stream_args=stream_args,
+                    source=entry.path,
+                    destination=destination_filename,
+                    source_stat=entry.stat(),
                 )
+
+        if sync:
+            self._remove_deleted_outputs(source, destination, str(stream_args["mode"]), seen_sources)
@@ -0,0 +1,248 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Append-only journal of completed operations used to resume interrupted runs."""
+import hashlib
+import json
+import logging
+import os
+import time
+
+import attr
+import six
+
+from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+from aws_encryption_sdk_cli.internal.state_index import _mtime_ns, content_hash
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import IO, Any, Dict, List, Optional, Text, Tuple  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("Journal", "DigestingWriter")
+_LOGGER = logging.getLogger(LOGGER_NAME)
+#: Number of entries to buffer before writing them to the journal.
+_FLUSH_INTERVAL = 1000
+#: Maximum number of seconds to buffer entries before writing them to the journal.
+_FLUSH_SECONDS = 5.0
+
+
+class DigestingWriter(object):
+    """Wraps a writable file, calculating the length and SHA-256 digest of everything written to it.
+
+    All other attributes are passed through to the wrapped file.
+
+    :param wrapped: File to wrap
+    :type wrapped: file-like object
+    """
+
+    def __init__(self, wrapped):
+        # type: (IO) -> None
+        """Prepares the digest."""
+        self.__wrapped = wrapped
+        self.__digest = hashlib.sha256()
+        self.length = 0
+
+    def __getattr__(self, name):
+        # type: (str) -> Any
+        """Passes through all other attributes to the wrapped file."""
+        return getattr(self.__wrapped, name)
+
+    def __enter__(self):
+        # type: () -> DigestingWriter
+        """Returns self so that writes made within a ``with`` block are still digested."""
+        self.__wrapped.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # type: (Any, Any, Any) -> Any
+        """Passes through context manager exit to the wrapped file."""
+        return self.__wrapped.__exit__(exc_type, exc_value, traceback)
+
+    def write(self, data):
+        # type: (bytes) -> int
+        """Writes data to the wrapped file and adds it to the digest.
+
+        :param bytes data: Data to write
+        """
+        self.__digest.update(data)
+        self.length += len(data)
+        return self.__wrapped.write(data)
+
+    def hexdigest(self):
+        # type: () -> str
+        """Returns the hex-encoded SHA-256 digest of everything written so far.
+
+        :rtype: str
+        """
+        return self.__digest.hexdigest()
+
+
+def _key(source, destination, mode):
+    # type: (str, str, str) -> Tuple[Text, Text, Text]
+    """Builds the key identifying an operation in the journal.
+
+    :param str source: Full file path to source file
+    :param str destination: Full file path to destination file
+    :param str mode: Operating mode (encrypt/decrypt)
+    :rtype: tuple
+    """
+    return six.text_type(mode), six.text_type(os.path.abspath(source)), six.text_type(os.path.abspath(destination))
+
+
+@attr.s(hash=False, init=False)
+class Journal(object):
+    """Append-only journal of completed operations, stored as one JSON object per line.
+
+    Each entry records the source size and modification time and the length and SHA-256 digest
+    of the output. An operation is complete if its source is unchanged and its output still
+    matches the recorded digest.
+
+    Entries are written and synced to disk in batches, so if the process is interrupted, only the
+    most recent entries are lost and those operations are performed again when resuming.
+
+    :param str filename: Path to journal file
+    """
+
+    filename = attr.ib(validator=attr.validators.instance_of(six.string_types))
+    _entries = None  # type: Optional[Dict[Tuple[Text, Text, Text], Dict[str, Any]]]
+    _journal_file = None  # type: Optional[IO]
+
+    def __init__(self, filename):
+        # type: (str) -> None
+        """Workaround pending resolution of attrs/mypy interaction.
+        https://github.com/python/mypy/issues/2088
+        https://github.com/python-attrs/attrs/issues/215
+        """
+        self.filename = os.path.abspath(filename)
+        attr.validate(self)
+        self._pending = []  # type: List[str]
+        self._last_flush = time.time()
+
+        if not os.path.isdir(os.path.dirname(self.filename)):
+            raise BadUserArgumentError("Parent directory for requested resume journal file does not exist.")
+
+    def _load(self):
+        # type: () -> Dict[Tuple[Text, Text, Text], Dict[str, Any]]
+        """Reads all entries from an existing journal.
+
+        :rtype: dict
+        """
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = {}
+        try:
+            journal_file = open(self.filename, "rb")
+        except IOError:
+            _LOGGER.debug("Starting new resume journal: %s", self.filename)
+            return self._entries
+
+        with journal_file:
+            for line_number, line in enumerate(journal_file, 1):
+                try:
+                    entry = json.loads(line.decode("utf-8"))
+                    self._entries[_key(entry["input"], entry["output"], entry["mode"])] = entry
+                except (ValueError, KeyError, TypeError):
+                    # The last entry is incomplete if the process was interrupted while writing it.
+                    _LOGGER.debug("Ignoring malformed resume journal entry on line %d", line_number)
+        _LOGGER.debug("Loaded %d entries from resume journal: %s", len(self._entries), self.filename)
+        return self._entries
+
+    def is_complete(self, source, source_stat, destination, mode):
+        # type: (str, os.stat_result, str, str) -> bool
+        """Determines whether an operation was completed and its output is intact.
+
+        :param str source: Full file path to source file
+        :param source_stat: Status of source file
+        :type source_stat: os.stat_result
+        :param str destination: Full file path to destination file
+        :param str mode: Operating mode (encrypt/decrypt)
+        :rtype: bool
+        """
+        entry = self._load().get(_key(source, destination, mode))
+        if entry is None:
+            return False
+        if entry["input_size"] != source_stat.st_size or entry["input_mtime_ns"] != _mtime_ns(source_stat):
+            return False
+        try:
+            if os.path.getsize(destination) != entry["output_size"]:
+                return False
+            return content_hash(destination) == entry["output_sha256"]
+        except (IOError, OSError):
+            return False
+
+    def record(self, source, source_stat, destination, mode, output_size, output_digest):
+        # pylint: disable=too-many-arguments
+        # type: (str, os.stat_result, str, str, int, str) -> None
+        """Records a completed operation.
+
+        :param str source: Full file path to source file
+        :param source_stat: Status of source file before it was processed
+        :type source_stat: os.stat_result
+        :param str destination: Full file path to destination file
+        :param str mode: Operating mode (encrypt/decrypt)
+        :param int output_size: Length of output in bytes
+        :param str output_digest: Hex-encoded SHA-256 digest of output
+        """
+        mode, source, destination = _key(source, destination, mode)
+        entry = dict(
+            mode=mode,
+            input=source,
+            output=destination,
+            input_size=source_stat.st_size,
+            input_mtime_ns=_mtime_ns(source_stat),
+            output_size=output_size,
+            output_sha256=output_digest,
+            completed=time.time(),
+        )
+        self._load()[(mode, source, destination)] = entry
+        self._pending.append(json.dumps(entry, sort_keys=True))
+        if len(self._pending) >= _FLUSH_INTERVAL or time.time() - self._last_flush >= _FLUSH_SECONDS:
+            self.flush()
+
+    def _open(self):
+        # type: () -> IO
+        """Opens the journal for appending, making sure that new entries start on a new line.
+
+        :rtype: file-like object
+        """
+        if self._journal_file is None:
+            self._journal_file = open(self.filename, "ab+")
+            self._journal_file.seek(0, os.SEEK_END)
+            if self._journal_file.tell():
+                self._journal_file.seek(-1, os.SEEK_END)
+                if self._journal_file.read(1) != b"\n":
+                    self._journal_file.write(b"\n")
+        return self._journal_file
+
+    def flush(self):
+        # type: () -> None
+        """Writes all pending entries to the journal and syncs them to disk."""
+        self._last_flush = time.time()
+        if not self._pending:
+            return
+        journal_file = self._open()
+        journal_file.write("".join(line + "\n" for line in self._pending).encode("utf-8"))
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+        self._pending = []
+
+    def close(self):
+        # type: () -> None
+        """Writes all pending entries to the journal and closes it."""
+        self.flush()
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
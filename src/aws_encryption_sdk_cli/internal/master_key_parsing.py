@@ -19,14 +19,17 @@ import aws_encryption_sdk
 import pkg_resources
 from aws_encryption_sdk import CachingCryptoMaterialsManager  # noqa pylint: disable=unused-import
 from aws_encryption_sdk import DefaultCryptoMaterialsManager  # noqa pylint: disable=unused-import
+from aws_encryption_sdk.exceptions import CacheKeyError
 from aws_encryption_sdk.key_providers.base import MasterKeyProvider  # noqa pylint: disable=unused-import
 
 from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
 from aws_encryption_sdk_cli.internal.identifiers import MASTER_KEY_PROVIDERS_ENTRY_POINT, PLUGIN_NAMESPACE_DIVIDER
 from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+from aws_encryption_sdk_cli.internal.stats import active_statistics
+from aws_encryption_sdk_cli.internal.tracing import span
 
 try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
-    from typing import Callable, DefaultDict, Dict, List, Union  # noqa pylint: disable=unused-import
+    from typing import Any, Callable, DefaultDict, Dict, List, Union  # noqa pylint: disable=unused-import
 
     from aws_encryption_sdk_cli.internal.mypy_types import (  # noqa pylint: disable=unused-import
         CACHING_CONFIG,
@@ -36,7 +39,7 @@ except ImportError:  # pragma: no cover
     # We only actually need these imports when running the mypy checks
     pass
 
-__all__ = ("build_crypto_materials_manager_from_args",)
+__all__ = ("build_crypto_materials_manager_from_args", "build_master_key_provider_from_args")
 _LOGGER = logging.getLogger(LOGGER_NAME)
 _ENTRY_POINTS = defaultdict(dict)  # type: DefaultDict[str, Dict[str, pkg_resources.EntryPoint]]
 
@@ -83,6 +86,40 @@ def _entry_points():
     return _ENTRY_POINTS
 
 
+class _CountingCache(aws_encryption_sdk.LocalCryptoMaterialsCache):
+    """Local cryptographic materials cache that records its hits and misses in the statistics
+    of the run in progress, if there are any.
+    """
+
+    def _lookup(self, get_materials, *args):
+        # type: (Callable, *Any) -> Any
+        """Looks up materials, recording whether they were found.
+
+        :param callable get_materials: Lookup method of parent class
+        :raises CacheKeyError: if no materials were found
+        """
+        statistics = active_statistics()
+        try:
+            materials = get_materials(*args)
+        except CacheKeyError:
+            if statistics is not None:
+                statistics.record_cache_lookup(hit=False)
+            raise
+        if statistics is not None:
+            statistics.record_cache_lookup(hit=True)
+        return materials
+
+    def get_encryption_materials(self, cache_key, plaintext_length):
+        # type: (bytes, int) -> Any
+        """Gets encryption materials from the cache, recording whether they were found."""
+        return self._lookup(super(_CountingCache, self).get_encryption_materials, cache_key, plaintext_length)
+
+    def get_decryption_materials(self, cache_key):
+        # type: (bytes) -> Any
+        """Gets decryption materials from the cache, recording whether they were found."""
+        return self._lookup(super(_CountingCache, self).get_decryption_materials, cache_key)
+
+
 def _load_master_key_provider(name):
     # type: (str) -> Callable
     """Find the correct master key provider entry point for the specified name.
@@ -182,6 +219,16 @@ def _parse_master_key_providers_from_args(*key_providers_info):
     return _assemble_master_key_providers(*key_providers)  # pylint: disable=no-value-for-parameter
 
 
+def build_master_key_provider_from_args(key_providers_config):
+    # type: (List[RAW_MASTER_KEY_PROVIDER_CONFIG]) -> MasterKeyProvider
+    """Builds a master key provider from the provided arguments.
+
+    :param list key_providers_config: List of one or more dicts containing key provider configuration
+    :rtype: aws_encryption_sdk.key_providers.base.MasterKeyProvider
+    """
+    return _parse_master_key_providers_from_args(*key_providers_config)
+
+
 def build_crypto_materials_manager_from_args(
     key_providers_config,  # type: List[RAW_MASTER_KEY_PROVIDER_CONFIG]
     caching_config,  # type: CACHING_CONFIG
@@ -194,13 +241,14 @@ def build_crypto_materials_manager_from_args(
     :rtype: aws_encryption_sdk.materials_managers.base.CryptoMaterialsManager
     """
     caching_config = copy.deepcopy(caching_config)
-    key_provider = _parse_master_key_providers_from_args(*key_providers_config)
-    cmm = aws_encryption_sdk.DefaultCryptoMaterialsManager(key_provider)
+    with span("build_crypto_materials_manager_from_args"):
+        key_provider = _parse_master_key_providers_from_args(*key_providers_config)
+        cmm = aws_encryption_sdk.DefaultCryptoMaterialsManager(key_provider)
 
-    if caching_config is None:
-        return cmm
+        if caching_config is None:
+            return cmm
 
-    cache = aws_encryption_sdk.LocalCryptoMaterialsCache(capacity=caching_config.pop("capacity"))
-    return aws_encryption_sdk.CachingCryptoMaterialsManager(
-        backing_materials_manager=cmm, cache=cache, **caching_config
-    )
+        cache = _CountingCache(capacity=caching_config.pop("capacity"))
+        return aws_encryption_sdk.CachingCryptoMaterialsManager(
+            backing_materials_manager=cmm, cache=cache, **caching_config
+        )
@@ -14,26 +14,455 @@
 import base64
 import codecs
 import json
+import logging
 import os
+import sqlite3
 import sys
+import threading
+import time
 from enum import Enum
 from types import TracebackType  # noqa pylint: disable=unused-import
 
 import attr
 import six
+from aws_encryption_sdk.internal.defaults import ENCODED_SIGNER_KEY
 from aws_encryption_sdk.internal.structures import MessageHeaderAuthentication  # noqa pylint: disable=unused-import
 from aws_encryption_sdk.structures import MessageHeader  # noqa pylint: disable=unused-import
 
 from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+from aws_encryption_sdk_cli.internal.tracing import span
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    # orjson is optional: without it, records are encoded by the standard library json module
+    orjson = None  # pylint: disable=invalid-name
 
 try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
-    from typing import IO, Any, Dict, Optional, Text, Union  # noqa pylint: disable=unused-import
+    from typing import IO, Any, Callable, Dict, List, Optional, Text, Tuple, Union  # noqa pylint: disable=unused-import
 except ImportError:  # pragma: no cover
     # We only actually need these imports when running the mypy checks
     pass
 
 
-__all__ = ("MetadataWriter", "unicode_b64_encode", "json_ready_header", "json_ready_header_auth")
+__all__ = ("MetadataWriter", "LazyValue", "unicode_b64_encode", "json_ready_header", "json_ready_header_auth")
+_LOGGER = logging.getLogger(LOGGER_NAME)
+#: Size of the write buffer for metadata files. Full buffers are written out as they fill.
+_BUFFER_SIZE = 64 * 1024
+#: Maximum number of seconds that written records are held in the buffer.
+_FLUSH_SECONDS = 1.0
+#: Maximum number of records waiting to be written. Writers wait for space once it is full.
+_QUEUE_SIZE = 1024
+#: Maximum number of distinct shared headers to remember when compacting headers. Any others are written in full.
+_MAX_SHARED_HEADERS = 4096
+#: Record fields that contain message headers.
+_HEADER_FIELDS = ("header", "source_header")
+#: Message header fields that are unique to each message.
+_UNIQUE_HEADER_FIELDS = ("message_id", "commitment_key", "encrypted_data_keys")
+#: Prefix of metadata output targets that are SQLite databases rather than files of JSON lines.
+_SQLITE_PREFIX = "sqlite:"
+#: Number of records to hold before inserting them into a SQLite metadata database.
+_SQLITE_BATCH_SIZE = 1000
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    id INTEGER PRIMARY KEY,
+    mode TEXT,
+    input TEXT,
+    output TEXT,
+    result TEXT,
+    reason TEXT,
+    message_id TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metadata_input ON metadata (input);
+CREATE INDEX IF NOT EXISTS metadata_output ON metadata (output);
+CREATE INDEX IF NOT EXISTS metadata_mode ON metadata (mode);
+CREATE INDEX IF NOT EXISTS metadata_result ON metadata (result);
+CREATE INDEX IF NOT EXISTS metadata_reason ON metadata (reason);
+CREATE INDEX IF NOT EXISTS metadata_message_id ON metadata (message_id);
+"""
+_LINESEP = os.linesep.encode("ascii")
+_FLUSH = object()
+_STOP = object()
+
+
+class _OperationFailed(object):
+    """Notice that the operation that wrote the latest record to an output failed after its record was written.
+
+    :param str output: Output of the failed operation
+    """
+
+    __slots__ = ("output",)
+
+    def __init__(self, output):
+        # type: (str) -> None
+        """Sets the output."""
+        self.output = output
+
+
+class LazyValue(object):
+    """Value in a metadata record that is only computed if the record is written.
+
+    The value is computed by the background writer as the record is serialized, so building it
+    costs nothing on the path of the operation, and nothing at all if metadata is suppressed.
+    The arguments must not be modified after the record is written.
+
+    :param callable function: Callable that computes a JSON-serializable value
+    :param *args: Arguments to pass to ``function``
+    """
+
+    __slots__ = ("_function", "_args")
+
+    def __init__(self, function, *args):
+        # type: (Callable[..., Any], *Any) -> None
+        """Stores the callable and its arguments without calling it."""
+        self._function = function
+        self._args = args
+
+    def resolve(self):
+        # type: () -> Any
+        """Computes the value.
+
+        :returns: JSON-serializable value
+        """
+        return self._function(*self._args)
+
+
+def _resolve_lazy_value(value):
+    # type: (Any) -> Any
+    """Computes lazy values as they are found during JSON serialization.
+
+    :param value: Value that the JSON encoder cannot serialize
+    :returns: JSON-serializable value
+    :raises TypeError: if value is not a lazy value
+    """
+    if isinstance(value, LazyValue):
+        return value.resolve()
+    raise TypeError("Object of type {} is not JSON serializable".format(value.__class__.__name__))
+
+
+def _stdlib_json_line(metadata):
+    # type: (Dict[str, Any]) -> bytes
+    """Encodes a record as a line of JSON using the standard library json module.
+
+    The line is encoded the same way as by orjson, so the output does not depend on whether it is installed.
+
+    :param dict metadata: Record to encode
+    :returns: UTF-8 encoded line
+    :rtype: bytes
+    """
+    return (
+        json.dumps(metadata, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=_resolve_lazy_value)
+        + os.linesep
+    ).encode("utf-8")
+
+
+def _orjson_line(metadata):
+    # type: (Dict[str, Any]) -> bytes
+    """Encodes a record as a line of JSON using orjson.
+
+    :param dict metadata: Record to encode
+    :returns: UTF-8 encoded line
+    :rtype: bytes
+    """
+    return orjson.dumps(metadata, default=_resolve_lazy_value, option=orjson.OPT_SORT_KEYS) + _LINESEP
+
+
+#: Encodes records as lines of JSON: using orjson if it is installed, otherwise the standard library json module.
+_json_line = _stdlib_json_line if orjson is None else _orjson_line
+
+
+def _split_header(header):
+    # type: (Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]
+    """Splits a JSON-ready message header into the fields that every message written with the same
+    encryption context and algorithm shares, and the fields unique to each message.
+
+    The unique fields are the message ID, any commitment key, the encrypted data keys (raw AES
+    wrapping keys store a unique IV in their key info), and the signing public key from the
+    encryption context of a signed message.
+
+    :param dict header: Message header, as returned by :func:`json_ready_header`
+    :returns: Shared fields and unique fields
+    :rtype: tuple of dict
+    """
+    shared = {key: value for key, value in header.items() if key not in _UNIQUE_HEADER_FIELDS}
+    unique = {key: value for key, value in header.items() if key in _UNIQUE_HEADER_FIELDS}
+
+    if ENCODED_SIGNER_KEY in header["encryption_context"]:
+        shared["encryption_context"] = {
+            key: value for key, value in header["encryption_context"].items() if key != ENCODED_SIGNER_KEY
+        }
+        unique["encryption_context"] = {ENCODED_SIGNER_KEY: header["encryption_context"][ENCODED_SIGNER_KEY]}
+    return shared, unique
+
+
+class _MetadataSink(threading.Thread):
+    """Background thread that serializes metadata records and writes them to an output stream in the
+    order that they were queued.
+
+    Written records are flushed once they have been held for ``_FLUSH_SECONDS``, or as soon as no more
+    records are waiting after that. If a write fails, the error is kept for the writer to raise, and
+    the remaining records are discarded so that nothing waiting on the queue is blocked.
+
+    If ``compact_headers`` is set, the fields of each message header that are shared with other
+    messages are written once, in a ``"header"`` mode record with a ``header_id``. Records then
+    carry only the fields unique to each message along with the ``header_id`` of the shared fields.
+
+    :param output_stream: Stream to which to write records
+    :type output_stream: file-like object
+    :param bool binary: Should records be encoded before they are written
+    :param bool compact_headers: Should shared header fields be written only once (default: False)
+    """
+
+    def __init__(self, output_stream, binary, compact_headers=False):
+        # type: (IO, bool, bool) -> None
+        """Prepares the thread without starting it."""
+        super(_MetadataSink, self).__init__(name="aws-encryption-cli-metadata")
+        # Never keep the process alive on a hung metadata target
+        self.daemon = True
+        self.queue = six.moves.queue.Queue(_QUEUE_SIZE)  # type: six.moves.queue.Queue
+        self.error = None  # type: Optional[Exception]
+        self._output_stream = output_stream
+        self._binary = binary
+        self._compact_headers = compact_headers
+        self._header_ids = {}  # type: Dict[bytes, int]
+        self._unflushed_since = None  # type: Optional[float]
+
+    def _write_line(self, metadata):
+        # type: (Dict[str, Any]) -> None
+        """Serializes and writes a single record.
+
+        :param dict metadata: JSON-serializable record
+        """
+        metadata_line = _json_line(metadata)
+        self._output_stream.write(metadata_line if self._binary else metadata_line.decode("utf-8"))
+        if self._unflushed_since is None:
+            self._unflushed_since = time.time()
+
+    def _compact_header(self, header):
+        # type: (Dict[str, Any]) -> Dict[str, Any]
+        """Replaces the shared fields of a header with a reference to a record containing them,
+        writing that record first if this is the first header to share them.
+
+        :param dict header: Message header, as returned by :func:`json_ready_header`
+        :returns: Header fields unique to the message, with the ``header_id`` of the shared fields
+        :rtype: dict
+        """
+        shared, unique = _split_header(header)
+        shared_key = _json_line(shared)
+        header_id = self._header_ids.get(shared_key)
+        if header_id is None:
+            if len(self._header_ids) >= _MAX_SHARED_HEADERS:
+                return header
+            header_id = self._header_ids[shared_key] = len(self._header_ids) + 1
+            self._write_line(dict(mode="header", header_id=header_id, header=shared))
+        unique["header_id"] = header_id
+        return unique
+
+    def _write(self, metadata):
+        # type: (Dict[str, Any]) -> None
+        """Writes a single record, first compacting its headers if requested.
+
+        :param dict metadata: JSON-serializable record
+        """
+        if self._compact_headers:
+            for field in _HEADER_FIELDS:
+                header = metadata.get(field)
+                if isinstance(header, LazyValue):
+                    header = header.resolve()
+                if header is not None:
+                    metadata[field] = self._compact_header(header)
+        self._write_line(metadata)
+
+    def _record_failure(self, output):
+        # type: (str) -> None
+        """Records that the operation that wrote the latest record failed afterwards.
+
+        Lines already written cannot be amended, so this does nothing.
+
+        :param str output: Output of the failed operation
+        """
+
+    def _flush(self):
+        # type: () -> None
+        """Flushes all written records."""
+        if self._unflushed_since is not None:
+            self._output_stream.flush()
+            self._unflushed_since = None
+
+    def _process(self, item):
+        # type: (Any) -> None
+        """Processes a single queued record or flush request.
+
+        :param item: Record, or flush request
+        """
+        if self.error is not None:
+            return
+        try:
+            if item is _FLUSH or item is _STOP:
+                self._flush()
+                return
+            if isinstance(item, _OperationFailed):
+                self._record_failure(item.output)
+                return
+            with span("metadata_write", input=item.get("input")):
+                self._write(item)
+            if time.time() - self._unflushed_since >= _FLUSH_SECONDS:  # type: ignore
+                self._flush()
+        except Exception as error:  # pylint: disable=broad-except
+            self.error = error
+
+    def run(self):
+        # type: () -> None
+        """Writes queued records until asked to stop."""
+        while True:
+            try:
+                # Once records are waiting to be flushed, flush them when nothing more arrives in time
+                item = self.queue.get(timeout=None if self._unflushed_since is None else _FLUSH_SECONDS)
+            except six.moves.queue.Empty:
+                self._process(_FLUSH)
+                continue
+            try:
+                self._process(item)
+            finally:
+                self.queue.task_done()
+            if item is _STOP:
+                return
+
+
+def _record_result(metadata):
+    # type: (Dict[str, Any]) -> Optional[str]
+    """Summarizes the result of the operation that a record describes.
+
+    :param dict metadata: Record
+    :returns: ``"skipped"``, ``"failed"``, or ``"success"``, or None if the record does not describe an operation
+    :rtype: str
+    """
+    if metadata.get("mode") == "header":
+        return None
+    if metadata.get("skipped"):
+        return "skipped"
+    if "error" in metadata or metadata.get("verified") is False:
+        return "failed"
+    return "success"
+
+
+def _open_database(filename, overwrite):
+    # type: (str, bool) -> sqlite3.Connection
+    """Opens a SQLite metadata database, creating it if necessary.
+
+    :param str filename: Path to database file
+    :param bool overwrite: Should all records already in the database be deleted
+    :rtype: sqlite3.Connection
+    :raises BadUserArgumentError: if the file is not a SQLite database
+    """
+    try:
+        # The connection is used only by the background writer thread once it is opened
+        connection = sqlite3.connect(filename, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SQLITE_SCHEMA)
+        if overwrite:
+            connection.execute("DELETE FROM metadata")
+            connection.commit()
+    except sqlite3.DatabaseError as error:
+        raise BadUserArgumentError('Unable to open metadata database "{}": {}'.format(filename, error))
+    return connection
+
+
+class _SqliteMetadataSink(_MetadataSink):
+    """Background thread that inserts metadata records into a SQLite database in the order that
+    they were queued.
+
+    Each record is stored in full as JSON, along with indexed columns for its mode, input, output,
+    result, skip reason, and message ID. Records are inserted in batches, and each flush commits
+    them in a single transaction. Operation records are written once the message header is ready,
+    so if the operation fails afterwards, the result of its row is updated to ``"failed"``.
+
+    :param connection: Connection to database, as opened by :func:`_open_database`
+    :type connection: sqlite3.Connection
+    :param bool compact_headers: Should shared header fields be written only once (default: False)
+    """
+
+    def __init__(self, connection, compact_headers=False):
+        # type: (sqlite3.Connection, bool) -> None
+        """Prepares the thread without starting it."""
+        super(_SqliteMetadataSink, self).__init__(connection, binary=False, compact_headers=compact_headers)
+        self._rows = []  # type: List[Tuple[Any, ...]]
+        # Output of the latest record, if it is the last row written and its operation has not failed
+        self._last_output = None  # type: Optional[str]
+
+    def _write(self, metadata):
+        # type: (Dict[str, Any]) -> None
+        """Writes a single record, first resolving its headers so that their message ID can be indexed.
+
+        :param dict metadata: JSON-serializable record
+        """
+        for field in _HEADER_FIELDS:
+            if isinstance(metadata.get(field), LazyValue):
+                metadata[field] = metadata[field].resolve()
+        super(_SqliteMetadataSink, self)._write(metadata)
+
+    def _write_line(self, metadata):
+        # type: (Dict[str, Any]) -> None
+        """Serializes a single record and holds it for the next batch insert.
+
+        :param dict metadata: JSON-serializable record
+        """
+        header = metadata.get("header") or metadata.get("source_header") or {}
+        result = _record_result(metadata)
+        self._rows.append(
+            (
+                metadata.get("mode"),
+                metadata.get("input"),
+                metadata.get("output"),
+                result,
+                metadata.get("reason"),
+                header.get("message_id"),
+                _json_line(metadata).decode("utf-8").rstrip(),
+            )
+        )
+        self._last_output = metadata.get("output") if result == "success" else None
+        if len(self._rows) >= _SQLITE_BATCH_SIZE:
+            self._insert()
+        if self._unflushed_since is None:
+            self._unflushed_since = time.time()
+
+    def _record_failure(self, output):
+        # type: (str) -> None
+        """Updates the result of the latest record to ``"failed"``, if it was written by the failed operation.
+
+        :param str output: Output of the failed operation
+        """
+        if output is None or output != self._last_output:
+            return
+        self._last_output = None
+        if self._rows:
+            self._rows[-1] = self._rows[-1][:3] + ("failed",) + self._rows[-1][4:]
+            return
+        # The latest record has already been inserted, as the last row
+        self._output_stream.execute("UPDATE metadata SET result = 'failed' WHERE id = last_insert_rowid()")
+        if self._unflushed_since is None:
+            self._unflushed_since = time.time()
+
+    def _insert(self):
+        # type: () -> None
+        """Inserts all held records."""
+        rows, self._rows = self._rows, []
+        self._output_stream.executemany(
+            "INSERT INTO metadata (mode, input, output, result, reason, message_id, record)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def _flush(self):
+        # type: () -> None
+        """Inserts and commits all written records."""
+        if self._unflushed_since is not None:
+            self._insert()
+            self._output_stream.commit()
+            self._unflushed_since = None
 
 
 @attr.s(hash=False, init=False, order=True, eq=True)
@@ -41,6 +470,17 @@ class MetadataWriter(object):
     # pylint: disable=too-few-public-methods
     """Writes JSON-encoded metadata to output stream unless suppressed.
 
+    Records are handed to a background thread through a bounded queue. The thread serializes and
+    writes them in the order that they were written, so that a slow metadata target does not delay
+    the operations that produce them. Records must not be modified after they are written.
+
+    Opening the writer again while it is already open reuses the same output stream and thread, and
+    only the matching outermost close drains the queue and closes the stream. Holding the writer
+    open across many operations therefore avoids reopening the output for each one.
+
+    An output file of the form ``sqlite:PATH`` writes records to a SQLite database at ``PATH``
+    rather than as lines of JSON.
+
     :param bool suppress_output: Should output be suppressed (default: False)
     """
 
@@ -50,6 +490,10 @@ class MetadataWriter(object):
     )
     _output_mode = None  # type: str
     _output_stream = None  # type: IO
+    _open_count = 0  # type: int
+    _sink = None  # type: Optional[_MetadataSink]
+    _compact_headers = False  # type: bool
+    _database = False  # type: bool
 
     def __init__(self, suppress_output=False):
         # type: (bool) -> None
@@ -66,9 +510,13 @@ class MetadataWriter(object):
         .. note::
             Separated from ``__init__`` to make use as an argparse type simpler.
 
-        :param str output_file: Path to file to write to, or "-" for stdout (optional)
+        :param str output_file: Path to file to write to, "-" for stdout, or "sqlite:" followed by
+            the path to a SQLite database to write to (optional)
         """
         self.output_file = output_file
+        self._database = output_file is not None and output_file.startswith(_SQLITE_PREFIX)
+        if self._database:
+            self.output_file = output_file.partition(_SQLITE_PREFIX)[2]  # type: ignore
 
         if self.suppress_output:
             return self
@@ -76,6 +524,9 @@ class MetadataWriter(object):
         if self.output_file is None:
             raise TypeError("output_file cannot be None when suppress_output is False")
 
+        if self.output_file == "-" and self._database:
+            raise BadUserArgumentError("SQLite metadata output must be written to a file.")
+
         if self.output_file == "-":
             self._output_mode = "w"
             return self
@@ -95,17 +546,31 @@ class MetadataWriter(object):
         """Force the output to overwrite the target metadata file."""
         self._output_mode = "wb"
 
+    def compact_headers(self):
+        # type: () -> None
+        """Write the header fields that messages share only once, rather than in every record."""
+        self._compact_headers = True
+
     def open(self):
         # type: () -> None
-        """Create and open the output stream."""
-        if not self.suppress_output:
+        """Create and open the output stream and start the background writer, unless they are already open."""
+        self._open_count += 1
+        if not self.suppress_output and self._output_stream is None and self._database:
+            self._output_stream = _open_database(self.output_file, overwrite="w" in self._output_mode)  # type: ignore
+            self._sink = _SqliteMetadataSink(self._output_stream, compact_headers=self._compact_headers)
+            self._sink.start()
+        elif not self.suppress_output and self._output_stream is None:
             if self.output_file == "-":
                 self._output_stream = sys.stdout
             else:
                 # mypy insists that by this point that output_file can be None
                 # That potentiality is addressed by the initial constructor logic,
                 # but I can't figure out how to tell mypy that.
-                self._output_stream = open(self.output_file, self._output_mode)  # type: ignore
+                self._output_stream = open(self.output_file, self._output_mode, _BUFFER_SIZE)  # type: ignore
+            self._sink = _MetadataSink(
+                self._output_stream, binary="b" in self._output_mode, compact_headers=self._compact_headers
+            )
+            self._sink.start()
 
     def __enter__(self):
         # type: () -> MetadataWriter
@@ -113,40 +578,103 @@ class MetadataWriter(object):
         self.open()
         return self
 
+    def _raise_sink_error(self):
+        # type: () -> None
+        """Raises any error encountered by the background writer.
+
+        :raises Exception: if the background writer failed to write a record
+        """
+        if self._sink is not None and self._sink.error is not None:
+            raise self._sink.error  # pylint: disable=raising-bad-type
+
+    def record_failure(self, output):
+        # type: (str) -> None
+        """Records that an operation failed after its metadata record was written, for outputs that
+        store the result of each operation.
+
+        Errors from the background writer are left for the next write or flush to raise, so that
+        they do not hide the error that failed the operation.
+
+        :param str output: Output of the failed operation
+        """
+        if self.suppress_output or self._sink is None:
+            return
+        self._sink.queue.put(_OperationFailed(output))
+
+    def flush(self):
+        # type: () -> None
+        """Wait for all written records to be written to the output stream, then flush it."""
+        if self._sink is not None:
+            self._sink.queue.put(_FLUSH)
+            self._sink.queue.join()
+            self._raise_sink_error()
+
     def close(self):
         # type: () -> None
-        """Flush and close the output stream."""
-        if self._output_stream is not None:
+        """Drain all written records, then flush and close the output stream, unless it is still held
+        open by an outer open.
+        """
+        self._open_count = max(self._open_count - 1, 0)
+        if self._open_count:
+            return
+
+        sink, self._sink = self._sink, None
+        if sink is not None:
+            sink.queue.put(_STOP)
+            sink.join()
+
+        if self._output_stream is not None and self._database:
+            # Anything the background writer could not commit is rolled back
+            self._output_stream.close()
+            self._output_stream = None
+        elif self._output_stream is not None:
             self._output_stream.flush()
             if self._output_stream is not sys.stdout:
                 self._output_stream.close()
+            self._output_stream = None
 
         # Since we re-use each instance of this in a single call, we only want to overwrite
         # the first time if we are overwriting.
         if self.output_file != "-":
             self._output_mode = "ab"
 
+        if sink is not None and sink.error is not None:
+            raise sink.error  # pylint: disable=raising-bad-type
+
     def __exit__(self, exc_type, exc_value, traceback):
         # type: (type, BaseException, TracebackType) -> None
         """Flush and close the output stream on close."""
-        self.close()
+        if exc_type is None:
+            self.close()
+            return
+        try:
+            self.close()
+        except Exception as error:  # pylint: disable=broad-except
+            # Do not hide the error that is already being raised
+            _LOGGER.warning("Unable to write metadata: %s", error)
+
+    def queue_depth(self):
+        # type: () -> int
+        """Counts the records waiting to be written by the background writer.
+
+        :rtype: int
+        """
+        sink = self._sink
+        return 0 if sink is None else sink.queue.qsize()
 
     def write_metadata(self, **metadata):
-        # type: (**Any) -> Optional[int]
-        """Writes metadata to the output stream if output is not suppressed.
+        # type: (**Any) -> None
+        """Queues metadata to be written to the output stream if output is not suppressed.
 
         :param **metadata: JSON-serializeable metadata kwargs to write
+        :raises Exception: if the background writer failed to write an earlier record
         """
         if self.suppress_output:
-            return 0  # wrote 0 bytes
-
-        metadata_line = json.dumps(metadata, sort_keys=True) + os.linesep
-        metadata_output = ""  # type: Union[str, bytes]
-        if "b" in self._output_mode:
-            metadata_output = metadata_line.encode("utf-8")
-        else:
-            metadata_output = metadata_line
-        return self._output_stream.write(metadata_output)
+            return
+        self._raise_sink_error()
+        # Waits for space in the queue if the background writer has fallen behind
+        with span("metadata"):
+            self._sink.queue.put(metadata)  # type: ignore
 
 
 def unicode_b64_encode(value):
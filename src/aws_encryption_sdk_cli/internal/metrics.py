@@ -0,0 +1,258 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Export of run statistics as Prometheus metrics."""
+import bisect
+import logging
+import os
+import threading
+import time
+
+import attr
+import six
+
+from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal.durability import AtomicOutput
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+from aws_encryption_sdk_cli.internal.stats import RunStatistics
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("MetricsExporter", "format_metrics")
+_LOGGER = logging.getLogger(LOGGER_NAME)
+_PREFIX = "aws_encryption_cli_"
+#: Upper bounds of the KMS call latency histogram buckets, in seconds.
+_KMS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_INTERVAL = 15.0
+
+
+def _format_value(value):
+    # type: (float) -> str
+    """Formats a sample value.
+
+    :param value: Value of the sample
+    :type value: int or float
+    :rtype: str
+    """
+    if value != value:  # pylint: disable=comparison-with-itself
+        return "NaN"
+    return repr(value)
+
+
+def _format_labels(labels):
+    # type: (Dict[str, str]) -> str
+    """Formats the labels of a sample.
+
+    :param dict labels: Label names and values
+    :rtype: str
+    """
+    if not labels:
+        return ""
+    return "{{{}}}".format(
+        ",".join(
+            '{}="{}"'.format(name, value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\""))
+            for name, value in sorted(labels.items())
+        )
+    )
+
+
+def _metric(name, metric_type, description, samples):
+    # type: (str, str, str, Iterable[Tuple[str, Dict[str, str], float]]) -> List[str]
+    """Formats a metric family.
+
+    :param str name: Name of the metric, without the common prefix
+    :param str metric_type: Prometheus metric type
+    :param str description: Help text
+    :param samples: Suffix, labels, and value of each sample
+    :returns: Lines of the metric family
+    :rtype: list of str
+    """
+    lines = ["# HELP {}{} {}".format(_PREFIX, name, description), "# TYPE {}{} {}".format(_PREFIX, name, metric_type)]
+    for suffix, labels, value in samples:
+        lines.append("{}{}{}{} {}".format(_PREFIX, name, suffix, _format_labels(labels), _format_value(value)))
+    return lines
+
+
+def _histogram_samples(values, buckets):
+    # type: (List[float], Iterable[float]) -> List[Tuple[str, Dict[str, str], float]]
+    """Builds the samples of a histogram.
+
+    :param list values: Observed values
+    :param buckets: Upper bounds of the buckets, in ascending order
+    :returns: Cumulative bucket counts, then the sum and count of the values
+    :rtype: list
+    """
+    sorted_values = sorted(values)
+    samples = [
+        ("_bucket", {"le": repr(bound)}, bisect.bisect_right(sorted_values, bound)) for bound in buckets
+    ]  # type: List[Tuple[str, Dict[str, str], float]]
+    samples.append(("_bucket", {"le": "+Inf"}, len(values)))
+    samples.append(("_sum", {}, sum(values)))
+    samples.append(("_count", {}, len(values)))
+    return samples
+
+
+def format_metrics(summary, kms_latencies, queue_depths):
+    # type: (Dict[str, Any], List[float], Dict[str, int]) -> str
+    """Formats run statistics in the Prometheus text exposition format.
+
+    :param dict summary: Summary, as returned by :meth:`RunStatistics.summary`
+    :param list kms_latencies: Latency of each KMS call, as returned by :meth:`RunStatistics.kms_latencies`
+    :param dict queue_depths: Number of items waiting in each named queue
+    :rtype: str
+    """
+    operations = summary["operations"]
+    cache = summary["cache"]
+    lookups = cache["hits"] + cache["misses"]
+    lines = []  # type: List[str]
+    for metric in (
+        (
+            "operations_total",
+            "counter",
+            "Operations by outcome.",
+            [("", {"outcome": outcome}, count) for outcome, count in sorted(operations.items()) if outcome != "total"],
+        ),
+        ("input_bytes_total", "counter", "Bytes of input files.", [("", {}, summary["input_bytes"])]),
+        ("output_bytes_total", "counter", "Bytes of output files.", [("", {}, summary["output_bytes"])]),
+        (
+            "errors_total",
+            "counter",
+            "Errors that failed an operation, by class.",
+            [("", {"class": name}, count) for name, count in sorted(summary["errors"].items())],
+        ),
+        (
+            "kms_calls_total",
+            "counter",
+            "AWS KMS calls by API operation.",
+            [("", {"operation": name}, count) for name, count in sorted(summary["kms"]["operations"].items())],
+        ),
+        ("kms_call_errors_total", "counter", "AWS KMS calls that failed.", [("", {}, summary["kms"]["errors"])]),
+        (
+            "kms_call_duration_seconds",
+            "histogram",
+            "Latency of AWS KMS calls.",
+            _histogram_samples(kms_latencies, _KMS_LATENCY_BUCKETS),
+        ),
+        (
+            "cache_lookups_total",
+            "counter",
+            "Data key cache lookups by result.",
+            [("", {"result": "hit"}, cache["hits"]), ("", {"result": "miss"}, cache["misses"])],
+        ),
+        (
+            "cache_hit_ratio",
+            "gauge",
+            "Fraction of data key cache lookups that were hits.",
+            [("", {}, float(cache["hits"]) / lookups if lookups else float("nan"))],
+        ),
+        (
+            "queue_depth",
+            "gauge",
+            "Items waiting in each queue.",
+            [("", {"queue": name}, depth) for name, depth in sorted(queue_depths.items())],
+        ),
+        ("elapsed_seconds", "gauge", "Seconds since the run started.", [("", {}, summary["elapsed_seconds"])]),
+        ("last_update_timestamp_seconds", "gauge", "Time of this update.", [("", {}, round(time.time(), 3))]),
+    ):
+        lines.extend(_metric(*metric))
+    return "\n".join(lines) + "\n"
+
+
+@attr.s(hash=False, init=False)
+class MetricsExporter(object):
+    """Periodically writes run statistics as Prometheus metrics to a file, for example for the
+    node exporter textfile collector.
+
+    The file is replaced atomically, so that a scrape never reads a partial file. It is written
+    when the run starts, every ``interval`` seconds from a background thread, and when the run
+    finishes.
+
+    :param str output_file: File to which to write the metrics
+    :param statistics: Statistics to export
+    :type statistics: aws_encryption_sdk_cli.internal.stats.RunStatistics
+    :param float interval: Seconds between writes (default: 15)
+    """
+
+    output_file = attr.ib(validator=attr.validators.instance_of(six.string_types))
+    statistics = attr.ib(validator=attr.validators.instance_of(RunStatistics))
+    interval = attr.ib(validator=attr.validators.instance_of(float))
+    _thread = None  # type: Optional[threading.Thread]
+
+    def __init__(self, output_file, statistics, interval=DEFAULT_INTERVAL):
+        # type: (str, RunStatistics, float) -> None
+        """Workaround pending resolution of attrs/mypy interaction.
+        https://github.com/python/mypy/issues/2088
+        https://github.com/python-attrs/attrs/issues/215
+        """
+        self.output_file = os.path.abspath(output_file)
+        self.statistics = statistics
+        self.interval = interval
+        attr.validate(self)
+
+        if not os.path.isdir(os.path.dirname(self.output_file)):
+            raise BadUserArgumentError("Parent directory for requested metrics file does not exist.")
+
+        self._stopped = threading.Event()
+        self._queue_depths = {}  # type: Dict[str, Callable[[], int]]
+
+    def write(self):
+        # type: () -> None
+        """Writes the current metrics."""
+        metrics = format_metrics(
+            self.statistics.summary(),
+            self.statistics.kms_latencies(),
+            {name: depth() for name, depth in self._queue_depths.items()},
+        )
+        output = AtomicOutput(self.output_file, replace_existing=True)
+        try:
+            with output:
+                output.write(metrics.encode("utf-8"))
+        except Exception:
+            output.discard()
+            raise
+        output.rename()
+
+    def _run(self):
+        # type: () -> None
+        """Writes the metrics every interval until stopped."""
+        while not self._stopped.wait(self.interval):
+            try:
+                self.write()
+            except Exception as error:  # pylint: disable=broad-except
+                # A failed update must not stop the run: the next one may succeed
+                _LOGGER.warning("Unable to write metrics: %s", error)
+
+    def start(self, queue_depths=None):
+        # type: (Optional[Dict[str, Callable[[], int]]]) -> None
+        """Writes the metrics and starts writing them every interval.
+
+        :param dict queue_depths: Callables that return the number of items waiting in each named
+            queue (optional)
+        """
+        self._queue_depths = queue_depths or {}
+        self.write()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        # type: () -> None
+        """Stops writing the metrics every interval and writes them one last time."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write()
@@ -0,0 +1,377 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Helper functions for planning operations without performing them."""
+from __future__ import division
+
+import logging
+import os
+import stat
+from enum import Enum
+
+import attr
+import six
+from aws_encryption_sdk.identifiers import Algorithm  # noqa pylint: disable=unused-import
+from aws_encryption_sdk.identifiers import CommitmentPolicy
+from aws_encryption_sdk.internal.defaults import (
+    ALGORITHM,
+    ALGORITHM_COMMIT_KEY,
+    MAX_BYTES_PER_KEY,
+    MAX_MESSAGES_PER_KEY,
+)
+
+from aws_encryption_sdk_cli.internal.io_handling import IOHandler  # noqa pylint: disable=unused-import
+from aws_encryption_sdk_cli.internal.io_handling import _output_dir, _stat, deleted_outputs, output_filename
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+from aws_encryption_sdk_cli.internal.sizing import encoded_length, estimate_ciphertext_length
+from aws_encryption_sdk_cli.internal.traversal import walk
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import Any, Dict, Iterable, List, Optional, Set  # noqa pylint: disable=unused-import
+
+    from aws_encryption_sdk_cli.internal.mypy_types import (  # noqa pylint: disable=unused-import
+        CACHING_CONFIG,
+        STREAM_KWARGS,
+    )
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("PlannedAction", "OperationPlan", "estimate_data_keys", "build_plan")
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+class PlannedAction(Enum):
+    """Identifies what would happen to a single output."""
+
+    WRITE = "write"
+    OVERWRITE = "overwrite"
+    PROMPT = "prompt"
+    SKIP = "skip"
+    MOVE = "move"
+    DELETE = "delete"
+
+
+#: Actions that read the source and write a new message.
+_PERFORMED_ACTIONS = frozenset((PlannedAction.WRITE.value, PlannedAction.OVERWRITE.value, PlannedAction.PROMPT.value))
+
+
+def estimate_data_keys(plaintext_lengths, caching_config):
+    # type: (Iterable[int], Optional[CACHING_CONFIG]) -> int
+    """Estimates how many data keys must be generated to encrypt plaintexts of the given lengths.
+
+    This mirrors how the caching cryptographic materials manager retires cache entries, but cannot
+    account for ``max_age``, so the result is a lower bound when caching is enabled.
+
+    :param plaintext_lengths: Length of each plaintext in the order they will be encrypted
+    :param dict caching_config: Parsed caching configuration, or None if caching is not used
+    :rtype: int
+    """
+    if caching_config is None:
+        return len(list(plaintext_lengths))
+
+    max_messages = caching_config.get("max_messages_encrypted", MAX_MESSAGES_PER_KEY)
+    max_bytes = caching_config.get("max_bytes_encrypted", MAX_BYTES_PER_KEY)
+    data_keys = 0
+    cached_messages = cached_bytes = None  # type: Optional[int]
+    for length in plaintext_lengths:
+        if length >= max_bytes:
+            # Too large to ever be cached
+            data_keys += 1
+            continue
+        if cached_messages is not None:
+            cached_messages += 1
+            cached_bytes += length
+            if cached_messages <= max_messages and cached_bytes <= max_bytes:
+                continue
+        data_keys += 1
+        cached_messages = 1
+        cached_bytes = length
+    return data_keys
+
+
+@attr.s(hash=False)
+class OperationPlan(object):
+    """Collects the planned source to destination mapping and projections for a request.
+
+    :param str mode: Operating mode (encrypt/decrypt)
+    """
+
+    mode = attr.ib(validator=attr.validators.instance_of(six.string_types))
+    operations = attr.ib(default=attr.Factory(list))  # type: List[Dict[str, Any]]
+    estimated_kms_calls = attr.ib(default=0)  # type: int
+
+    def add(self, source, destination, action, input_bytes=None, output_bytes=None, reason=None):
+        # type: (str, str, PlannedAction, Optional[int], Optional[int], Optional[str]) -> None
+        """Adds a single planned operation.
+
+        :param str source: Identifier for the source
+        :param str destination: Identifier for the destination
+        :param action: What would happen to the destination
+        :type action: PlannedAction
+        :param int input_bytes: Length of the source in bytes, if known
+        :param int output_bytes: Projected length of the destination in bytes, if known
+        :param str reason: Reason for the action, if it is not the default
+        """
+        operation = dict(
+            input=source, output=destination, action=action.value, input_bytes=input_bytes, output_bytes=output_bytes
+        )
+        if reason is not None:
+            operation["reason"] = reason
+        self.operations.append(operation)
+
+    def to_dict(self):
+        # type: () -> Dict[str, Any]
+        """Builds a JSON-serializable representation of this plan.
+
+        :rtype: dict
+        """
+        counts = dict((action.value, 0) for action in PlannedAction)
+        input_bytes = output_bytes = 0
+        for operation in self.operations:
+            counts[operation["action"]] += 1
+            if operation["action"] in _PERFORMED_ACTIONS:
+                input_bytes += operation["input_bytes"] or 0
+                output_bytes += operation["output_bytes"] or 0
+        return dict(
+            mode=self.mode,
+            operations=self.operations,
+            summary=dict(
+                operations=len(self.operations),
+                actions=counts,
+                input_bytes=input_bytes,
+                output_bytes=output_bytes,
+                estimated_kms_calls=self.estimated_kms_calls,
+            ),
+        )
+
+
+def _algorithm(stream_args):
+    # type: (STREAM_KWARGS) -> Algorithm
+    """Determines the algorithm suite that the AWS Encryption SDK will use for encryption.
+
+    :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
+    :rtype: aws_encryption_sdk.identifiers.Algorithm
+    """
+    if stream_args.get("algorithm") is not None:
+        return stream_args["algorithm"]
+    if stream_args.get("commitment_policy") == CommitmentPolicy.FORBID_ENCRYPT_ALLOW_DECRYPT:
+        return ALGORITHM
+    return ALGORITHM_COMMIT_KEY
+
+
+def _projected_output_length(handler, stream_args, key_ids, source_length):
+    # type: (IOHandler, STREAM_KWARGS, List[str], int) -> int
+    """Projects the length of a single output.
+
+    Encrypted outputs are estimated using AWS KMS sized encrypted data keys. Decrypted outputs are
+    bounded by the length of their ciphertext.
+
+    :param handler: IOHandler that would perform the operation
+    :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
+    :param list key_ids: Identifiers of all wrapping keys that encrypt new data keys
+    :param int source_length: Length of source in bytes, after any decoding
+    :rtype: int
+    """
+    if stream_args["mode"] == "encrypt":
+        output_length = estimate_ciphertext_length(
+            plaintext_length=source_length,
+            algorithm=_algorithm(stream_args),
+            key_ids=key_ids,
+            encryption_context=stream_args.get("encryption_context"),
+            frame_length=stream_args.get("frame_length"),
+        )
+    else:
+        output_length = source_length
+
+    if handler.encode_output:
+        return encoded_length(output_length)
+    return output_length
+
+
+def _planned_action(handler, destination_stat):
+    # type: (IOHandler, Optional[os.stat_result]) -> PlannedAction
+    """Determines what would happen to a single destination file.
+
+    :param handler: IOHandler that would perform the operation
+    :param destination_stat: Status of destination file, or None if it does not exist
+    :type destination_stat: os.stat_result
+    :rtype: PlannedAction
+    """
+    if destination_stat is None or not stat.S_ISREG(destination_stat.st_mode):
+        return PlannedAction.WRITE
+    if handler.no_overwrite:
+        return PlannedAction.SKIP
+    if handler.interactive:
+        return PlannedAction.PROMPT
+    return PlannedAction.OVERWRITE
+
+
+def _plan_single_file(plan, handler, stream_args, key_ids, source, destination, source_stat=None):
+    # type: (OperationPlan, IOHandler, STREAM_KWARGS, List[str], str, str, Optional[os.stat_result]) -> None
+    """Adds the plan for a single source file.
+
+    :param plan: Plan to which to add
+    :param handler: IOHandler that would perform the operation
+    :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
+    :param list key_ids: Identifiers of all wrapping keys that encrypt new data keys
+    :param str source: Full file path to source file
+    :param str destination: Full file path to destination file
+    :param source_stat: Already collected status of source file (optional)
+    :type source_stat: os.stat_result
+    """
+    if source_stat is None:
+        source_stat = os.stat(source)
+    source_length = source_stat.st_size
+    destination_stat = _stat(destination)
+    if destination_stat is not None and os.path.samestat(source_stat, destination_stat):
+        plan.add(source, destination, PlannedAction.SKIP, source_length, reason="Source and destination are the same")
+        return
+
+    mode = str(stream_args["mode"])
+    if handler.journal is not None and handler.journal.is_complete(source, source_stat, destination, mode):
+        plan.add(source, destination, PlannedAction.SKIP, source_length, reason="Source was already processed")
+        return
+    if handler.state_index is not None and handler.state_index.is_unchanged(source, source_stat, destination, mode):
+        plan.add(source, destination, PlannedAction.SKIP, source_length, reason="Source is unchanged")
+        return
+    if handler.sync and handler.state_index is not None and destination_stat is None:
+        moved = handler.state_index.find_moved(source, source_stat, mode)
+        if moved is not None:
+            plan.add(moved[1], destination, PlannedAction.MOVE, reason="Source was renamed")
+            return
+
+    action = _planned_action(handler, destination_stat)
+    if action is PlannedAction.SKIP:
+        plan.add(source, destination, action, source_length, reason="Destination exists and overwrite is disabled")
+        return
+
+    if handler.decode_input and not handler.encode_output:
+        plaintext_length = int(source_length * (3 / 4))
+    else:
+        plaintext_length = source_length
+    output_length = _projected_output_length(handler, stream_args, key_ids, plaintext_length)
+    plan.add(source, destination, action, source_length, output_length)
+
+
+def _plan_dir(plan, handler, stream_args, key_ids, source, destination, suffix):
+    # pylint: disable=too-many-arguments
+    # type: (OperationPlan, IOHandler, STREAM_KWARGS, List[str], str, str, Optional[str]) -> None
+    """Adds the plans for all files in a source directory tree.
+
+    :param plan: Plan to which to add
+    :param handler: IOHandler that would perform the operations
+    :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
+    :param list key_ids: Identifiers of all wrapping keys that encrypt new data keys
+    :param str source: Full file path to source directory root
+    :param str destination: Full file path to destination directory root
+    :param str suffix: Suffix to append to output filenames
+    """
+    mode = str(stream_args["mode"])
+    seen_sources = set()  # type: Set[str]
+    for base_dir, entries in walk(source, handler.source_filter):
+        destination_dir = _output_dir(source_root=source, destination_root=destination, source_dir=base_dir)
+        for entry in entries:
+            seen_sources.add(os.path.abspath(entry.path))
+            destination_filename = output_filename(
+                source_filename=entry.path, destination_dir=destination_dir, mode=mode, suffix=suffix
+            )
+            _plan_single_file(plan, handler, stream_args, key_ids, entry.path, destination_filename, entry.stat())
+
+    if handler.sync and handler.state_index is not None:
+        moved_outputs = set(
+            operation["input"] for operation in plan.operations if operation["action"] == PlannedAction.MOVE.value
+        )
+        for old_source, output in deleted_outputs(handler.state_index, source, destination, mode, seen_sources):
+            if output not in moved_outputs:
+                plan.add(old_source, output, PlannedAction.DELETE, reason="Source was deleted")
+
+
+def _estimate_kms_calls(plan, key_ids, caching_config):
+    # type: (OperationPlan, List[str], Optional[CACHING_CONFIG]) -> int
+    """Estimates how many AWS KMS calls the planned operations would make.
+
+    :param plan: Plan containing all planned operations
+    :param list key_ids: Identifiers of all wrapping keys that encrypt new data keys
+    :param dict caching_config: Parsed caching configuration, or None if caching is not used
+    :rtype: int
+    """
+    performed = [operation for operation in plan.operations if operation["action"] in _PERFORMED_ACTIONS]
+    calls_per_data_key = max(len(key_ids), 1)
+    if plan.mode in ("reencrypt", "rewrap"):
+        # Every data key is decrypted once, then encrypted (or a new one generated) under the new wrapping keys
+        return len(performed) * (1 + calls_per_data_key)
+    if plan.mode != "encrypt":
+        # Every message has its own data key unless it was encrypted using cached materials
+        return len(performed)
+
+    plaintext_lengths = [operation["input_bytes"] for operation in performed]
+    if None in plaintext_lengths:
+        # Streams of unknown length are never cached
+        return len(performed) * calls_per_data_key
+    return estimate_data_keys(plaintext_lengths, caching_config) * calls_per_data_key
+
+
+def build_plan(
+    handler,  # type: IOHandler
+    stream_args,  # type: STREAM_KWARGS
+    sources,  # type: Iterable[str]
+    destination,  # type: str
+    recursive,  # type: bool
+    suffix,  # type: Optional[str]
+    key_ids,  # type: List[str]
+    caching_config,  # type: Optional[CACHING_CONFIG]
+):
+    # type: (...) -> OperationPlan
+    """Plans all operations for a request in a single scan of the sources, without reading
+    any source contents, prompting, or writing any output.
+
+    :param handler: IOHandler that would perform the operations
+    :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
+    :param sources: Expanded source paths, or ``["-"]`` for stdin
+    :param str destination: Identifier for the destination (filesystem path or ``-`` for stdout)
+    :param bool recursive: Should directories be processed
+    :param str suffix: Suffix to append to output filenames
+    :param list key_ids: Identifiers of all wrapping keys that encrypt new data keys
+    :param dict caching_config: Parsed caching configuration, or None if caching is not used
+    :rtype: OperationPlan
+    """
+    mode = str(stream_args["mode"])
+    plan = OperationPlan(mode=mode)
+
+    for source in sources:
+        if source == "-":
+            plan.add(source, destination, PlannedAction.WRITE)
+            continue
+
+        if os.path.isdir(source):
+            if not recursive:
+                plan.add(
+                    source, destination, PlannedAction.SKIP, reason="Source is a directory and recursive is not set"
+                )
+                continue
+            _plan_dir(plan, handler, stream_args, key_ids, source, destination, suffix)
+
+        elif os.path.isfile(source):
+            _destination = destination
+            if os.path.isdir(destination):
+                _destination = output_filename(
+                    source_filename=source, destination_dir=destination, mode=mode, suffix=suffix
+                )
+            _plan_single_file(plan, handler, stream_args, key_ids, source, _destination)
+
+        else:
+            plan.add(source, destination, PlannedAction.SKIP, reason="Source does not exist")
+
+    plan.estimated_kms_calls = _estimate_kms_calls(plan, key_ids, caching_config)
+    _LOGGER.debug("Planned %d operations", len(plan.operations))
+    return plan
@@ -0,0 +1,195 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""CPU and memory profiling of a run."""
+import cProfile
+import json
+import logging
+import os
+
+import attr
+import six
+
+from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+
+try:  # tracemalloc was added in Python 3.4
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None  # type: ignore  # pylint: disable=invalid-name
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import Any, Dict, List  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("Profiler", "CpuProfiler", "MemoryProfiler", "PROFILERS")
+_LOGGER = logging.getLogger(LOGGER_NAME)
+#: Number of allocation sites to report for each operation.
+_TOP_SITES = 10
+
+
+@attr.s(hash=False, init=False)
+class Profiler(object):
+    """Profiles a run, writing the results to a file when the run finishes.
+
+    Use as a context manager around the run. Operations report their start and end so that
+    a profiler can measure each of them.
+
+    :param str output_file: File to which to write the profile
+    """
+
+    output_file = attr.ib(validator=attr.validators.instance_of(six.string_types))
+
+    def __init__(self, output_file):
+        # type: (str) -> None
+        """Workaround pending resolution of attrs/mypy interaction.
+        https://github.com/python/mypy/issues/2088
+        https://github.com/python-attrs/attrs/issues/215
+        """
+        self.output_file = os.path.abspath(output_file)
+        attr.validate(self)
+
+        if not os.path.isdir(os.path.dirname(self.output_file)):
+            raise BadUserArgumentError("Parent directory for requested profile file does not exist.")
+
+    def __enter__(self):
+        # type: () -> Profiler
+        """Starts profiling."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # type: (Any, Any, Any) -> None
+        """Stops profiling and writes the profile, whether or not the run succeeded."""
+
+    def begin_operation(self):
+        # type: () -> None
+        """Marks the start of a single operation."""
+
+    def end_operation(self, mode, source, destination):
+        # type: (str, str, str) -> None
+        """Marks the end of a single operation.
+
+        :param str mode: Operating mode of the operation
+        :param str source: Source of the operation
+        :param str destination: Destination of the operation
+        """
+
+
+@attr.s(hash=False, init=False)
+class CpuProfiler(Profiler):
+    """Profiles the CPU time of a run with cProfile, writing pstats data that can be read with
+    ``python -m pstats`` or ``pstats.Stats``.
+
+    :param str output_file: File to which to write the profile
+    """
+
+    def __init__(self, output_file):
+        # type: (str) -> None
+        """Workaround pending resolution of attrs/mypy interaction.
+        https://github.com/python/mypy/issues/2088
+        https://github.com/python-attrs/attrs/issues/215
+        """
+        super(CpuProfiler, self).__init__(output_file)
+        self._profile = cProfile.Profile()
+
+    def __enter__(self):
+        # type: () -> CpuProfiler
+        """Starts profiling."""
+        self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # type: (Any, Any, Any) -> None
+        """Stops profiling and writes the profile, whether or not the run succeeded."""
+        self._profile.disable()
+        self._profile.dump_stats(self.output_file)
+        _LOGGER.info("Wrote CPU profile to %s", self.output_file)
+
+
+@attr.s(hash=False, init=False)
+class MemoryProfiler(Profiler):
+    """Profiles the memory allocated by each operation of a run with tracemalloc, writing the
+    results as JSON.
+
+    For each operation, the profile records the most memory allocated at any one time while the
+    operation ran and the allocation sites holding the most memory when it finished. Memory
+    allocated before an operation started is not counted towards it.
+
+    :param str output_file: File to which to write the profile
+    :raises BadUserArgumentError: if tracemalloc is not available
+    """
+
+    def __init__(self, output_file):
+        # type: (str) -> None
+        """Workaround pending resolution of attrs/mypy interaction.
+        https://github.com/python/mypy/issues/2088
+        https://github.com/python-attrs/attrs/issues/215
+        """
+        if tracemalloc is None:
+            raise BadUserArgumentError("Memory profiling requires Python 3.4 or later.")
+        super(MemoryProfiler, self).__init__(output_file)
+        self._operations = []  # type: List[Dict[str, Any]]
+        self._was_tracing = False
+
+    def __enter__(self):
+        # type: () -> MemoryProfiler
+        """Starts tracing memory allocations."""
+        self._was_tracing = tracemalloc.is_tracing()
+        if not self._was_tracing:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # type: (Any, Any, Any) -> None
+        """Stops tracing memory allocations and writes the profile, whether or not the run succeeded."""
+        if not self._was_tracing:
+            tracemalloc.stop()
+        profile = dict(
+            peak_bytes=max([operation["peak_bytes"] for operation in self._operations] or [0]),
+            operations=self._operations,
+        )
+        with open(self.output_file, "w") as output:
+            json.dump(profile, output, indent=4, sort_keys=True)
+        _LOGGER.info("Wrote memory profile to %s", self.output_file)
+
+    def begin_operation(self):
+        # type: () -> None
+        """Marks the start of a single operation, resetting the traced memory and its peak."""
+        tracemalloc.clear_traces()
+
+    def end_operation(self, mode, source, destination):
+        # type: (str, str, str) -> None
+        """Records the peak memory of an operation and the allocation sites holding the most memory.
+
+        :param str mode: Operating mode of the operation
+        :param str source: Source of the operation
+        :param str destination: Destination of the operation
+        """
+        _current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+        )
+        sites = [
+            dict(
+                site="{}:{}".format(stat.traceback[0].filename, stat.traceback[0].lineno),
+                bytes=stat.size,
+                blocks=stat.count,
+            )
+            for stat in snapshot.statistics("lineno")[:_TOP_SITES]
+        ]
+        self._operations.append(dict(mode=mode, input=source, output=destination, peak_bytes=peak, top_sites=sites))
+
+
+#: Profilers by the kind named in ``--profile KIND:PATH``.
+PROFILERS = dict(cpu=CpuProfiler, mem=MemoryProfiler)
@@ -0,0 +1,319 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Re-wraps the data key of an encrypted message under new wrapping keys without re-encrypting its body."""
+import errno
+import hmac
+import logging
+import os
+import shutil
+
+import attr
+from aws_encryption_sdk.exceptions import CustomMaximumValueExceeded, MasterKeyProviderError, SerializationError
+from aws_encryption_sdk.identifiers import ContentType
+from aws_encryption_sdk.internal.crypto.authentication import Signer, Verifier
+from aws_encryption_sdk.internal.crypto.data_keys import calculate_commitment_key, derive_data_encryption_key
+from aws_encryption_sdk.internal.crypto.elliptic_curve import generate_ecc_signing_key
+from aws_encryption_sdk.internal.defaults import ENCODED_SIGNER_KEY
+from aws_encryption_sdk.internal.formatting.deserialize import (
+    deserialize_footer,
+    deserialize_frame,
+    deserialize_header,
+    deserialize_header_auth,
+    deserialize_non_framed_values,
+    deserialize_tag,
+    validate_header,
+)
+from aws_encryption_sdk.internal.formatting.serialize import serialize_footer, serialize_header, serialize_header_auth
+from aws_encryption_sdk.internal.str_ops import to_str
+from aws_encryption_sdk.internal.utils.commitment import (
+    validate_commitment_policy_on_decrypt,
+    validate_commitment_policy_on_encrypt,
+)
+from aws_encryption_sdk.materials_managers import DecryptionMaterialsRequest
+
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import IO, Any, Optional  # noqa pylint: disable=unused-import
+
+    from aws_encryption_sdk.key_providers.base import MasterKeyProvider  # noqa pylint: disable=unused-import
+    from aws_encryption_sdk.materials_managers.base import CryptoMaterialsManager  # noqa pylint: disable=unused-import
+    from aws_encryption_sdk.structures import MessageHeader  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("MessageRewrapper",)
+_LOGGER = logging.getLogger(LOGGER_NAME)
+#: Number of bytes to copy at a time.
+_COPY_CHUNK_SIZE = 1024 * 1024
+#: Errors from copy_file_range that mean the files cannot be copied that way.
+_COPY_FILE_RANGE_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.EBADF}
+
+
+class _TeeReader(object):
+    """Readable stream that writes everything read from it to a destination and adds it to a signature.
+
+    :param source: Stream to read from
+    :type source: file-like object
+    :param destination: Stream to which to write everything read
+    :type destination: file-like object
+    :param signer: Signer to update with everything read
+    :type signer: aws_encryption_sdk.internal.crypto.authentication.Signer
+    """
+
+    def __init__(self, source, destination, signer):
+        # type: (IO, IO, Signer) -> None
+        """Prepares the reader."""
+        self.__source = source
+        self.__destination = destination
+        self.__signer = signer
+
+    def read(self, size=-1):
+        # type: (int) -> bytes
+        """Reads data from the source, passing it on to the destination and signer.
+
+        :param int size: Number of bytes to read
+        :rtype: bytes
+        """
+        data = self.__source.read(size)
+        self.__destination.write(data)
+        self.__signer.update(data)
+        return data
+
+
+def _copy_file_range(source, destination):
+    # type: (IO, IO) -> bool
+    """Copies the rest of a file to another file within the kernel, without passing the data through
+    this process, where the platform and filesystems support it.
+
+    :param source: File to copy from
+    :type source: file-like object
+    :param destination: File to copy to
+    :type destination: file-like object
+    :returns: True if the rest of the source was copied, False if it could not be copied this way
+    :rtype: bool
+    """
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is None:
+        return False
+    try:
+        destination.flush()
+        source_fd, destination_fd = source.fileno(), destination.fileno()
+        source_offset, destination_offset = source.tell(), destination.tell()
+    except (AttributeError, IOError, OSError, ValueError):
+        # Not a file
+        return False
+
+    copied = True
+    while copied:
+        try:
+            copied = copy_file_range(source_fd, destination_fd, _COPY_CHUNK_SIZE, source_offset, destination_offset)
+        except OSError as error:
+            if error.errno not in _COPY_FILE_RANGE_UNSUPPORTED:
+                raise
+            _LOGGER.debug("Unable to copy within the kernel: %s", error)
+            break
+        source_offset += copied
+        destination_offset += copied
+
+    source.seek(source_offset)
+    destination.seek(destination_offset)
+    return not copied
+
+
+@attr.s(hash=False, init=False)
+class MessageRewrapper(object):
+    """Re-wraps the data key of an encrypted message under new wrapping keys.
+
+    The message body is bound to the data key and message ID, not to the wrapping keys, so only the
+    header and header authentication are rewritten and the body is copied through unchanged. Signed
+    messages are signed again with a new signing key, so their bodies are read and their original
+    signature is verified, but never decrypted.
+
+    Use in three steps: :meth:`unwrap` decrypts the data key and authenticates the header,
+    :meth:`wrap` builds the new header, and :meth:`write` writes the new message.
+
+    :param source: Stream containing the message, which the header is read from immediately
+    :type source: file-like object
+    :param commitment_policy: Commitment policy to apply to the message
+    :type commitment_policy: aws_encryption_sdk.identifiers.CommitmentPolicy
+    :param int max_body_length: Maximum frame length (for framed messages) or content length
+        (for non-framed messages) (optional)
+    """
+
+    source = attr.ib()
+    commitment_policy = attr.ib()
+    max_body_length = attr.ib(validator=attr.validators.optional(attr.validators.instance_of(int)))
+    header_auth = None  # type: Any
+
+    def __init__(self, source, commitment_policy, max_body_length=None):
+        # type: (IO, Any, Optional[int]) -> None
+        """Workaround pending resolution of attrs/mypy interaction.
+        https://github.com/python/mypy/issues/2088
+        https://github.com/python-attrs/attrs/issues/215
+        """
+        self.source = source
+        self.commitment_policy = commitment_policy
+        self.max_body_length = max_body_length
+        attr.validate(self)
+        self.header, self._raw_header = deserialize_header(source)
+        validate_commitment_policy_on_decrypt(commitment_policy, self.header.algorithm)
+        if (
+            max_body_length is not None
+            and self.header.content_type == ContentType.FRAMED_DATA
+            and self.header.frame_length > max_body_length
+        ):
+            raise CustomMaximumValueExceeded(
+                "Frame Size in header found larger than custom value: {found:d} > {custom:d}".format(
+                    found=self.header.frame_length, custom=max_body_length
+                )
+            )
+        self._verifier = None  # type: Optional[Verifier]
+        self._signer = None  # type: Optional[Signer]
+        self._data_key = None  # type: Any
+        self._derived_data_key = None  # type: Optional[bytes]
+        self._new_header = None  # type: Optional[bytes]
+
+    def unwrap(self, materials_manager):
+        # type: (CryptoMaterialsManager) -> None
+        """Decrypts the data key of the message and authenticates the message header.
+
+        :param materials_manager: Materials manager that can decrypt the data key
+        :type materials_manager: aws_encryption_sdk.materials_managers.base.CryptoMaterialsManager
+        :raises MasterKeyProviderError: if key commitment validation fails
+        """
+        header = self.header
+        materials = materials_manager.decrypt_materials(
+            request=DecryptionMaterialsRequest(
+                encrypted_data_keys=header.encrypted_data_keys,
+                algorithm=header.algorithm,
+                encryption_context=header.encryption_context,
+                commitment_policy=self.commitment_policy,
+            )
+        )
+        if materials.verification_key is not None:
+            self._verifier = Verifier.from_key_bytes(algorithm=header.algorithm, key_bytes=materials.verification_key)
+            self._verifier.update(self._raw_header)
+
+        self.header_auth = deserialize_header_auth(
+            version=header.version, stream=self.source, algorithm=header.algorithm, verifier=self._verifier
+        )
+        self._data_key = materials.data_key
+        self._derived_data_key = derive_data_encryption_key(
+            source_key=materials.data_key.data_key, algorithm=header.algorithm, message_id=header.message_id
+        )
+        if header.algorithm.is_committing():
+            expected_commitment_key = calculate_commitment_key(
+                source_key=materials.data_key.data_key, algorithm=header.algorithm, message_id=header.message_id
+            )
+            if not hmac.compare_digest(expected_commitment_key, header.commitment_key):
+                raise MasterKeyProviderError(
+                    "Key commitment validation failed. Key identity does not match the identity asserted in the "
+                    "message. Halting processing of this message."
+                )
+        validate_header(
+            header=header, header_auth=self.header_auth, raw_header=self._raw_header, data_key=self._derived_data_key
+        )
+
+    def wrap(self, key_provider):
+        # type: (MasterKeyProvider) -> MessageHeader
+        """Encrypts the data key of the message under new wrapping keys and builds the new message header.
+
+        :param key_provider: Master key provider for the new wrapping keys
+        :type key_provider: aws_encryption_sdk.key_providers.base.MasterKeyProvider
+        :returns: New message header
+        :rtype: aws_encryption_sdk.structures.MessageHeader
+        """
+        if self._data_key is None:
+            raise SerializationError("Data key must be unwrapped before it can be wrapped")
+        algorithm = self.header.algorithm
+        validate_commitment_policy_on_encrypt(self.commitment_policy, algorithm)
+
+        encryption_context = dict(self.header.encryption_context)
+        if algorithm.signing_algorithm_info is not None:
+            # The original signing key is not available, so the new message is signed with a new one
+            self._signer = Signer(algorithm=algorithm, key=generate_ecc_signing_key(algorithm=algorithm))
+            encryption_context[ENCODED_SIGNER_KEY] = to_str(self._signer.encoded_public_key())
+
+        _primary_master_key, master_keys = key_provider.master_keys_for_encryption(
+            encryption_context=encryption_context, plaintext_rostream=None
+        )
+        encrypted_data_keys = set(
+            master_key.encrypt_data_key(
+                data_key=self._data_key, algorithm=algorithm, encryption_context=encryption_context
+            )
+            for master_key in master_keys
+        )
+        header = attr.evolve(
+            self.header, encryption_context=encryption_context, encrypted_data_keys=encrypted_data_keys
+        )
+        raw_header = serialize_header(header=header, signer=self._signer)
+        self._new_header = raw_header + serialize_header_auth(
+            version=header.version,
+            algorithm=algorithm,
+            header=raw_header,
+            data_encryption_key=self._derived_data_key,
+            signer=self._signer,
+        )
+        return header
+
+    def write(self, destination, fast_copy=False):
+        # type: (IO, bool) -> None
+        """Writes the new message.
+
+        :param destination: Stream to which to write the new message
+        :type destination: file-like object
+        :param bool fast_copy: Should an unsigned body be copied within the kernel where possible (default: False)
+        :raises SerializationError: if the original message signature is invalid
+        """
+        if self._new_header is None:
+            raise SerializationError("Header must be wrapped before the message can be written")
+        destination.write(self._new_header)
+
+        if self._signer is None:
+            if not (fast_copy and _copy_file_range(self.source, destination)):
+                shutil.copyfileobj(self.source, destination, _COPY_CHUNK_SIZE)
+            return
+
+        self._copy_signed_body(_TeeReader(self.source, destination, self._signer))
+        deserialize_footer(stream=self.source, verifier=self._verifier)
+        destination.write(serialize_footer(self._signer))
+
+    def _copy_signed_body(self, body):
+        # type: (_TeeReader) -> None
+        """Copies the body of a signed message, adding it to the original message signature.
+
+        :param body: Reader that copies everything read from the message body
+        :type body: _TeeReader
+        """
+        if self.header.content_type != ContentType.NO_FRAMING:
+            final_frame = False
+            while not final_frame:
+                _frame, final_frame = deserialize_frame(stream=body, header=self.header, verifier=self._verifier)
+            return
+
+        _iv, remaining = deserialize_non_framed_values(stream=body, header=self.header, verifier=self._verifier)
+        if self.max_body_length is not None and remaining > self.max_body_length:
+            raise CustomMaximumValueExceeded(
+                "Non-framed message content length found larger than custom value: {found:d} > {custom:d}".format(
+                    found=remaining, custom=self.max_body_length
+                )
+            )
+        while remaining:
+            chunk = body.read(min(remaining, _COPY_CHUNK_SIZE))
+            if not chunk:
+                raise SerializationError("Total message body contents less than specified in body description")
+            self._verifier.update(chunk)  # type: ignore
+            remaining -= len(chunk)
+        deserialize_tag(stream=body, header=self.header, verifier=self._verifier)
@@ -0,0 +1,163 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Parallel read-only scans of source files that produce a metadata record for each file."""
+import collections
+import itertools
+import logging
+import os
+from multiprocessing.pool import ThreadPool
+
+import six
+
+from aws_encryption_sdk_cli.internal.io_handling import IOHandler  # noqa pylint: disable=unused-import
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+from aws_encryption_sdk_cli.internal.stats import FAILED, SUCCEEDED, RunStatistics  # noqa pylint: disable=unused-import
+from aws_encryption_sdk_cli.internal.traversal import walk
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("scan", "error_description")
+_LOGGER = logging.getLogger(LOGGER_NAME)
+#: Number of files per worker thread that may be waiting to be scanned or written at a time.
+_WINDOW_PER_JOB = 4
+
+
+def error_description(error):
+    # type: (Exception) -> str
+    """Describes an error for a metadata record.
+
+    :param error: Error to describe
+    :type error: Exception
+    :rtype: str
+    """
+    return "{cls}({args})".format(
+        cls=error.__class__.__name__, args=", ".join('"{}"'.format(arg) for arg in error.args)
+    )
+
+
+def _source_files(handler, sources, recursive):
+    # type: (IOHandler, Iterable[str], bool) -> Iterator[str]
+    """Lazily expands the requested sources into the files to scan.
+
+    :param handler: IOHandler whose source filter selects files in source directories
+    :param sources: Source paths, or ``-`` for stdin
+    :param bool recursive: Should source directories be scanned
+    :returns: Iterator of file paths
+    """
+    for source in sources:
+        if source == "-":
+            yield source
+        elif os.path.isdir(source):
+            if not recursive:
+                _LOGGER.warning("Skipping %s because it is a directory and -r/-R/--recursive is not set", source)
+                continue
+            for _base_dir, entries in walk(source, handler.source_filter):
+                for entry in entries:
+                    yield entry.path
+        elif os.path.isfile(source):
+            yield source
+        else:
+            _LOGGER.warning("Skipping %s because it does not exist", source)
+
+
+def _windowed_map(pool, function, items, window):
+    # type: (ThreadPool, Callable[[str], Dict[str, Any]], Iterable[str], int) -> Iterator[Dict[str, Any]]
+    """Lazily maps a function over items using a thread pool, yielding results in item order.
+
+    Unlike :meth:`ThreadPool.imap`, which consumes all items up front, at most ``window`` items
+    are submitted and not yet yielded at a time, so large source trees are expanded only as the
+    workers keep up.
+
+    :param pool: Thread pool in which to call function
+    :type pool: multiprocessing.pool.ThreadPool
+    :param callable function: Callable to apply to each item
+    :param items: Items to pass to function
+    :param int window: Maximum number of outstanding items
+    :returns: Iterator of results
+    """
+    items = iter(items)
+    pending = collections.deque(pool.apply_async(function, (item,)) for item in itertools.islice(items, window))
+    while pending:
+        result = pending.popleft().get()
+        # Keep the workers busy while the result is written
+        pending.extend(pool.apply_async(function, (item,)) for item in itertools.islice(items, 1))
+        yield result
+
+
+def _record_scan(statistics, record, scan_failed):
+    # type: (RunStatistics, Dict[str, Any], bool) -> None
+    """Records the outcome of scanning a file, and the class of any error that failed it, in run statistics.
+
+    :param statistics: Run statistics
+    :type statistics: aws_encryption_sdk_cli.internal.stats.RunStatistics
+    :param dict record: Metadata record for the file
+    :param bool scan_failed: Did the file fail the scan
+    """
+    statistics.record_operation(FAILED if scan_failed else SUCCEEDED)
+    if "error" in record:
+        # Described by error_description
+        statistics.record_error(record["error"].partition("(")[0])
+
+
+def scan(
+    handler,  # type: IOHandler
+    scan_file,  # type: Callable[[str], Dict[str, Any]]
+    sources,  # type: Iterable[str]
+    recursive,  # type: bool
+    jobs=1,  # type: int
+    on_record=None,  # type: Optional[Callable[[Dict[str, Any]], None]]
+):
+    # pylint: disable=too-many-arguments
+    # type: (...) -> Tuple[int, int]
+    """Scans every file in the requested sources, writing the metadata record for each one.
+
+    Files are scanned by ``jobs`` worker threads, and sources are only expanded a few files ahead of
+    the records being written. Records are written in source order, whatever order the workers finish
+    in, and are passed to ``on_record`` from the calling thread. A file
+    fails the scan if its record contains an ``error`` or is marked as ``skipped``. Each result is
+    recorded in the run statistics of the handler, if it has any.
+
+    :param handler: IOHandler whose source filter and metadata writer to use
+    :param callable scan_file: Callable that scans a single file, or ``-`` for stdin, and returns its record
+    :param sources: Source paths, or ``-`` for stdin
+    :param bool recursive: Should source directories be scanned
+    :param int jobs: Number of files to scan in parallel (default: 1)
+    :param callable on_record: Callable that is passed each record, in source order, as it is written (optional)
+    :returns: Number of files scanned and number of files that failed the scan
+    :rtype: tuple of int
+    """
+    pool = ThreadPool(jobs) if jobs > 1 else None
+    try:
+        if pool is None:
+            records = six.moves.map(scan_file, _source_files(handler, sources, recursive))  # type: Iterable
+        else:
+            records = _windowed_map(pool, scan_file, _source_files(handler, sources, recursive), jobs * _WINDOW_PER_JOB)
+        total = failed = 0
+        with handler.metadata_writer as metadata:
+            for record in records:
+                total += 1
+                scan_failed = "error" in record or record.get("skipped", False)
+                failed += scan_failed
+                if handler.statistics is not None:
+                    _record_scan(handler.statistics, record, scan_failed)
+                metadata.write_metadata(**record)
+                if on_record is not None:
+                    on_record(record)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return total, failed
@@ -0,0 +1,149 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Helper functions for calculating the size of operation outputs."""
+import aws_encryption_sdk.internal.formatting
+import six
+from aws_encryption_sdk.identifiers import Algorithm  # noqa pylint: disable=unused-import
+from aws_encryption_sdk.identifiers import ContentType, ObjectType, SerializationVersion
+from aws_encryption_sdk.internal.defaults import ENCODED_SIGNER_KEY, FRAME_LENGTH
+from aws_encryption_sdk.structures import EncryptedDataKey, MasterKeyInfo, MessageHeader
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import Dict, Iterable, Optional  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("encoded_length", "ciphertext_length", "estimate_ciphertext_length")
+
+#: Provider ID assumed for wrapping keys when estimating encrypted data key sizes.
+ESTIMATED_PROVIDER_ID = "aws-kms"
+#: Bytes that AWS KMS adds to a plaintext when producing a ciphertext blob for a symmetric key.
+#: A 32-byte data key produces a 184-byte ciphertext blob.
+_KMS_CIPHERTEXT_BLOB_OVERHEAD = 152
+
+
+def encoded_length(length):
+    # type: (int) -> int
+    """Calculates the length of a value after it is Base64-encoded.
+
+    :param int length: Length of raw value in bytes
+    :returns: Length of encoded value in bytes
+    :rtype: int
+    """
+    full_blocks, remainder = divmod(length, 3)
+    if remainder:
+        full_blocks += 1
+    return full_blocks * 4
+
+
+def ciphertext_length(header, plaintext_length):
+    # type: (MessageHeader, int) -> int
+    """Calculates the length of the ciphertext message that will be produced for a plaintext
+    of ``plaintext_length`` bytes, given the complete message header.
+
+    :param header: Complete message header
+    :type header: aws_encryption_sdk.structures.MessageHeader
+    :param int plaintext_length: Length of plaintext in bytes
+    :returns: Length of ciphertext message in bytes
+    :rtype: int
+    """
+    return aws_encryption_sdk.internal.formatting.ciphertext_length(header=header, plaintext_length=plaintext_length)
+
+
+def _estimated_encryption_context(algorithm, encryption_context):
+    # type: (Algorithm, Dict[str, str]) -> Dict[str, str]
+    """Adds a placeholder for the public verification key that the AWS Encryption SDK adds to the
+    encryption context when using a signing algorithm suite.
+
+    :param algorithm: Algorithm suite that will be used
+    :type algorithm: aws_encryption_sdk.identifiers.Algorithm
+    :param dict encryption_context: Encryption context requested by the caller
+    :rtype: dict
+    """
+    estimated_context = dict(encryption_context)
+    if algorithm.signing_algorithm_info is not None:
+        # The public key is stored as a Base64-encoded compressed elliptic curve point.
+        point_length = 1 + (algorithm.signing_algorithm_info.key_size + 7) // 8
+        estimated_context[ENCODED_SIGNER_KEY] = "A" * encoded_length(point_length)
+    return estimated_context
+
+
+def _estimated_encrypted_data_keys(algorithm, key_ids):
+    # type: (Algorithm, Iterable[str]) -> set
+    """Builds placeholder encrypted data keys of the size that AWS KMS would return.
+
+    :param algorithm: Algorithm suite that will be used
+    :type algorithm: aws_encryption_sdk.identifiers.Algorithm
+    :param key_ids: Identifiers of all wrapping keys
+    :rtype: set of aws_encryption_sdk.structures.EncryptedDataKey
+    """
+    encrypted_key_length = algorithm.kdf_input_len + _KMS_CIPHERTEXT_BLOB_OVERHEAD
+    return set(
+        EncryptedDataKey(
+            key_provider=MasterKeyInfo(provider_id=ESTIMATED_PROVIDER_ID, key_info=six.b(key_id)),
+            encrypted_data_key=six.int2byte(position % 256) * encrypted_key_length,
+        )
+        for position, key_id in enumerate(key_ids)
+    )
+
+
+def estimate_ciphertext_length(
+    plaintext_length,  # type: int
+    algorithm,  # type: Algorithm
+    key_ids,  # type: Iterable[str]
+    encryption_context=None,  # type: Optional[Dict[str, str]]
+    frame_length=None,  # type: Optional[int]
+):
+    # type: (...) -> int
+    """Estimates the length of the ciphertext message that will be produced for a plaintext
+    of ``plaintext_length`` bytes before any encrypted data keys are available.
+
+    Encrypted data keys are assumed to be the size of those produced by AWS KMS symmetric keys.
+    All other values are exact.
+
+    :param int plaintext_length: Length of plaintext in bytes
+    :param algorithm: Algorithm suite that will be used
+    :type algorithm: aws_encryption_sdk.identifiers.Algorithm
+    :param key_ids: Identifiers of all wrapping keys that will wrap the data key
+    :param dict encryption_context: Encryption context requested by the caller (optional)
+    :param int frame_length: Frame length in bytes, or 0 for non-framed messages (optional)
+    :returns: Estimated length of ciphertext message in bytes
+    :rtype: int
+    """
+    if frame_length is None:
+        frame_length = FRAME_LENGTH
+
+    header_kwargs = dict(
+        algorithm=algorithm,
+        message_id=b"\x00" * algorithm.message_id_length(),
+        encryption_context=_estimated_encryption_context(algorithm, encryption_context or {}),
+        encrypted_data_keys=_estimated_encrypted_data_keys(algorithm, key_ids),
+        content_type=ContentType.FRAMED_DATA if frame_length else ContentType.NO_FRAMING,
+        frame_length=frame_length,
+    )
+    if algorithm.message_format_version == 0x01:
+        header_kwargs.update(
+            dict(
+                version=SerializationVersion.V1,
+                type=ObjectType.CUSTOMER_AE_DATA,
+                content_aad_length=0,
+                header_iv_length=algorithm.iv_len,
+            )
+        )
+    else:
+        header_kwargs.update(
+            dict(version=SerializationVersion.V2, commitment_key=b"\x00" * algorithm.algorithm_suite_data_length())
+        )
+
+    return ciphertext_length(header=MessageHeader(**header_kwargs), plaintext_length=plaintext_length)
@@ -0,0 +1,306 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Local index of completed operations used to skip unchanged sources."""
+import hashlib
+import logging
+import os
+import sqlite3
+import stat
+import time
+
+import attr
+import six
+
+from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import Iterator, Optional, Text, Tuple  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("StateIndex", "content_hash")
+_LOGGER = logging.getLogger(LOGGER_NAME)
+#: Number of records to write before committing them to the index.
+_COMMIT_INTERVAL = 1000
+#: Number of bytes to read at a time when hashing file contents.
+_HASH_CHUNK_SIZE = 1024 * 1024
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS operations (
+    source TEXT PRIMARY KEY,
+    mode TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    content_hash TEXT,
+    output TEXT NOT NULL,
+    output_size INTEGER,
+    output_mtime_ns INTEGER,
+    message_id TEXT NOT NULL,
+    completed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS operations_inode ON operations (inode);
+"""
+
+
+def content_hash(filename):
+    # type: (str) -> Text
+    """Calculates the SHA-256 digest of the contents of a file.
+
+    :param str filename: Full path to file
+    :returns: Hex-encoded digest
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as source:
+        for chunk in iter(lambda: source.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _mtime_ns(source_stat):
+    # type: (os.stat_result) -> int
+    """Reads the modification time of a file in nanoseconds.
+
+    :param source_stat: Status of file
+    :type source_stat: os.stat_result
+    :rtype: int
+    """
+    try:
+        return source_stat.st_mtime_ns
+    except AttributeError:  # pragma: no cover
+        # st_mtime_ns is not available before Python 3.3
+        return int(source_stat.st_mtime * 1e9)
+
+
+def _stat(path):
+    # type: (str) -> Optional[os.stat_result]
+    """Collects the status of a file, if it exists.
+
+    :param str path: Full path to file
+    :returns: Status of file, or None if it does not exist
+    :rtype: os.stat_result
+    """
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+@attr.s(hash=False, init=False)
+class StateIndex(object):
+    """SQLite-backed index of completed operations, keyed on source path.
+
+    A source is unchanged if its size, modification time, and inode all match the values recorded
+    when it was last processed, and the output recorded for it still exists with the size and
+    modification time it had when it was recorded. If ``hash_content``
+    is set, a source whose size matches but whose other attributes do not is also unchanged if the
+    SHA-256 digest of its contents matches the recorded digest.
+
+    Records are committed in batches, so if the process is interrupted, only the most recent
+    records are lost and those sources are processed again on the next run. An operation must only
+    be recorded once its output is in place.
+
+    :param str filename: Path to index file
+    :param bool hash_content: Should content digests be recorded and used to detect changes (default: False)
+    """
+
+    filename = attr.ib(validator=attr.validators.instance_of(six.string_types))
+    hash_content = attr.ib(validator=attr.validators.instance_of(bool))
+    _connection = None  # type: Optional[sqlite3.Connection]
+    _pending = 0  # type: int
+
+    def __init__(self, filename, hash_content=False):
+        # type: (str, bool) -> None
+        """Workaround pending resolution of attrs/mypy interaction.
+        https://github.com/python/mypy/issues/2088
+        https://github.com/python-attrs/attrs/issues/215
+        """
+        self.filename = os.path.abspath(filename)
+        self.hash_content = hash_content
+        attr.validate(self)
+
+        if not os.path.isdir(os.path.dirname(self.filename)):
+            raise BadUserArgumentError("Parent directory for requested state index file does not exist.")
+
+    def _open(self):
+        # type: () -> sqlite3.Connection
+        """Opens the index, creating it if necessary.
+
+        :rtype: sqlite3.Connection
+        """
+        if self._connection is None:
+            try:
+                self._connection = sqlite3.connect(self.filename)
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.execute("PRAGMA synchronous=NORMAL")
+                self._connection.executescript(_SCHEMA)
+            except sqlite3.DatabaseError as error:
+                raise BadUserArgumentError('Unable to open state index "{}": {}'.format(self.filename, error))
+        return self._connection
+
+    def is_unchanged(self, source, source_stat, destination, mode):
+        # type: (str, os.stat_result, str, str) -> bool
+        """Determines whether a source has already been processed to this destination and
+        has not changed since.
+
+        :param str source: Full file path to source file
+        :param source_stat: Status of source file
+        :type source_stat: os.stat_result
+        :param str destination: Full file path to destination file
+        :param str mode: Operating mode (encrypt/decrypt)
+        :rtype: bool
+        """
+        row = (
+            self._open()
+            .execute(
+                "SELECT mode, size, mtime_ns, inode, content_hash, output, output_size, output_mtime_ns, message_id "
+                "FROM operations WHERE source = ?",
+                (os.path.abspath(source),),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return False
+
+        recorded_mode, size, mtime_ns, inode, recorded_hash, output, output_size, output_mtime_ns, message_id = row
+        if recorded_mode != mode or output != os.path.abspath(destination):
+            return False
+        output_stat = _stat(output)
+        if output_stat is None or not stat.S_ISREG(output_stat.st_mode):
+            return False
+        if output_size != output_stat.st_size or output_mtime_ns != _mtime_ns(output_stat):
+            # The output was replaced, or is left over from an earlier run
+            return False
+        if size != source_stat.st_size:
+            return False
+        if mtime_ns == _mtime_ns(source_stat) and inode == source_stat.st_ino:
+            return True
+        if not (self.hash_content and recorded_hash):
+            return False
+
+        current_hash = content_hash(source)
+        if current_hash != recorded_hash:
+            return False
+        # Contents are unchanged: remember the new attributes so the next check does not need to read the file.
+        self.record(source, source_stat, destination, mode, message_id, current_hash)
+        return True
+
+    def record(self, source, source_stat, destination, mode, message_id, source_hash=None):
+        # pylint: disable=too-many-arguments
+        # type: (str, os.stat_result, str, str, Text, Optional[Text]) -> None
+        """Records a completed operation, along with the current size and modification time of its output.
+
+        :param str source: Full file path to source file
+        :param source_stat: Status of source file before it was processed
+        :type source_stat: os.stat_result
+        :param str destination: Full file path to destination file, which must already be in place
+        :param str mode: Operating mode (encrypt/decrypt)
+        :param str message_id: Base64-encoded message ID of the processed message
+        :param str source_hash: Hex-encoded SHA-256 digest of source contents (optional)
+        """
+        output_stat = _stat(destination)
+        self._open().execute(
+            "INSERT OR REPLACE INTO operations (source, mode, size, mtime_ns, inode, content_hash, output, output_size,"
+            " output_mtime_ns, message_id, completed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                os.path.abspath(source),
+                mode,
+                source_stat.st_size,
+                _mtime_ns(source_stat),
+                source_stat.st_ino,
+                source_hash,
+                os.path.abspath(destination),
+                None if output_stat is None else output_stat.st_size,
+                None if output_stat is None else _mtime_ns(output_stat),
+                message_id,
+                time.time(),
+            ),
+        )
+        self._pending += 1
+        if self._pending >= _COMMIT_INTERVAL:
+            self.commit()
+
+    def find_moved(self, source, source_stat, mode):
+        # type: (str, os.stat_result, str) -> Optional[Tuple[Text, Text, Text, Optional[Text]]]
+        """Finds a previously processed source that has since been moved to a new path.
+
+        A recorded source was moved if it no longer exists and its recorded size, modification
+        time, and inode all match the file now at the new path.
+
+        :param str source: Full file path to source file at its new path
+        :param source_stat: Status of source file
+        :type source_stat: os.stat_result
+        :param str mode: Operating mode (encrypt/decrypt)
+        :returns: Recorded source path, output path, message ID, and content digest, or None if none were moved
+        :rtype: tuple
+        """
+        rows = (
+            self._open()
+            .execute(
+                "SELECT source, output, message_id, content_hash FROM operations "
+                "WHERE inode = ? AND size = ? AND mtime_ns = ? AND mode = ? AND source != ?",
+                (source_stat.st_ino, source_stat.st_size, _mtime_ns(source_stat), mode, os.path.abspath(source)),
+            )
+            .fetchall()
+        )
+        for old_source, output, message_id, source_hash in rows:
+            if not os.path.lexists(old_source) and os.path.isfile(output):
+                return old_source, output, message_id, source_hash
+        return None
+
+    def records_under(self, source_root, mode):
+        # type: (str, str) -> Iterator[Tuple[Text, Text]]
+        """Lists all recorded operations on sources inside a directory tree.
+
+        :param str source_root: Full file path to source directory root
+        :param str mode: Operating mode (encrypt/decrypt)
+        :returns: Iterator of tuples of recorded source path and output path
+        """
+        prefix = os.path.join(os.path.abspath(source_root), "")
+        # Every path that starts with the prefix sorts between the prefix and the prefix with its final separator
+        # incremented, so this range query can use the primary key index.
+        upper_bound = prefix[:-1] + six.unichr(ord(prefix[-1]) + 1)
+        cursor = self._open().execute(
+            "SELECT source, output FROM operations WHERE source >= ? AND source < ? AND mode = ?",
+            (prefix, upper_bound, mode),
+        )
+        # Read all rows up front so callers can remove records while iterating.
+        return iter(cursor.fetchall())
+
+    def remove(self, source):
+        # type: (str) -> None
+        """Removes the record of an operation.
+
+        :param str source: Full file path to source file
+        """
+        self._open().execute("DELETE FROM operations WHERE source = ?", (os.path.abspath(source),))
+        self._pending += 1
+        if self._pending >= _COMMIT_INTERVAL:
+            self.commit()
+
+    def commit(self):
+        # type: () -> None
+        """Commits all pending records."""
+        if self._connection is not None and self._pending:
+            self._connection.commit()
+            self._pending = 0
+
+    def close(self):
+        # type: () -> None
+        """Commits all pending records and closes the index."""
+        if self._connection is not None:
+            self.commit()
+            self._connection.close()
+            self._connection = None
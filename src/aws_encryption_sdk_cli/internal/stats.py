@@ -0,0 +1,313 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Statistics aggregated across all operations of a run."""
+import collections
+import json
+import logging
+import os
+import sys
+import threading
+import timeit
+
+import attr
+import six
+
+from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import Any, Dict, List, Optional, Sequence  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = (
+    "RunStatistics",
+    "active_statistics",
+    "instrument_botocore_session",
+    "OUTCOMES",
+    "SUCCEEDED",
+    "SKIPPED",
+    "FAILED",
+)
+_LOGGER = logging.getLogger(LOGGER_NAME)
+_clock = timeit.default_timer  # pylint: disable=invalid-name
+SUCCEEDED = "succeeded"
+SKIPPED = "skipped"
+FAILED = "failed"
+#: Outcomes of an operation. An ``OperationResult`` that needs cleanup is counted as failed, one that wrote
+#: output as succeeded, and any other as skipped.
+OUTCOMES = (SUCCEEDED, SKIPPED, FAILED)
+#: Key under which the start of a KMS call is kept in its botocore request context.
+_CONTEXT_KEY = "aws_encryption_sdk_cli_started"
+#: Percentiles of KMS call latency to report.
+_PERCENTILES = (50, 90, 99)
+#: Statistics of the run in progress, if they are being collected.
+_ACTIVE = None  # type: Optional[RunStatistics]
+
+
+def active_statistics():
+    # type: () -> Optional[RunStatistics]
+    """Finds the statistics being collected for the run in progress.
+
+    :returns: Statistics, or None if they are not being collected
+    :rtype: RunStatistics
+    """
+    return _ACTIVE
+
+
+def _percentile(sorted_values, percent):
+    # type: (Sequence[float], int) -> Optional[float]
+    """Finds a percentile of some values using the nearest-rank method.
+
+    :param sorted_values: Values, in ascending order
+    :param int percent: Percentile to find
+    :returns: Percentile, or None if there are no values
+    :rtype: float
+    """
+    if not sorted_values:
+        return None
+    rank = -(-len(sorted_values) * percent // 100)  # ceiling division
+    return sorted_values[max(rank, 1) - 1]
+
+
+def _before_kms_call(context, **_kwargs):
+    # type: (Dict[str, Any], **Any) -> None
+    """Notes the start of a KMS call.
+
+    :param dict context: botocore request context
+    """
+    if _ACTIVE is not None:
+        context[_CONTEXT_KEY] = _clock()
+
+
+def _after_kms_call(model, context, http_response, **_kwargs):
+    # type: (Any, Dict[str, Any], Any, **Any) -> None
+    """Records a completed KMS call.
+
+    :param model: botocore operation model
+    :param dict context: botocore request context
+    :param http_response: botocore HTTP response
+    """
+    started = context.pop(_CONTEXT_KEY, None)
+    if _ACTIVE is not None and started is not None:
+        _ACTIVE.record_kms_call(model.name, _clock() - started, error=http_response.status_code >= 300)
+
+
+def _after_kms_call_error(event_name, context, **_kwargs):
+    # type: (str, Dict[str, Any], **Any) -> None
+    """Records a KMS call that failed without a response.
+
+    :param str event_name: Name of botocore event, ending with the operation name
+    :param dict context: botocore request context
+    """
+    started = context.pop(_CONTEXT_KEY, None)
+    if _ACTIVE is not None and started is not None:
+        _ACTIVE.record_kms_call(event_name.rsplit(".", 1)[-1], _clock() - started, error=True)
+
+
+def instrument_botocore_session(botocore_session):
+    # type: (Any) -> None
+    """Registers handlers that record the count and latency of the KMS calls made by clients
+    of a botocore session in the statistics of the run in progress, if there are any.
+
+    :param botocore_session: botocore session
+    :type botocore_session: botocore.session.Session
+    """
+    botocore_session.register("before-call.kms", _before_kms_call)
+    botocore_session.register("after-call.kms", _after_kms_call)
+    botocore_session.register("after-call-error.kms", _after_kms_call_error)
+
+
+@attr.s(hash=False, init=False)
+class RunStatistics(object):
+    """Counts the results and bytes of all operations, the KMS calls they make and their latency,
+    and data key cache hits and misses, and reports them when the run finishes.
+
+    Operations are recorded by the IOHandler that performs them. KMS calls and cache lookups are
+    recorded from inside the AWS Encryption SDK, so they are recorded in whichever statistics were
+    most recently started.
+
+    :param str output_file: File to which to write the statistics as JSON, ``-`` to write a
+        summary to stderr, or None to collect the statistics without reporting them (default: ``-``)
+    """
+
+    output_file = attr.ib(validator=attr.validators.optional(attr.validators.instance_of(six.string_types)))
+    _started = None  # type: Optional[float]
+    _finished = None  # type: Optional[float]
+
+    def __init__(self, output_file="-"):
+        # type: (str) -> None
+        """Workaround pending resolution of attrs/mypy interaction.
+        https://github.com/python/mypy/issues/2088
+        https://github.com/python-attrs/attrs/issues/215
+        """
+        self.output_file = output_file
+        attr.validate(self)
+
+        if self.output_file not in (None, "-"):
+            self.output_file = os.path.abspath(self.output_file)
+            if not os.path.isdir(os.path.dirname(self.output_file)):
+                raise BadUserArgumentError("Parent directory for requested statistics file does not exist.")
+
+        # Operations may be recorded from worker threads
+        self._lock = threading.Lock()
+        self._results = collections.Counter()  # type: collections.Counter
+        self._bytes = collections.Counter()  # type: collections.Counter
+        self._kms_calls = collections.Counter()  # type: collections.Counter
+        self._kms_errors = 0
+        self._kms_latencies = []  # type: List[float]
+        self._cache = collections.Counter()  # type: collections.Counter
+        self._errors = collections.Counter()  # type: collections.Counter
+
+    def record_operation(self, outcome, input_bytes=None, output_bytes=None):
+        # type: (str, Optional[int], Optional[int]) -> None
+        """Records the outcome of an operation.
+
+        :param str outcome: Outcome of the operation, one of ``OUTCOMES``
+        :param int input_bytes: Bytes read, if known (optional)
+        :param int output_bytes: Bytes written, if known (optional)
+        """
+        with self._lock:
+            self._results[outcome] += 1
+            self._bytes["input"] += input_bytes or 0
+            self._bytes["output"] += output_bytes or 0
+
+    def record_error(self, error_class):
+        # type: (str) -> None
+        """Records an error that failed an operation.
+
+        :param str error_class: Name of the class of the error
+        """
+        with self._lock:
+            self._errors[error_class] += 1
+
+    def record_kms_call(self, operation, seconds, error=False):
+        # type: (str, float, bool) -> None
+        """Records a call to AWS KMS.
+
+        :param str operation: Name of KMS API operation
+        :param float seconds: Latency of the call
+        :param bool error: Did the call fail (default: False)
+        """
+        with self._lock:
+            self._kms_calls[operation] += 1
+            self._kms_errors += error
+            self._kms_latencies.append(seconds)
+
+    def record_cache_lookup(self, hit):
+        # type: (bool) -> None
+        """Records a data key cache lookup.
+
+        :param bool hit: Were materials found in the cache
+        """
+        with self._lock:
+            self._cache["hits" if hit else "misses"] += 1
+
+    def start(self):
+        # type: () -> None
+        """Starts the run, collecting KMS calls and cache lookups in these statistics."""
+        global _ACTIVE  # pylint: disable=global-statement
+        self._started = _clock()
+        _ACTIVE = self
+
+    def summary(self):
+        # type: () -> Dict[str, Any]
+        """Summarizes the statistics collected so far.
+
+        :returns: JSON-serializable summary
+        :rtype: dict
+        """
+        with self._lock:
+            end = self._finished if self._finished is not None else _clock()
+            elapsed = end - self._started if self._started is not None else 0.0
+            latencies = sorted(self._kms_latencies)
+            latency = {"p{}".format(percent): _percentile(latencies, percent) for percent in _PERCENTILES}
+            latency["max"] = latencies[-1] if latencies else None
+            operations = {outcome: self._results[outcome] for outcome in OUTCOMES}
+            operations["total"] = sum(self._results.values())
+            return {
+                "operations": operations,
+                "input_bytes": self._bytes["input"],
+                "output_bytes": self._bytes["output"],
+                "elapsed_seconds": round(elapsed, 6),
+                "input_bytes_per_second": round(self._bytes["input"] / elapsed, 1) if elapsed else None,
+                "kms": dict(
+                    calls=sum(self._kms_calls.values()),
+                    errors=self._kms_errors,
+                    operations=dict(self._kms_calls),
+                    latency_seconds=latency,
+                ),
+                "cache": dict(hits=self._cache["hits"], misses=self._cache["misses"]),
+                "errors": dict(self._errors),
+            }
+
+    def kms_latencies(self):
+        # type: () -> List[float]
+        """Lists the latency of every KMS call recorded so far.
+
+        :returns: Latencies in seconds, in the order that the calls finished
+        :rtype: list of float
+        """
+        with self._lock:
+            return list(self._kms_latencies)
+
+    def finish(self):
+        # type: () -> None
+        """Finishes the run and writes the statistics."""
+        global _ACTIVE  # pylint: disable=global-statement
+        if _ACTIVE is self:
+            _ACTIVE = None
+        self._finished = _clock()
+        if self.output_file is None:
+            return
+        summary = self.summary()
+        if self.output_file == "-":
+            sys.stderr.write(format_summary(summary))
+            return
+        with open(self.output_file, "w") as output:
+            json.dump(summary, output, indent=4, sort_keys=True)
+
+
+def format_summary(summary):
+    # type: (Dict[str, Any]) -> str
+    """Formats a summary of run statistics for people to read.
+
+    :param dict summary: Summary, as returned by :meth:`RunStatistics.summary`
+    :rtype: str
+    """
+    operations = summary["operations"]
+    latency = summary["kms"]["latency_seconds"]
+    lines = [
+        "Operations: {total} ({details})".format(
+            total=operations["total"],
+            details=", ".join(
+                "{}: {}".format(name, count) for name, count in sorted(operations.items()) if name != "total"
+            ),
+        ),
+        "Bytes: {input_bytes} in, {output_bytes} out in {elapsed_seconds:.3f} seconds".format(**summary),
+        "KMS calls: {calls} ({errors} failed)".format(**summary["kms"]),
+        "Data key cache: {hits} hits, {misses} misses".format(**summary["cache"]),
+    ]
+    if summary["input_bytes_per_second"] is not None:
+        lines[1] += " ({:.0f} bytes/second in)".format(summary["input_bytes_per_second"])
+    if latency["max"] is not None:
+        lines[2] += "; latency seconds: " + ", ".join(
+            "{} {:.3f}".format(name, latency[name]) for name in sorted(latency)
+        )
+    if summary["errors"]:
+        lines.append(
+            "Errors: "
+            + ", ".join("{}: {}".format(name, count) for name, count in sorted(summary["errors"].items()))
+        )
+    return os.linesep.join(lines) + os.linesep
@@ -0,0 +1,145 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Per-operation timing and throughput measurements."""
+import os
+import stat
+import timeit
+
+import attr
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import IO, Any, Dict, Optional  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("OperationTimer", "frame_count", "stream_position", "stream_size")
+_clock = timeit.default_timer  # pylint: disable=invalid-name
+
+
+def frame_count(stream):
+    # type: (Any) -> int
+    """Counts the frames that an encrypt or decrypt stream has processed so far.
+
+    :param stream: Stream returned by ``aws_encryption_sdk.EncryptionSDKClient.stream``
+    :returns: Number of frames, or 0 for a non-framed message
+    :rtype: int
+    """
+    if hasattr(stream, "last_sequence_number"):
+        # Decryptors count the frames that they have read
+        return stream.last_sequence_number
+    # Encryptors hold the sequence number of the next frame to write
+    return stream.sequence_number - 1
+
+
+def stream_position(stream):
+    # type: (IO) -> Optional[int]
+    """Finds how many bytes have been read from or written to a stream.
+
+    :param stream: Stream
+    :type stream: file-like object
+    :returns: Bytes read or written, or None if the stream cannot tell
+    :rtype: int
+    """
+    try:
+        return stream.tell()
+    except (AttributeError, IOError, OSError, ValueError):
+        # Pipes and terminals do not track their position
+        return None
+
+
+def stream_size(stream):
+    # type: (IO) -> Optional[int]
+    """Finds the size of the file that a stream reads from or writes to.
+
+    Unlike its position, the size of a stream can be found before the stream is used or closed.
+
+    :param stream: Stream
+    :type stream: file-like object
+    :returns: Size in bytes, or None if the stream is not backed by a regular file
+    :rtype: int
+    """
+    try:
+        stream_stat = os.fstat(stream.fileno())
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
+    if not stat.S_ISREG(stream_stat.st_mode):
+        return None
+    return stream_stat.st_size
+
+
+@attr.s(hash=False, init=False)
+class OperationTimer(object):
+    """Measures where the time of a single operation goes.
+
+    The timer starts when it is created. The operation marks when the message header is ready,
+    which includes obtaining the data key from the materials manager (and so any AWS KMS calls),
+    and reports each chunk of output that it writes.
+    """
+
+    start = attr.ib()
+    header_ready_at = None  # type: Optional[float]
+    first_byte_at = None  # type: Optional[float]
+    output_bytes = 0  # type: int
+
+    def __init__(self):
+        # type: () -> None
+        """Workaround pending resolution of attrs/mypy interaction.
+        https://github.com/python/mypy/issues/2088
+        https://github.com/python-attrs/attrs/issues/215
+        """
+        self.start = _clock()
+
+    def header_ready(self):
+        # type: () -> None
+        """Marks that the message header is ready."""
+        self.header_ready_at = _clock()
+
+    def wrote(self, chunk):
+        # type: (bytes) -> None
+        """Counts a chunk of output.
+
+        :param bytes chunk: Output written
+        """
+        if self.first_byte_at is None and chunk:
+            self.first_byte_at = _clock()
+        self.output_bytes += len(chunk)
+
+    def _since_start(self, moment):
+        # type: (Optional[float]) -> Optional[float]
+        """Calculates the seconds between the start of the operation and a moment in it.
+
+        :param float moment: Clock reading, or None if the moment was never reached
+        :rtype: float
+        """
+        if moment is None:
+            return None
+        return round(moment - self.start, 6)
+
+    def fields(self, **counts):
+        # type: (**Any) -> Dict[str, Any]
+        """Builds the timing fields of a metadata record, ending the measurement.
+
+        :param **counts: Additional counts to report, such as ``input_bytes`` and ``frames``
+        :returns: Seconds until the header was ready, until the first byte of output, and until
+            the operation finished, along with bytes of output and the additional counts
+        :rtype: dict
+        """
+        fields = dict(
+            header_seconds=self._since_start(self.header_ready_at),
+            first_byte_seconds=self._since_start(self.first_byte_at),
+            duration_seconds=self._since_start(_clock()),
+            output_bytes=self.output_bytes,
+        )
+        fields.update(counts)
+        return fields
@@ -0,0 +1,454 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Trace spans showing where the wall time of a run goes."""
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import timeit
+
+import attr
+import six
+
+from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import IO, Any, Dict, List, Optional  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("Tracer", "JsonLinesTracer", "ChromeTracer", "TRACERS", "clock", "span", "instrument_botocore_session")
+_LOGGER = logging.getLogger(LOGGER_NAME)
+clock = timeit.default_timer  # pylint: disable=invalid-name
+#: Key under which the span of a KMS call is kept in its botocore request context.
+_CONTEXT_KEY = "aws_encryption_sdk_cli_span"
+#: Tracer of the run in progress, if it is being traced.
+_ACTIVE = None  # type: Optional[Tracer]
+
+
+class _NoSpan(object):
+    """Span that records nothing, used when no run is being traced."""
+
+    def __enter__(self):
+        # type: () -> _NoSpan
+        """Does nothing."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # type: (Any, Any, Any) -> None
+        """Does nothing."""
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span(object):
+    """Span of time spent on one part of a run. Use as a context manager around that part.
+
+    :param tracer: Tracer to which to report the span
+    :type tracer: Tracer
+    :param str name: Name of the span
+    :param dict args: Details of the span
+    """
+
+    def __init__(self, tracer, name, args):
+        # type: (Tracer, str, Dict[str, Any]) -> None
+        """Prepares the span without starting it."""
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.span_id = 0
+        self.parent_id = None  # type: Optional[int]
+        self.thread = None  # type: Optional[threading.Thread]
+        self.start = 0.0
+
+    def __enter__(self):
+        # type: () -> _Span
+        """Starts the span."""
+        self.tracer.begin(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # type: (Any, Any, Any) -> None
+        """Ends the span, noting the class of any error that ended it."""
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.end(self)
+
+
+def span(name, **args):
+    # type: (str, **Any) -> Any
+    """Builds a span of the run in progress, to use as a context manager around the part of the run
+    that it measures.
+
+    The span is a child of the innermost span open in the same thread or, if there is none, of the
+    span of the whole run. If the run is not being traced, the span records nothing.
+
+    :param str name: Name of the span
+    :param **args: Details of the span, such as the file that it relates to
+    """
+    tracer = _ACTIVE
+    if tracer is None:
+        return _NO_SPAN
+    return _Span(tracer, name, args)
+
+
+def _before_kms_call(model, context, **_kwargs):
+    # type: (Any, Dict[str, Any], **Any) -> None
+    """Starts the span of a KMS call.
+
+    :param model: botocore operation model
+    :param dict context: botocore request context
+    """
+    tracer = _ACTIVE
+    if tracer is not None:
+        kms_span = context[_CONTEXT_KEY] = _Span(tracer, "kms." + model.name, {})
+        tracer.begin(kms_span)
+
+
+def _after_kms_call(context, http_response, **_kwargs):
+    # type: (Dict[str, Any], Any, **Any) -> None
+    """Ends the span of a completed KMS call.
+
+    :param dict context: botocore request context
+    :param http_response: botocore HTTP response
+    """
+    kms_span = context.pop(_CONTEXT_KEY, None)
+    if kms_span is not None:
+        kms_span.args["status"] = http_response.status_code
+        kms_span.tracer.end(kms_span)
+
+
+def _after_kms_call_error(context, exception, **_kwargs):
+    # type: (Dict[str, Any], Exception, **Any) -> None
+    """Ends the span of a KMS call that failed without a response.
+
+    :param dict context: botocore request context
+    :param exception: Error that failed the call
+    :type exception: Exception
+    """
+    kms_span = context.pop(_CONTEXT_KEY, None)
+    if kms_span is not None:
+        kms_span.args["error"] = exception.__class__.__name__
+        kms_span.tracer.end(kms_span)
+
+
+def instrument_botocore_session(botocore_session):
+    # type: (Any) -> None
+    """Registers handlers that trace the KMS calls made by clients of a botocore session
+    in the run in progress, if it is being traced.
+
+    :param botocore_session: botocore session
+    :type botocore_session: botocore.session.Session
+    """
+    botocore_session.register("before-call.kms", _before_kms_call)
+    botocore_session.register("after-call.kms", _after_kms_call)
+    botocore_session.register("after-call-error.kms", _after_kms_call_error)
+
+
+@attr.s(hash=False, init=False)
+class Tracer(object):
+    """Traces a run, writing each span to a file as it ends.
+
+    Use as a context manager around the run: the run itself is the root span, whose children are
+    the spans that start in the calling thread and the outermost spans of every other thread.
+    Each span records its parent, so that the spans of each file form a tree even when files are
+    processed in parallel.
+
+    :param str output_file: File to which to write the trace
+    """
+
+    output_file = attr.ib(validator=attr.validators.instance_of(six.string_types))
+    _output = None  # type: Optional[IO]
+
+    def __init__(self, output_file):
+        # type: (str) -> None
+        """Workaround pending resolution of attrs/mypy interaction.
+        https://github.com/python/mypy/issues/2088
+        https://github.com/python-attrs/attrs/issues/215
+        """
+        self.output_file = os.path.abspath(output_file)
+        attr.validate(self)
+
+        if not os.path.isdir(os.path.dirname(self.output_file)):
+            raise BadUserArgumentError("Parent directory for requested trace file does not exist.")
+
+        # Wall clock time at which the clock read 0, so that spans can be placed in time
+        self._epoch = time.time() - clock()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._root = None  # type: Optional[_Span]
+
+    def _open_spans(self):
+        # type: () -> List[_Span]
+        """Finds the spans open in the calling thread, innermost last.
+
+        :rtype: list
+        """
+        try:
+            return self._local.spans
+        except AttributeError:
+            self._local.spans = []
+            return self._local.spans
+
+    def begin(self, new_span):
+        # type: (_Span) -> None
+        """Starts a span.
+
+        :param new_span: Span to start
+        """
+        open_spans = self._open_spans()
+        new_span.span_id = next(self._ids)
+        if open_spans:
+            new_span.parent_id = open_spans[-1].span_id
+        elif self._root is not None:
+            new_span.parent_id = self._root.span_id
+        new_span.thread = threading.current_thread()
+        open_spans.append(new_span)
+        new_span.start = clock()
+
+    def end(self, ended_span):
+        # type: (_Span) -> None
+        """Ends a span and writes it.
+
+        :param ended_span: Span to end, which must be the innermost span open in the calling thread
+        """
+        ended = clock()
+        self._open_spans().remove(ended_span)
+        self.add_span(
+            ended_span.name,
+            ended_span.start,
+            ended,
+            args=ended_span.args,
+            span_id=ended_span.span_id,
+            parent_id=ended_span.parent_id,
+            thread=ended_span.thread,
+        )
+
+    def add_span(
+        self,
+        name,  # type: str
+        start,  # type: float
+        end,  # type: float
+        args=None,  # type: Optional[Dict[str, Any]]
+        span_id=None,  # type: Optional[int]
+        parent_id=None,  # type: Optional[int]
+        thread=None,  # type: Optional[threading.Thread]
+    ):
+        # pylint: disable=too-many-arguments
+        # type: (...) -> None
+        """Writes a span that has ended, such as one that was measured before tracing started.
+
+        :param str name: Name of the span
+        :param float start: Clock reading when the span started
+        :param float end: Clock reading when the span ended
+        :param dict args: Details of the span (optional)
+        :param int span_id: Identifier of the span (default: a new identifier)
+        :param int parent_id: Identifier of the parent span (default: none)
+        :param thread: Thread in which the span ran (default: the calling thread)
+        :type thread: threading.Thread
+        """
+        if span_id is None:
+            span_id = next(self._ids)
+        if thread is None:
+            thread = threading.current_thread()
+        with self._lock:
+            if self._output is None:
+                # The run has finished
+                return
+            self._output.write(
+                self._format(
+                    name=name,
+                    span_id=span_id,
+                    parent_id=parent_id,
+                    thread=thread,
+                    start=self._epoch + start,
+                    duration=end - start,
+                    args=args or {},
+                )
+            )
+
+    def _format(self, name, span_id, parent_id, thread, start, duration, args):
+        # pylint: disable=too-many-arguments
+        # type: (str, int, Optional[int], threading.Thread, float, float, Dict[str, Any]) -> str
+        """Formats a span for the trace file.
+
+        :param str name: Name of the span
+        :param int span_id: Identifier of the span
+        :param int parent_id: Identifier of the parent span, if any
+        :param thread: Thread in which the span ran
+        :type thread: threading.Thread
+        :param float start: Wall clock time when the span started, in seconds since the epoch
+        :param float duration: Seconds that the span lasted
+        :param dict args: Details of the span
+        :rtype: str
+        """
+        raise NotImplementedError("Tracer does not implement _format")
+
+    def _header(self):
+        # type: () -> str
+        """Builds the text that starts the trace file.
+
+        :rtype: str
+        """
+        return ""
+
+    def _footer(self):
+        # type: () -> str
+        """Builds the text that ends the trace file.
+
+        :rtype: str
+        """
+        return ""
+
+    def __enter__(self):
+        # type: () -> Tracer
+        """Opens the trace file and starts the span of the run."""
+        global _ACTIVE  # pylint: disable=global-statement
+        self._output = open(self.output_file, "w")
+        self._output.write(self._header())
+        _ACTIVE = self
+        root = _Span(self, "run", {})
+        self.begin(root)
+        self._root = root
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # type: (Any, Any, Any) -> None
+        """Ends the span of the run and closes the trace file, whether or not the run succeeded."""
+        global _ACTIVE  # pylint: disable=global-statement
+        self._root.__exit__(exc_type, exc_value, traceback)  # type: ignore
+        _ACTIVE = None
+        with self._lock:
+            output, self._output = self._output, None
+            output.write(self._footer())  # type: ignore
+            output.close()  # type: ignore
+        _LOGGER.info("Wrote trace to %s", self.output_file)
+
+
+@attr.s(hash=False, init=False)
+class JsonLinesTracer(Tracer):
+    """Traces a run, writing each span as a line of JSON.
+
+    Each line holds the ``name``, ``id``, ``parent`` id, ``thread`` name, ``start`` time (in
+    seconds since the epoch), ``duration`` (in seconds) and ``args`` of a span.
+
+    :param str output_file: File to which to write the trace
+    """
+
+    def _format(self, name, span_id, parent_id, thread, start, duration, args):
+        # pylint: disable=too-many-arguments
+        # type: (str, int, Optional[int], threading.Thread, float, float, Dict[str, Any]) -> str
+        """Formats a span as a line of JSON.
+
+        :rtype: str
+        """
+        return (
+            json.dumps(
+                dict(
+                    name=name,
+                    id=span_id,
+                    parent=parent_id,
+                    thread=thread.name,
+                    start=round(start, 6),
+                    duration=round(duration, 6),
+                    args=args,
+                ),
+                sort_keys=True,
+            )
+            + "\n"
+        )
+
+
+@attr.s(hash=False, init=False)
+class ChromeTracer(Tracer):
+    """Traces a run, writing the spans in the Chrome trace event format, which can be loaded into
+    ``chrome://tracing`` or Perfetto.
+
+    Each span is a complete event in the track of the thread in which it ran. Its id and the id of
+    its parent are kept in its ``args``.
+
+    :param str output_file: File to which to write the trace
+    """
+
+    def __init__(self, output_file):
+        # type: (str) -> None
+        """Workaround pending resolution of attrs/mypy interaction.
+        https://github.com/python/mypy/issues/2088
+        https://github.com/python-attrs/attrs/issues/215
+        """
+        super(ChromeTracer, self).__init__(output_file)
+        self._pid = os.getpid()
+        self._threads = {}  # type: Dict[int, str]
+
+    def _event(self, event):
+        # type: (Dict[str, Any]) -> str
+        """Formats an event as an element of the trace event array.
+
+        :param dict event: Trace event
+        :rtype: str
+        """
+        # The array is left open while the run continues: trace viewers accept a trailing comma
+        return json.dumps(event, sort_keys=True) + ",\n"
+
+    def _format(self, name, span_id, parent_id, thread, start, duration, args):
+        # pylint: disable=too-many-arguments
+        # type: (str, int, Optional[int], threading.Thread, float, float, Dict[str, Any]) -> str
+        """Formats a span as a complete trace event.
+
+        :rtype: str
+        """
+        self._threads[thread.ident] = thread.name  # type: ignore
+        event_args = dict(args, span_id=span_id, parent_id=parent_id)
+        return self._event(
+            dict(
+                name=name,
+                cat="aws-encryption-cli",
+                ph="X",
+                ts=round(start * 1e6, 3),
+                dur=round(duration * 1e6, 3),
+                pid=self._pid,
+                tid=thread.ident,
+                args=event_args,
+            )
+        )
+
+    def _header(self):
+        # type: () -> str
+        """Opens the trace event array.
+
+        :rtype: str
+        """
+        return "[\n"
+
+    def _footer(self):
+        # type: () -> str
+        """Names the thread of each track and closes the trace event array.
+
+        :rtype: str
+        """
+        events = [
+            dict(name="thread_name", ph="M", pid=self._pid, tid=ident, args=dict(name=name))
+            for ident, name in sorted(self._threads.items())
+        ]
+        # The span of the run has always been written by now, so there is at least one thread to name
+        return ",\n".join(json.dumps(event, sort_keys=True) for event in events) + "\n]\n"
+
+
+#: Tracers by the format named in ``--trace FORMAT:PATH``.
+TRACERS = dict(jsonl=JsonLinesTracer, chrome=ChromeTracer)
@@ -0,0 +1,252 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Helper functions for traversing source directory trees."""
+import fnmatch
+import logging
+import os
+import stat
+
+import attr
+import six
+
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import Any, Iterator, List, Optional, Tuple  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("SourceFilter", "walk")
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+def _matches_any(patterns, relative_path):
+    # type: (List[str], str) -> bool
+    """Determines whether a path matches any of a set of pathname patterns.
+
+    Each pattern is compared against both the final component of the path and the
+    full path relative to the source root.
+
+    :param list patterns: Pathname patterns
+    :param str relative_path: Path relative to the source root
+    :rtype: bool
+    """
+    name = os.path.basename(relative_path)
+    for pattern in patterns:
+        if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern):
+            return True
+    return False
+
+
+@attr.s(hash=False, init=False)
+class SourceFilter(object):
+    """Selects which entries in a source directory tree should be processed.
+
+    :param list include: Only process files matching at least one of these patterns (optional)
+    :param list exclude: Never process files or directories matching any of these patterns (optional)
+    :param int min_size: Only process files of at least this many bytes (optional)
+    :param int max_size: Only process files of at most this many bytes (optional)
+    :param float newer_than: Only process files modified after this POSIX timestamp (optional)
+    """
+
+    include = attr.ib(validator=attr.validators.instance_of(list))
+    exclude = attr.ib(validator=attr.validators.instance_of(list))
+    min_size = attr.ib(validator=attr.validators.optional(attr.validators.instance_of(six.integer_types)))
+    max_size = attr.ib(validator=attr.validators.optional(attr.validators.instance_of(six.integer_types)))
+    newer_than = attr.ib(validator=attr.validators.optional(attr.validators.instance_of((float,) + six.integer_types)))
+
+    def __init__(
+        self,
+        include=None,  # type: Optional[List[str]]
+        exclude=None,  # type: Optional[List[str]]
+        min_size=None,  # type: Optional[int]
+        max_size=None,  # type: Optional[int]
+        newer_than=None,  # type: Optional[float]
+    ):
+        # type: (...) -> None
+        """Workaround pending resolution of attrs/mypy interaction.
+        https://github.com/python/mypy/issues/2088
+        https://github.com/python-attrs/attrs/issues/215
+        """
+        self.include = include or []
+        self.exclude = exclude or []
+        self.min_size = min_size
+        self.max_size = max_size
+        self.newer_than = newer_than
+        attr.validate(self)
+
+    def includes_dir(self, relative_path):
+        # type: (str) -> bool
+        """Determines whether a directory should be traversed.
+
+        :param str relative_path: Path to directory relative to the source root
+        :rtype: bool
+        """
+        return not _matches_any(self.exclude, relative_path)
+
+    def includes_file(self, relative_path, entry):
+        # type: (str, Any) -> bool
+        """Determines whether a file should be processed.
+
+        Name patterns are checked first so that the file is only stat-ed if they match.
+
+        :param str relative_path: Path to file relative to the source root
+        :param entry: Directory entry for file
+        :type entry: os.DirEntry
+        :rtype: bool
+        """
+        if self.include and not _matches_any(self.include, relative_path):
+            return False
+        if _matches_any(self.exclude, relative_path):
+            return False
+        if self.min_size is None and self.max_size is None and self.newer_than is None:
+            return True
+
+        try:
+            file_stat = entry.stat()
+        except OSError:
+            # Let processing report the problem with this file
+            return True
+        if self.min_size is not None and file_stat.st_size < self.min_size:
+            return False
+        if self.max_size is not None and file_stat.st_size > self.max_size:
+            return False
+        if self.newer_than is not None and file_stat.st_mtime <= self.newer_than:
+            return False
+        return True
+
+
+class _ListedEntry(object):
+    """Minimal stand-in for :class:`os.DirEntry` for a name listed by :func:`os.listdir`,
+    used where :func:`os.scandir` is not available.
+
+    :param str dirpath: Path to directory containing entry
+    :param str name: Name of entry
+    """
+
+    def __init__(self, dirpath, name):
+        # type: (str, str) -> None
+        """Sets the name and path."""
+        self.name = name
+        self.path = os.path.join(dirpath, name)
+        self._stat = None  # type: Optional[os.stat_result]
+        self._lstat = None  # type: Optional[os.stat_result]
+
+    def stat(self):
+        # type: () -> os.stat_result
+        """Collects and caches the status of the entry, following symbolic links."""
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def _link_stat(self):
+        # type: () -> os.stat_result
+        """Collects and caches the status of the entry itself."""
+        if self._lstat is None:
+            self._lstat = os.lstat(self.path)
+        return self._lstat
+
+    def is_dir(self):
+        # type: () -> bool
+        """Determines whether the entry is a directory or a symbolic link to one."""
+        try:
+            return stat.S_ISDIR(self.stat().st_mode)
+        except OSError:
+            # Broken symbolic links are reported as files, as os.DirEntry does
+            return False
+
+    def is_symlink(self):
+        # type: () -> bool
+        """Determines whether the entry is a symbolic link."""
+        return stat.S_ISLNK(self._link_stat().st_mode)
+
+
+def _scandir(dirpath):
+    # type: (str) -> List[Any]
+    """Lists the entries in a directory, using :func:`os.scandir` where it is available.
+
+    :param str dirpath: Path to directory
+    :returns: Directory entries
+    :raises OSError: if the directory cannot be read
+    """
+    if hasattr(os, "scandir"):
+        return list(os.scandir(dirpath))
+    # Python 2.7 and 3.4 do not have os.scandir
+    return [_ListedEntry(dirpath, name) for name in os.listdir(dirpath)]
+
+
+def _is_dir(entry):
+    # type: (Any) -> bool
+    """Determines whether a directory entry refers to a directory, treating entries that
+    cannot be inspected as files.
+
+    :param entry: Directory entry to inspect
+    :type entry: os.DirEntry
+    :rtype: bool
+    """
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def walk(top, source_filter=None):
+    # type: (str, Optional[SourceFilter]) -> Iterator[Tuple[str, List[Any]]]
+    """Walks a directory tree top-down, in the same order as :func:`os.walk`.
+
+    Unlike :func:`os.walk`, the ``os.DirEntry`` objects for all non-directory entries are
+    yielded rather than their names. Each entry caches its own ``stat`` results, so callers
+    can reuse them rather than making further metadata calls for every file.
+
+    Symbolic links to directories are not followed. Directories that cannot be read are skipped.
+
+    If a filter is provided, only entries that it selects are yielded, and excluded directories
+    are not traversed at all.
+
+    :param str top: Root of directory tree to walk
+    :param source_filter: Filter selecting entries to yield (optional)
+    :type source_filter: SourceFilter
+    :returns: Iterator of tuples of directory path and all selected non-directory entries in that directory
+    """
+    pending = [top]
+    while pending:
+        dirpath = pending.pop()
+        try:
+            entries = _scandir(dirpath)
+        except OSError as error:
+            _LOGGER.debug("Unable to read directory %s: %s", dirpath, error)
+            continue
+
+        relative_dir = os.path.relpath(dirpath, top)
+        files = []  # type: List[Any]
+        subdirs = []  # type: List[str]
+        for entry in entries:
+            is_dir = _is_dir(entry)
+            if source_filter is not None:
+                relative_path = entry.name if relative_dir == os.curdir else os.path.join(relative_dir, entry.name)
+                if is_dir:
+                    selected = source_filter.includes_dir(relative_path)
+                else:
+                    selected = source_filter.includes_file(relative_path, entry)
+                if not selected:
+                    _LOGGER.debug("Skipping filtered entry: %s", entry.path)
+                    continue
+
+            if not is_dir:
+                files.append(entry)
+            elif not entry.is_symlink():
+                subdirs.append(entry.path)
+
+        yield dirpath, files
+        pending.extend(reversed(subdirs))
@@ -0,0 +1,124 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Authentication of encrypted messages without writing their plaintext anywhere."""
+import copy
+import logging
+import os
+
+from aws_encryption_sdk_cli.exceptions import AWSEncryptionSDKCLIError
+from aws_encryption_sdk_cli.internal.io_handling import IOHandler  # noqa pylint: disable=unused-import
+from aws_encryption_sdk_cli.internal.io_handling import _encoder, _stdin
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+from aws_encryption_sdk_cli.internal.metadata import LazyValue, json_ready_header, json_ready_header_auth
+from aws_encryption_sdk_cli.internal.scanning import error_description, scan
+from aws_encryption_sdk_cli.internal.tracing import span
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import IO, Any, Dict, Iterable  # noqa pylint: disable=unused-import
+
+    from aws_encryption_sdk_cli.internal.mypy_types import STREAM_KWARGS  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("verify",)
+_LOGGER = logging.getLogger(LOGGER_NAME)
+#: Number of plaintext bytes to request from the decryptor at a time. Reading the plaintext in
+#: large pieces lets each read authenticate many frames, rather than one line at a time.
+_READ_SIZE = 1024 * 1024
+
+
+def _authenticate(handler, stream_args, source, record):
+    # type: (IOHandler, STREAM_KWARGS, IO, Dict[str, Any]) -> bool
+    """Decrypts a message, discarding the plaintext, so that every frame and any signature is authenticated.
+
+    :param handler: IOHandler that holds the configuration for the operation
+    :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
+    :param source: Stream from which to read the message
+    :type source: file-like object
+    :param dict record: Metadata for the operation, to which the message header is added
+    :returns: True if the message is authentic and has all required encryption context, False otherwise
+    :rtype: bool
+    """
+    with _encoder(source, handler.decode_input) as _source:
+        with handler.client.stream(source=_source, **stream_args) as decryptor:
+            with span("header"):
+                record["header"] = LazyValue(json_ready_header, decryptor.header)
+            record["header_auth"] = LazyValue(json_ready_header_auth, decryptor.header_auth)
+            # Check before reading the body, so that no more than the header is read from a skipped message
+            if not handler._has_required_context(decryptor.header, record):  # pylint: disable=protected-access
+                return False
+
+            with span("body"):
+                while decryptor.read(_READ_SIZE):
+                    pass
+                # Fails if the message ended before its footer
+                decryptor.close()
+    return True
+
+
+def _verify_message(handler, stream_args, source):
+    # type: (IOHandler, STREAM_KWARGS, str) -> Dict[str, Any]
+    """Verifies a single message, recording the result rather than raising if it is not authentic.
+
+    :param handler: IOHandler that holds the configuration for the operation
+    :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
+    :param str source: Full file path to source file, or ``-`` for stdin
+    :returns: Metadata for the operation
+    :rtype: dict
+    """
+    _LOGGER.info("verifying file %s", source)
+    record = dict(mode="verify", input=source, verified=False)  # type: Dict[str, Any]
+    with span("operation", input=source):
+        try:
+            if source == "-":
+                record["verified"] = _authenticate(handler, stream_args, _stdin(), record)
+            else:
+                with open(os.path.abspath(source), "rb") as source_reader:
+                    record["verified"] = _authenticate(handler, stream_args, source_reader, record)
+        except Exception as error:  # pylint: disable=broad-except
+            # Any failure to read or authenticate a message is a verification failure for that message alone
+            # Authentication failures such as InvalidTag carry no message, so name the error as well
+            record["error"] = error_description(error)
+            _LOGGER.warning("Verification failed for %s: %s", source, record["error"])
+            _LOGGER.debug("Verification failure details", exc_info=True)
+    return record
+
+
+def verify(handler, stream_args, sources, recursive, jobs=1):
+    # type: (IOHandler, STREAM_KWARGS, Iterable[str], bool, int) -> None
+    """Verifies all messages in the requested sources, writing a metadata record for each one.
+
+    Each message is decrypted as it is read and its plaintext is discarded. Nothing is written
+    except the metadata. Messages are verified by ``jobs`` worker threads, which share the
+    handler's cryptographic materials manager and any data key cache. Records are written in
+    source order, whatever order the workers finish in.
+
+    :param handler: IOHandler that holds the configuration for the operations
+    :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
+    :param sources: Source paths, or ``-`` for stdin
+    :param bool recursive: Should source directories be verified
+    :param int jobs: Number of messages to verify in parallel (default: 1)
+    :raises AWSEncryptionSDKCLIError: if any message could not be verified
+    """
+    verify_args = copy.copy(stream_args)
+    verify_args["mode"] = "decrypt"
+
+    def _verify(source):
+        # type: (str) -> Dict[str, Any]
+        return _verify_message(handler, verify_args, source)
+
+    total, failed = scan(handler, _verify, sources, recursive, jobs)
+    _LOGGER.info("Verified %d messages: %d failed", total, failed)
+    if failed:
+        raise AWSEncryptionSDKCLIError("Verification failed for {} of {} messages".format(failed, total))
@@ -0,0 +1,420 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Continuous processing of files as they are written to a source directory."""
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import time
+
+from aws_encryption_sdk_cli.internal.io_handling import IOHandler  # noqa pylint: disable=unused-import
+from aws_encryption_sdk_cli.internal.io_handling import _output_dir, output_filename
+from aws_encryption_sdk_cli.internal.logging_utils import LOGGER_NAME
+from aws_encryption_sdk_cli.internal.state_index import _mtime_ns
+from aws_encryption_sdk_cli.internal.traversal import SourceFilter  # noqa pylint: disable=unused-import
+from aws_encryption_sdk_cli.internal.traversal import walk
+
+try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
+    from typing import Dict, Iterator, List, Optional, Tuple, Union  # noqa pylint: disable=unused-import
+
+    from aws_encryption_sdk_cli.internal.mypy_types import STREAM_KWARGS  # noqa pylint: disable=unused-import
+except ImportError:  # pragma: no cover
+    # We only actually need these imports when running the mypy checks
+    pass
+
+__all__ = ("watch",)
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+# inotify constants from <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+#: Number of seconds to keep collecting further changes after the first one before processing them together.
+_BATCH_WINDOW = 0.05
+#: Maximum number of files to process in one batch. Further events wait in the kernel queue.
+_MAX_BATCH = 1000
+#: Number of seconds between scans when inotify is not available.
+_POLL_INTERVAL = 1.0
+
+
+class _FileEntry(object):
+    """Minimal stand-in for :class:`os.DirEntry` for a file reported by inotify.
+
+    :param str path: Full path to file
+    """
+
+    def __init__(self, path):
+        # type: (str) -> None
+        """Sets the path."""
+        self.path = path
+        self._stat = None  # type: Optional[os.stat_result]
+
+    def stat(self):
+        # type: () -> os.stat_result
+        """Collects and caches the status of the file."""
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+
+def _includes_dir(source_filter, relative_path):
+    # type: (Optional[SourceFilter], str) -> bool
+    """Determines whether a directory and all of its parents would be traversed.
+
+    :param source_filter: Filter selecting entries to process (optional)
+    :type source_filter: aws_encryption_sdk_cli.internal.traversal.SourceFilter
+    :param str relative_path: Path to directory relative to the source root
+    :rtype: bool
+    """
+    if source_filter is None:
+        return True
+    parts = relative_path.split(os.sep)
+    return all(source_filter.includes_dir(os.sep.join(parts[: index + 1])) for index in range(len(parts)))
+
+
+class _InotifyWatcher(object):
+    """Reports files under a directory tree as soon as they are closed after writing or moved into
+    the tree, using Linux inotify.
+
+    :param str root: Root of directory tree to watch
+    :param source_filter: Filter selecting entries to process (optional)
+    :type source_filter: aws_encryption_sdk_cli.internal.traversal.SourceFilter
+    :raises OSError: if inotify is not available
+    """
+
+    def __init__(self, root, source_filter):
+        # type: (str, Optional[SourceFilter]) -> None
+        """Sets up watches on every directory in the tree."""
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        self._root = root
+        self._source_filter = source_filter
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            error_number = ctypes.get_errno()
+            raise OSError(error_number, os.strerror(error_number))
+        self._dirs = {}  # type: Dict[int, str]
+        try:
+            for dirpath, _entries in walk(root, source_filter):
+                self._add_watch(dirpath)
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    def _add_watch(self, dirpath):
+        # type: (str) -> None
+        """Starts watching a single directory.
+
+        :param str dirpath: Full path to directory
+        """
+        watch_descriptor = self._libc.inotify_add_watch(
+            self._fd, ctypes.c_char_p(os.fsencode(dirpath)), ctypes.c_uint32(_WATCH_MASK)
+        )
+        if watch_descriptor < 0:
+            _LOGGER.warning("Unable to watch directory %s: %s", dirpath, os.strerror(ctypes.get_errno()))
+            return
+        self._dirs[watch_descriptor] = dirpath
+
+    def _selected(self, path):
+        # type: (str) -> bool
+        """Determines whether a file should be processed.
+
+        :param str path: Full path to file
+        :rtype: bool
+        """
+        if self._source_filter is None:
+            return True
+        relative_path = os.path.relpath(path, self._root)
+        return _includes_dir(self._source_filter, os.path.dirname(relative_path)) and (
+            self._source_filter.includes_file(relative_path, _FileEntry(path))
+        )
+
+    def _new_dir(self, dirpath):
+        # type: (str) -> List[str]
+        """Starts watching a directory tree that was created or moved into the watched tree, and lists the
+        files it already contains, since they were written before they could be watched.
+
+        :param str dirpath: Full path to directory
+        :returns: Full paths to all files in the directory tree
+        :rtype: list
+        """
+        if not _includes_dir(self._source_filter, os.path.relpath(dirpath, self._root)):
+            return []
+        existing = []
+        for subdir, entries in walk(dirpath):
+            if not _includes_dir(self._source_filter, os.path.relpath(subdir, self._root)):
+                continue
+            self._add_watch(subdir)
+            existing.extend(entry.path for entry in entries if self._selected(entry.path))
+        return existing
+
+    def _rescan(self):
+        # type: () -> List[str]
+        """Lists all files in the tree after events were lost.
+
+        :returns: Full paths to all selected files
+        :rtype: list
+        """
+        _LOGGER.warning("Event queue overflowed: rescanning %s", self._root)
+        return [entry.path for _dirpath, entries in walk(self._root, self._source_filter) for entry in entries]
+
+    def _read_events(self):
+        # type: () -> List[str]
+        """Reads and interprets all queued events.
+
+        :returns: Full paths to files that are ready to process
+        :rtype: list
+        """
+        try:
+            data = os.read(self._fd, _READ_SIZE)
+        except OSError as error:
+            if error.errno == errno.EAGAIN:
+                return []
+            raise
+
+        ready = []  # type: List[str]
+        offset = 0
+        while offset < len(data):
+            watch_descriptor, mask, _cookie, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + name_length].rstrip(b"\0"))
+            offset += name_length
+            ready.extend(self._interpret_event(watch_descriptor, mask, name))
+        return ready
+
+    def _interpret_event(self, watch_descriptor, mask, name):
+        # type: (int, int, str) -> List[str]
+        """Interprets a single event.
+
+        :param int watch_descriptor: Watch that reported the event
+        :param int mask: Event flags
+        :param str name: Name of the entry in the watched directory, if any
+        :returns: Full paths to files that are ready to process
+        :rtype: list
+        """
+        if mask & _IN_Q_OVERFLOW:
+            return self._rescan()
+        if mask & _IN_IGNORED:
+            # The watched directory was removed
+            self._dirs.pop(watch_descriptor, None)
+            return []
+        dirpath = self._dirs.get(watch_descriptor)
+        if dirpath is None or not name:
+            return []
+
+        path = os.path.join(dirpath, name)
+        if mask & _IN_ISDIR:
+            return self._new_dir(path)
+        if mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO) and self._selected(path):
+            return [path]
+        return []
+
+    def changes(self, timeout):
+        # type: (float) -> List[str]
+        """Waits for files to become ready, then collects any further files that become ready
+        within a short window so that they can be processed together.
+
+        :param float timeout: Maximum number of seconds to wait for the first file
+        :returns: Full paths to files that are ready to process, without duplicates
+        :rtype: list
+        """
+        ready = []  # type: List[str]
+        deadline = None  # type: Optional[float]
+        wait = timeout
+        while len(ready) < _MAX_BATCH:
+            readable, _writable, _exceptional = select.select([self._fd], [], [], wait)
+            if not readable:
+                break
+            ready.extend(self._read_events())
+            if deadline is None:
+                deadline = time.time() + _BATCH_WINDOW
+            wait = max(deadline - time.time(), 0)
+        return list(_unique(ready))
+
+    def close(self):
+        # type: () -> None
+        """Stops watching."""
+        os.close(self._fd)
+
+
+class _PollingWatcher(object):
+    """Reports files under a directory tree by scanning it periodically, for platforms without inotify.
+
+    Because there is no notification when a writer closes a file, a file is only reported once its
+    size and modification time are the same in two consecutive scans.
+
+    :param str root: Root of directory tree to watch
+    :param source_filter: Filter selecting entries to process (optional)
+    :type source_filter: aws_encryption_sdk_cli.internal.traversal.SourceFilter
+    :param float interval: Number of seconds between scans
+    """
+
+    def __init__(self, root, source_filter, interval=_POLL_INTERVAL):
+        # type: (str, Optional[SourceFilter], float) -> None
+        """Takes the initial snapshot of the tree."""
+        self._root = root
+        self._source_filter = source_filter
+        self._interval = interval
+        self._snapshot = self._scan()
+        # Files that exist now are processed by the initial scan of the tree.
+        self._reported = dict(self._snapshot)
+
+    def _scan(self):
+        # type: () -> Dict[str, Tuple[int, int]]
+        """Collects the size and modification time of every selected file in the tree.
+
+        :rtype: dict
+        """
+        snapshot = {}
+        for _dirpath, entries in walk(self._root, self._source_filter):
+            for entry in entries:
+                try:
+                    file_stat = entry.stat()
+                except OSError:
+                    continue
+                snapshot[entry.path] = (file_stat.st_size, _mtime_ns(file_stat))
+        return snapshot
+
+    def changes(self, timeout):
+        # type: (float) -> List[str]
+        """Waits for the next scan and reports files that have settled since they last changed.
+
+        :param float timeout: Maximum number of seconds to wait
+        :returns: Full paths to files that are ready to process
+        :rtype: list
+        """
+        time.sleep(min(timeout, self._interval))
+        current = self._scan()
+        ready = [
+            path
+            for path, signature in current.items()
+            if self._snapshot.get(path) == signature and self._reported.get(path) != signature
+        ]
+        for path in ready:
+            self._reported[path] = current[path]
+        for path in set(self._reported).difference(current):
+            del self._reported[path]
+        self._snapshot = current
+        return sorted(ready)[:_MAX_BATCH]
+
+    def close(self):
+        # type: () -> None
+        """Stops watching."""
+
+
+def _unique(paths):
+    # type: (List[str]) -> Iterator[str]
+    """Yields each path once, in the order in which it was first seen.
+
+    :param list paths: Paths
+    """
+    seen = set()
+    for path in paths:
+        if path not in seen:
+            seen.add(path)
+            yield path
+
+
+def _watcher(source, source_filter):
+    # type: (str, Optional[SourceFilter]) -> Union[_InotifyWatcher, _PollingWatcher]
+    """Builds the best available watcher for this platform.
+
+    :param str source: Root of directory tree to watch
+    :param source_filter: Filter selecting entries to process (optional)
+    :type source_filter: aws_encryption_sdk_cli.internal.traversal.SourceFilter
+    """
+    try:
+        return _InotifyWatcher(source, source_filter)
+    except (AttributeError, OSError) as error:
+        _LOGGER.info("inotify is not available, falling back to polling: %s", error)
+        return _PollingWatcher(source, source_filter)
+
+
+def _process_batch(handler, stream_args, source, destination, suffix, paths):
+    # pylint: disable=too-many-arguments
+    # type: (IOHandler, STREAM_KWARGS, str, str, Optional[str], List[str]) -> None
+    """Processes a batch of files that are ready.
+
+    A failure to process one file is logged and does not stop the remaining files from being processed.
+
+    :param handler: IOHandler that performs the operations
+    :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
+    :param str source: Full file path to source directory root
+    :param str destination: Full file path to destination directory root
+    :param str suffix: Suffix to append to output filenames
+    :param list paths: Full paths to source files to process
+    """
+    for path in paths:
+        if not os.path.isfile(path):
+            # Removed or replaced since it was reported
+            continue
+        destination_filename = output_filename(
+            source_filename=path,
+            destination_dir=_output_dir(
+                source_root=source, destination_root=destination, source_dir=os.path.dirname(path)
+            ),
+            mode=str(stream_args["mode"]),
+            suffix=suffix,
+        )
+        try:
+            handler.process_single_file(stream_args=stream_args, source=path, destination=destination_filename)
+        except Exception as error:  # pylint: disable=broad-except
+            _LOGGER.warning("Unable to process %s: %s", path, error)
+    handler.flush()
+
+
+def watch(handler, stream_args, source, destination, suffix, idle_timeout=1.0):
+    # pylint: disable=too-many-arguments
+    # type: (IOHandler, STREAM_KWARGS, str, str, Optional[str], float) -> None
+    """Processes all files in a source directory tree, then keeps processing files as they are written
+    to the tree until interrupted.
+
+    The same handler, and therefore the same cryptographic materials manager and any data key cache,
+    is used for every file.
+
+    :param handler: IOHandler that performs the operations
+    :param dict stream_args: kwargs to pass to `aws_encryption_sdk.stream`
+    :param str source: Full file path to source directory root
+    :param str destination: Full file path to destination directory root
+    :param str suffix: Suffix to append to output filenames
+    :param float idle_timeout: Maximum number of seconds to wait for changes at a time
+    """
+    # Start watching before the initial scan so that no file written during the scan is missed.
+    watcher = _watcher(source, handler.source_filter)
+    try:
+        handler.process_dir(stream_args=stream_args, source=source, destination=destination, suffix=suffix)
+        handler.flush()
+        _LOGGER.info("Watching %s for changes", source)
+        while True:
+            ready = watcher.changes(idle_timeout)
+            if ready:
+                _LOGGER.debug("Processing %d changed files", len(ready))
+                _process_batch(handler, stream_args, source, destination, suffix, ready)
+    except KeyboardInterrupt:
+        _LOGGER.info("Stopped watching %s", source)
+    finally:
+        watcher.close()
@@ -17,6 +17,7 @@ import botocore.session
 from aws_encryption_sdk import DiscoveryAwsKmsMasterKeyProvider, StrictAwsKmsMasterKeyProvider
 
 from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal import stats, tracing
 from aws_encryption_sdk_cli.internal.identifiers import USER_AGENT_SUFFIX
 
 try:  # Python 3.5.0 and 3.5.1 have incompatible typing modules
@@ -54,6 +55,8 @@ def aws_kms_master_key_provider(discovery=True, **kwargs):
 
     botocore_session = botocore.session.Session(profile=profile_name)
     botocore_session.user_agent_extra = USER_AGENT_SUFFIX
+    stats.instrument_botocore_session(botocore_session)
+    tracing.instrument_botocore_session(botocore_session)
     kwargs["botocore_session"] = botocore_session
 
     try:
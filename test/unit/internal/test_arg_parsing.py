@@ -13,7 +13,9 @@
 """Unit testing suite for ``aws_encryption_sdk_cli.internal.arg_parsing``."""
 import os
 import platform
+import re
 import shlex
+import time
 
 import aws_encryption_sdk
 import pytest
@@ -24,6 +26,15 @@ from pytest_mock import mocker  # noqa pylint: disable=unused-import
 import aws_encryption_sdk_cli
 from aws_encryption_sdk_cli.exceptions import ParameterParseError
 from aws_encryption_sdk_cli.internal import arg_parsing, identifiers, metadata
+from aws_encryption_sdk_cli.internal.catalog import Catalog
+from aws_encryption_sdk_cli.internal.durability import Durability
+from aws_encryption_sdk_cli.internal.journal import Journal
+from aws_encryption_sdk_cli.internal.metrics import MetricsExporter
+from aws_encryption_sdk_cli.internal.profiling import CpuProfiler, MemoryProfiler
+from aws_encryption_sdk_cli.internal.state_index import StateIndex
+from aws_encryption_sdk_cli.internal.stats import RunStatistics
+from aws_encryption_sdk_cli.internal.tracing import ChromeTracer, JsonLinesTracer
+from aws_encryption_sdk_cli.internal.traversal import SourceFilter
 
 pytestmark = [pytest.mark.unit, pytest.mark.local]
 
@@ -65,6 +76,18 @@ def patch_process_caching_config(mocker):
     yield arg_parsing._process_caching_config
 
 
+@pytest.fixture
+def patch_process_source_filter(mocker):
+    mocker.patch.object(arg_parsing, "_process_source_filter")
+    return arg_parsing._process_source_filter
+
+
+@pytest.fixture
+def patch_process_state_index(mocker):
+    mocker.patch.object(arg_parsing, "_process_state_index")
+    return arg_parsing._process_state_index
+
+
 def test_version_report():
     test = arg_parsing._version_report()
     assert test == "aws-encryption-sdk-cli/{cli} aws-encryption-sdk/{sdk}".format(
@@ -220,6 +243,23 @@ def build_expected_good_args(from_file=False):  # pylint: disable=too-many-local
         good_args.append((encrypt_flag + suppress_metadata + valid_io + mkp_1, "action", "encrypt"))
     for decrypt_flag in (decrypt, "--decrypt"):
         good_args.append((decrypt_flag + suppress_metadata + valid_io + mkp_1 + default_discovery, "action", "decrypt"))
+    default_reencrypt = "--reencrypt" + suppress_metadata + valid_io + mkp_1 + default_discovery
+    new_mkp_2 = mkp_2.replace(" -w ", " --new-wrapping-keys ")
+    good_args.append((default_reencrypt + new_mkp_2, "action", "reencrypt"))
+    good_args.append((default_reencrypt + new_mkp_2, "new_wrapping_keys", [mkp_2_parsed]))
+    good_args.append((default_encrypt, "new_wrapping_keys", None))
+    default_rewrap = default_reencrypt.replace("--reencrypt", "--rewrap")
+    good_args.append((default_rewrap + new_mkp_2, "action", "rewrap"))
+    good_args.append((default_rewrap + new_mkp_2, "new_wrapping_keys", [mkp_2_parsed]))
+    default_verify = "--verify" + suppress_metadata + short_input + mkp_1 + default_discovery
+    good_args.append((default_verify, "action", "verify"))
+    good_args.append((default_verify, "output", None))
+    good_args.append((default_verify, "jobs", 1))
+    good_args.append((default_verify + " --jobs 8", "jobs", 8))
+    default_inspect = "--inspect" + suppress_metadata + short_input
+    good_args.append((default_inspect, "action", "inspect"))
+    good_args.append((default_inspect, "wrapping_keys", []))
+    good_args.append((default_inspect + " --jobs 8", "jobs", 8))
 
     # wrapping key config
     good_args.append((default_encrypt, "wrapping_keys", [mkp_1_parsed]))
@@ -283,6 +323,37 @@ def build_expected_good_args(from_file=False):  # pylint: disable=too-many-local
     for recursive_flag in (" -r", " -R", " --recursive"):
         good_args.append((default_encrypt + recursive_flag, "recursive", True))
 
+    # dry run
+    # input list
+    good_args.append((default_encrypt, "input_from", None))
+    good_args.append((encrypt + suppress_metadata + " --input-from -" + short_output + mkp_1, "input_from", "-"))
+    good_args.append((encrypt + suppress_metadata + " --input-from -" + short_output + mkp_1, "input", None))
+
+    # source filter
+    good_args.append((default_encrypt, "source_filter", None))
+    good_args.append(
+        (
+            default_encrypt + " --include *.csv --include *.json --exclude tmp --min-size 1K --max-size 2M",
+            "source_filter",
+            SourceFilter(include=["*.csv", "*.json"], exclude=["tmp"], min_size=1024, max_size=2 * 1024 * 1024),
+        )
+    )
+
+    # incremental
+    good_args.append((default_encrypt, "state_index", None))
+    good_args.append((default_encrypt, "sync", False))
+    good_args.append((default_encrypt, "resume", None))
+    good_args.append((default_encrypt, "watch", False))
+    good_args.append((default_encrypt + " -r --watch", "watch", True))
+    good_args.append((default_encrypt + " -r --incremental state.db --sync", "sync", True))
+
+    # durability
+    good_args.append((default_encrypt, "durability", Durability.none))
+    good_args.append((default_encrypt + " --durability batch", "durability", Durability.batch))
+
+    good_args.append((default_encrypt, "dry_run", False))
+    good_args.append((default_encrypt + " --dry-run", "dry_run", True))
+
     # logging verbosity
     good_args.append((default_encrypt, "verbosity", None))
     for count in (1, 2, 3, 4):
@@ -297,6 +368,35 @@ def build_expected_good_args(from_file=False):  # pylint: disable=too-many-local
             metadata.MetadataWriter(suppress_output=False)(output_file="-"),
         )
     )
+    good_args.append((default_encrypt, "compact_metadata", False))
+    good_args.append((default_encrypt + " --compact-metadata", "compact_metadata", True))
+    good_args.append((default_encrypt, "metadata_timing", False))
+    good_args.append((default_encrypt + " --metadata-timing", "metadata_timing", True))
+    good_args.append((default_encrypt, "stats", None))
+    good_args.append((default_encrypt + " --stats", "stats", RunStatistics()))
+    good_args.append((default_encrypt + " --stats stats.json", "stats", RunStatistics("stats.json")))
+    good_args.append((default_encrypt, "metrics_file", None))
+    good_args.append(
+        (
+            default_encrypt + " --metrics-file cli.prom",
+            "metrics_file",
+            MetricsExporter("cli.prom", RunStatistics(None)),
+        )
+    )
+    good_args.append(
+        (
+            default_encrypt + " --metrics-file cli.prom --metrics-interval 60 --stats",
+            "metrics_file",
+            MetricsExporter("cli.prom", RunStatistics(), 60.0),
+        )
+    )
+    good_args.append((default_encrypt + " --metrics-file cli.prom", "stats", RunStatistics(None)))
+    good_args.append((default_encrypt, "profile", None))
+    good_args.append((default_encrypt + " --profile cpu:run.prof", "profile", CpuProfiler("run.prof")))
+    good_args.append((default_encrypt + " --profile mem:run.json", "profile", MemoryProfiler("run.json")))
+    good_args.append((default_encrypt, "trace", None))
+    good_args.append((default_encrypt + " --trace jsonl:run.jsonl", "trace", JsonLinesTracer("run.jsonl")))
+    good_args.append((default_encrypt + " --trace chrome:run.json", "trace", ChromeTracer("run.json")))
 
     # discovery
     discovery_valid_configs = [
@@ -334,6 +434,7 @@ def build_bad_io_arguments():
         "-d -S -o - -w provider=ex_provider key=ex_mk_id",
         "-d -S -i - -w provider=ex_provider key=ex_mk_id",
         "-d -S -i - -o - --required-encryption-context-keys asd asdfa",
+        "-d -S -i - --input-from - -o - -w provider=ex_provider key=ex_mk_id",
     ]
 
 
@@ -342,6 +443,7 @@ def build_bad_multiple_arguments():
     protected_arguments = [
         " --caching key=value",
         " --input -",
+        " --input-from -",
         " --output -",
         " --encryption-context key=value",
         " --algorithm ALGORITHM",
@@ -532,11 +634,267 @@ def test_process_wrapping_key_provider_configs_no_keys():
     excinfo.match(r'At least one "key" must be provided for each wrapping key provider configuration')
 
 
+@pytest.mark.parametrize(
+    "raw_size, expected",
+    (("0", 0), ("512", 512), ("10K", 10240), ("10k", 10240), ("10KB", 10240), ("1.5M", 1572864), ("2G", 2 * 1024 ** 3)),
+)
+def test_process_size(raw_size, expected):
+    assert arg_parsing._process_size(raw_size) == expected
+
+
+@pytest.mark.parametrize("raw_size", ("", "K", "-1", "10X", "ten"))
+def test_process_size_invalid(raw_size):
+    with pytest.raises(ParameterParseError) as excinfo:
+        arg_parsing._process_size(raw_size)
+
+    excinfo.match(r"Invalid size: ")
+
+
+@pytest.mark.parametrize("raw_age, seconds", (("30s", 30), ("5m", 300), ("12h", 43200), ("7d", 604800), ("1w", 604800)))
+def test_process_newer_than_age(mocker, raw_age, seconds):
+    mocker.patch.object(arg_parsing.time, "time")
+    arg_parsing.time.time.return_value = 1000000.0
+
+    assert arg_parsing._process_newer_than(raw_age) == 1000000.0 - seconds
+
+
+@pytest.mark.parametrize(
+    "raw_time, expected",
+    (
+        ("2017-10-01", (2017, 10, 1, 0, 0, 0)),
+        ("2017-10-01T12:30", (2017, 10, 1, 12, 30, 0)),
+        ("2017-10-01T12:30:15", (2017, 10, 1, 12, 30, 15)),
+    ),
+)
+def test_process_newer_than_time(raw_time, expected):
+    assert arg_parsing._process_newer_than(raw_time) == time.mktime(expected + (0, 0, -1))
+
+
+@pytest.mark.parametrize("raw_newer_than", ("", "7", "7y", "2017-13-01", "yesterday"))
+def test_process_newer_than_invalid(raw_newer_than):
+    with pytest.raises(ParameterParseError) as excinfo:
+        arg_parsing._process_newer_than(raw_newer_than)
+
+    excinfo.match(r"Invalid time or age: ")
+
+
+def test_process_state_index(tmpdir):
+    test = arg_parsing._process_state_index(
+        MagicMock(incremental=str(tmpdir.join("state.db")), incremental_hash=True, sync=False)
+    )
+
+    assert test == StateIndex(str(tmpdir.join("state.db")), hash_content=True)
+
+
+def test_process_state_index_hash_without_index():
+    with pytest.raises(ParameterParseError) as excinfo:
+        arg_parsing._process_state_index(MagicMock(incremental=None, incremental_hash=True, sync=False))
+
+    excinfo.match(r"--incremental-hash can only be used with --incremental")
+
+
+@pytest.mark.parametrize(
+    "incremental, recursive, message",
+    (
+        ("state.db", False, r"--sync can only be used with --recursive"),
+        (None, True, r"--sync can only be used with --incremental"),
+    ),
+)
+def test_process_state_index_bad_sync(incremental, recursive, message):
+    with pytest.raises(ParameterParseError) as excinfo:
+        arg_parsing._process_state_index(
+            MagicMock(incremental=incremental, incremental_hash=False, sync=True, recursive=recursive)
+        )
+
+    excinfo.match(message)
+
+
+def test_parse_args_resume(tmpdir):
+    test = arg_parsing.parse_args(
+        shlex.split("-e -S -i - -o - --wrapping-keys key=a --resume " + str(tmpdir.join("journal")))
+    )
+
+    assert test.resume == Journal(str(tmpdir.join("journal")))
+
+
+@pytest.mark.parametrize(
+    "extra_args, message",
+    (
+        ("-i - --watch", r"--watch can only be used with --recursive"),
+        ("-i - -r --watch --dry-run", r"--watch cannot be used with --input-from or --dry-run"),
+        ("--input-from - -r --watch", r"--watch cannot be used with --input-from or --dry-run"),
+    ),
+)
+def test_parse_args_bad_watch(capsys, extra_args, message):
+    with pytest.raises(SystemExit):
+        arg_parsing.parse_args(shlex.split("-e -S -o - --wrapping-keys key=a " + extra_args))
+
+    assert re.search(message, capsys.readouterr().err)
+
+
+@pytest.mark.parametrize(
+    "argstring, message",
+    (
+        ("--reencrypt --discovery=false -w key=a", r"--reencrypt requires --new-wrapping-keys"),
+        ("-e -w key=a --new-wrapping-keys key=b", r"--new-wrapping-keys can only be used with --reencrypt or --rewrap"),
+        ("--rewrap --discovery=false -w key=a", r"--rewrap requires --new-wrapping-keys"),
+        (
+            "--rewrap --discovery=false -w key=a --new-wrapping-keys key=b --frame-length 1024",
+            r"--rewrap keeps the algorithm and frame length of each message",
+        ),
+        ("--reencrypt -w key=a --new-wrapping-keys key=b", r"Discovery must be set to True or False."),
+    ),
+)
+def test_parse_args_bad_reencrypt(capsys, argstring, message):
+    with pytest.raises(SystemExit):
+        arg_parsing.parse_args(shlex.split("-S -i - -o - " + argstring))
+
+    assert re.search(message, capsys.readouterr().err)
+
+
+@pytest.mark.parametrize(
+    "argstring, message",
+    (
+        ("-e -w key=a", r"the following arguments are required: -o/--output"),
+        ("-e -o - -w key=a --jobs 2", r"--jobs can only be used with --verify or --inspect"),
+        ("--verify --discovery=false -w key=a -o -", r"--verify does not write any output"),
+        ("--verify --discovery=false -w key=a --jobs 0", r"--jobs must be at least 1"),
+        ("--verify --discovery=false -w key=a -r --watch", r"--verify cannot be used with --watch"),
+        ("--verify --discovery=false -w key=a --resume journal", r"--verify cannot be used with"),
+        ("--verify -w key=a", r"Discovery must be set to True or False."),
+        ("--inspect -o -", r"--inspect does not write any output"),
+        ("--inspect -w key=a", r"--inspect and --query-catalog do not use wrapping keys"),
+        ("--inspect --dry-run", r"--inspect cannot be used with --watch, --dry-run"),
+    ),
+)
+def test_parse_args_bad_verify(capsys, argstring, message):
+    with pytest.raises(SystemExit):
+        arg_parsing.parse_args(shlex.split("-S -i - " + argstring))
+
+    assert re.search(message, capsys.readouterr().err)
+
+
+def test_parse_args_catalog(tmpdir):
+    catalog = str(tmpdir.join("catalog"))
+
+    inspect_args = arg_parsing.parse_args(shlex.split("--inspect -S -i - --catalog " + catalog))
+    assert isinstance(inspect_args.catalog, Catalog)
+    assert inspect_args.catalog.filename == catalog
+
+    tmpdir.join("catalog").write(b"")
+    query_args = arg_parsing.parse_args(
+        shlex.split("--query-catalog --catalog {} --wrapped-by key-a -c a=b c".format(catalog))
+    )
+    assert query_args.action == "query"
+    assert query_args.catalog.filename == catalog
+    assert query_args.wrapped_by == "key-a"
+    assert query_args.wrapping_keys == []
+    assert query_args.encryption_context == {"a": "b"}
+    assert query_args.required_encryption_context_keys == ["c"]
+
+
+@pytest.mark.parametrize(
+    "argstring, message",
+    (
+        ("-e -w key=a -o -", r"one of the arguments -i/--input --input-from is required"),
+        ("-e -w key=a -i - -o -", r"one of the arguments -S/--suppress-metadata --metadata-output is required"),
+        ("-e -S -w key=a -i - -o - --catalog catalog", r"--catalog can only be used with --inspect or --query-catalog"),
+        ("--inspect -S -i - --wrapped-by key-a", r"--wrapped-by can only be used with --query-catalog"),
+        ("--query-catalog", r"--query-catalog requires --catalog"),
+        ("--query-catalog --catalog missing-catalog", r'Catalog "missing-catalog" does not exist'),
+        ("--query-catalog --catalog catalog -i -", r"--query-catalog reads only the catalog"),
+        ("--query-catalog --catalog catalog -w key=a", r"--inspect and --query-catalog do not use wrapping keys"),
+    ),
+)
+def test_parse_args_bad_catalog(capsys, argstring, message):
+    with pytest.raises(SystemExit):
+        arg_parsing.parse_args(shlex.split(argstring))
+
+    assert re.search(message, capsys.readouterr().err)
+
+
+def test_parse_args_stats_query_catalog(tmpdir, capsys):
+    catalog = tmpdir.join("catalog")
+    catalog.write(b"")
+
+    with pytest.raises(SystemExit):
+        arg_parsing.parse_args(shlex.split("--query-catalog --catalog {} --stats".format(catalog)))
+
+    assert "--stats cannot be used with --query-catalog" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("profile", ("cpu", "cpu:", "disk:run.prof", "run.prof"))
+def test_parse_args_bad_profile(capsys, profile):
+    with pytest.raises(SystemExit):
+        arg_parsing.parse_args(shlex.split("-e -i - -o - -w key=a -S --profile " + profile))
+
+    assert '--profile must be "cpu:PATH" or "mem:PATH"' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("trace", ("jsonl", "chrome:", "csv:run.csv", "run.jsonl"))
+def test_parse_args_bad_trace(capsys, trace):
+    with pytest.raises(SystemExit):
+        arg_parsing.parse_args(shlex.split("-e -i - -o - -w key=a -S --trace " + trace))
+
+    assert '--trace must be "jsonl:PATH" or "chrome:PATH"' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "argstring", ("--stats", "--metrics-file cli.prom", "--profile cpu:run.prof", "--trace jsonl:run")
+)
+def test_parse_args_dry_run_with_measurement(capsys, argstring):
+    with pytest.raises(SystemExit):
+        arg_parsing.parse_args(shlex.split("-e -i - -o - -w key=a -S --dry-run " + argstring))
+
+    assert "--dry-run cannot be used with --stats, --metrics-file, --profile, or --trace" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "argstring, message",
+    (
+        ("--metrics-interval 10", r"--metrics-interval can only be used with --metrics-file"),
+        ("--metrics-file cli.prom --metrics-interval 0", r"--metrics-interval must be greater than 0"),
+    ),
+)
+def test_parse_args_bad_metrics(capsys, argstring, message):
+    with pytest.raises(SystemExit):
+        arg_parsing.parse_args(shlex.split("-e -i - -o - -w key=a -S " + argstring))
+
+    assert re.search(message, capsys.readouterr().err)
+
+
+def test_parse_args_metrics_query_catalog(tmpdir, capsys):
+    catalog = tmpdir.join("catalog")
+    catalog.write(b"")
+
+    with pytest.raises(SystemExit):
+        arg_parsing.parse_args(shlex.split("--query-catalog --catalog {} --metrics-file cli.prom".format(catalog)))
+
+    assert "--metrics-file cannot be used with --query-catalog" in capsys.readouterr().err
+
+
+def test_parse_args_compact_metadata():
+    parsed_args = arg_parsing.parse_args(shlex.split("-e -i - -o - -w key=a --metadata-output - --compact-metadata"))
+
+    assert parsed_args.metadata_output._compact_headers
+
+
+def test_process_source_filter_min_greater_than_max():
+    with pytest.raises(ParameterParseError) as excinfo:
+        arg_parsing._process_source_filter(
+            MagicMock(include=None, exclude=None, min_size="2K", max_size="1K", newer_than=None)
+        )
+
+    excinfo.match(r"--min-size cannot be greater than --max-size")
+
+
 def test_parse_args(
     patch_build_parser,
     patch_process_wrapping_key_provider_configs,
     patch_process_encryption_context,
     patch_process_caching_config,
+    patch_process_source_filter,
+    patch_process_state_index,
 ):
     mock_parsed_args = MagicMock(
         wrapping_keys=sentinel.raw_keys,
@@ -550,6 +908,17 @@ def test_parse_args(
         version=False,
         dummy_redirect=None,
         commitment_policy=CommitmentPolicy.REQUIRE_ENCRYPT_REQUIRE_DECRYPT,
+        resume=None,
+        stats=None,
+        metrics_file=None,
+        metrics_interval=None,
+        profile=None,
+        trace=None,
+        watch=False,
+        new_wrapping_keys=None,
+        jobs=1,
+        catalog=None,
+        wrapped_by=None,
     )
     patch_build_parser.return_value.parse_args.return_value = mock_parsed_args
     test = arg_parsing.parse_args(sentinel.raw_args)
@@ -572,6 +941,10 @@ def test_parse_args(
     assert test.required_encryption_context_keys is sentinel.required_keys
     patch_process_caching_config.assert_called_once_with(sentinel.raw_caching)
     assert test.caching is patch_process_caching_config.return_value
+    patch_process_source_filter.assert_called_once_with(mock_parsed_args)
+    assert test.source_filter is patch_process_source_filter.return_value
+    patch_process_state_index.assert_called_once_with(mock_parsed_args)
+    assert test.state_index is patch_process_state_index.return_value
     assert test is mock_parsed_args
 
 
@@ -0,0 +1,117 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.catalog``."""
+import base64
+
+import pytest
+
+from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal import catalog
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+KEY_A = "arn:aws:kms:us-west-2:111122223333:key/aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa"
+KEY_B = "arn:aws:kms:us-west-2:111122223333:key/bbbbbbbb-bbbb-bbbb-bbbb-bbbbbbbbbbbb"
+
+
+def _b64(value):
+    return base64.b64encode(value.encode("utf-8")).decode("ascii")
+
+
+def _header(key_ids, encryption_context):
+    return {
+        "message_id": _b64("message id"),
+        "algorithm": "AES_256_GCM_HKDF_SHA512_COMMIT_KEY_ECDSA_P384",
+        "encryption_context": encryption_context,
+        "encrypted_data_keys": [
+            {"key_provider": {"provider_id": _b64("aws-kms"), "key_info": _b64(key_id)}, "encrypted_data_key": ""}
+            for key_id in key_ids
+        ],
+    }
+
+
+@pytest.fixture
+def populated_catalog(tmpdir):
+    test = catalog.Catalog(str(tmpdir.join("catalog")))
+    test.record(str(tmpdir.join("a")), _header([KEY_A], {"team": "blue", "stage": "prod"}))
+    test.record(str(tmpdir.join("b")), _header([KEY_A, KEY_B], {"team": "red", "stage": "prod"}))
+    test.record(str(tmpdir.join("c")), _header([KEY_B], {"team": "blue"}))
+    return test
+
+
+@pytest.mark.parametrize(
+    "kwargs, expected",
+    (
+        ({}, ["a", "b", "c"]),
+        (dict(key_info=KEY_A), ["a", "b"]),
+        (dict(key_info=KEY_B.encode("utf-8")), ["b", "c"]),
+        (dict(key_info="unknown"), []),
+        (dict(encryption_context={"team": "blue"}), ["a", "c"]),
+        (dict(encryption_context={"team": "blue", "stage": "prod"}), ["a"]),
+        (dict(encryption_context_keys=["stage"]), ["a", "b"]),
+        (dict(key_info=KEY_B, encryption_context={"stage": "prod"}), ["b"]),
+        (dict(key_info=KEY_B, encryption_context_keys=["stage", "team"]), ["b"]),
+    ),
+)
+def test_find(tmpdir, populated_catalog, kwargs, expected):
+    assert populated_catalog.find(**kwargs) == [str(tmpdir.join(name)) for name in expected]
+
+
+def test_record_replaces(tmpdir, populated_catalog):
+    populated_catalog.record(str(tmpdir.join("a")), _header([KEY_B], {"team": "red"}))
+
+    assert populated_catalog.find(key_info=KEY_A) == [str(tmpdir.join("b"))]
+    assert populated_catalog.find(encryption_context={"team": "red"}) == [str(tmpdir.join("a")), str(tmpdir.join("b"))]
+
+
+def test_remove(tmpdir, populated_catalog):
+    populated_catalog.remove(str(tmpdir.join("b")))
+
+    assert populated_catalog.find() == [str(tmpdir.join("a")), str(tmpdir.join("c"))]
+    assert populated_catalog.find(key_info=KEY_A) == [str(tmpdir.join("a"))]
+
+
+def test_close_persists(tmpdir, populated_catalog):
+    populated_catalog.close()
+
+    assert catalog.Catalog(str(tmpdir.join("catalog"))).find(key_info=KEY_B) == [
+        str(tmpdir.join("b")),
+        str(tmpdir.join("c")),
+    ]
+
+
+def test_commit_interval(tmpdir, monkeypatch):
+    monkeypatch.setattr(catalog, "_COMMIT_INTERVAL", 2)
+    test = catalog.Catalog(str(tmpdir.join("catalog")))
+    test.record(str(tmpdir.join("a")), _header([KEY_A], {}))
+    test.record(str(tmpdir.join("b")), _header([KEY_A], {}))
+    test.record(str(tmpdir.join("c")), _header([KEY_A], {}))
+
+    # Only the first batch is visible to a second connection until the catalog is closed
+    assert catalog.Catalog(str(tmpdir.join("catalog"))).find() == [str(tmpdir.join("a")), str(tmpdir.join("b"))]
+
+
+def test_missing_parent_directory(tmpdir):
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        catalog.Catalog(str(tmpdir.join("missing", "catalog")))
+
+    excinfo.match(r"Parent directory for requested catalog file does not exist.")
+
+
+def test_not_a_catalog(tmpdir):
+    tmpdir.join("catalog").write(b"not a database" * 100)
+
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        catalog.Catalog(str(tmpdir.join("catalog"))).find()
+
+    excinfo.match(r'Unable to open catalog "')
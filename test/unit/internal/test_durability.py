@@ -0,0 +1,211 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.durability``."""
+import os
+import stat
+
+import pytest
+from mock import call
+from pytest_mock import mocker  # noqa pylint: disable=unused-import
+
+from aws_encryption_sdk_cli.internal import durability
+from aws_encryption_sdk_cli.internal.durability import AtomicOutput, Durability, OutputCommitter
+
+from ..unit_test_utils import WINDOWS_SKIP_MESSAGE, is_windows
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+
+@pytest.yield_fixture
+def patch_fsync(mocker):
+    mocker.patch.object(durability, "_fsync_path")
+    mocker.patch.object(durability, "_fsync_dir")
+    yield durability
+
+
+def _output(directory, name, data=b"some data"):
+    output = AtomicOutput(str(directory.join(name)))
+    output.write(data)
+    return output
+
+
+def test_atomic_output_rename(tmpdir):
+    destination = tmpdir.join("destination")
+
+    with AtomicOutput(str(destination)) as output:
+        output.write(b"some data")
+        assert not destination.check()
+        assert output.name == str(destination)
+    output.rename()
+
+    assert destination.read(mode="rb") == b"some data"
+    assert tmpdir.listdir() == [destination]
+
+
+def test_atomic_output_discard(tmpdir):
+    destination = tmpdir.join("destination")
+    destination.write(b"existing data")
+    output = AtomicOutput(str(destination), replace_existing=True)
+    output.write(b"partial")
+
+    output.discard()
+
+    assert destination.read(mode="rb") == b"existing data"
+    assert tmpdir.listdir() == [destination]
+
+
+@pytest.mark.skipif(is_windows(), reason=WINDOWS_SKIP_MESSAGE)
+def test_atomic_output_keeps_permissions(tmpdir):
+    destination = tmpdir.join("destination")
+    destination.write(b"existing data")
+    os.chmod(str(destination), 0o600)
+
+    output = AtomicOutput(str(destination), replace_existing=True)
+    output.close()
+    output.rename()
+
+    assert stat.S_IMODE(os.stat(str(destination)).st_mode) == 0o600
+
+
+@pytest.mark.parametrize("policy", (Durability.none, Durability.file))
+def test_commit_immediate(tmpdir, patch_fsync, policy):
+    output = _output(tmpdir, "a")
+
+    OutputCommitter(policy).commit(output)
+
+    assert output.closed
+    assert tmpdir.join("a").read(mode="rb") == b"some data"
+    if policy is Durability.file:
+        durability._fsync_path.assert_called_once_with(output.temp_name)
+        durability._fsync_dir.assert_called_once_with(str(tmpdir))
+    else:
+        assert not durability._fsync_path.called
+        assert not durability._fsync_dir.called
+
+
+def test_commit_batch(tmpdir, patch_fsync, monkeypatch):
+    monkeypatch.setattr(durability, "_BATCH_FILES", 3)
+    monkeypatch.setattr(durability, "_BATCH_SECONDS", 1000)
+    committer = OutputCommitter(Durability.batch)
+    nested = tmpdir.mkdir("nested")
+    outputs = [_output(tmpdir, "a"), _output(nested, "b")]
+
+    for output in outputs:
+        committer.commit(output)
+    assert not tmpdir.join("a").check()
+    assert not durability._fsync_path.called
+
+    committer.commit(_output(tmpdir, "c"))
+
+    assert tmpdir.join("a").check(file=True)
+    assert nested.join("b").check(file=True)
+    assert tmpdir.join("c").check(file=True)
+    assert durability._fsync_path.call_count == 3
+    durability._fsync_dir.assert_has_calls([call(str(tmpdir)), call(str(nested))])
+    assert durability._fsync_dir.call_count == 2
+
+
+def test_flush_batch(tmpdir, patch_fsync):
+    committer = OutputCommitter(Durability.batch)
+    committer.commit(_output(tmpdir, "a"))
+    assert not tmpdir.join("a").check()
+
+    committer.flush()
+    committer.flush()
+
+    assert tmpdir.join("a").read(mode="rb") == b"some data"
+    durability._fsync_dir.assert_called_once_with(str(tmpdir))
+
+
+@pytest.mark.parametrize("policy", (Durability.none, Durability.file))
+def test_commit_immediate_on_committed(tmpdir, patch_fsync, policy):
+    destination = tmpdir.join("a")
+    committed = []
+
+    OutputCommitter(policy).commit(_output(tmpdir, "a"), lambda: committed.append(destination.check(file=True)))
+
+    assert committed == [True]
+
+
+def test_commit_batch_on_committed(tmpdir, patch_fsync, monkeypatch):
+    monkeypatch.setattr(durability, "_BATCH_FILES", 2)
+    monkeypatch.setattr(durability, "_BATCH_SECONDS", 1000)
+    committer = OutputCommitter(Durability.batch)
+    committed = []
+
+    committer.commit(_output(tmpdir, "a"), lambda: committed.append(tmpdir.join("a").check(file=True)))
+    assert committed == []
+    committer.commit(_output(tmpdir, "b"))
+    assert committed == [True]
+
+    committer.commit(_output(tmpdir, "c"), lambda: committed.append(tmpdir.join("c").check(file=True)))
+    committer.flush()
+    assert committed == [True, True]
+
+
+def _wait_for_timer(committer):
+    timer = committer._timer
+    if timer is not None:
+        timer.join(5)
+    # The timer may already be flushing
+    with committer._lock:
+        pass
+
+
+def test_batch_flushed_by_timer(tmpdir, patch_fsync, monkeypatch):
+    monkeypatch.setattr(durability, "_BATCH_SECONDS", 0.01)
+    committer = OutputCommitter(Durability.batch)
+    committer.commit(_output(tmpdir, "a"))
+
+    _wait_for_timer(committer)
+
+    assert tmpdir.join("a").read(mode="rb") == b"some data"
+
+
+def test_batch_flushed_by_timer_defers_on_committed(tmpdir, patch_fsync, monkeypatch):
+    monkeypatch.setattr(durability, "_BATCH_SECONDS", 0.01)
+    committer = OutputCommitter(Durability.batch)
+    committed = []
+    committer.commit(_output(tmpdir, "a"), lambda: committed.append(tmpdir.join("a").check(file=True)))
+    _wait_for_timer(committer)
+    assert committed == []
+
+    committer.flush()
+
+    assert committed == [True]
+
+
+def test_batch_timer_error_raised_on_flush(tmpdir, patch_fsync, monkeypatch):
+    monkeypatch.setattr(durability, "_BATCH_SECONDS", 0.01)
+    durability._fsync_path.side_effect = OSError("disk failed")
+    committer = OutputCommitter(Durability.batch)
+    committer.commit(_output(tmpdir, "a"))
+    _wait_for_timer(committer)
+
+    with pytest.raises(OSError) as excinfo:
+        committer.flush()
+
+    excinfo.match(r"disk failed")
+    committer.flush()
+
+
+def test_durability_str():
+    assert [str(policy) for policy in Durability] == ["none", "file", "batch"]
+
+
+def test_fsync_path(tmpdir):
+    target = tmpdir.join("target")
+    target.write(b"some data")
+
+    durability._fsync_path(str(target))
+    durability._fsync_dir(str(tmpdir))
@@ -0,0 +1,156 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.inspection``."""
+import base64
+import io
+import json
+import os
+
+import aws_encryption_sdk
+import pytest
+from aws_encryption_sdk.identifiers import CommitmentPolicy
+from pytest_mock import mocker  # noqa pylint: disable=unused-import
+
+from aws_encryption_sdk_cli.exceptions import AWSEncryptionSDKCLIError
+from aws_encryption_sdk_cli.internal import inspection, io_handling, metadata
+from aws_encryption_sdk_cli.internal.catalog import Catalog
+
+from ..unit_test_utils import static_materials_manager
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+
+def _ciphertext(*key_ids):
+    ciphertext, _header = aws_encryption_sdk.EncryptionSDKClient().encrypt(
+        source=os.urandom(10000),
+        materials_manager=static_materials_manager(*key_ids),
+        encryption_context={"some": "context"},
+        frame_length=1024,
+    )
+    return ciphertext
+
+
+def _inspect(tmpdir, sources, jobs=1, recursive=False, decode_input=False, catalog=None):
+    metadata_output = tmpdir.join("metadata")
+    handler = io_handling.IOHandler(
+        metadata_writer=metadata.MetadataWriter()(str(metadata_output)),
+        interactive=False,
+        no_overwrite=False,
+        decode_input=decode_input,
+        encode_output=False,
+        required_encryption_context={},
+        required_encryption_context_keys=[],
+        commitment_policy=CommitmentPolicy.REQUIRE_ENCRYPT_REQUIRE_DECRYPT,
+    )
+    try:
+        inspection.inspect_headers(handler, [str(source) for source in sources], recursive, jobs, catalog)
+    finally:
+        records = [json.loads(line) for line in metadata_output.readlines()] if metadata_output.check() else []
+    return records
+
+
+def _key_infos(record):
+    return sorted(
+        base64.b64decode(data_key["key_provider"]["key_info"])[:5]
+        for data_key in record["header"]["encrypted_data_keys"]
+    )
+
+
+def test_inspect(tmpdir):
+    source = tmpdir.join("source")
+    ciphertext = _ciphertext("key-1", "key-2")
+    # The body is never read, so it is not authenticated
+    source.write_binary(ciphertext[:-100] + b"\x00" * 100)
+
+    records = _inspect(tmpdir, [source])
+
+    assert len(records) == 1
+    assert records[0]["mode"] == "inspect"
+    assert records[0]["input"] == str(source)
+    assert records[0]["header"]["encryption_context"]["some"] == "context"
+    assert _key_infos(records[0]) == [b"key-1", b"key-2"]
+    assert "error" not in records[0]
+
+
+def test_inspect_decode_input(tmpdir):
+    source = tmpdir.join("source")
+    source.write_binary(base64.b64encode(_ciphertext("key-1")))
+
+    records = _inspect(tmpdir, [source], decode_input=True)
+
+    assert _key_infos(records[0]) == [b"key-1"]
+
+
+def test_inspect_not_a_message(tmpdir):
+    good = tmpdir.join("good")
+    good.write_binary(_ciphertext("key-1"))
+    bad = tmpdir.join("bad")
+    bad.write_binary(b"not a message")
+
+    with pytest.raises(AWSEncryptionSDKCLIError) as excinfo:
+        _inspect(tmpdir, [bad, good])
+
+    excinfo.match(r"Unable to read the message header of 1 of 2 files")
+    records = [json.loads(line) for line in tmpdir.join("metadata").readlines()]
+    assert [record["input"] for record in records] == [str(bad), str(good)]
+    assert records[0]["error"]
+    assert "header" not in records[0]
+    assert "error" not in records[1]
+
+
+def test_inspect_directory_jobs(tmpdir):
+    source = tmpdir.mkdir("source")
+    nested = source.mkdir("nested")
+    paths = []
+    for directory, name in ((source, "a"), (source, "b"), (nested, "c")):
+        directory.join(name).write_binary(_ciphertext("key-" + name))
+        paths.append(str(directory.join(name)))
+
+    records = _inspect(tmpdir, [source], jobs=2, recursive=True)
+
+    assert sorted(record["input"] for record in records) == paths
+    assert sorted(_key_infos(record)[0] for record in records) == [b"key-a", b"key-b", b"key-c"]
+
+
+def test_inspect_stdin(tmpdir, mocker):
+    mocker.patch.object(inspection, "_stdin", return_value=io.BytesIO(_ciphertext("key-1")))
+
+    records = _inspect(tmpdir, ["-"])
+
+    assert records[0]["input"] == "-"
+    assert _key_infos(records[0]) == [b"key-1"]
+
+
+def test_inspect_catalog(tmpdir):
+    source = tmpdir.mkdir("source")
+    source.join("a").write_binary(_ciphertext("key-1"))
+    source.join("b").write_binary(_ciphertext("key-1", "key-2"))
+    source.join("c").write_binary(b"not a message")
+    catalog = Catalog(str(tmpdir.join("catalog")))
+
+    with pytest.raises(AWSEncryptionSDKCLIError):
+        _inspect(tmpdir, [source], jobs=2, recursive=True, catalog=catalog)
+    records = [json.loads(line) for line in tmpdir.join("metadata").readlines()]
+
+    assert catalog.find(encryption_context={"some": "context"}) == [str(source.join("a")), str(source.join("b"))]
+    for record in (record for record in records if "header" in record):
+        for data_key in record["header"]["encrypted_data_keys"]:
+            key_info = base64.b64decode(data_key["key_provider"]["key_info"])
+            assert catalog.find(key_info=key_info) == [record["input"]]
+
+    # A file that is no longer a message is removed from the catalog
+    source.join("a").write_binary(b"not a message")
+    with pytest.raises(AWSEncryptionSDKCLIError):
+        _inspect(tmpdir, [source.join("a")], catalog=catalog)
+
+    assert catalog.find() == [str(source.join("b"))]
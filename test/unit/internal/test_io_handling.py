@@ -13,18 +13,29 @@
 """Unit test suite for ``aws_encryption_sdk_cli.internal.io_handling``."""
 import base64
 import io
+import json
 import os
+import sqlite3
 import sys
 
+import aws_encryption_sdk
 import pytest
 import six
+from aws_encryption_sdk.identifiers import Algorithm
 from aws_encryption_sdk.materials_managers import CommitmentPolicy
-from mock import MagicMock, patch, sentinel
+from mock import ANY, MagicMock, patch, sentinel
 from pytest_mock import mocker  # noqa pylint: disable=unused-import
 
-from aws_encryption_sdk_cli.internal import identifiers, io_handling, metadata
+from aws_encryption_sdk_cli.internal import identifiers, io_handling, metadata, rewrap
+from aws_encryption_sdk_cli.internal.durability import AtomicOutput, Durability
+from aws_encryption_sdk_cli.internal.journal import Journal
+from aws_encryption_sdk_cli.internal.profiling import MemoryProfiler
+from aws_encryption_sdk_cli.internal.state_index import StateIndex
+from aws_encryption_sdk_cli.internal.stats import RunStatistics
+from aws_encryption_sdk_cli.internal.tracing import JsonLinesTracer
+from aws_encryption_sdk_cli.internal.traversal import SourceFilter
 
-from ..unit_test_utils import WINDOWS_SKIP_MESSAGE, is_windows
+from ..unit_test_utils import WINDOWS_SKIP_MESSAGE, StaticRawMasterKeyProvider, is_windows, static_materials_manager
 
 pytestmark = [pytest.mark.unit, pytest.mark.local]
 DATA = b"aosidhjf9aiwhj3f98wiaj49c8a3hj49f8uwa0edifja9w843hj98"
@@ -76,6 +87,12 @@ def patch_process_single_operation(mocker):
     yield io_handling.IOHandler.process_single_operation
 
 
+@pytest.fixture
+def patch_process_single_file(mocker):
+    mocker.patch.object(io_handling.IOHandler, "process_single_file")
+    return io_handling.IOHandler.process_single_file
+
+
 @pytest.yield_fixture
 def patch_should_write_file(mocker):
     mocker.patch.object(io_handling.IOHandler, "_should_write_file")
@@ -89,6 +106,13 @@ def patch_json_ready_header(mocker):
     return io_handling.json_ready_header
 
 
+@pytest.fixture
+def patch_ciphertext_length(mocker):
+    mocker.patch.object(io_handling, "ciphertext_length")
+    io_handling.ciphertext_length.return_value = 0
+    return io_handling.ciphertext_length
+
+
 @pytest.fixture
 def patch_json_ready_header_auth(mocker):
     mocker.patch.object(io_handling, "json_ready_header_auth")
@@ -173,6 +197,31 @@ def test_encoder(mocker, should_base64):
         assert test is sentinel.stream
 
 
+def test_preallocate(tmpdir, mocker):
+    mocker.patch.object(io_handling.os, "posix_fallocate", create=True)
+    target = tmpdir.join("target")
+    with open(str(target), "wb") as destination:
+        destination.write(b"12345")
+        test = io_handling._preallocate(destination, 1000)
+
+        io_handling.os.posix_fallocate.assert_called_once_with(destination.fileno(), 5, 1000)
+    assert test
+
+
+@pytest.mark.parametrize("error", (OSError, io.UnsupportedOperation))
+def test_preallocate_unsupported(mocker, error):
+    mocker.patch.object(io_handling.os, "posix_fallocate", create=True)
+    io_handling.os.posix_fallocate.side_effect = error
+
+    assert not io_handling._preallocate(MagicMock(), 1000)
+
+
+def test_preallocate_not_available(mocker):
+    mocker.patch.object(io_handling, "os", MagicMock(spec=[]))
+
+    assert not io_handling._preallocate(MagicMock(), 1000)
+
+
 def test_iohandler_attrs_good():
     io_handling.IOHandler(**GOOD_IOHANDLER_KWARGS)
 
@@ -216,14 +265,15 @@ def test_single_io_write_stream_encrypt(
     patch_aws_encryption_sdk_stream.assert_called_once_with(
         mode="encrypt", source=mock_source.__enter__.return_value, a=sentinel.a, b=sentinel.b
     )
+    write_metadata = standard_handler.metadata_writer.__enter__.return_value.write_metadata
+    write_metadata.assert_called_once_with(
+        mode="encrypt", input=mock_source.name, output=destination_writer.name, header=ANY
+    )
+    # The header is only made JSON-ready when the record is written out
+    assert not patch_json_ready_header.called
+    assert write_metadata.call_args[1]["header"].resolve() is patch_json_ready_header.return_value
     patch_json_ready_header.assert_called_once_with(patch_aws_encryption_sdk_stream.return_value.header)
     assert not patch_json_ready_header_auth.called
-    standard_handler.metadata_writer.__enter__.return_value.write_metadata.assert_called_once_with(
-        mode="encrypt",
-        input=mock_source.name,
-        output=destination_writer.name,
-        header=patch_json_ready_header.return_value,
-    )
     assert target_file.read("rb") == DATA
 
 
@@ -242,14 +292,13 @@ def test_single_io_write_stream_decrypt(
             source=mock_source,
             destination_writer=destination_writer,
         )
-    patch_json_ready_header_auth.assert_called_once_with(patch_aws_encryption_sdk_stream.return_value.header_auth)
-    standard_handler.metadata_writer.__enter__.return_value.write_metadata.assert_called_once_with(
-        mode="decrypt",
-        input=mock_source.name,
-        output=destination_writer.name,
-        header=patch_json_ready_header.return_value,
-        header_auth=patch_json_ready_header_auth.return_value,
+    write_metadata = standard_handler.metadata_writer.__enter__.return_value.write_metadata
+    write_metadata.assert_called_once_with(
+        mode="decrypt", input=mock_source.name, output=destination_writer.name, header=ANY, header_auth=ANY
     )
+    assert write_metadata.call_args[1]["header"].resolve() is patch_json_ready_header.return_value
+    assert write_metadata.call_args[1]["header_auth"].resolve() is patch_json_ready_header_auth.return_value
+    patch_json_ready_header_auth.assert_called_once_with(patch_aws_encryption_sdk_stream.return_value.header_auth)
 
 
 def test_single_io_write_stream_encode_output(
@@ -272,6 +321,517 @@ def test_single_io_write_stream_encode_output(
     assert target_file.read("rb") == base64.b64encode(DATA)
 
 
+@pytest.mark.functional
+@pytest.mark.parametrize("encode_output", (True, False))
+def test_f_process_single_file_preallocates_encrypt_output(tmpdir, mocker, encode_output):
+    mocker.spy(io_handling, "_preallocate")
+    source = tmpdir.join("source")
+    source.write_binary(DATA * 100)
+    destination = tmpdir.join("destination")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs["encode_output"] = encode_output
+    handler = io_handling.IOHandler(**kwargs)
+
+    handler.process_single_file(
+        stream_args=dict(mode="encrypt", materials_manager=static_materials_manager(), frame_length=1024),
+        source=str(source),
+        destination=str(destination),
+    )
+
+    preallocated_length = io_handling._preallocate.call_args[0][1]
+    assert preallocated_length == len(destination.read_binary())
+
+
+@pytest.mark.functional
+def test_f_process_single_file_state_index(tmpdir, mocker):
+    source = tmpdir.join("source")
+    source.write_binary(DATA)
+    destination = tmpdir.join("destination")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs["state_index"] = StateIndex(str(tmpdir.join("state.db")))
+    handler = io_handling.IOHandler(**kwargs)
+    stream_args = dict(mode="encrypt", materials_manager=static_materials_manager())
+
+    handler.process_single_file(stream_args=stream_args, source=str(source), destination=str(destination))
+    mocker.spy(handler, "process_single_operation")
+    handler.process_single_file(stream_args=stream_args, source=str(source), destination=str(destination))
+
+    assert destination.check()
+    assert not handler.process_single_operation.called
+
+    source.write_binary(DATA * 2)
+    handler.process_single_file(stream_args=stream_args, source=str(source), destination=str(destination))
+
+    assert handler.process_single_operation.call_count == 1
+
+
+@pytest.mark.functional
+def test_f_process_single_file_state_index_batch_durability(tmpdir):
+    source = tmpdir.join("source")
+    source.write_binary(DATA)
+    destination = tmpdir.join("destination")
+    index = StateIndex(str(tmpdir.join("state.db")))
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs.update(dict(state_index=index, durability=Durability.batch))
+    handler = io_handling.IOHandler(**kwargs)
+
+    handler.process_single_file(
+        stream_args=dict(mode="encrypt", materials_manager=static_materials_manager()),
+        source=str(source),
+        destination=str(destination),
+    )
+
+    # The output is still held for the batch, so it must not be recorded yet
+    assert not destination.check()
+    assert not index.is_unchanged(str(source), os.stat(str(source)), str(destination), "encrypt")
+
+    handler.flush()
+
+    assert destination.check()
+    assert index.is_unchanged(str(source), os.stat(str(source)), str(destination), "encrypt")
+
+
+@pytest.mark.functional
+def test_f_process_single_file_state_index_no_overwrite(tmpdir, mocker):
+    source = tmpdir.join("source")
+    source.write_binary(DATA)
+    destination = tmpdir.join("destination")
+    destination.write_binary(b"existing")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs.update(dict(state_index=StateIndex(str(tmpdir.join("state.db"))), no_overwrite=True))
+    handler = io_handling.IOHandler(**kwargs)
+    stream_args = dict(mode="encrypt", materials_manager=static_materials_manager())
+
+    handler.process_single_file(stream_args=stream_args, source=str(source), destination=str(destination))
+
+    assert destination.read_binary() == b"existing"
+
+    # Skipped outputs are not recorded, so they are processed once overwriting is allowed
+    handler.no_overwrite = False
+    mocker.spy(handler, "process_single_operation")
+    handler.process_single_file(stream_args=stream_args, source=str(source), destination=str(destination))
+
+    assert handler.process_single_operation.call_count == 1
+    assert destination.read_binary() != b"existing"
+
+
+@pytest.mark.functional
+def test_f_process_single_file_failure_recorded_in_database(tmpdir, mocker):
+    source = tmpdir.join("source")
+    source.write_binary(DATA)
+    database = tmpdir.join("metadata.db")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs["metadata_writer"] = metadata.MetadataWriter(False)("sqlite:" + str(database))
+    handler = io_handling.IOHandler(**kwargs)
+    mocker.patch.object(handler, "_write_body", side_effect=IOError("disk full"))
+
+    with handler.metadata_writer:
+        with pytest.raises(IOError):
+            handler.process_single_file(
+                stream_args=dict(mode="encrypt", materials_manager=static_materials_manager()),
+                source=str(source),
+                destination=str(tmpdir.join("destination")),
+            )
+
+    connection = sqlite3.connect(str(database))
+    try:
+        assert connection.execute("SELECT result FROM metadata").fetchall() == [("failed",)]
+    finally:
+        connection.close()
+
+
+@pytest.mark.functional
+def test_f_process_dir_sync(tmpdir, mocker):
+    source = tmpdir.mkdir("source")
+    source.join("unchanged").write_binary(DATA)
+    source.join("renamed").write_binary(DATA)
+    source.mkdir("nested").join("deleted").write_binary(DATA)
+    destination = tmpdir.mkdir("destination")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs.update(dict(state_index=StateIndex(str(tmpdir.join("state.db"))), sync=True))
+    handler = io_handling.IOHandler(**kwargs)
+    stream_args = dict(mode="encrypt", materials_manager=static_materials_manager())
+    handler.process_dir(stream_args=stream_args, source=str(source), destination=str(destination), suffix=None)
+    renamed_ciphertext = destination.join("renamed.encrypted").read_binary()
+
+    source.join("renamed").rename(source.join("new-name"))
+    source.join("nested", "deleted").remove()
+    source.join("added").write_binary(DATA)
+    mocker.spy(handler, "process_single_operation")
+    handler.process_dir(stream_args=stream_args, source=str(source), destination=str(destination), suffix=None)
+
+    assert handler.process_single_operation.call_count == 1
+    assert sorted(path.basename for path in destination.listdir()) == [
+        "added.encrypted",
+        "new-name.encrypted",
+        "unchanged.encrypted",
+    ]
+    assert destination.join("new-name.encrypted").read_binary() == renamed_ciphertext
+
+
+@pytest.mark.functional
+def test_f_process_single_file_resume_no_overwrite(tmpdir, mocker):
+    source = tmpdir.join("source")
+    source.write_binary(DATA)
+    destination = tmpdir.join("destination")
+    destination.write_binary(b"existing")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs.update(dict(journal=Journal(str(tmpdir.join("journal"))), no_overwrite=True))
+    handler = io_handling.IOHandler(**kwargs)
+    stream_args = dict(mode="encrypt", materials_manager=static_materials_manager())
+
+    handler.process_single_file(stream_args=stream_args, source=str(source), destination=str(destination))
+    handler.close()
+
+    assert destination.read_binary() == b"existing"
+
+    # Skipped outputs are not journaled, so they are processed once overwriting is allowed
+    kwargs.update(dict(journal=Journal(str(tmpdir.join("journal"))), no_overwrite=False))
+    resumed = io_handling.IOHandler(**kwargs)
+    mocker.spy(resumed, "process_single_operation")
+    resumed.process_single_file(stream_args=stream_args, source=str(source), destination=str(destination))
+
+    assert resumed.process_single_operation.call_count == 1
+    assert destination.read_binary() != b"existing"
+
+
+def test_close_after_commit_failure(tmpdir, mocker):
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs.update(
+        dict(state_index=StateIndex(str(tmpdir.join("state.db"))), journal=Journal(str(tmpdir.join("journal"))))
+    )
+    handler = io_handling.IOHandler(**kwargs)
+    mocker.patch.object(handler._committer, "flush", side_effect=OSError("disk failed"))
+    mocker.spy(handler.state_index, "close")
+    mocker.spy(handler.journal, "close")
+
+    with pytest.raises(OSError) as excinfo:
+        handler.close()
+
+    excinfo.match(r"disk failed")
+    handler.state_index.close.assert_called_once_with()
+    handler.journal.close.assert_called_once_with()
+
+
+@pytest.mark.functional
+@pytest.mark.parametrize("encode_output", (True, False))
+def test_f_process_single_file_resume(tmpdir, mocker, encode_output):
+    source = tmpdir.join("source")
+    source.write_binary(DATA * 100)
+    destination = tmpdir.join("destination")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs.update(dict(encode_output=encode_output, journal=Journal(str(tmpdir.join("journal")))))
+    handler = io_handling.IOHandler(**kwargs)
+    stream_args = dict(mode="encrypt", materials_manager=static_materials_manager(), frame_length=1024)
+    handler.process_single_file(stream_args=stream_args, source=str(source), destination=str(destination))
+    handler.close()
+
+    kwargs["journal"] = Journal(str(tmpdir.join("journal")))
+    resumed = io_handling.IOHandler(**kwargs)
+    mocker.spy(resumed, "process_single_operation")
+    resumed.process_single_file(stream_args=stream_args, source=str(source), destination=str(destination))
+
+    assert not resumed.process_single_operation.called
+
+    destination.write_binary(b"truncated")
+    resumed.process_single_file(stream_args=stream_args, source=str(source), destination=str(destination))
+
+    assert resumed.process_single_operation.call_count == 1
+
+
+def _encrypted_source(tmpdir, encryption_context, **kwargs):
+    source = tmpdir.join("source")
+    ciphertext, _header = aws_encryption_sdk.EncryptionSDKClient().encrypt(
+        source=DATA * 100,
+        materials_manager=static_materials_manager("old-key"),
+        encryption_context=encryption_context,
+        frame_length=1024,
+        **kwargs
+    )
+    source.write_binary(ciphertext)
+    return source
+
+
+@pytest.mark.functional
+@pytest.mark.parametrize("mode", ("encrypt", "decrypt"))
+@pytest.mark.parametrize("encode_output", (True, False))
+def test_f_process_single_file_timing(tmpdir, mode, encode_output):
+    if mode == "encrypt":
+        source = tmpdir.join("source")
+        source.write_binary(DATA * 100)
+    else:
+        source = _encrypted_source(tmpdir, {})
+    destination = tmpdir.join("destination")
+    metadata_output = tmpdir.join("metadata")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs.update(
+        dict(encode_output=encode_output, metadata_writer=metadata.MetadataWriter()(str(metadata_output)), timing=True)
+    )
+    handler = io_handling.IOHandler(**kwargs)
+
+    stream_args = dict(mode=mode, materials_manager=static_materials_manager("old-key"))
+    if mode == "encrypt":
+        stream_args["frame_length"] = 1024
+
+    handler.process_single_file(stream_args=stream_args, source=str(source), destination=str(destination))
+
+    timing = json.loads(metadata_output.read())["timing"]
+    assert timing["input_bytes"] == source.size()
+    assert timing["output_bytes"] == destination.size()
+    # 5300 bytes of plaintext in 1024 byte frames
+    assert timing["frames"] == 6
+    assert 0 <= timing["header_seconds"] <= timing["first_byte_seconds"] <= timing["duration_seconds"]
+
+
+@pytest.mark.functional
+def test_f_process_single_file_timing_failure(tmpdir):
+    source = _encrypted_source(tmpdir, {})
+    source.write_binary(source.read_binary()[:-200])
+    metadata_output = tmpdir.join("metadata")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs.update(dict(metadata_writer=metadata.MetadataWriter()(str(metadata_output)), timing=True))
+    handler = io_handling.IOHandler(**kwargs)
+
+    with pytest.raises(Exception):
+        handler.process_single_file(
+            stream_args=dict(mode="decrypt", materials_manager=static_materials_manager("old-key")),
+            source=str(source),
+            destination=str(tmpdir.join("destination")),
+        )
+
+    # The record of a failed operation is still written, with the timing up to the failure
+    record = json.loads(metadata_output.read())
+    assert record["mode"] == "decrypt"
+    assert record["timing"]["frames"] < 6
+    assert not tmpdir.join("destination").check()
+
+
+@pytest.mark.functional
+def test_f_process_single_file_statistics(tmpdir):
+    source = tmpdir.join("source")
+    source.write_binary(DATA * 100)
+    destination = tmpdir.join("destination")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs.update(dict(no_overwrite=True, statistics=RunStatistics()))
+    handler = io_handling.IOHandler(**kwargs)
+    stream_args = dict(mode="encrypt", materials_manager=static_materials_manager("old-key"))
+
+    handler.process_single_file(stream_args=stream_args, source=str(source), destination=str(destination))
+    # The destination now exists, so the second operation is skipped
+    handler.process_single_file(stream_args=stream_args, source=str(source), destination=str(destination))
+
+    test = handler.statistics.summary()
+    assert test["operations"] == dict(succeeded=1, skipped=1, failed=0, total=2)
+    assert test["input_bytes"] == source.size()
+    assert test["output_bytes"] == destination.size()
+    assert test["errors"] == {}
+
+
+@pytest.mark.functional
+def test_f_process_single_file_traced(tmpdir):
+    source = tmpdir.join("source")
+    source.write_binary(DATA * 100)
+    destination = tmpdir.join("destination")
+    trace = tmpdir.join("trace.jsonl")
+    metadata_output = tmpdir.join("metadata")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs["metadata_writer"] = metadata.MetadataWriter()(str(metadata_output))
+    handler = io_handling.IOHandler(**kwargs)
+
+    with JsonLinesTracer(str(trace)), handler.metadata_writer:
+        handler.process_single_file(
+            stream_args=dict(mode="encrypt", materials_manager=static_materials_manager("old-key")),
+            source=str(source),
+            destination=str(destination),
+        )
+
+    spans = {span["name"]: span for span in (json.loads(line) for line in trace.readlines())}
+    operation = spans["operation"]
+    assert operation["args"] == dict(input=str(source), output=str(destination))
+    assert operation["parent"] == spans["run"]["id"]
+    for name in ("header", "body", "metadata"):
+        assert spans[name]["parent"] == operation["id"]
+    # Records are written by the background writer
+    assert spans["metadata_write"]["parent"] == spans["run"]["id"]
+    assert spans["metadata_write"]["args"] == dict(input=str(source))
+
+
+@pytest.mark.functional
+def test_f_process_single_file_statistics_error(tmpdir):
+    source = _encrypted_source(tmpdir, {})
+    source.write_binary(source.read_binary()[:-200])
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs["statistics"] = RunStatistics()
+    handler = io_handling.IOHandler(**kwargs)
+
+    with pytest.raises(Exception) as excinfo:
+        handler.process_single_file(
+            stream_args=dict(mode="decrypt", materials_manager=static_materials_manager("old-key")),
+            source=str(source),
+            destination=str(tmpdir.join("destination")),
+        )
+
+    test = handler.statistics.summary()
+    assert test["operations"]["failed"] == 1
+    assert test["errors"] == {excinfo.type.__name__: 1}
+
+
+@pytest.mark.functional
+def test_f_process_single_file_memory_profile(tmpdir):
+    source = tmpdir.join("source")
+    source.write_binary(DATA * 100)
+    destination = tmpdir.join("destination")
+    profile = tmpdir.join("profile")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs["profiler"] = MemoryProfiler(str(profile))
+    handler = io_handling.IOHandler(**kwargs)
+
+    with handler.profiler:
+        handler.process_single_file(
+            stream_args=dict(mode="encrypt", materials_manager=static_materials_manager("old-key")),
+            source=str(source),
+            destination=str(destination),
+        )
+
+    operation = json.loads(profile.read())["operations"][0]
+    assert (operation["mode"], operation["input"], operation["output"]) == ("encrypt", str(source), str(destination))
+    assert operation["peak_bytes"] > 0
+
+
+@pytest.mark.functional
+@pytest.mark.parametrize("encode_output", (True, False))
+def test_f_process_single_file_reencrypt(tmpdir, encode_output):
+    source = _encrypted_source(tmpdir, {"some": "context"})
+    destination = tmpdir.join("destination")
+    metadata_output = tmpdir.join("metadata")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs.update(dict(encode_output=encode_output, metadata_writer=metadata.MetadataWriter()(str(metadata_output))))
+    handler = io_handling.IOHandler(**kwargs)
+
+    handler.process_single_file(
+        stream_args=dict(
+            mode="reencrypt",
+            materials_manager=static_materials_manager("old-key"),
+            reencrypt_args=dict(materials_manager=static_materials_manager("new-key")),
+        ),
+        source=str(source),
+        destination=str(destination),
+    )
+
+    ciphertext = destination.read_binary()
+    if encode_output:
+        ciphertext = base64.b64decode(ciphertext)
+    plaintext, header = aws_encryption_sdk.EncryptionSDKClient().decrypt(
+        source=ciphertext, materials_manager=static_materials_manager("new-key")
+    )
+    assert plaintext == DATA * 100
+    assert header.encryption_context["some"] == "context"
+    assert [key.key_provider.key_info[:7] for key in header.encrypted_data_keys] == [b"new-key"]
+    record = json.loads(metadata_output.read())
+    assert record["mode"] == "reencrypt"
+    assert record["header"]["message_id"] == metadata.unicode_b64_encode(header.message_id)
+    assert record["source_header"]["message_id"] != record["header"]["message_id"]
+
+
+@pytest.mark.functional
+def test_f_process_single_file_reencrypt_missing_required_context(tmpdir):
+    source = _encrypted_source(tmpdir, {"some": "context"})
+    destination = tmpdir.join("destination")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs["required_encryption_context"] = {"other": "context"}
+    handler = io_handling.IOHandler(**kwargs)
+
+    handler.process_single_file(
+        stream_args=dict(
+            mode="reencrypt",
+            materials_manager=static_materials_manager("old-key"),
+            reencrypt_args=dict(materials_manager=static_materials_manager("new-key")),
+        ),
+        source=str(source),
+        destination=str(destination),
+    )
+
+    assert not destination.check()
+
+
+@pytest.mark.functional
+@pytest.mark.parametrize("encode_output", (True, False))
+def test_f_process_single_file_rewrap(tmpdir, mocker, encode_output):
+    mocker.spy(rewrap, "_copy_file_range")
+    source = _encrypted_source(tmpdir, {"some": "context"}, algorithm=Algorithm.AES_256_GCM_HKDF_SHA512_COMMIT_KEY)
+    destination = tmpdir.join("destination")
+    metadata_output = tmpdir.join("metadata")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs.update(dict(encode_output=encode_output, metadata_writer=metadata.MetadataWriter()(str(metadata_output))))
+    handler = io_handling.IOHandler(**kwargs)
+    key_provider = StaticRawMasterKeyProvider()
+    key_provider.add_master_key("new-key")
+
+    handler.process_single_file(
+        stream_args=dict(
+            mode="rewrap", materials_manager=static_materials_manager("old-key"), key_provider=key_provider
+        ),
+        source=str(source),
+        destination=str(destination),
+    )
+
+    ciphertext = destination.read_binary()
+    if encode_output:
+        ciphertext = base64.b64decode(ciphertext)
+    plaintext, header = aws_encryption_sdk.EncryptionSDKClient().decrypt(
+        source=ciphertext, materials_manager=static_materials_manager("new-key")
+    )
+    assert plaintext == DATA * 100
+    assert [key.key_provider.key_info[:7] for key in header.encrypted_data_keys] == [b"new-key"]
+    assert rewrap._copy_file_range.called is not encode_output
+    record = json.loads(metadata_output.read())
+    assert record["mode"] == "rewrap"
+    assert record["source_header"]["message_id"] == record["header"]["message_id"]
+
+
+@pytest.mark.functional
+def test_f_process_single_file_rewrap_missing_required_context(tmpdir):
+    source = _encrypted_source(tmpdir, {"some": "context"})
+    destination = tmpdir.join("destination")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs["required_encryption_context"] = {"other": "context"}
+    handler = io_handling.IOHandler(**kwargs)
+    materials_manager = MagicMock()
+
+    handler.process_single_file(
+        stream_args=dict(mode="rewrap", materials_manager=materials_manager, key_provider=sentinel.key_provider),
+        source=str(source),
+        destination=str(destination),
+    )
+
+    assert not destination.check()
+    assert not materials_manager.decrypt_materials.called
+
+
+def test_deleted_outputs_ignores_other_destinations(tmpdir):
+    state_index = StateIndex(str(tmpdir.join("state.db")))
+    source = tmpdir.mkdir("source")
+    for name, destination in (("a", "destination"), ("b", "other-destination"), ("c", "destination")):
+        source.join(name).write(b"data")
+        state_index.record(
+            str(source.join(name)),
+            os.stat(str(source.join(name))),
+            str(tmpdir.join(destination, name)),
+            "encrypt",
+            "message-id",
+        )
+    source.join("a").remove()
+    source.join("b").remove()
+
+    test = list(
+        io_handling.deleted_outputs(
+            state_index, str(source), str(tmpdir.join("destination")), "encrypt", {str(source.join("c"))}
+        )
+    )
+
+    assert test == [(str(source.join("a")), str(tmpdir.join("destination", "a")))]
+
+
 def test_process_single_operation_stdout(patch_for_process_single_operation, patch_should_write_file, standard_handler):
     standard_handler.process_single_operation(stream_args=sentinel.stream_args, source=sentinel.source, destination="-")
     io_handling.IOHandler._single_io_write.assert_called_once_with(
@@ -294,15 +854,46 @@ def test_process_single_operation_stdin_stdout(
 def test_process_single_operation_file(
     tmpdir, patch_for_process_single_operation, patch_should_write_file, standard_handler
 ):
+    io_handling.IOHandler._single_io_write.return_value = identifiers.OperationResult.SUCCESS
     destination = tmpdir.join("destination")
     with tmpdir.as_cwd():
-        with patch("aws_encryption_sdk_cli.internal.io_handling.open", create=True) as mock_open:
-            standard_handler.process_single_operation(
-                stream_args=sentinel.stream_args, source=sentinel.source, destination="destination"
-            )
+        standard_handler.process_single_operation(
+            stream_args=sentinel.stream_args, source=sentinel.source, destination="destination"
+        )
     io_handling._ensure_dir_exists.assert_called_once_with("destination")
-    patch_should_write_file.assert_called_once_with("destination")
-    mock_open.assert_called_once_with(str(destination), "wb")
+    patch_should_write_file.assert_called_once_with("destination", file_exists=None)
+    writer = io_handling.IOHandler._single_io_write.call_args[1]["destination_writer"]
+    assert isinstance(writer, AtomicOutput)
+    assert writer.name == "destination"
+    assert destination.check(file=True)
+    assert tmpdir.listdir() == [destination]
+
+
+@pytest.mark.parametrize("result", (identifiers.OperationResult.FAILED, identifiers.OperationResult.FAILED_VALIDATION))
+def test_process_single_operation_file_failure_keeps_existing(
+    tmpdir, patch_for_process_single_operation, patch_should_write_file, standard_handler, result
+):
+    io_handling.IOHandler._single_io_write.return_value = result
+    destination = tmpdir.join("destination")
+    destination.write(b"existing data")
+
+    standard_handler.process_single_operation(
+        stream_args=sentinel.stream_args, source=sentinel.source, destination=str(destination), destination_exists=True
+    )
+
+    assert destination.read(mode="rb") == b"existing data"
+    assert tmpdir.listdir() == [destination]
+
+
+def test_process_single_operation_special_file(
+    patch_for_process_single_operation, patch_should_write_file, standard_handler
+):
+    with patch("aws_encryption_sdk_cli.internal.io_handling.open", create=True) as mock_open:
+        standard_handler.process_single_operation(
+            stream_args=sentinel.stream_args, source=sentinel.source, destination=os.devnull
+        )
+
+    mock_open.assert_called_once_with(os.devnull, "wb")
     io_handling.IOHandler._single_io_write.assert_called_once_with(
         stream_args=sentinel.stream_args, source=sentinel.source, destination_writer=mock_open.return_value
     )
@@ -321,6 +912,36 @@ def test_process_single_operation_file_should_not_write(
     assert not io_handling._stdout.called
 
 
+def test_process_single_operation_batch_durability(tmpdir, patch_for_process_single_operation, patch_should_write_file):
+    io_handling.IOHandler._single_io_write.return_value = identifiers.OperationResult.SUCCESS
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs["durability"] = Durability.batch
+    handler = io_handling.IOHandler(**kwargs)
+    destination = tmpdir.join("destination")
+
+    handler.process_single_operation(
+        stream_args=sentinel.stream_args, source=sentinel.source, destination=str(destination)
+    )
+    assert not destination.check()
+
+    handler.flush()
+    assert destination.check(file=True)
+
+
+def test_process_single_operation_creates_each_directory_once(
+    tmpdir, patch_for_process_single_operation, patch_should_write_file, standard_handler
+):
+    with patch("aws_encryption_sdk_cli.internal.io_handling.AtomicOutput"):
+        for name in ("a", "b"):
+            standard_handler.process_single_operation(
+                stream_args=sentinel.stream_args,
+                source=sentinel.source,
+                destination=os.path.join(str(tmpdir), "dir", name),
+            )
+
+    io_handling._ensure_dir_exists.assert_called_once_with(os.path.join(str(tmpdir), "dir", "a"))
+
+
 @pytest.mark.functional
 @pytest.mark.parametrize("interactive, no_overwrite", ((False, False), (False, True), (True, False), (True, True)))
 def test_f_should_write_file_does_not_exist(tmpdir, interactive, no_overwrite):
@@ -392,7 +1013,35 @@ def test_process_single_file(
         handler.process_single_file(stream_args=initial_kwargs, source=str(source), destination=str(destination))
     mock_open.assert_called_once_with(str(source), "rb")
     patch_process_single_operation.assert_called_once_with(
-        stream_args=updated_kwargs, source=mock_open.return_value.__enter__.return_value, destination=str(destination)
+        stream_args=updated_kwargs,
+        source=mock_open.return_value.__enter__.return_value,
+        destination=str(destination),
+        destination_exists=False,
+        on_committed=None,
+    )
+
+
+def test_process_single_file_reuses_source_stat(tmpdir, mocker, patch_process_single_operation, standard_handler):
+    patch_process_single_operation.return_value = identifiers.OperationResult.SUCCESS
+    source = tmpdir.join("source")
+    source.write("some data")
+    destination = tmpdir.join("destination")
+    destination.write("existing data")
+    source_stat = os.stat(str(source))
+    mocker.spy(io_handling.os, "stat")
+
+    with patch("aws_encryption_sdk_cli.internal.io_handling.open", create=True) as mock_open:
+        standard_handler.process_single_file(
+            stream_args={"mode": "encrypt"}, source=str(source), destination=str(destination), source_stat=source_stat
+        )
+
+    io_handling.os.stat.assert_called_once_with(str(destination))
+    patch_process_single_operation.assert_called_once_with(
+        stream_args={"mode": "encrypt", "source_length": source_stat.st_size},
+        source=mock_open.return_value.__enter__.return_value,
+        destination=str(destination),
+        destination_exists=True,
+        on_committed=None,
     )
 
 
@@ -541,7 +1190,9 @@ def _mock_aws_encryption_sdk_stream_output(source, *args, **kwargs):
     return mock_stream
 
 
-def test_process_dir(tmpdir, patch_aws_encryption_sdk_stream, patch_json_ready_header, standard_handler):
+def test_process_dir(
+    tmpdir, patch_aws_encryption_sdk_stream, patch_json_ready_header, patch_ciphertext_length, standard_handler
+):
     patch_aws_encryption_sdk_stream.side_effect = _mock_aws_encryption_sdk_stream_output
     source = tmpdir.mkdir("source")
     source.mkdir("a")
@@ -573,3 +1224,23 @@ def test_process_dir(tmpdir, patch_aws_encryption_sdk_stream, patch_json_ready_h
         assert os.path.isfile(filename)
         with open(filename, "rb") as f:
             assert f.read() == DATA + suffix
+
+
+def test_process_dir_source_filter(tmpdir, patch_process_single_file):
+    source = tmpdir.mkdir("source")
+    source.join("keep").write(b"some data")
+    source.join("skip.tmp").write(b"some data")
+    source.mkdir("cache").join("keep").write(b"some data")
+    target = tmpdir.mkdir("target")
+    kwargs = GOOD_IOHANDLER_KWARGS.copy()
+    kwargs["source_filter"] = SourceFilter(exclude=["*.tmp", "cache"])
+    handler = io_handling.IOHandler(**kwargs)
+
+    handler.process_dir(stream_args={"mode": "encrypt"}, source=str(source), destination=str(target), suffix=None)
+
+    patch_process_single_file.assert_called_once_with(
+        stream_args={"mode": "encrypt"},
+        source=str(source.join("keep")),
+        destination=str(target.join("keep.encrypted")),
+        source_stat=ANY,
+    )
@@ -0,0 +1,135 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.journal``."""
+import hashlib
+import io
+import json
+import os
+
+import pytest
+
+from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal import journal
+from aws_encryption_sdk_cli.internal.journal import DigestingWriter, Journal
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+
+@pytest.fixture
+def files(tmpdir):
+    source = tmpdir.join("source")
+    source.write(b"some data")
+    destination = tmpdir.join("destination")
+    destination.write(b"ciphertext")
+    return str(source), str(destination)
+
+
+def _record(test_journal, files, output=b"ciphertext"):
+    source, destination = files
+    test_journal.record(
+        source, os.stat(source), destination, "encrypt", len(output), hashlib.sha256(output).hexdigest()
+    )
+
+
+def test_digesting_writer():
+    wrapped = io.BytesIO()
+    writer = DigestingWriter(wrapped)
+
+    writer.write(b"some ")
+    writer.write(b"data")
+
+    assert wrapped.getvalue() == b"some data"
+    assert writer.length == 9
+    assert writer.hexdigest() == hashlib.sha256(b"some data").hexdigest()
+    assert writer.tell() == 9
+
+
+def test_journal_missing_parent_directory(tmpdir):
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        Journal(str(tmpdir.join("missing", "journal")))
+
+    excinfo.match(r"Parent directory for requested resume journal file does not exist.")
+
+
+def test_is_complete_new_journal(tmpdir, files):
+    source, destination = files
+
+    assert not Journal(str(tmpdir.join("journal"))).is_complete(source, os.stat(source), destination, "encrypt")
+
+
+def test_is_complete_after_resume(tmpdir, files):
+    source, destination = files
+    test_journal = Journal(str(tmpdir.join("journal")))
+    _record(test_journal, files)
+    test_journal.close()
+
+    resumed = Journal(str(tmpdir.join("journal")))
+
+    assert resumed.is_complete(source, os.stat(source), destination, "encrypt")
+    assert not resumed.is_complete(source, os.stat(source), destination, "decrypt")
+
+
+def test_is_complete_source_changed(tmpdir, files):
+    source, destination = files
+    test_journal = Journal(str(tmpdir.join("journal")))
+    _record(test_journal, files)
+    with open(source, "ab") as source_file:
+        source_file.write(b"more data")
+
+    assert not test_journal.is_complete(source, os.stat(source), destination, "encrypt")
+
+
+@pytest.mark.parametrize("output", (b"ciphertexT", b"short", None))
+def test_is_complete_output_changed(tmpdir, files, output):
+    source, destination = files
+    test_journal = Journal(str(tmpdir.join("journal")))
+    _record(test_journal, files)
+    if output is None:
+        os.remove(destination)
+    else:
+        with open(destination, "wb") as destination_file:
+            destination_file.write(output)
+
+    assert not test_journal.is_complete(source, os.stat(source), destination, "encrypt")
+
+
+def test_flush_batches_entries(tmpdir, files, monkeypatch):
+    monkeypatch.setattr(journal, "_FLUSH_INTERVAL", 2)
+    monkeypatch.setattr(journal, "_FLUSH_SECONDS", 1000)
+    journal_file = tmpdir.join("journal")
+    test_journal = Journal(str(journal_file))
+
+    _record(test_journal, files)
+    assert not journal_file.check()
+
+    _record(test_journal, files)
+    assert len(journal_file.readlines()) == 2
+
+
+def test_resume_after_interrupted_write(tmpdir, files):
+    source, destination = files
+    journal_file = tmpdir.join("journal")
+    test_journal = Journal(str(journal_file))
+    _record(test_journal, files)
+    test_journal.close()
+    with open(str(journal_file), "ab") as raw_journal:
+        raw_journal.write(b'{"mode": "enc')
+
+    resumed = Journal(str(journal_file))
+    assert resumed.is_complete(source, os.stat(source), destination, "encrypt")
+    _record(resumed, files)
+    resumed.close()
+
+    lines = journal_file.readlines()
+    assert len(lines) == 3
+    assert json.loads(lines[-1])["output"] == os.path.abspath(destination)
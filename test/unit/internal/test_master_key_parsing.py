@@ -16,11 +16,15 @@ from collections import defaultdict, namedtuple
 
 import pytest
 import six
+from aws_encryption_sdk.exceptions import CacheKeyError
+from aws_encryption_sdk.materials_managers import DecryptionMaterials
+from aws_encryption_sdk.structures import DataKey, MasterKeyInfo
 from mock import MagicMock, call, sentinel
 from pytest_mock import mocker  # noqa pylint: disable=unused-import
 
 from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
 from aws_encryption_sdk_cli.internal import logging_utils, master_key_parsing
+from aws_encryption_sdk_cli.internal.stats import RunStatistics
 from aws_encryption_sdk_cli.key_providers import aws_kms_master_key_provider
 
 pytestmark = [pytest.mark.unit, pytest.mark.local]
@@ -229,6 +233,13 @@ def test_parse_master_key_providers_from_args(patch_build_master_key_provider, p
     assert test is sentinel.assembled_key_providers
 
 
+def test_build_master_key_provider_from_args(patch_parse_master_key_providers):
+    test = master_key_parsing.build_master_key_provider_from_args((sentinel.key_config_1, sentinel.key_config_2))
+
+    patch_parse_master_key_providers.assert_called_once_with(sentinel.key_config_1, sentinel.key_config_2)
+    assert test is patch_parse_master_key_providers.return_value
+
+
 def test_build_crypto_materials_manager_from_args_no_caching(
     patch_parse_master_key_providers, patch_aws_encryption_sdk
 ):
@@ -246,18 +257,46 @@ def test_build_crypto_materials_manager_from_args_no_caching(
 
 
 def test_build_crypto_materials_manager_from_args_with_caching(
-    patch_parse_master_key_providers, patch_aws_encryption_sdk
+    mocker, patch_parse_master_key_providers, patch_aws_encryption_sdk
 ):
+    mocker.patch.object(master_key_parsing, "_CountingCache")
     test = master_key_parsing.build_crypto_materials_manager_from_args(
         key_providers_config=(sentinel.key_config_1, sentinel.key_config_2),
         caching_config={"a": "cache_config_a", "b": "cache_config_b", "capacity": 5},
     )
 
-    patch_aws_encryption_sdk.LocalCryptoMaterialsCache.assert_called_once_with(capacity=5)
+    master_key_parsing._CountingCache.assert_called_once_with(capacity=5)
     patch_aws_encryption_sdk.CachingCryptoMaterialsManager.assert_called_once_with(
         backing_materials_manager=patch_aws_encryption_sdk.DefaultCryptoMaterialsManager.return_value,
-        cache=patch_aws_encryption_sdk.LocalCryptoMaterialsCache.return_value,
+        cache=master_key_parsing._CountingCache.return_value,
         a="cache_config_a",
         b="cache_config_b",
     )
     assert test is patch_aws_encryption_sdk.CachingCryptoMaterialsManager.return_value
+
+
+def test_counting_cache():
+    statistics = RunStatistics()
+    cache = master_key_parsing._CountingCache(capacity=5)
+    materials = DecryptionMaterials(
+        data_key=DataKey(
+            key_provider=MasterKeyInfo(provider_id="provider", key_info=b"key"),
+            data_key=b"\x00" * 32,
+            encrypted_data_key=b"encrypted",
+        )
+    )
+    cache.put_decryption_materials(b"known", materials)
+
+    cache.get_decryption_materials(b"known")
+    statistics.start()
+    try:
+        assert cache.get_decryption_materials(b"known").value is materials
+        with pytest.raises(CacheKeyError):
+            cache.get_decryption_materials(b"unknown")
+        with pytest.raises(CacheKeyError):
+            cache.get_encryption_materials(b"unknown", plaintext_length=10)
+    finally:
+        statistics.finish()
+
+    # Lookups outside of the run are not counted
+    assert statistics.summary()["cache"] == {"hits": 1, "misses": 2}
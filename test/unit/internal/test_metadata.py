@@ -15,7 +15,11 @@
 # pylint: disable=no-name-in-module,import-error
 import json
 import os
+import sqlite3
+import threading
+import time
 
+import aws_encryption_sdk
 import pytest
 from aws_encryption_sdk.identifiers import Algorithm, ContentType, ObjectType, SerializationVersion
 from aws_encryption_sdk.internal.structures import MessageHeaderAuthentication
@@ -24,6 +28,8 @@ from aws_encryption_sdk.structures import EncryptedDataKey, MasterKeyInfo, Messa
 from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
 from aws_encryption_sdk_cli.internal import metadata
 
+from ..unit_test_utils import static_materials_manager
+
 pytestmark = [pytest.mark.unit, pytest.mark.local]
 GOOD_INIT_KWARGS = dict(suppress_output=False)
 
@@ -177,6 +183,113 @@ def test_overwrite_metdata_file_multiuse(tmpdir):
     assert lines[0] == lines[1]
 
 
+def test_metadata_file_held_open(tmpdir):
+    output_file = tmpdir.join("metadata")
+    output_file.write(b"")
+    writer = metadata.MetadataWriter(suppress_output=False)(str(output_file))
+    writer.force_overwrite()
+
+    with writer:
+        stream = writer._output_stream
+        sink = writer._sink
+        for count in range(3000):
+            with writer:
+                assert writer._output_stream is stream
+                assert writer._sink is sink
+                writer.write_metadata(count=count)
+    assert stream.closed
+    assert not sink.is_alive()
+
+    assert [json.loads(line)["count"] for line in output_file.readlines()] == list(range(3000))
+
+
+def test_metadata_file_flush(tmpdir):
+    output_file = tmpdir.join("metadata")
+    writer = metadata.MetadataWriter(suppress_output=False)(str(output_file))
+
+    with writer:
+        writer.write_metadata(some="data")
+        writer.flush()
+        assert json.loads(output_file.read()) == {"some": "data"}
+
+
+def test_metadata_file_idle_flush(tmpdir, monkeypatch):
+    monkeypatch.setattr(metadata, "_FLUSH_SECONDS", 0.01)
+    output_file = tmpdir.join("metadata")
+    writer = metadata.MetadataWriter(suppress_output=False)(str(output_file))
+
+    with writer:
+        writer.write_metadata(some="data")
+        deadline = time.time() + 5
+        while not output_file.read() and time.time() < deadline:
+            time.sleep(0.01)
+        assert json.loads(output_file.read()) == {"some": "data"}
+
+
+def test_metadata_queue_depth(tmpdir):
+    writer = metadata.MetadataWriter(suppress_output=False)(str(tmpdir.join("metadata")))
+    resume = threading.Event()
+    started = threading.Event()
+
+    def _blocked():
+        started.set()
+        return resume.wait()
+
+    assert writer.queue_depth() == 0
+    with writer:
+        writer.write_metadata(blocked=metadata.LazyValue(_blocked))
+        started.wait()
+        writer.write_metadata(some="data")
+        writer.write_metadata(more="data")
+        assert writer.queue_depth() == 2
+        resume.set()
+        writer.flush()
+        assert writer.queue_depth() == 0
+
+
+def test_metadata_sink_error(tmpdir):
+    writer = metadata.MetadataWriter(suppress_output=False)(str(tmpdir.join("metadata")))
+
+    with pytest.raises(TypeError):
+        with writer:
+            writer.write_metadata(not_serializable=object())
+            writer.write_metadata(some="data")
+            writer.flush()
+
+    assert writer._sink is None
+    assert tmpdir.join("metadata").read() == ""
+
+
+def test_metadata_sink_error_does_not_hide_original(tmpdir):
+    writer = metadata.MetadataWriter(suppress_output=False)(str(tmpdir.join("metadata")))
+
+    with pytest.raises(ValueError):
+        with writer:
+            writer.write_metadata(not_serializable=object())
+            raise ValueError()
+
+    assert writer._output_stream is None
+
+
+@pytest.mark.parametrize("suppress", (True, False))
+def test_write_lazy_value(tmpdir, suppress):
+    output_file = tmpdir.join("metadata")
+    calls = []
+
+    def _compute(value):
+        calls.append(value)
+        return {"computed": value}
+
+    with metadata.MetadataWriter(suppress_output=suppress)(str(output_file)) as writer:
+        writer.write_metadata(some="data", header=metadata.LazyValue(_compute, "header"))
+
+    if suppress:
+        assert calls == []
+    else:
+        assert calls == ["header"]
+        assert json.loads(output_file.read()) == {"some": "data", "header": {"computed": "header"}}
+
+
 def test_metadata_output_file_parent_dir_does_not_exist(tmpdir):
     metadata_file = os.path.join(str(tmpdir), "missing_dir", "metadata")
 
@@ -186,6 +299,114 @@ def test_metadata_output_file_parent_dir_does_not_exist(tmpdir):
     excinfo.match(r"Parent directory for requested metdata file does not exist.")
 
 
+def _database_rows(filename):
+    connection = sqlite3.connect(filename)
+    try:
+        return connection.execute(
+            "SELECT mode, input, output, result, reason, message_id, record FROM metadata ORDER BY id"
+        ).fetchall()
+    finally:
+        connection.close()
+
+
+def test_sqlite_metadata(tmpdir):
+    database = tmpdir.join("metadata.db")
+    header = _message_header("key-1", some="context")
+    message_id = metadata.json_ready_header(header)["message_id"]
+    writer = metadata.MetadataWriter(suppress_output=False)("sqlite:" + str(database))
+
+    with writer:
+        writer.write_metadata(
+            mode="encrypt",
+            input="a",
+            output="a.encrypted",
+            header=metadata.LazyValue(metadata.json_ready_header, header),
+        )
+        writer.write_metadata(mode="decrypt", input="b", output="b.decrypted", skipped=True, reason="Missing key")
+        writer.write_metadata(mode="verify", input="c", verified=False, error="bad message")
+        writer.write_metadata(mode="inspect", input="d", error="not a message")
+
+    assert writer.output_file == str(database)
+    rows = _database_rows(str(database))
+    assert [row[:6] for row in rows] == [
+        ("encrypt", "a", "a.encrypted", "success", None, message_id),
+        ("decrypt", "b", "b.decrypted", "skipped", "Missing key", None),
+        ("verify", "c", None, "failed", None, None),
+        ("inspect", "d", None, "failed", None, None),
+    ]
+    assert json.loads(rows[0][6])["header"] == json.loads(json.dumps(metadata.json_ready_header(header)))
+
+
+def test_sqlite_metadata_append_and_overwrite(tmpdir):
+    database = "sqlite:" + str(tmpdir.join("metadata.db"))
+    for count in range(2):
+        with metadata.MetadataWriter(suppress_output=False)(database) as writer:
+            writer.write_metadata(mode="encrypt", input=str(count))
+
+    assert [row[1] for row in _database_rows(str(tmpdir.join("metadata.db")))] == ["0", "1"]
+
+    writer = metadata.MetadataWriter(suppress_output=False)(database)
+    writer.force_overwrite()
+    with writer:
+        writer.write_metadata(mode="encrypt", input="2")
+
+    assert [row[1] for row in _database_rows(str(tmpdir.join("metadata.db")))] == ["2"]
+
+
+def test_sqlite_metadata_batches(tmpdir, monkeypatch):
+    monkeypatch.setattr(metadata, "_SQLITE_BATCH_SIZE", 2)
+    database = tmpdir.join("metadata.db")
+    writer = metadata.MetadataWriter(suppress_output=False)("sqlite:" + str(database))
+
+    with writer:
+        for count in range(5):
+            writer.write_metadata(mode="encrypt", input=str(count))
+        writer.flush()
+        # Flushed records are committed, so they are visible to other connections
+        assert [row[1] for row in _database_rows(str(database))] == ["0", "1", "2", "3", "4"]
+
+
+@pytest.mark.parametrize("flush", (True, False))
+def test_sqlite_metadata_record_failure(tmpdir, flush):
+    database = tmpdir.join("metadata.db")
+    writer = metadata.MetadataWriter(suppress_output=False)("sqlite:" + str(database))
+
+    with writer:
+        writer.write_metadata(mode="encrypt", input="a", output="a.encrypted")
+        writer.write_metadata(mode="encrypt", input="b", output="b.encrypted")
+        if flush:
+            writer.flush()
+        # Only the latest record can belong to the failed operation
+        writer.record_failure("a.encrypted")
+        writer.record_failure("b.encrypted")
+        writer.write_metadata(mode="decrypt", input="c", output="c.decrypted", skipped=True, reason="Missing key")
+        writer.record_failure("c.decrypted")
+
+    assert [row[2:4] for row in _database_rows(str(database))] == [
+        ("a.encrypted", "success"),
+        ("b.encrypted", "failed"),
+        ("c.decrypted", "skipped"),
+    ]
+
+
+def test_sqlite_metadata_stdout():
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        metadata.MetadataWriter(suppress_output=False)("sqlite:-")
+
+    excinfo.match(r"SQLite metadata output must be written to a file.")
+
+
+def test_sqlite_metadata_not_a_database(tmpdir):
+    database = tmpdir.join("metadata.db")
+    database.write(b"not a database" * 100)
+
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        with metadata.MetadataWriter(suppress_output=False)("sqlite:" + str(database)):
+            pass
+
+    excinfo.match(r'Unable to open metadata database "')
+
+
 def test_json_ready_message_header():
     # pylint: disable=too-many-locals
     message_id = b"a message ID"
@@ -288,3 +509,85 @@ def test_json_ready_header_auth():
     assert test == expected_header_auth_dict
     # verify that the dict is actually JSON-encodable
     json.dumps(test)
+
+
+@pytest.mark.parametrize(
+    "json_line",
+    (
+        metadata._stdlib_json_line,
+        pytest.param(
+            metadata._orjson_line,
+            marks=pytest.mark.skipif(metadata.orjson is None, reason="orjson is not installed"),
+        ),
+    ),
+)
+def test_json_line(json_line):
+    record = {"b": [1, "two", None], "a": {"nested": metadata.LazyValue(dict, [("c", "\u00e9")])}}
+
+    line = json_line(record)
+
+    # Keys are sorted at every level, and both encoders write the same bytes
+    assert line == u'{"a":{"nested":{"c":"\u00e9"}},"b":[1,"two",null]}'.encode("utf-8") + os.linesep.encode("ascii")
+
+
+def _message_header(*key_ids, **encryption_context):
+    _ciphertext, header = aws_encryption_sdk.EncryptionSDKClient().encrypt(
+        source=b"some data", materials_manager=static_materials_manager(*key_ids), encryption_context=encryption_context
+    )
+    return header
+
+
+def _expand_headers(lines):
+    shared_headers = {}
+    records = []
+    for line in lines:
+        record = json.loads(line)
+        if record["mode"] == "header":
+            shared_headers[record["header_id"]] = record["header"]
+            continue
+        compact = record["header"]
+        header = dict(shared_headers[compact["header_id"]])
+        header.update({key: value for key, value in compact.items() if key not in ("header_id", "encryption_context")})
+        header["encryption_context"] = dict(header["encryption_context"], **compact.get("encryption_context", {}))
+        records.append(dict(record, header=header))
+    return records
+
+
+def test_compact_headers(tmpdir):
+    output_file = tmpdir.join("metadata")
+    headers = [
+        _message_header("key-1", "key-2", some="context"),
+        _message_header("key-1", "key-2", some="context"),
+        _message_header("key-1", "key-2", other="context"),
+    ]
+    writer = metadata.MetadataWriter(suppress_output=False)(str(output_file))
+    writer.compact_headers()
+
+    with writer:
+        for header in headers:
+            writer.write_metadata(mode="encrypt", header=metadata.LazyValue(metadata.json_ready_header, header))
+
+    lines = output_file.readlines()
+    assert [json.loads(line)["mode"] for line in lines] == ["header", "encrypt", "encrypt", "header", "encrypt"]
+    assert [json.loads(line)["header"].get("header_id") for line in lines] == [None, 1, 1, None, 2]
+    assert _expand_headers(lines) == [
+        dict(mode="encrypt", header=json.loads(json.dumps(metadata.json_ready_header(header)))) for header in headers
+    ]
+
+
+def test_compact_headers_limit(tmpdir, monkeypatch):
+    monkeypatch.setattr(metadata, "_MAX_SHARED_HEADERS", 1)
+    output_file = tmpdir.join("metadata")
+    headers = [_message_header("key-1", some="context"), _message_header("key-1", other="context")]
+    writer = metadata.MetadataWriter(suppress_output=False)(str(output_file))
+    writer.compact_headers()
+
+    with writer:
+        for header in headers:
+            writer.write_metadata(mode="encrypt", source_header=metadata.json_ready_header(header))
+
+    records = [json.loads(line) for line in output_file.readlines()]
+    assert [record["mode"] for record in records] == ["header", "encrypt", "encrypt"]
+    assert records[1]["source_header"]["header_id"] == 1
+    # Once the limit is reached, headers are written in full
+    assert records[2]["source_header"] == json.loads(json.dumps(metadata.json_ready_header(headers[1])))
@@ -0,0 +1,133 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.metrics``."""
+import time
+
+import pytest
+from pytest_mock import mocker  # noqa pylint: disable=unused-import
+
+from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal import metrics, stats
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+
+def _samples(text):
+    samples = {}
+    for line in text.splitlines():
+        if not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            samples[name] = value
+    return samples
+
+
+@pytest.fixture
+def run_statistics():
+    test = stats.RunStatistics(None)
+    test.record_operation(stats.SUCCEEDED, input_bytes=100, output_bytes=250)
+    test.record_operation(stats.FAILED, input_bytes=10)
+    test.record_error("IncorrectMasterKeyError")
+    for seconds in (0.004, 0.02, 0.02, 3.0):
+        test.record_kms_call("Decrypt", seconds)
+    test.record_kms_call("GenerateDataKey", 0.3, error=True)
+    test.record_cache_lookup(True)
+    test.record_cache_lookup(True)
+    test.record_cache_lookup(True)
+    test.record_cache_lookup(False)
+    return test
+
+
+def test_format_metrics(run_statistics):
+    test = metrics.format_metrics(run_statistics.summary(), run_statistics.kms_latencies(), dict(metadata=3))
+    samples = _samples(test)
+
+    assert "# TYPE aws_encryption_cli_operations_total counter" in test
+    assert "# TYPE aws_encryption_cli_kms_call_duration_seconds histogram" in test
+    assert samples['aws_encryption_cli_operations_total{outcome="succeeded"}'] == "1"
+    assert samples['aws_encryption_cli_operations_total{outcome="failed"}'] == "1"
+    assert samples['aws_encryption_cli_operations_total{outcome="skipped"}'] == "0"
+    assert samples["aws_encryption_cli_input_bytes_total"] == "110"
+    assert samples["aws_encryption_cli_output_bytes_total"] == "250"
+    assert samples['aws_encryption_cli_errors_total{class="IncorrectMasterKeyError"}'] == "1"
+    assert samples['aws_encryption_cli_kms_calls_total{operation="Decrypt"}'] == "4"
+    assert samples["aws_encryption_cli_kms_call_errors_total"] == "1"
+    assert samples['aws_encryption_cli_kms_call_duration_seconds_bucket{le="0.005"}'] == "1"
+    assert samples['aws_encryption_cli_kms_call_duration_seconds_bucket{le="0.025"}'] == "3"
+    assert samples['aws_encryption_cli_kms_call_duration_seconds_bucket{le="0.5"}'] == "4"
+    assert samples['aws_encryption_cli_kms_call_duration_seconds_bucket{le="+Inf"}'] == "5"
+    assert samples["aws_encryption_cli_kms_call_duration_seconds_count"] == "5"
+    assert float(samples["aws_encryption_cli_kms_call_duration_seconds_sum"]) == pytest.approx(3.344)
+    assert samples['aws_encryption_cli_cache_lookups_total{result="hit"}'] == "3"
+    assert samples["aws_encryption_cli_cache_hit_ratio"] == "0.75"
+    assert samples['aws_encryption_cli_queue_depth{queue="metadata"}'] == "3"
+    assert test.endswith("\n")
+
+
+def test_format_metrics_empty():
+    test = stats.RunStatistics(None)
+
+    samples = _samples(metrics.format_metrics(test.summary(), test.kms_latencies(), {}))
+
+    assert samples["aws_encryption_cli_cache_hit_ratio"] == "NaN"
+    assert samples['aws_encryption_cli_kms_call_duration_seconds_bucket{le="+Inf"}'] == "0"
+
+
+def test_format_labels_escaped():
+    assert metrics._format_labels({"class": 'a"b\\c\nd'}) == r'{class="a\"b\\c\nd"}'
+
+
+def test_exporter(tmpdir, run_statistics):
+    output = tmpdir.join("cli.prom")
+    exporter = metrics.MetricsExporter(str(output), run_statistics, interval=0.01)
+
+    exporter.start(dict(metadata=lambda: 7))
+    try:
+        assert _samples(output.read())["aws_encryption_cli_input_bytes_total"] == "110"
+        run_statistics.record_operation(stats.SUCCEEDED, input_bytes=1000)
+        deadline = time.time() + 5
+        while _samples(output.read())["aws_encryption_cli_input_bytes_total"] != "1110" and time.time() < deadline:
+            time.sleep(0.01)
+        assert _samples(output.read())["aws_encryption_cli_input_bytes_total"] == "1110"
+    finally:
+        exporter.stop()
+
+    run_statistics.record_operation(stats.SUCCEEDED, input_bytes=1)
+    exporter.write()
+    samples = _samples(output.read())
+    assert samples["aws_encryption_cli_input_bytes_total"] == "1111"
+    assert samples['aws_encryption_cli_queue_depth{queue="metadata"}'] == "7"
+    # Only the metrics file is left behind
+    assert tmpdir.listdir() == [output]
+
+
+def test_exporter_keeps_running_after_failed_write(tmpdir, run_statistics, mocker):
+    exporter = metrics.MetricsExporter(str(tmpdir.join("cli.prom")), run_statistics, interval=0.01)
+    exporter.start()
+    mocker.patch.object(exporter, "write", side_effect=IOError("disk full"))
+    mocker.patch.object(metrics._LOGGER, "warning")
+
+    deadline = time.time() + 5
+    while exporter.write.call_count < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    exporter.write.side_effect = None
+    exporter.stop()
+
+    assert exporter.write.call_count >= 3
+    assert metrics._LOGGER.warning.called
+
+
+def test_missing_parent_directory(tmpdir):
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        metrics.MetricsExporter(str(tmpdir.join("missing", "cli.prom")), stats.RunStatistics(None))
+
+    excinfo.match(r"Parent directory for requested metrics file does not exist.")
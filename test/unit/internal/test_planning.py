@@ -0,0 +1,278 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.planning``."""
+import hashlib
+import json
+import os
+
+import pytest
+from aws_encryption_sdk.identifiers import Algorithm, CommitmentPolicy
+from mock import MagicMock
+
+from aws_encryption_sdk_cli.internal import planning, sizing
+from aws_encryption_sdk_cli.internal.journal import Journal
+from aws_encryption_sdk_cli.internal.state_index import StateIndex
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+
+def _handler(interactive=False, no_overwrite=False, decode_input=False, encode_output=False):
+    return MagicMock(
+        interactive=interactive,
+        no_overwrite=no_overwrite,
+        decode_input=decode_input,
+        encode_output=encode_output,
+        source_filter=None,
+        state_index=None,
+        sync=False,
+        journal=None,
+    )
+
+
+def _build_plan(handler, sources, destination, mode="encrypt", recursive=True, key_ids=("key",), caching_config=None):
+    return planning.build_plan(
+        handler=handler,
+        stream_args={"mode": mode, "commitment_policy": CommitmentPolicy.REQUIRE_ENCRYPT_REQUIRE_DECRYPT},
+        sources=sources,
+        destination=destination,
+        recursive=recursive,
+        suffix=None,
+        key_ids=list(key_ids),
+        caching_config=caching_config,
+    )
+
+
+@pytest.mark.parametrize(
+    "lengths, caching_config, expected",
+    (
+        ([10, 10, 10], None, 3),
+        ([], {"max_messages_encrypted": 2}, 0),
+        ([10, 10, 10], {}, 1),
+        ([10, 10, 10, 10, 10], {"max_messages_encrypted": 2}, 3),
+        ([10, 10, 10, 10], {"max_bytes_encrypted": 25}, 2),
+        ([10, 30, 10], {"max_bytes_encrypted": 25}, 2),
+        ([25, 10, 10], {"max_bytes_encrypted": 25}, 2),
+    ),
+)
+def test_estimate_data_keys(lengths, caching_config, expected):
+    assert planning.estimate_data_keys(lengths, caching_config) == expected
+
+
+def test_build_plan_directory(tmpdir):
+    source = tmpdir.mkdir("source")
+    source.join("a").write(b"a" * 10)
+    source.mkdir("nested").join("b").write(b"b" * 100)
+    destination = tmpdir.mkdir("destination")
+
+    test = _build_plan(_handler(), [str(source)], str(destination))
+
+    algorithm = Algorithm.AES_256_GCM_HKDF_SHA512_COMMIT_KEY_ECDSA_P384
+    expected = {
+        str(source.join("a")): (str(destination.join("a.encrypted")), 10),
+        str(source.join("nested", "b")): (str(destination.join("nested", "b.encrypted")), 100),
+    }
+    assert len(test.operations) == 2
+    for operation in test.operations:
+        output, length = expected[operation["input"]]
+        assert operation["output"] == output
+        assert operation["action"] == "write"
+        assert operation["input_bytes"] == length
+        assert operation["output_bytes"] == sizing.estimate_ciphertext_length(length, algorithm, ["key"])
+    summary = test.to_dict()["summary"]
+    assert summary["input_bytes"] == 110
+    assert summary["actions"]["write"] == 2
+    assert summary["estimated_kms_calls"] == 2
+
+
+@pytest.mark.parametrize(
+    "handler_kwargs, action",
+    (({}, "overwrite"), ({"interactive": True}, "prompt"), ({"no_overwrite": True}, "skip")),
+)
+def test_build_plan_existing_destination(tmpdir, handler_kwargs, action):
+    source = tmpdir.join("source")
+    source.write(b"data")
+    destination = tmpdir.join("destination")
+    destination.write(b"existing")
+
+    test = _build_plan(_handler(**handler_kwargs), [str(source)], str(destination))
+
+    assert test.operations[0]["action"] == action
+    assert test.to_dict()["summary"]["estimated_kms_calls"] == (0 if action == "skip" else 1)
+
+
+def test_build_plan_source_is_destination(tmpdir):
+    source = tmpdir.join("source")
+    source.write(b"data")
+
+    test = _build_plan(_handler(), [str(source)], str(source))
+
+    assert test.operations[0]["action"] == "skip"
+    assert test.operations[0]["reason"] == "Source and destination are the same"
+
+
+def test_build_plan_resume(tmpdir):
+    source = tmpdir.mkdir("source")
+    destination = tmpdir.mkdir("destination")
+    journal = Journal(str(tmpdir.join("journal")))
+    for name in ("done", "changed"):
+        source.join(name).write(b"data")
+        destination.join(name + ".encrypted").write(b"ciphertext")
+        journal.record(
+            str(source.join(name)),
+            os.stat(str(source.join(name))),
+            str(destination.join(name + ".encrypted")),
+            "encrypt",
+            len(b"ciphertext"),
+            hashlib.sha256(b"ciphertext").hexdigest(),
+        )
+    destination.join("changed.encrypted").write(b"truncated")
+    handler = _handler()
+    handler.journal = journal
+
+    test = _build_plan(handler, [str(source)], str(destination))
+
+    actions = dict(
+        (operation["input"], (operation["action"], operation.get("reason"))) for operation in test.operations
+    )
+    assert actions == {
+        str(source.join("done")): ("skip", "Source was already processed"),
+        str(source.join("changed")): ("overwrite", None),
+    }
+    assert test.estimated_kms_calls == 1
+
+
+def test_build_plan_directory_nonrecursive(tmpdir):
+    source = tmpdir.mkdir("source")
+    source.join("a").write(b"a")
+
+    test = _build_plan(_handler(), [str(source)], str(tmpdir.mkdir("destination")), recursive=False)
+
+    assert len(test.operations) == 1
+    assert test.operations[0]["action"] == "skip"
+
+
+def test_build_plan_stdin():
+    test = _build_plan(_handler(), ["-"], "-", key_ids=("key1", "key2"), caching_config={"capacity": 1})
+
+    assert test.operations == [
+        {"input": "-", "output": "-", "action": "write", "input_bytes": None, "output_bytes": None}
+    ]
+    assert test.estimated_kms_calls == 2
+
+
+def test_build_plan_decrypt(tmpdir):
+    source = tmpdir.join("source")
+    source.write(b"a" * 400)
+
+    test = _build_plan(_handler(decode_input=True), [str(source)], str(tmpdir.join("destination")), mode="decrypt")
+
+    assert test.operations[0]["output_bytes"] == 300
+    assert test.estimated_kms_calls == 1
+
+
+@pytest.mark.parametrize("mode", ("reencrypt", "rewrap"))
+def test_build_plan_reencrypt(tmpdir, mode):
+    source = tmpdir.mkdir("source")
+    source.join("a.encrypted").write(b"a" * 400)
+    source.join("b.encrypted").write(b"b" * 400)
+    destination = tmpdir.mkdir("destination")
+
+    test = _build_plan(
+        _handler(), [str(source)], str(destination), mode=mode, key_ids=("key1", "key2"), caching_config={}
+    )
+
+    assert sorted(operation["output"] for operation in test.operations) == [
+        str(destination.join("a.encrypted")),
+        str(destination.join("b.encrypted")),
+    ]
+    assert test.operations[0]["output_bytes"] == 400
+    assert test.estimated_kms_calls == 6
+
+
+def test_build_plan_encode_output(tmpdir):
+    source = tmpdir.join("source")
+    source.write(b"a" * 400)
+
+    plain = _build_plan(_handler(), [str(source)], str(tmpdir.join("destination")))
+    encoded = _build_plan(_handler(encode_output=True), [str(source)], str(tmpdir.join("destination")))
+
+    assert encoded.operations[0]["output_bytes"] == sizing.encoded_length(plain.operations[0]["output_bytes"])
+
+
+def test_build_plan_caching_multiple_keys(tmpdir):
+    source = tmpdir.mkdir("source")
+    for name in "abcde":
+        source.join(name).write(b"data")
+
+    test = _build_plan(
+        _handler(),
+        [str(source)],
+        str(tmpdir.mkdir("destination")),
+        key_ids=("key1", "key2"),
+        caching_config={"capacity": 10, "max_age": 10.0, "max_messages_encrypted": 2},
+    )
+
+    assert test.estimated_kms_calls == 6
+
+
+def test_build_plan_sync(tmpdir):
+    source = tmpdir.mkdir("source")
+    destination = tmpdir.mkdir("destination")
+    state_index = StateIndex(str(tmpdir.join("state.db")))
+    for name in ("renamed", "deleted"):
+        source.join(name).write(b"data")
+        destination.join(name + ".encrypted").write(b"ciphertext")
+        state_index.record(
+            str(source.join(name)),
+            os.stat(str(source.join(name))),
+            str(destination.join(name + ".encrypted")),
+            "encrypt",
+            "message-id",
+        )
+    source.join("renamed").rename(source.join("new-name"))
+    source.join("deleted").remove()
+    handler = _handler()
+    handler.state_index = state_index
+    handler.sync = True
+
+    test = _build_plan(handler, [str(source)], str(destination))
+
+    assert test.operations == [
+        {
+            "input": str(destination.join("renamed.encrypted")),
+            "output": str(destination.join("new-name.encrypted")),
+            "action": "move",
+            "input_bytes": None,
+            "output_bytes": None,
+            "reason": "Source was renamed",
+        },
+        {
+            "input": str(source.join("deleted")),
+            "output": str(destination.join("deleted.encrypted")),
+            "action": "delete",
+            "input_bytes": None,
+            "output_bytes": None,
+            "reason": "Source was deleted",
+        },
+    ]
+    assert test.estimated_kms_calls == 0
+    assert test.to_dict()["summary"]["input_bytes"] == 0
+
+
+def test_operation_plan_to_dict_is_json_serializable(tmpdir):
+    source = tmpdir.join("source")
+    source.write(b"data")
+
+    test = _build_plan(_handler(), [str(source)], str(tmpdir.join("destination")))
+
+    assert json.loads(json.dumps(test.to_dict())) == test.to_dict()
@@ -0,0 +1,79 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.profiling``."""
+import json
+import pstats
+
+import pytest
+
+from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal import profiling
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+
+def _allocate(size):
+    return [bytearray(size)]
+
+
+def test_cpu_profiler(tmpdir):
+    output = tmpdir.join("profile")
+
+    with profiling.CpuProfiler(str(output)):
+        _allocate(10)
+
+    functions = [function for _filename, _line, function in pstats.Stats(str(output)).stats]
+    assert "_allocate" in functions
+
+
+def test_cpu_profiler_failed_run(tmpdir):
+    output = tmpdir.join("profile")
+
+    with pytest.raises(ValueError):
+        with profiling.CpuProfiler(str(output)):
+            raise ValueError()
+
+    assert output.check()
+
+
+def test_memory_profiler(tmpdir):
+    output = tmpdir.join("profile")
+    kept = []
+
+    with profiling.MemoryProfiler(str(output)) as profiler:
+        profiler.begin_operation()
+        kept.append(_allocate(1024 * 1024))
+        profiler.end_operation("encrypt", "source-a", "destination-a")
+        profiler.begin_operation()
+        _allocate(2 * 1024 * 1024)
+        profiler.end_operation("decrypt", "source-b", "destination-b")
+
+    profile = json.loads(output.read())
+    first, second = profile["operations"]
+    assert (first["mode"], first["input"], first["output"]) == ("encrypt", "source-a", "destination-a")
+    assert first["peak_bytes"] >= 1024 * 1024
+    # The allocation is still held when the first operation ends
+    assert first["top_sites"][0]["site"].startswith(__file__.rstrip("c"))
+    assert first["top_sites"][0]["bytes"] >= 1024 * 1024
+    # The allocation is freed before the second operation ends, but still counts towards its peak
+    assert second["peak_bytes"] >= 2 * 1024 * 1024
+    assert not any(site["bytes"] >= 1024 * 1024 for site in second["top_sites"])
+    assert profile["peak_bytes"] == second["peak_bytes"]
+
+
+@pytest.mark.parametrize("profiler_class", (profiling.CpuProfiler, profiling.MemoryProfiler))
+def test_missing_parent_directory(tmpdir, profiler_class):
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        profiler_class(str(tmpdir.join("missing", "profile")))
+
+    excinfo.match(r"Parent directory for requested profile file does not exist.")
@@ -0,0 +1,168 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.rewrap``."""
+import errno
+import io
+import os
+
+import aws_encryption_sdk
+import pytest
+from aws_encryption_sdk.exceptions import ActionNotAllowedError, SerializationError
+from aws_encryption_sdk.identifiers import Algorithm, CommitmentPolicy
+from aws_encryption_sdk.internal.defaults import ENCODED_SIGNER_KEY
+from pytest_mock import mocker  # noqa pylint: disable=unused-import
+
+from aws_encryption_sdk_cli.internal import rewrap
+from aws_encryption_sdk_cli.internal.rewrap import MessageRewrapper
+
+from ..unit_test_utils import StaticRawMasterKeyProvider, static_materials_manager
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+PLAINTEXT = os.urandom(10000)
+
+
+def _ciphertext(algorithm=None, frame_length=1024, commitment_policy=CommitmentPolicy.REQUIRE_ENCRYPT_REQUIRE_DECRYPT):
+    kwargs = {} if algorithm is None else {"algorithm": algorithm}
+    ciphertext, _header = aws_encryption_sdk.EncryptionSDKClient(commitment_policy=commitment_policy).encrypt(
+        source=PLAINTEXT,
+        materials_manager=static_materials_manager("old-key"),
+        encryption_context={"some": "context"},
+        frame_length=frame_length,
+        **kwargs
+    )
+    return ciphertext
+
+
+def _new_key_provider():
+    key_provider = StaticRawMasterKeyProvider()
+    key_provider.add_master_key("new-key-1")
+    key_provider.add_master_key("new-key-2")
+    return key_provider
+
+
+def _rewrap(ciphertext, commitment_policy=CommitmentPolicy.REQUIRE_ENCRYPT_ALLOW_DECRYPT):
+    destination = io.BytesIO()
+    rewrapper = MessageRewrapper(io.BytesIO(ciphertext), commitment_policy)
+    rewrapper.unwrap(static_materials_manager("old-key"))
+    header = rewrapper.wrap(_new_key_provider())
+    rewrapper.write(destination)
+    return header, destination.getvalue()
+
+
+def _decrypt(ciphertext):
+    return aws_encryption_sdk.EncryptionSDKClient(
+        commitment_policy=CommitmentPolicy.REQUIRE_ENCRYPT_ALLOW_DECRYPT
+    ).decrypt(source=ciphertext, materials_manager=static_materials_manager("new-key-1"))
+
+
+@pytest.mark.parametrize(
+    "algorithm, commitment_policy",
+    (
+        (Algorithm.AES_256_GCM_HKDF_SHA512_COMMIT_KEY, CommitmentPolicy.REQUIRE_ENCRYPT_REQUIRE_DECRYPT),
+        (Algorithm.AES_256_GCM_HKDF_SHA512_COMMIT_KEY_ECDSA_P384, CommitmentPolicy.REQUIRE_ENCRYPT_REQUIRE_DECRYPT),
+        (Algorithm.AES_256_GCM_IV12_TAG16_HKDF_SHA256, CommitmentPolicy.FORBID_ENCRYPT_ALLOW_DECRYPT),
+        (Algorithm.AES_256_GCM_IV12_TAG16_HKDF_SHA384_ECDSA_P384, CommitmentPolicy.FORBID_ENCRYPT_ALLOW_DECRYPT),
+    ),
+)
+@pytest.mark.parametrize("frame_length", (1024, 0))
+def test_rewrap(algorithm, commitment_policy, frame_length):
+    ciphertext = _ciphertext(algorithm, frame_length, commitment_policy)
+    header, output = _rewrap(ciphertext, commitment_policy)
+
+    plaintext, decrypted_header = _decrypt(output)
+
+    assert plaintext == PLAINTEXT
+    assert decrypted_header == header
+    assert decrypted_header.algorithm is algorithm
+    assert sorted(key.key_provider.key_info[:9] for key in decrypted_header.encrypted_data_keys) == [
+        b"new-key-1",
+        b"new-key-2",
+    ]
+    assert decrypted_header.encryption_context["some"] == "context"
+    original_header = MessageRewrapper(io.BytesIO(ciphertext), commitment_policy).header
+    assert decrypted_header.message_id == original_header.message_id
+    if algorithm.signing_algorithm_info is None:
+        assert output.endswith(ciphertext[-len(PLAINTEXT) :])
+    else:
+        assert header.encryption_context[ENCODED_SIGNER_KEY] != original_header.encryption_context[ENCODED_SIGNER_KEY]
+
+
+def test_rewrap_bad_signature():
+    ciphertext = bytearray(_ciphertext(Algorithm.AES_256_GCM_HKDF_SHA512_COMMIT_KEY_ECDSA_P384))
+    ciphertext[-1] ^= 1
+
+    with pytest.raises(Exception):
+        _rewrap(bytes(ciphertext))
+
+
+def test_rewrap_bad_header():
+    ciphertext = bytearray(_ciphertext())
+    rewrapper = MessageRewrapper(io.BytesIO(bytes(ciphertext)), CommitmentPolicy.REQUIRE_ENCRYPT_ALLOW_DECRYPT)
+    # Corrupt the header authentication tag
+    ciphertext[len(rewrapper._raw_header)] ^= 1
+
+    with pytest.raises(SerializationError):
+        _rewrap(bytes(ciphertext))
+
+
+def test_rewrap_commitment_policy():
+    ciphertext = _ciphertext(
+        Algorithm.AES_256_GCM_IV12_TAG16_HKDF_SHA256, 1024, CommitmentPolicy.FORBID_ENCRYPT_ALLOW_DECRYPT
+    )
+
+    with pytest.raises(ActionNotAllowedError):
+        _rewrap(ciphertext, CommitmentPolicy.REQUIRE_ENCRYPT_ALLOW_DECRYPT)
+
+
+def test_wrap_before_unwrap():
+    rewrapper = MessageRewrapper(io.BytesIO(_ciphertext()), CommitmentPolicy.REQUIRE_ENCRYPT_ALLOW_DECRYPT)
+
+    with pytest.raises(SerializationError) as excinfo:
+        rewrapper.wrap(_new_key_provider())
+
+    excinfo.match(r"Data key must be unwrapped before it can be wrapped")
+
+
+def test_write_fast_copy(tmpdir):
+    ciphertext = _ciphertext()
+    source = tmpdir.join("source")
+    source.write_binary(ciphertext)
+    destination = tmpdir.join("destination")
+
+    with open(str(source), "rb") as source_file, open(str(destination), "wb") as destination_file:
+        rewrapper = MessageRewrapper(source_file, CommitmentPolicy.REQUIRE_ENCRYPT_ALLOW_DECRYPT)
+        rewrapper.unwrap(static_materials_manager("old-key"))
+        rewrapper.wrap(_new_key_provider())
+        rewrapper.write(destination_file, fast_copy=True)
+        assert source_file.tell() == len(ciphertext)
+
+    assert _decrypt(destination.read_binary())[0] == PLAINTEXT
+
+
+@pytest.mark.skipif(not hasattr(os, "copy_file_range"), reason="copy_file_range is not available")
+def test_copy_file_range_unsupported_falls_back(tmpdir, mocker):
+    mocker.patch.object(rewrap.os, "copy_file_range", side_effect=OSError(errno.EXDEV, "cross-device"))
+    source = tmpdir.join("source")
+    source.write_binary(b"header" + PLAINTEXT)
+    destination = tmpdir.join("destination")
+
+    with open(str(source), "rb") as source_file, open(str(destination), "wb") as destination_file:
+        source_file.read(6)
+        assert not rewrap._copy_file_range(source_file, destination_file)
+        assert source_file.tell() == 6
+        assert destination_file.tell() == 0
+
+
+def test_copy_file_range_not_a_file():
+    assert not rewrap._copy_file_range(io.BytesIO(b"data"), io.BytesIO())
@@ -0,0 +1,90 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.scanning``."""
+import time
+from multiprocessing.pool import ThreadPool
+
+import pytest
+from mock import MagicMock
+
+from aws_encryption_sdk_cli.internal import scanning
+from aws_encryption_sdk_cli.internal.traversal import SourceFilter
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+
+def _handler(source_filter=None):
+    handler = MagicMock(source_filter=source_filter)
+    handler.metadata_writer.__enter__.return_value = handler.metadata_writer
+    return handler
+
+
+def _scan_file(source):
+    # Finish out of order
+    time.sleep(0.02 if source.endswith("a") else 0)
+    if source.endswith("bad"):
+        return {"input": source, "error": "failed"}
+    return {"input": source}
+
+
+@pytest.mark.parametrize("jobs", (1, 4))
+def test_scan(tmpdir, jobs):
+    source = tmpdir.mkdir("source")
+    for name in ("a", "b", "bad", "c.skip"):
+        source.join(name).write(b"data")
+    single = tmpdir.join("single")
+    single.write(b"data")
+    handler = _handler(SourceFilter(exclude=["*.skip"]))
+
+    test = scanning.scan(handler, _scan_file, [str(single), str(source), "-", str(tmpdir.join("missing"))], True, jobs)
+
+    assert test == (5, 1)
+    written = [call[1]["input"] for call in handler.metadata_writer.write_metadata.call_args_list]
+    assert written[0] == str(single)
+    assert sorted(written[1:4]) == [str(source.join(name)) for name in ("a", "b", "bad")]
+    assert written[4] == "-"
+    outcomes = [call[0][0] for call in handler.statistics.record_operation.call_args_list]
+    assert sorted(outcomes) == ["failed"] + ["succeeded"] * 4
+    handler.statistics.record_error.assert_called_once_with("failed")
+
+
+def test_scan_not_recursive(tmpdir):
+    source = tmpdir.mkdir("source")
+    source.join("a").write(b"data")
+    handler = _handler()
+
+    assert scanning.scan(handler, _scan_file, [str(source)], False) == (0, 0)
+    assert not handler.metadata_writer.write_metadata.called
+
+
+def test_windowed_map():
+    consumed = []
+
+    def _items():
+        for index in range(100):
+            consumed.append(index)
+            yield str(index)
+
+    pool = ThreadPool(2)
+    try:
+        results = scanning._windowed_map(pool, lambda item: {"input": item}, _items(), 4)
+
+        assert next(results) == {"input": "0"}
+        assert len(consumed) == 5
+        assert [result["input"] for result in results] == [str(index) for index in range(1, 100)]
+    finally:
+        pool.terminate()
+
+
+def test_error_description():
+    assert scanning.error_description(ValueError("a", 1)) == 'ValueError("a", "1")'
@@ -0,0 +1,104 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.sizing``."""
+import base64
+import io
+
+import aws_encryption_sdk
+import pytest
+from aws_encryption_sdk.identifiers import Algorithm, CommitmentPolicy
+
+from aws_encryption_sdk_cli.internal import sizing
+
+from ..unit_test_utils import static_materials_manager
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+ALGORITHMS = (
+    Algorithm.AES_256_GCM_HKDF_SHA512_COMMIT_KEY,
+    Algorithm.AES_256_GCM_HKDF_SHA512_COMMIT_KEY_ECDSA_P384,
+    Algorithm.AES_256_GCM_IV12_TAG16_HKDF_SHA256,
+    Algorithm.AES_128_GCM_IV12_TAG16_HKDF_SHA256_ECDSA_P256,
+)
+
+
+def _encrypt(plaintext, algorithm, frame_length, encryption_context):
+    if algorithm.is_committing():
+        commitment_policy = CommitmentPolicy.REQUIRE_ENCRYPT_REQUIRE_DECRYPT
+    else:
+        commitment_policy = CommitmentPolicy.FORBID_ENCRYPT_ALLOW_DECRYPT
+    client = aws_encryption_sdk.EncryptionSDKClient(commitment_policy=commitment_policy)
+    with client.stream(
+        mode="encrypt",
+        source=io.BytesIO(plaintext),
+        materials_manager=static_materials_manager(),
+        algorithm=algorithm,
+        frame_length=frame_length,
+        encryption_context=encryption_context,
+    ) as encryptor:
+        ciphertext = encryptor.read()
+        return ciphertext, encryptor.header
+
+
+@pytest.mark.parametrize("length", (0, 1, 2, 3, 4, 5, 6, 1024, 1025))
+def test_encoded_length(length):
+    assert sizing.encoded_length(length) == len(base64.b64encode(b"\x00" * length))
+
+
+@pytest.mark.functional
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+@pytest.mark.parametrize("plaintext_length, frame_length", ((0, 4096), (10, 4096), (10000, 1024), (4096, 4096)))
+def test_f_ciphertext_length(algorithm, plaintext_length, frame_length):
+    ciphertext, header = _encrypt(b"\x02" * plaintext_length, algorithm, frame_length, {"some": "context"})
+
+    test = sizing.ciphertext_length(header, plaintext_length)
+
+    assert test == len(ciphertext)
+
+
+@pytest.mark.functional
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+@pytest.mark.parametrize("frame_length", (0, 1024))
+def test_f_estimate_ciphertext_length(monkeypatch, algorithm, frame_length):
+    encryption_context = {"some": "context", "more": "context"}
+    ciphertext, header = _encrypt(b"\x03" * 5000, algorithm, frame_length, encryption_context)
+    # Substitute the real encrypted data keys so that everything else about the estimate must be exact
+    monkeypatch.setattr(sizing, "_estimated_encrypted_data_keys", lambda *args: header.encrypted_data_keys)
+
+    test = sizing.estimate_ciphertext_length(
+        plaintext_length=5000,
+        algorithm=algorithm,
+        key_ids=["static-key"],
+        encryption_context=encryption_context,
+        frame_length=frame_length,
+    )
+
+    assert test == len(ciphertext)
+
+
+def test_estimate_ciphertext_length_scales_with_wrapping_keys():
+    algorithm = Algorithm.AES_256_GCM_HKDF_SHA512_COMMIT_KEY
+    one_key = sizing.estimate_ciphertext_length(plaintext_length=100, algorithm=algorithm, key_ids=["key"])
+    two_keys = sizing.estimate_ciphertext_length(plaintext_length=100, algorithm=algorithm, key_ids=["key", "key"])
+
+    # provider ID, key info, and encrypted data key, each with a two-byte length prefix
+    assert two_keys - one_key == (2 + len(sizing.ESTIMATED_PROVIDER_ID)) + (2 + 3) + (2 + 32 + 152)
+
+
+def test_estimate_ciphertext_length_default_frame_length():
+    algorithm = Algorithm.AES_256_GCM_HKDF_SHA512_COMMIT_KEY
+    assert sizing.estimate_ciphertext_length(
+        plaintext_length=100, algorithm=algorithm, key_ids=["key"]
+    ) == sizing.estimate_ciphertext_length(
+        plaintext_length=100, algorithm=algorithm, key_ids=["key"], frame_length=4096
+    )
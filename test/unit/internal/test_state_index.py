@@ -0,0 +1,246 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.state_index``."""
+import hashlib
+import os
+
+import pytest
+
+from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal import state_index
+from aws_encryption_sdk_cli.internal.state_index import StateIndex
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+
+@pytest.fixture
+def files(tmpdir):
+    source = tmpdir.join("source")
+    source.write(b"some data")
+    destination = tmpdir.join("destination")
+    destination.write(b"ciphertext")
+    return str(source), str(destination)
+
+
+def _recorded_index(tmpdir, files, hash_content=False):
+    source, destination = files
+    index = StateIndex(str(tmpdir.join("state.db")), hash_content=hash_content)
+    source_hash = state_index.content_hash(source) if hash_content else None
+    index.record(source, os.stat(source), destination, "encrypt", "message-id", source_hash)
+    return index
+
+
+def test_content_hash(tmpdir):
+    source = tmpdir.join("source")
+    source.write(b"some data")
+
+    assert state_index.content_hash(str(source)) == hashlib.sha256(b"some data").hexdigest()
+
+
+def test_state_index_missing_parent_directory(tmpdir):
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        StateIndex(str(tmpdir.join("missing", "state.db")))
+
+    excinfo.match(r"Parent directory for requested state index file does not exist.")
+
+
+def test_state_index_invalid_file(tmpdir):
+    index_file = tmpdir.join("state.db")
+    index_file.write(b"this is not a database" * 100)
+    index = StateIndex(str(index_file))
+
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        index.is_unchanged("source", None, "destination", "encrypt")
+
+    excinfo.match(r"Unable to open state index")
+
+
+def test_is_unchanged_not_recorded(tmpdir, files):
+    source, destination = files
+    index = StateIndex(str(tmpdir.join("state.db")))
+
+    assert not index.is_unchanged(source, os.stat(source), destination, "encrypt")
+
+
+def test_is_unchanged(tmpdir, files):
+    source, destination = files
+    index = _recorded_index(tmpdir, files)
+
+    assert index.is_unchanged(source, os.stat(source), destination, "encrypt")
+
+
+@pytest.mark.parametrize("destination_name, mode", (("destination", "decrypt"), ("other", "encrypt")))
+def test_is_unchanged_different_operation(tmpdir, files, destination_name, mode):
+    source, _destination = files
+    tmpdir.join("other").write(b"ciphertext")
+    index = _recorded_index(tmpdir, files)
+
+    assert not index.is_unchanged(source, os.stat(source), str(tmpdir.join(destination_name)), mode)
+
+
+def test_is_unchanged_destination_removed(tmpdir, files):
+    source, destination = files
+    index = _recorded_index(tmpdir, files)
+    os.remove(destination)
+
+    assert not index.is_unchanged(source, os.stat(source), destination, "encrypt")
+
+
+def test_is_unchanged_destination_replaced(tmpdir, files):
+    source, destination = files
+    index = _recorded_index(tmpdir, files)
+    with open(destination, "ab") as destination_file:
+        destination_file.write(b"more ciphertext")
+
+    assert not index.is_unchanged(source, os.stat(source), destination, "encrypt")
+
+
+def test_is_unchanged_destination_mtime_changed(tmpdir, files):
+    source, destination = files
+    index = _recorded_index(tmpdir, files)
+    destination_stat = os.stat(destination)
+    os.utime(destination, (destination_stat.st_atime, destination_stat.st_mtime - 10))
+
+    assert not index.is_unchanged(source, os.stat(source), destination, "encrypt")
+
+
+def test_is_unchanged_destination_not_in_place(tmpdir, files):
+    source, destination = files
+    os.remove(destination)
+    index = _recorded_index(tmpdir, files)
+    tmpdir.join("destination").write(b"ciphertext")
+
+    assert not index.is_unchanged(source, os.stat(source), destination, "encrypt")
+
+
+def test_is_unchanged_size_changed(tmpdir, files):
+    source, destination = files
+    index = _recorded_index(tmpdir, files, hash_content=True)
+    with open(source, "ab") as source_file:
+        source_file.write(b"more data")
+
+    assert not index.is_unchanged(source, os.stat(source), destination, "encrypt")
+
+
+def test_is_unchanged_mtime_changed(tmpdir, files):
+    source, destination = files
+    index = _recorded_index(tmpdir, files)
+    source_stat = os.stat(source)
+    os.utime(source, (source_stat.st_atime, source_stat.st_mtime + 10))
+
+    assert not index.is_unchanged(source, os.stat(source), destination, "encrypt")
+
+
+def test_is_unchanged_mtime_changed_same_content(tmpdir, files, mocker):
+    source, destination = files
+    index = _recorded_index(tmpdir, files, hash_content=True)
+    source_stat = os.stat(source)
+    os.utime(source, (source_stat.st_atime, source_stat.st_mtime + 10))
+
+    assert index.is_unchanged(source, os.stat(source), destination, "encrypt")
+
+    # The new attributes are recorded, so the contents are not read again
+    mocker.patch.object(state_index, "content_hash")
+    assert index.is_unchanged(source, os.stat(source), destination, "encrypt")
+    assert not state_index.content_hash.called
+
+
+def test_is_unchanged_mtime_changed_different_content(tmpdir, files):
+    source, destination = files
+    index = _recorded_index(tmpdir, files, hash_content=True)
+    source_stat = os.stat(source)
+    with open(source, "wb") as source_file:
+        source_file.write(b"SOME DATA")
+    os.utime(source, (source_stat.st_atime, source_stat.st_mtime + 10))
+
+    assert not index.is_unchanged(source, os.stat(source), destination, "encrypt")
+
+
+def test_find_moved(tmpdir, files):
+    source, destination = files
+    index = _recorded_index(tmpdir, files)
+    new_source = str(tmpdir.join("renamed"))
+    os.rename(source, new_source)
+
+    test = index.find_moved(new_source, os.stat(new_source), "encrypt")
+
+    assert test == (source, destination, "message-id", None)
+
+
+def test_find_moved_source_still_exists(tmpdir, files):
+    source, _destination = files
+    index = _recorded_index(tmpdir, files)
+    new_source = str(tmpdir.join("hardlink"))
+    os.link(source, new_source)
+
+    assert index.find_moved(new_source, os.stat(new_source), "encrypt") is None
+
+
+def test_find_moved_different_mode(tmpdir, files):
+    source, _destination = files
+    index = _recorded_index(tmpdir, files)
+    new_source = str(tmpdir.join("renamed"))
+    os.rename(source, new_source)
+
+    assert index.find_moved(new_source, os.stat(new_source), "decrypt") is None
+
+
+def test_records_under(tmpdir):
+    index = StateIndex(str(tmpdir.join("state.db")))
+    for name in ("source/a", "source/nested/b", "source2/c", "sourc/d"):
+        source = tmpdir.join(*name.split("/"))
+        source.ensure()
+        index.record(str(source), os.stat(str(source)), str(source) + ".encrypted", "encrypt", "message-id")
+
+    test = sorted(index.records_under(str(tmpdir.join("source")), "encrypt"))
+
+    assert test == [
+        (str(tmpdir.join("source", "a")), str(tmpdir.join("source", "a")) + ".encrypted"),
+        (str(tmpdir.join("source", "nested", "b")), str(tmpdir.join("source", "nested", "b")) + ".encrypted"),
+    ]
+    assert list(index.records_under(str(tmpdir.join("source")), "decrypt")) == []
+
+
+def test_remove(tmpdir, files):
+    source, destination = files
+    index = _recorded_index(tmpdir, files)
+
+    index.remove(source)
+
+    assert not index.is_unchanged(source, os.stat(source), destination, "encrypt")
+
+
+def test_record_batches_commits(tmpdir, files, monkeypatch):
+    source, destination = files
+    monkeypatch.setattr(state_index, "_COMMIT_INTERVAL", 2)
+    index_file = str(tmpdir.join("state.db"))
+    index = StateIndex(index_file)
+    reader = StateIndex(index_file)
+
+    index.record(source, os.stat(source), destination, "encrypt", "message-id")
+    assert not reader.is_unchanged(source, os.stat(source), destination, "encrypt")
+
+    index.record(source, os.stat(source), destination, "encrypt", "message-id")
+    assert reader.is_unchanged(source, os.stat(source), destination, "encrypt")
+
+
+def test_close_persists_records(tmpdir, files):
+    source, destination = files
+    index = _recorded_index(tmpdir, files)
+    index.close()
+
+    assert StateIndex(str(tmpdir.join("state.db"))).is_unchanged(source, os.stat(source), destination, "encrypt")
+
+
+def test_close_unopened():
+    StateIndex("state.db").close()
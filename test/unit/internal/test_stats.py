@@ -0,0 +1,173 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.stats``."""
+import json
+
+import pytest
+from botocore.hooks import HierarchicalEmitter
+from mock import MagicMock
+
+from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal import stats
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+
+@pytest.fixture
+def run_statistics():
+    test = stats.RunStatistics()
+    test.start()
+    yield test
+    if stats.active_statistics() is test:
+        stats._ACTIVE = None
+
+
+@pytest.mark.parametrize(
+    "values, percent, expected",
+    (
+        ([], 50, None),
+        ([1.0], 99, 1.0),
+        ([1.0, 2.0, 3.0, 4.0], 50, 2.0),
+        ([1.0, 2.0, 3.0, 4.0], 90, 4.0),
+        (list(range(1, 101)), 99, 99),
+    ),
+)
+def test_percentile(values, percent, expected):
+    assert stats._percentile(values, percent) == expected
+
+
+def test_summary(run_statistics):
+    run_statistics.record_operation(stats.SUCCEEDED, input_bytes=100, output_bytes=200)
+    run_statistics.record_operation(stats.SUCCEEDED, input_bytes=50)
+    run_statistics.record_operation(stats.SKIPPED)
+    run_statistics.record_operation(stats.FAILED, input_bytes=10, output_bytes=0)
+    for seconds in (0.4, 0.1, 0.3, 0.2):
+        run_statistics.record_kms_call("Decrypt", seconds)
+    run_statistics.record_kms_call("GenerateDataKey", 0.5, error=True)
+    run_statistics.record_cache_lookup(True)
+    run_statistics.record_cache_lookup(False)
+    run_statistics.record_cache_lookup(True)
+    run_statistics.record_error("IncorrectMasterKeyError")
+    run_statistics.record_error("IncorrectMasterKeyError")
+
+    test = run_statistics.summary()
+
+    assert test["operations"]["total"] == 4
+    assert test["operations"]["succeeded"] == 2
+    assert test["operations"]["skipped"] == 1
+    assert test["operations"]["failed"] == 1
+    assert test["input_bytes"] == 160
+    assert test["output_bytes"] == 200
+    assert test["elapsed_seconds"] >= 0
+    assert test["kms"]["calls"] == 5
+    assert test["kms"]["errors"] == 1
+    assert test["kms"]["operations"] == {"Decrypt": 4, "GenerateDataKey": 1}
+    assert test["kms"]["latency_seconds"] == dict(p50=0.3, p90=0.5, p99=0.5, max=0.5)
+    assert test["cache"] == dict(hits=2, misses=1)
+    assert test["errors"] == {"IncorrectMasterKeyError": 2}
+    assert run_statistics.kms_latencies() == [0.4, 0.1, 0.3, 0.2, 0.5]
+
+
+def test_summary_empty():
+    test = stats.RunStatistics().summary()
+
+    assert test["operations"]["total"] == 0
+    assert test["input_bytes_per_second"] is None
+    assert test["kms"]["latency_seconds"] == dict(p50=None, p90=None, p99=None, max=None)
+
+
+def test_kms_calls_recorded_through_botocore(run_statistics, monkeypatch):
+    clock = iter((10.0, 10.25, 20.0, 20.5, 30.0))
+    monkeypatch.setattr(stats, "_clock", lambda: next(clock))
+    # Sessions register handlers with their event emitter
+    session = HierarchicalEmitter()
+    stats.instrument_botocore_session(session)
+
+    context = {}
+    session.emit("before-call.kms.Decrypt", context=context, params={})
+    session.emit(
+        "after-call.kms.Decrypt",
+        model=MagicMock(),
+        context=context,
+        http_response=MagicMock(status_code=200),
+        parsed={},
+    )
+    session.emit("before-call.kms.GenerateDataKey", context=context, params={})
+    session.emit("after-call-error.kms.GenerateDataKey", context=context, exception=ValueError())
+
+    test = run_statistics.summary()["kms"]
+    assert test["calls"] == 2
+    assert test["errors"] == 1
+    assert test["latency_seconds"]["p50"] == 0.25
+    assert test["latency_seconds"]["max"] == 0.5
+    assert "GenerateDataKey" in test["operations"]
+
+
+def test_kms_calls_not_recorded_without_active_statistics():
+    context = {}
+    stats._before_kms_call(context=context)
+
+    assert context == {}
+
+
+def test_finish_json(tmpdir):
+    output = tmpdir.join("stats.json")
+    test = stats.RunStatistics(str(output))
+    test.start()
+    test.record_operation(stats.SUCCEEDED, input_bytes=10, output_bytes=20)
+
+    test.finish()
+
+    assert stats.active_statistics() is None
+    assert json.loads(output.read())["operations"]["succeeded"] == 1
+
+
+def test_finish_stderr(capsys, run_statistics):
+    run_statistics.record_operation(stats.SUCCEEDED, input_bytes=10, output_bytes=20)
+    run_statistics.record_kms_call("Decrypt", 0.125)
+
+    run_statistics.finish()
+
+    err = capsys.readouterr().err
+    assert "Operations: 1 (" in err
+    assert "succeeded: 1" in err
+    assert "Bytes: 10 in, 20 out in " in err
+    assert "KMS calls: 1 (0 failed); latency seconds: max 0.125, p50 0.125" in err
+    assert "Data key cache: 0 hits, 0 misses" in err
+    assert "Errors" not in err
+
+
+def test_finish_stderr_errors(capsys, run_statistics):
+    run_statistics.record_error("ValueError")
+    run_statistics.record_error("IOError")
+
+    run_statistics.finish()
+
+    assert "Errors: IOError: 1, ValueError: 1" in capsys.readouterr().err
+
+
+def test_finish_not_reported(capsys):
+    test = stats.RunStatistics(None)
+    test.start()
+
+    test.finish()
+
+    assert stats.active_statistics() is None
+    assert capsys.readouterr().err == ""
+
+
+def test_missing_parent_directory(tmpdir):
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        stats.RunStatistics(str(tmpdir.join("missing", "stats.json")))
+
+    excinfo.match(r"Parent directory for requested statistics file does not exist.")
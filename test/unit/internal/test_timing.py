@@ -0,0 +1,97 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.timing``."""
+import io
+
+import aws_encryption_sdk
+import pytest
+from mock import MagicMock
+
+from aws_encryption_sdk_cli.internal import timing
+
+from ..unit_test_utils import static_materials_manager
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+
+@pytest.mark.parametrize("frame_length, expected", ((1024, 3), (0, 0)))
+def test_frame_count(frame_length, expected):
+    client = aws_encryption_sdk.EncryptionSDKClient()
+    plaintext = b"\x00" * 3000
+    with client.stream(
+        mode="encrypt",
+        source=io.BytesIO(plaintext),
+        materials_manager=static_materials_manager(),
+        frame_length=frame_length,
+    ) as encryptor:
+        ciphertext = encryptor.read()
+    assert timing.frame_count(encryptor) == expected
+
+    with client.stream(
+        mode="decrypt", source=io.BytesIO(ciphertext), materials_manager=static_materials_manager()
+    ) as decryptor:
+        assert decryptor.read() == plaintext
+    assert timing.frame_count(decryptor) == expected
+
+
+def test_stream_position():
+    source = io.BytesIO(b"some data")
+    source.read(4)
+
+    assert timing.stream_position(source) == 4
+
+
+def test_stream_position_unknown():
+    source = MagicMock()
+    source.tell.side_effect = IOError("Illegal seek")
+
+    assert timing.stream_position(source) is None
+
+
+def test_stream_size(tmpdir):
+    source = tmpdir.join("source")
+    source.write_binary(b"some data")
+
+    with open(str(source), "rb") as stream:
+        assert timing.stream_size(stream) == 9
+
+
+@pytest.mark.parametrize("stream", (io.BytesIO(b"some data"), MagicMock(fileno=MagicMock(side_effect=OSError()))))
+def test_stream_size_unknown(stream):
+    assert timing.stream_size(stream) is None
+
+
+def test_operation_timer(monkeypatch):
+    clock = iter((10.0, 10.5, 11.25, 12.0))
+    monkeypatch.setattr(timing, "_clock", lambda: next(clock))
+    timer = timing.OperationTimer()
+
+    timer.header_ready()
+    timer.wrote(b"")
+    timer.wrote(b"some")
+    timer.wrote(b"data")
+
+    assert timer.fields(frames=1) == dict(
+        header_seconds=0.5, first_byte_seconds=1.25, duration_seconds=2.0, output_bytes=8, frames=1
+    )
+
+
+def test_operation_timer_no_output(monkeypatch):
+    clock = iter((10.0, 11.0))
+    monkeypatch.setattr(timing, "_clock", lambda: next(clock))
+
+    fields = timing.OperationTimer().fields()
+
+    assert fields["header_seconds"] is None
+    assert fields["first_byte_seconds"] is None
+    assert fields["duration_seconds"] == 1.0
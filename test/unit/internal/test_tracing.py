@@ -0,0 +1,145 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.tracing``."""
+import json
+import threading
+
+import pytest
+from botocore.hooks import HierarchicalEmitter
+from mock import MagicMock
+
+from aws_encryption_sdk_cli.exceptions import BadUserArgumentError
+from aws_encryption_sdk_cli.internal import tracing
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+
+def _spans(output):
+    return {span["name"]: span for span in (json.loads(line) for line in output.readlines())}
+
+
+def test_span_not_traced():
+    test = tracing.span("operation", input="source")
+
+    assert test is tracing._NO_SPAN
+    with test:
+        pass
+
+
+def test_json_lines_tracer(tmpdir):
+    output = tmpdir.join("trace.jsonl")
+    tracer = tracing.JsonLinesTracer(str(output))
+
+    with tracer:
+        tracer.add_span("parse_args", tracing.clock() - 1.0, tracing.clock())
+        with tracing.span("operation", input="source"):
+            with tracing.span("header"):
+                pass
+            with pytest.raises(ValueError):
+                with tracing.span("body"):
+                    raise ValueError()
+    assert tracing.span("operation") is tracing._NO_SPAN
+
+    spans = _spans(output)
+    assert spans["parse_args"]["parent"] is None
+    assert spans["parse_args"]["duration"] >= 1.0
+    assert spans["run"]["parent"] is None
+    assert spans["operation"]["parent"] == spans["run"]["id"]
+    assert spans["operation"]["args"] == dict(input="source")
+    assert spans["header"]["parent"] == spans["operation"]["id"]
+    assert spans["body"]["parent"] == spans["operation"]["id"]
+    assert spans["body"]["args"] == dict(error="ValueError")
+    assert spans["header"]["start"] >= spans["operation"]["start"]
+    assert spans["run"]["duration"] >= spans["operation"]["duration"]
+
+
+def test_spans_in_other_threads_are_children_of_run(tmpdir):
+    output = tmpdir.join("trace.jsonl")
+
+    def _worker():
+        with tracing.span("operation"):
+            with tracing.span("header"):
+                pass
+
+    with tracing.JsonLinesTracer(str(output)):
+        worker = threading.Thread(target=_worker, name="worker")
+        worker.start()
+        worker.join()
+
+    spans = _spans(output)
+    assert spans["operation"]["parent"] == spans["run"]["id"]
+    assert spans["operation"]["thread"] == "worker"
+    assert spans["header"]["parent"] == spans["operation"]["id"]
+
+
+def test_chrome_tracer(tmpdir):
+    output = tmpdir.join("trace.json")
+
+    with tracing.ChromeTracer(str(output)):
+        with tracing.span("operation", input="source"):
+            pass
+
+    events = json.loads(output.read())
+    operation = [event for event in events if event["name"] == "operation"][0]
+    run = [event for event in events if event["name"] == "run"][0]
+    thread_names = [event for event in events if event["ph"] == "M"]
+    assert operation["ph"] == "X"
+    assert operation["tid"] == threading.current_thread().ident
+    assert operation["args"]["input"] == "source"
+    assert operation["args"]["parent_id"] == run["args"]["span_id"]
+    assert run["ts"] <= operation["ts"]
+    assert run["dur"] >= operation["dur"]
+    assert thread_names == [
+        dict(
+            name="thread_name", ph="M", pid=run["pid"], tid=run["tid"], args=dict(name=threading.current_thread().name)
+        )
+    ]
+
+
+def test_kms_calls_traced_through_botocore(tmpdir):
+    output = tmpdir.join("trace.jsonl")
+    # Sessions register handlers with their event emitter
+    session = HierarchicalEmitter()
+    tracing.instrument_botocore_session(session)
+    decrypt = MagicMock()
+    decrypt.name = "Decrypt"
+    generate = MagicMock()
+    generate.name = "GenerateDataKey"
+
+    context = {}
+    session.emit("before-call.kms.Decrypt", model=decrypt, context=context, params={})
+    # Calls made while no run is being traced are not recorded
+    session.emit("after-call.kms.Decrypt", model=decrypt, context=context, http_response=MagicMock(status_code=200))
+    with tracing.JsonLinesTracer(str(output)):
+        with tracing.span("operation"):
+            session.emit("before-call.kms.Decrypt", model=decrypt, context=context, params={})
+            session.emit(
+                "after-call.kms.Decrypt", model=decrypt, context=context, http_response=MagicMock(status_code=200)
+            )
+            session.emit("before-call.kms.GenerateDataKey", model=generate, context=context, params={})
+            session.emit("after-call-error.kms.GenerateDataKey", context=context, exception=ValueError())
+
+    spans = _spans(output)
+    assert sorted(spans) == ["kms.Decrypt", "kms.GenerateDataKey", "operation", "run"]
+    assert spans["kms.Decrypt"]["parent"] == spans["operation"]["id"]
+    assert spans["kms.Decrypt"]["args"] == dict(status=200)
+    assert spans["kms.GenerateDataKey"]["args"] == dict(error="ValueError")
+    assert context == {}
+
+
+@pytest.mark.parametrize("tracer_class", (tracing.JsonLinesTracer, tracing.ChromeTracer))
+def test_missing_parent_directory(tmpdir, tracer_class):
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        tracer_class(str(tmpdir.join("missing", "trace")))
+
+    excinfo.match(r"Parent directory for requested trace file does not exist.")
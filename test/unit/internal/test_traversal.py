@@ -0,0 +1,142 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.traversal``."""
+import os
+
+import pytest
+
+from aws_encryption_sdk_cli.internal import traversal
+
+from ..unit_test_utils import WINDOWS_SKIP_MESSAGE, is_windows
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+
+def _build_tree(tmpdir):
+    source = tmpdir.mkdir("source")
+    source.join("root_file").write(b"")
+    a_dir = source.mkdir("a")
+    a_dir.join("a_file").write(b"a")
+    b_dir = a_dir.mkdir("b")
+    b_dir.join("b_file").write(b"bb")
+    source.mkdir("empty")
+    return source
+
+
+def test_walk_matches_os_walk(tmpdir):
+    source = str(_build_tree(tmpdir))
+
+    test = [(base_dir, sorted(entry.name for entry in entries)) for base_dir, entries in traversal.walk(source)]
+
+    expected = [(base_dir, sorted(files)) for base_dir, _dirs, files in os.walk(source)]
+    assert sorted(test) == sorted(expected)
+    assert test[0][0] == source
+
+
+def test_walk_entries_carry_stat(tmpdir):
+    source = _build_tree(tmpdir)
+
+    sizes = dict(
+        (entry.path, entry.stat().st_size) for _base_dir, entries in traversal.walk(str(source)) for entry in entries
+    )
+
+    assert sizes == {
+        str(source.join("root_file")): 0,
+        str(source.join("a", "a_file")): 1,
+        str(source.join("a", "b", "b_file")): 2,
+    }
+
+
+@pytest.mark.skipif(is_windows(), reason=WINDOWS_SKIP_MESSAGE)
+def test_walk_does_not_follow_directory_symlinks(tmpdir):
+    source = _build_tree(tmpdir)
+    os.symlink(str(source.join("a")), str(source.join("link_to_a")))
+
+    test = list(traversal.walk(str(source)))
+
+    assert str(source.join("link_to_a")) not in [base_dir for base_dir, _entries in test]
+    assert "link_to_a" not in [entry.name for _base_dir, entries in test for entry in entries]
+
+
+@pytest.mark.skipif(is_windows(), reason=WINDOWS_SKIP_MESSAGE)
+def test_walk_without_scandir(tmpdir, monkeypatch):
+    source = _build_tree(tmpdir)
+    os.symlink(str(source.join("a")), str(source.join("link_to_a")))
+    os.symlink(str(source.join("missing")), str(source.join("broken_link")))
+    expected = sorted((base_dir, sorted(files)) for base_dir, _dirs, files in os.walk(str(source)))
+    monkeypatch.delattr(os, "scandir")
+
+    test = list(traversal.walk(str(source)))
+
+    assert sorted((base_dir, sorted(entry.name for entry in entries)) for base_dir, entries in test) == expected
+    entries = dict((entry.name, entry) for _base_dir, entries in test for entry in entries)
+    assert entries["b_file"].stat().st_size == 2
+    assert entries["broken_link"].is_symlink()
+
+
+def test_walk_unreadable_directory(tmpdir):
+    assert list(traversal.walk(str(tmpdir.join("does_not_exist")))) == []
+
+
+def _walked_paths(source, source_filter):
+    return sorted(
+        os.path.relpath(entry.path, str(source))
+        for _base_dir, entries in traversal.walk(str(source), source_filter)
+        for entry in entries
+    )
+
+
+@pytest.mark.parametrize(
+    "filter_kwargs, expected",
+    (
+        ({}, ["a/a_file", "a/b/b_file", "root_file"]),
+        ({"include": ["*_file"]}, ["a/a_file", "a/b/b_file", "root_file"]),
+        ({"include": ["a_*", "b_*"]}, ["a/a_file", "a/b/b_file"]),
+        ({"include": ["a/*"]}, ["a/a_file", "a/b/b_file"]),
+        ({"exclude": ["root_*"]}, ["a/a_file", "a/b/b_file"]),
+        ({"exclude": ["b"]}, ["a/a_file", "root_file"]),
+        ({"exclude": ["a/b"]}, ["a/a_file", "root_file"]),
+        ({"include": ["*_file"], "exclude": ["a_file"]}, ["a/b/b_file", "root_file"]),
+        ({"min_size": 1}, ["a/a_file", "a/b/b_file"]),
+        ({"max_size": 1}, ["a/a_file", "root_file"]),
+        ({"min_size": 1, "max_size": 1}, ["a/a_file"]),
+    ),
+)
+def test_walk_source_filter(tmpdir, filter_kwargs, expected):
+    source = _build_tree(tmpdir)
+
+    test = _walked_paths(source, traversal.SourceFilter(**filter_kwargs))
+
+    assert test == [os.path.join(*path.split("/")) for path in expected]
+
+
+def test_walk_source_filter_newer_than(tmpdir):
+    source = _build_tree(tmpdir)
+    os.utime(str(source.join("root_file")), (1000, 1000))
+    os.utime(str(source.join("a", "a_file")), (3000, 3000))
+    os.utime(str(source.join("a", "b", "b_file")), (2000, 2000))
+
+    test = _walked_paths(source, traversal.SourceFilter(newer_than=2000))
+
+    assert test == [os.path.join("a", "a_file")]
+
+
+def test_walk_source_filter_prunes_excluded_directories(tmpdir, mocker):
+    source = _build_tree(tmpdir)
+    mocker.patch.object(traversal.SourceFilter, "includes_file", autospec=True, side_effect=lambda *args: False)
+    source_filter = traversal.SourceFilter(exclude=["b"])
+
+    list(traversal.walk(str(source), source_filter))
+
+    visited = sorted(call_args[0][1] for call_args in traversal.SourceFilter.includes_file.call_args_list)
+    assert visited == [os.path.join("a", "a_file"), "root_file"]
@@ -0,0 +1,177 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.verification``."""
+import base64
+import io
+import json
+import os
+
+import aws_encryption_sdk
+import pytest
+from aws_encryption_sdk.identifiers import Algorithm, CommitmentPolicy
+from pytest_mock import mocker  # noqa pylint: disable=unused-import
+
+from aws_encryption_sdk_cli.exceptions import AWSEncryptionSDKCLIError
+from aws_encryption_sdk_cli.internal import io_handling, metadata, verification
+from aws_encryption_sdk_cli.internal.traversal import SourceFilter
+
+from ..unit_test_utils import static_materials_manager
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+PLAINTEXT = os.urandom(10000)
+
+
+def _ciphertext(frame_length=1024, **kwargs):
+    ciphertext, _header = aws_encryption_sdk.EncryptionSDKClient().encrypt(
+        source=PLAINTEXT,
+        materials_manager=static_materials_manager("key"),
+        encryption_context={"some": "context"},
+        frame_length=frame_length,
+        **kwargs
+    )
+    return ciphertext
+
+
+def _verify(tmpdir, sources, jobs=1, recursive=False, **handler_kwargs):
+    metadata_output = tmpdir.join("metadata")
+    kwargs = dict(
+        metadata_writer=metadata.MetadataWriter()(str(metadata_output)),
+        interactive=False,
+        no_overwrite=False,
+        decode_input=False,
+        encode_output=False,
+        required_encryption_context={},
+        required_encryption_context_keys=[],
+        commitment_policy=CommitmentPolicy.REQUIRE_ENCRYPT_REQUIRE_DECRYPT,
+    )
+    kwargs.update(handler_kwargs)
+    handler = io_handling.IOHandler(**kwargs)
+    stream_args = dict(mode="verify", materials_manager=static_materials_manager("key"))
+    try:
+        verification.verify(handler, stream_args, [str(source) for source in sources], recursive, jobs)
+    finally:
+        records = [json.loads(line) for line in metadata_output.readlines()] if metadata_output.check() else []
+    return records
+
+
+@pytest.mark.parametrize(
+    "algorithm", (Algorithm.AES_256_GCM_HKDF_SHA512_COMMIT_KEY, Algorithm.AES_256_GCM_HKDF_SHA512_COMMIT_KEY_ECDSA_P384)
+)
+@pytest.mark.parametrize("frame_length", (1024, 0))
+def test_verify(tmpdir, algorithm, frame_length):
+    source = tmpdir.join("source")
+    source.write_binary(_ciphertext(algorithm=algorithm, frame_length=frame_length))
+
+    records = _verify(tmpdir, [source])
+
+    assert len(records) == 1
+    assert records[0]["mode"] == "verify"
+    assert records[0]["input"] == str(source)
+    assert records[0]["verified"]
+    assert records[0]["header"]["algorithm"] == algorithm.name
+    assert "error" not in records[0]
+    assert sorted(os.listdir(str(tmpdir))) == ["metadata", "source"]
+
+
+def test_verify_decode_input(tmpdir):
+    source = tmpdir.join("source")
+    source.write_binary(base64.b64encode(_ciphertext()))
+
+    records = _verify(tmpdir, [source], decode_input=True)
+
+    assert records[0]["verified"]
+
+
+@pytest.mark.parametrize(
+    "corrupt",
+    (
+        # Body
+        lambda ciphertext: ciphertext[:5000] + bytes(bytearray([ciphertext[5000] ^ 1])) + ciphertext[5001:],
+        # Signature
+        lambda ciphertext: ciphertext[:-1] + bytes(bytearray([ciphertext[-1] ^ 1])),
+        # Truncated
+        lambda ciphertext: ciphertext[:-200],
+    ),
+)
+def test_verify_failure(tmpdir, corrupt):
+    good = tmpdir.join("good")
+    good.write_binary(_ciphertext())
+    bad = tmpdir.join("bad")
+    bad.write_binary(corrupt(_ciphertext()))
+
+    with pytest.raises(AWSEncryptionSDKCLIError) as excinfo:
+        _verify(tmpdir, [bad, good])
+
+    excinfo.match(r"Verification failed for 1 of 2 messages")
+    records = [json.loads(line) for line in tmpdir.join("metadata").readlines()]
+    assert [(record["input"], record["verified"]) for record in records] == [(str(bad), False), (str(good), True)]
+    assert records[0]["error"]
+
+
+def test_verify_failure_without_message(tmpdir, mocker, caplog):
+    source = tmpdir.join("source")
+    source.write_binary(_ciphertext())
+    mocker.patch.object(verification, "_authenticate", side_effect=ValueError())
+
+    with pytest.raises(AWSEncryptionSDKCLIError):
+        _verify(tmpdir, [source])
+
+    records = [json.loads(line) for line in tmpdir.join("metadata").readlines()]
+    assert records[0]["error"] == "ValueError()"
+    assert "Verification failed for {}: ValueError()".format(source) in caplog.text
+
+
+def test_verify_missing_required_context(tmpdir, mocker):
+    source = tmpdir.join("source")
+    source.write_binary(_ciphertext())
+    read = mocker.spy(aws_encryption_sdk.streaming_client.StreamDecryptor, "read")
+
+    with pytest.raises(AWSEncryptionSDKCLIError):
+        _verify(tmpdir, [source], required_encryption_context={"other": "context"})
+
+    records = [json.loads(line) for line in tmpdir.join("metadata").readlines()]
+    assert not records[0]["verified"]
+    assert records[0]["skipped"]
+    assert records[0]["missing_encryption_context_pairs"] == [["other", "context"]]
+    assert not read.called
+
+
+def test_verify_directory_jobs(tmpdir):
+    source = tmpdir.mkdir("source")
+    paths = []
+    for name in ("a", "b", "c", "d"):
+        source.join(name).write_binary(_ciphertext())
+        paths.append(str(source.join(name)))
+    source.mkdir("nested").join("e.skip").write_binary(b"not a message")
+
+    records = _verify(tmpdir, [source], jobs=3, recursive=True, source_filter=SourceFilter(exclude=["*.skip"]))
+
+    assert sorted(record["input"] for record in records) == paths
+    assert all(record["verified"] for record in records)
+
+
+def test_verify_directory_not_recursive(tmpdir):
+    source = tmpdir.mkdir("source")
+    source.join("a").write_binary(_ciphertext())
+
+    assert _verify(tmpdir, [source, tmpdir.join("missing")]) == []
+
+
+def test_verify_stdin(tmpdir, mocker):
+    mocker.patch.object(verification, "_stdin", return_value=io.BytesIO(_ciphertext()))
+
+    records = _verify(tmpdir, ["-"])
+
+    assert records[0]["input"] == "-"
+    assert records[0]["verified"]
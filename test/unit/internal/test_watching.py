@@ -0,0 +1,191 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+# http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Unit test suite for ``aws_encryption_sdk_cli.internal.watching``."""
+import os
+import sys
+
+import pytest
+from mock import MagicMock, call, sentinel
+from pytest_mock import mocker  # noqa pylint: disable=unused-import
+
+from aws_encryption_sdk_cli.internal import watching
+from aws_encryption_sdk_cli.internal.traversal import SourceFilter
+
+pytestmark = [pytest.mark.unit, pytest.mark.local]
+
+LINUX_ONLY = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is only available on Linux")
+
+
+@pytest.fixture
+def inotify_watcher(tmpdir):
+    watcher = watching._InotifyWatcher(str(tmpdir), SourceFilter(exclude=["*.tmp", "skip"]))
+    yield watcher
+    watcher.close()
+
+
+def test_polling_watcher_reports_settled_files(tmpdir):
+    tmpdir.join("existing").write(b"data")
+    watcher = watching._PollingWatcher(str(tmpdir), None, interval=0)
+
+    assert watcher.changes(0) == []
+
+    tmpdir.join("new").write(b"data")
+    assert watcher.changes(0) == []
+    assert watcher.changes(0) == [str(tmpdir.join("new"))]
+    assert watcher.changes(0) == []
+
+    tmpdir.join("existing").write(b"more data")
+    assert watcher.changes(0) == []
+    assert watcher.changes(0) == [str(tmpdir.join("existing"))]
+
+
+def test_polling_watcher_source_filter(tmpdir):
+    watcher = watching._PollingWatcher(str(tmpdir), SourceFilter(exclude=["*.tmp"]), interval=0)
+
+    tmpdir.join("a.tmp").write(b"data")
+    tmpdir.join("b").write(b"data")
+    watcher.changes(0)
+
+    assert watcher.changes(0) == [str(tmpdir.join("b"))]
+
+
+@LINUX_ONLY
+def test_inotify_watcher_reports_closed_files(tmpdir, inotify_watcher):
+    with open(str(tmpdir.join("a")), "wb") as source:
+        source.write(b"data")
+        assert inotify_watcher.changes(0.1) == []
+
+    assert inotify_watcher.changes(1) == [str(tmpdir.join("a"))]
+
+
+@LINUX_ONLY
+def test_inotify_watcher_reports_moved_files(tmpdir, inotify_watcher):
+    outside = tmpdir.mkdir("outside")
+    with open(str(outside.join("a")), "wb") as source:
+        source.write(b"data")
+    inotify_watcher.changes(0.1)
+
+    outside.join("a").rename(tmpdir.join("a"))
+
+    assert inotify_watcher.changes(1) == [str(tmpdir.join("a"))]
+
+
+@LINUX_ONLY
+def test_inotify_watcher_new_directories(tmpdir, inotify_watcher):
+    nested = tmpdir.mkdir("nested")
+    assert inotify_watcher.changes(1) == []
+
+    nested.join("a").write(b"data")
+
+    assert inotify_watcher.changes(1) == [str(nested.join("a"))]
+
+
+@LINUX_ONLY
+def test_inotify_watcher_source_filter(tmpdir, inotify_watcher):
+    tmpdir.join("a.tmp").write(b"data")
+    tmpdir.mkdir("skip").join("b").write(b"data")
+    tmpdir.join("c").write(b"data")
+
+    assert inotify_watcher.changes(1) == [str(tmpdir.join("c"))]
+
+
+@LINUX_ONLY
+def test_inotify_watcher_overflow_rescans(tmpdir, inotify_watcher, mocker):
+    tmpdir.join("a").write(b"data")
+    inotify_watcher.changes(1)
+    overflow = watching._EVENT_HEADER.pack(-1, watching._IN_Q_OVERFLOW, 0, 0)
+    mocker.patch.object(watching.os, "read", return_value=overflow)
+
+    assert inotify_watcher._read_events() == [str(tmpdir.join("a"))]
+
+
+@LINUX_ONLY
+def test_inotify_watcher_closes_descriptor_on_error(tmpdir, mocker):
+    mocker.patch.object(watching, "walk", side_effect=ValueError("walk failed"))
+    open_fds = os.listdir("/proc/self/fd")
+
+    with pytest.raises(ValueError):
+        watching._InotifyWatcher(str(tmpdir), None)
+
+    assert os.listdir("/proc/self/fd") == open_fds
+
+
+def test_watcher_falls_back_to_polling(tmpdir, mocker):
+    mocker.patch.object(watching, "_InotifyWatcher", side_effect=OSError("not available"))
+
+    assert isinstance(watching._watcher(str(tmpdir), None), watching._PollingWatcher)
+
+
+def test_process_batch(tmpdir):
+    source = tmpdir.mkdir("source")
+    source.join("a").write(b"data")
+    source.mkdir("nested").join("b").write(b"data")
+    destination = tmpdir.mkdir("destination")
+    handler = MagicMock()
+    handler.process_single_file.side_effect = (Exception("failed"), None)
+
+    watching._process_batch(
+        handler,
+        {"mode": "encrypt"},
+        str(source),
+        str(destination),
+        None,
+        [str(source.join("a")), str(source.join("missing")), str(source.join("nested", "b"))],
+    )
+
+    handler.process_single_file.assert_has_calls(
+        [
+            call(
+                stream_args={"mode": "encrypt"},
+                source=str(source.join("a")),
+                destination=str(destination.join("a.encrypted")),
+            ),
+            call(
+                stream_args={"mode": "encrypt"},
+                source=str(source.join("nested", "b")),
+                destination=str(destination.join("nested", "b.encrypted")),
+            ),
+        ]
+    )
+    assert handler.process_single_file.call_count == 2
+    handler.flush.assert_called_once_with()
+
+
+def test_watch(mocker):
+    watcher = MagicMock()
+    watcher.changes.side_effect = ([], [sentinel.path], KeyboardInterrupt)
+    mocker.patch.object(watching, "_watcher", return_value=watcher)
+    mocker.patch.object(watching, "_process_batch")
+    handler = MagicMock()
+
+    watching.watch(handler, sentinel.stream_args, sentinel.source, sentinel.destination, sentinel.suffix)
+
+    watching._watcher.assert_called_once_with(sentinel.source, handler.source_filter)
+    handler.process_dir.assert_called_once_with(
+        stream_args=sentinel.stream_args,
+        source=sentinel.source,
+        destination=sentinel.destination,
+        suffix=sentinel.suffix,
+    )
+    watching._process_batch.assert_called_once_with(
+        handler, sentinel.stream_args, sentinel.source, sentinel.destination, sentinel.suffix, [sentinel.path]
+    )
+    watcher.close.assert_called_once_with()
+
+
+def test_includes_dir():
+    source_filter = SourceFilter(exclude=["skip"])
+
+    assert watching._includes_dir(source_filter, os.path.join("a", "b"))
+    assert not watching._includes_dir(source_filter, os.path.join("skip", "b"))
+    assert watching._includes_dir(None, os.path.join("skip", "b"))
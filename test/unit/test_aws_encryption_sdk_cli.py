@@ -11,6 +11,7 @@
 # ANY KIND, either express or implied. See the License for the specific
 # language governing permissions and limitations under the License.
 """Unit test suite for ``aws_encryption_sdk_cli``."""
+import json
 import logging
 import os
 import shlex
@@ -24,8 +25,11 @@ from mock import ANY, MagicMock, call, sentinel
 import aws_encryption_sdk_cli
 from aws_encryption_sdk_cli.exceptions import AWSEncryptionSDKCLIError, BadUserArgumentError
 from aws_encryption_sdk_cli.internal.arg_parsing import CommitmentPolicyArgs
+from aws_encryption_sdk_cli.internal.durability import Durability
+from aws_encryption_sdk_cli.internal.journal import Journal
 from aws_encryption_sdk_cli.internal.logging_utils import FORMAT_STRING, _KMSKeyRedactingFormatter
 from aws_encryption_sdk_cli.internal.metadata import MetadataWriter
+from aws_encryption_sdk_cli.internal.state_index import StateIndex
 
 from .unit_test_utils import is_windows
 
@@ -234,6 +238,65 @@ def test_catch_bad_metadata_file_requests_metadata_in_source_or_dest_dir(tmpdir,
     excinfo.match(r"Metadata output file cannot be in the {} directory".format(match))
 
 
+def test_catch_bad_state_index_requests_none():
+    aws_encryption_sdk_cli._catch_bad_state_index_requests(None, "-", "-")
+
+
+def test_catch_bad_state_index_requests_index_is_dir(tmpdir):
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        aws_encryption_sdk_cli._catch_bad_state_index_requests(
+            StateIndex(str(tmpdir.mkdir("state"))), "-", str(tmpdir.join("destination"))
+        )
+
+    excinfo.match(r"State index cannot be a directory")
+
+
+@pytest.mark.parametrize("match", ("source", "destination"))
+def test_catch_bad_state_index_requests_index_is_source_or_dest(tmpdir, match):
+    source = tmpdir.join("source")
+    destination = tmpdir.join("destination")
+
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        aws_encryption_sdk_cli._catch_bad_state_index_requests(
+            StateIndex(str(tmpdir.join(match))), str(source), str(destination)
+        )
+
+    excinfo.match(r"State index file cannot be the input or output")
+
+
+def test_catch_bad_state_index_requests_index_in_source_dir(tmpdir):
+    source = tmpdir.mkdir("source")
+
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        aws_encryption_sdk_cli._catch_bad_state_index_requests(
+            StateIndex(str(source.join("state.db"))), str(source), str(tmpdir.mkdir("destination"))
+        )
+
+    excinfo.match(r"State index file cannot be in the input directory")
+
+
+@pytest.mark.parametrize("match", ("source", "destination"))
+def test_catch_bad_journal_requests_journal_is_source_or_dest(tmpdir, match):
+    source = tmpdir.join("source")
+    destination = tmpdir.join("destination")
+
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        aws_encryption_sdk_cli._catch_bad_journal_requests(
+            Journal(str(tmpdir.join(match))), str(source), str(destination)
+        )
+
+    excinfo.match(r"Resume journal file cannot be the input or output")
+
+
+def test_catch_bad_state_index_requests_index_beside_source_dir(tmpdir):
+    source = tmpdir.mkdir("source")
+    tmpdir.mkdir("source-state")
+
+    aws_encryption_sdk_cli._catch_bad_state_index_requests(
+        StateIndex(str(tmpdir.join("source-state", "state.db"))), str(source), str(tmpdir.mkdir("destination"))
+    )
+
+
 @pytest.mark.parametrize("source_is_symlink, dest_is_symlink, use_files", build_same_file_and_dir_test_cases())
 def test_process_cli_request_source_is_destination(tmpdir, source_is_symlink, dest_is_symlink, use_files):
     source, dest = build_same_files_and_dirs(tmpdir, source_is_symlink, dest_is_symlink, use_files)
@@ -258,6 +321,18 @@ def test_process_cli_request_source_dir_nonrecursive(tmpdir, patch_iohandler):
             recursive=False,
             interactive=sentinel.interactive,
             no_overwrite=sentinel.no_overwrite,
+            dry_run=False,
+            watch=False,
+            source_filter=None,
+            state_index=None,
+            sync=False,
+            resume=None,
+            new_wrapping_keys=None,
+            durability=Durability.none,
+            metadata_timing=False,
+            stats=None,
+            metrics_file=None,
+            profile=None,
             metadata_output=metadata_writer,
             decode=sentinel.decode_input,
             encode=sentinel.encode_output,
@@ -276,6 +351,14 @@ def test_process_cli_request_source_dir_nonrecursive(tmpdir, patch_iohandler):
         required_encryption_context=sentinel.encryption_context,
         required_encryption_context_keys=sentinel.required_keys,
         commitment_policy=CommitmentPolicy.REQUIRE_ENCRYPT_REQUIRE_DECRYPT,
+        source_filter=None,
+        state_index=None,
+        sync=False,
+        journal=None,
+        durability=Durability.none,
+        timing=False,
+        statistics=None,
+        profiler=None,
     )
     assert not patch_iohandler.return_value.process_single_operation.called
     assert not patch_iohandler.return_value.process_dir.called
@@ -294,6 +377,18 @@ def test_process_cli_request_no_commitment_policy(tmpdir, patch_iohandler):
             recursive=False,
             interactive=sentinel.interactive,
             no_overwrite=sentinel.no_overwrite,
+            dry_run=False,
+            watch=False,
+            source_filter=None,
+            state_index=None,
+            sync=False,
+            resume=None,
+            new_wrapping_keys=None,
+            durability=Durability.none,
+            metadata_timing=False,
+            stats=None,
+            metrics_file=None,
+            profile=None,
             metadata_output=metadata_writer,
             decode=sentinel.decode_input,
             encode=sentinel.encode_output,
@@ -312,6 +407,14 @@ def test_process_cli_request_no_commitment_policy(tmpdir, patch_iohandler):
         required_encryption_context=sentinel.encryption_context,
         required_encryption_context_keys=sentinel.required_keys,
         commitment_policy=CommitmentPolicy.REQUIRE_ENCRYPT_REQUIRE_DECRYPT,
+        source_filter=None,
+        state_index=None,
+        sync=False,
+        journal=None,
+        durability=Durability.none,
+        timing=False,
+        statistics=None,
+        profiler=None,
     )
     assert not patch_iohandler.return_value.process_single_operation.called
     assert not patch_iohandler.return_value.process_dir.called
@@ -329,6 +432,18 @@ def test_process_cli_request_source_dir_destination_nondir(tmpdir):
                 recursive=True,
                 interactive=False,
                 no_overwrite=False,
+                dry_run=False,
+                watch=False,
+                source_filter=None,
+                state_index=None,
+                sync=False,
+                resume=None,
+                new_wrapping_keys=None,
+                durability=Durability.none,
+                metadata_timing=False,
+                stats=None,
+                metrics_file=None,
+                profile=None,
                 decode=False,
                 encode=False,
                 metadata_output=MetadataWriter(True)(),
@@ -351,6 +466,18 @@ def test_process_cli_request_source_dir_destination_dir(tmpdir, patch_iohandler)
             recursive=True,
             interactive=sentinel.interactive,
             no_overwrite=sentinel.no_overwrite,
+            dry_run=False,
+            watch=False,
+            source_filter=None,
+            state_index=None,
+            sync=False,
+            resume=None,
+            new_wrapping_keys=None,
+            durability=Durability.none,
+            metadata_timing=False,
+            stats=None,
+            metrics_file=None,
+            profile=None,
             suffix=sentinel.suffix,
             decode=sentinel.decode_input,
             encode=sentinel.encode_output,
@@ -385,6 +512,14 @@ def test_process_cli_request_source_stdin(tmpdir, patch_iohandler):
         recursive=False,
         interactive=sentinel.interactive,
         no_overwrite=sentinel.no_overwrite,
+        dry_run=False,
+        watch=False,
+        source_filter=None,
+        state_index=None,
+        sync=False,
+        resume=None,
+        new_wrapping_keys=None,
+        durability=Durability.none,
         decode=sentinel.decode_input,
         encode=sentinel.encode_output,
         metadata_output=MetadataWriter(True)(),
@@ -410,6 +545,18 @@ def test_process_cli_request_source_file_destination_dir(tmpdir, patch_iohandler
             recursive=False,
             interactive=sentinel.interactive,
             no_overwrite=sentinel.no_overwrite,
+            dry_run=False,
+            watch=False,
+            source_filter=None,
+            state_index=None,
+            sync=False,
+            resume=None,
+            new_wrapping_keys=None,
+            durability=Durability.none,
+            metadata_timing=False,
+            stats=None,
+            metrics_file=None,
+            profile=None,
             suffix="CUSTOM_SUFFIX",
             decode=sentinel.decode_input,
             encode=sentinel.encode_output,
@@ -439,6 +586,18 @@ def test_process_cli_request_source_file_destination_file(tmpdir, patch_iohandle
             recursive=False,
             interactive=sentinel.interactive,
             no_overwrite=sentinel.no_overwrite,
+            dry_run=False,
+            watch=False,
+            source_filter=None,
+            state_index=None,
+            sync=False,
+            resume=None,
+            new_wrapping_keys=None,
+            durability=Durability.none,
+            metadata_timing=False,
+            stats=None,
+            metrics_file=None,
+            profile=None,
             decode=sentinel.decode_input,
             encode=sentinel.encode_output,
             metadata_output=MetadataWriter(True)(),
@@ -452,6 +611,264 @@ def test_process_cli_request_source_file_destination_file(tmpdir, patch_iohandle
     )
 
 
+def _watch_parsed_args(source, destination):
+    return MagicMock(
+        input=str(source),
+        output=str(destination),
+        recursive=True,
+        interactive=False,
+        no_overwrite=False,
+        dry_run=False,
+        watch=True,
+        source_filter=None,
+        state_index=None,
+        sync=False,
+        resume=None,
+        new_wrapping_keys=None,
+        durability=Durability.none,
+        suffix=sentinel.suffix,
+        decode=False,
+        encode=False,
+        metadata_output=MetadataWriter(True)(),
+        commitment_policy=CommitmentPolicyArgs.require_encrypt_require_decrypt,
+    )
+
+
+def test_process_cli_request_watch(tmpdir, patch_iohandler, mocker):
+    mocker.patch.object(aws_encryption_sdk_cli, "watch")
+    source = tmpdir.mkdir("source")
+    destination = tmpdir.mkdir("destination")
+
+    aws_encryption_sdk_cli.process_cli_request(
+        stream_args=sentinel.stream_args, parsed_args=_watch_parsed_args(source, destination)
+    )
+
+    aws_encryption_sdk_cli.watch.assert_called_once_with(
+        handler=patch_iohandler.return_value,
+        stream_args=sentinel.stream_args,
+        source=str(source),
+        destination=str(destination),
+        suffix=sentinel.suffix,
+    )
+    patch_iohandler.return_value.close.assert_called_once_with()
+
+
+def test_process_cli_request_watch_source_is_not_dir(tmpdir, patch_iohandler, mocker):
+    mocker.patch.object(aws_encryption_sdk_cli, "watch")
+    source = tmpdir.join("source")
+    source.write("some data")
+
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        aws_encryption_sdk_cli.process_cli_request(
+            stream_args=sentinel.stream_args, parsed_args=_watch_parsed_args(source, tmpdir.mkdir("destination"))
+        )
+
+    excinfo.match(r"If watching a source, it must be a single existing directory")
+    assert not aws_encryption_sdk_cli.watch.called
+
+
+def test_process_cli_request_watch_destination_inside_source(tmpdir, patch_iohandler, mocker):
+    mocker.patch.object(aws_encryption_sdk_cli, "watch")
+    source = tmpdir.mkdir("source")
+
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        aws_encryption_sdk_cli.process_cli_request(
+            stream_args=sentinel.stream_args, parsed_args=_watch_parsed_args(source, source.mkdir("destination"))
+        )
+
+    excinfo.match(r"If watching a source, destination cannot be inside it")
+    assert not aws_encryption_sdk_cli.watch.called
+
+
+def _scan_parsed_args(action, source, metadata_file):
+    return MagicMock(
+        action=action,
+        input=source,
+        output=None,
+        recursive=False,
+        interactive=False,
+        no_overwrite=False,
+        state_index=None,
+        resume=None,
+        dry_run=False,
+        jobs=4,
+        catalog=sentinel.catalog,
+        metadata_output=MetadataWriter()(str(metadata_file)),
+        commitment_policy=CommitmentPolicyArgs.require_encrypt_require_decrypt,
+    )
+
+
+@pytest.mark.parametrize("many_sources", (True, False))
+def test_process_cli_request_verify(tmpdir, patch_iohandler, mocker, many_sources):
+    mocker.patch.object(aws_encryption_sdk_cli, "verify")
+    source = tmpdir.mkdir("source")
+    source.join("a").write("some data")
+    source.join("b").write("some data")
+    parsed_args = _scan_parsed_args(
+        "verify", str(source.join("*" if many_sources else "a")), tmpdir.join("metadata")
+    )
+
+    aws_encryption_sdk_cli.process_cli_request(stream_args=sentinel.stream_args, parsed_args=parsed_args)
+
+    aws_encryption_sdk_cli.verify.assert_called_once_with(
+        handler=patch_iohandler.return_value,
+        stream_args=sentinel.stream_args,
+        sources=ANY,
+        recursive=False,
+        jobs=4,
+    )
+    sources = sorted(aws_encryption_sdk_cli.verify.call_args[1]["sources"])
+    assert sources == ([str(source.join("a")), str(source.join("b"))] if many_sources else [str(source.join("a"))])
+    patch_iohandler.return_value.close.assert_called_once_with()
+
+
+def test_process_cli_request_inspect(tmpdir, patch_iohandler, mocker):
+    mocker.patch.object(aws_encryption_sdk_cli, "inspect_headers")
+
+    aws_encryption_sdk_cli.process_cli_request(
+        stream_args=sentinel.stream_args, parsed_args=_scan_parsed_args("inspect", "-", tmpdir.join("metadata"))
+    )
+
+    aws_encryption_sdk_cli.inspect_headers.assert_called_once_with(
+        handler=patch_iohandler.return_value, sources=["-"], recursive=False, jobs=4, catalog=sentinel.catalog
+    )
+    patch_iohandler.return_value.close.assert_called_once_with()
+
+
+def test_process_cli_request_holds_metadata_open(tmpdir, patch_iohandler, mocker):
+    parsed_args = _scan_parsed_args("inspect", "-", tmpdir.join("metadata"))
+    writer = parsed_args.metadata_output
+
+    def _process_sources(**kwargs):
+        assert writer._output_stream is not None
+        assert not patch_iohandler.return_value.close.called
+
+    mocker.patch.object(aws_encryption_sdk_cli, "_process_sources", side_effect=_process_sources)
+
+    aws_encryption_sdk_cli.process_cli_request(stream_args=sentinel.stream_args, parsed_args=parsed_args)
+
+    assert aws_encryption_sdk_cli._process_sources.called
+    assert writer._output_stream is None
+    patch_iohandler.return_value.close.assert_called_once_with()
+
+
+def test_process_cli_request_stats_failed_run(tmpdir, patch_iohandler, mocker):
+    parsed_args = _scan_parsed_args("inspect", "-", tmpdir.join("metadata"))
+    parsed_args.stats = MagicMock()
+    parsed_args.metrics_file = MagicMock()
+    mocker.patch.object(aws_encryption_sdk_cli, "_process_sources", side_effect=AWSEncryptionSDKCLIError)
+
+    with pytest.raises(AWSEncryptionSDKCLIError):
+        aws_encryption_sdk_cli.process_cli_request(stream_args=sentinel.stream_args, parsed_args=parsed_args)
+
+    assert patch_iohandler.call_args[1]["statistics"] is parsed_args.stats
+    parsed_args.stats.start.assert_called_once_with()
+    parsed_args.stats.finish.assert_called_once_with()
+    parsed_args.metrics_file.start.assert_called_once_with(dict(metadata=parsed_args.metadata_output.queue_depth))
+    parsed_args.metrics_file.stop.assert_called_once_with()
+
+
+def test_catch_bad_metadata_file_requests_no_destination(tmpdir):
+    source = tmpdir.mkdir("source")
+    metadata_writer = MetadataWriter(suppress_output=False)(output_file=str(source.join("metadata")))
+
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        aws_encryption_sdk_cli._catch_bad_metadata_file_requests(metadata_writer, str(source), None)
+
+    excinfo.match(r"Metadata output file cannot be in the input directory")
+
+
+def test_process_cli_request_dry_run(tmpdir, patch_iohandler, mocker, capsys):
+    mocker.patch.object(aws_encryption_sdk_cli, "build_plan")
+    aws_encryption_sdk_cli.build_plan.return_value.to_dict.return_value = {"a": "plan"}
+    source = tmpdir.join("source")
+    source.write("some data")
+    destination = tmpdir.join("destination")
+
+    aws_encryption_sdk_cli.process_cli_request(
+        stream_args=sentinel.stream_args,
+        parsed_args=MagicMock(
+            input=str(source),
+            output=str(destination),
+            recursive=sentinel.recursive,
+            interactive=sentinel.interactive,
+            no_overwrite=sentinel.no_overwrite,
+            dry_run=True,
+            source_filter=None,
+            state_index=None,
+            sync=False,
+            resume=None,
+            new_wrapping_keys=None,
+            durability=Durability.none,
+            metadata_timing=False,
+            stats=None,
+            metrics_file=None,
+            profile=None,
+            suffix=sentinel.suffix,
+            decode=sentinel.decode_input,
+            encode=sentinel.encode_output,
+            metadata_output=MetadataWriter(True)(),
+            commitment_policy=CommitmentPolicyArgs.require_encrypt_require_decrypt,
+            wrapping_keys=[{"provider": "aws-kms", "key": ["key1", "key2"]}, {"provider": "aws-kms", "key": ["key3"]}],
+            caching=sentinel.caching_config,
+        ),
+    )
+
+    aws_encryption_sdk_cli.build_plan.assert_called_once_with(
+        handler=patch_iohandler.return_value,
+        stream_args=sentinel.stream_args,
+        sources=ANY,
+        destination=str(destination),
+        recursive=sentinel.recursive,
+        suffix=sentinel.suffix,
+        key_ids=["key1", "key2", "key3"],
+        caching_config=sentinel.caching_config,
+    )
+    assert list(aws_encryption_sdk_cli.build_plan.call_args[1]["sources"]) == [str(source)]
+    assert not patch_iohandler.return_value.process_single_file.called
+    assert not destination.check()
+    out, _err = capsys.readouterr()
+    assert json.loads(out) == {"a": "plan"}
+
+
+def test_process_cli_request_dry_run_does_not_open_metadata_output(tmpdir, patch_iohandler, mocker, capsys):
+    mocker.patch.object(aws_encryption_sdk_cli, "build_plan")
+    aws_encryption_sdk_cli.build_plan.return_value.to_dict.return_value = {"a": "plan"}
+    source = tmpdir.join("source")
+    source.write("some data")
+    metadata = tmpdir.join("metadata")
+    metadata.write("existing metadata")
+    metadata_output = MetadataWriter(False)(str(metadata))
+    metadata_output.force_overwrite()
+
+    aws_encryption_sdk_cli.process_cli_request(
+        stream_args=sentinel.stream_args,
+        parsed_args=MagicMock(
+            input=str(source),
+            output=str(tmpdir.join("destination")),
+            dry_run=True,
+            source_filter=None,
+            state_index=None,
+            sync=False,
+            resume=None,
+            new_wrapping_keys=None,
+            durability=Durability.none,
+            metadata_timing=False,
+            stats=None,
+            metrics_file=None,
+            profile=None,
+            metadata_output=metadata_output,
+            commitment_policy=CommitmentPolicyArgs.require_encrypt_require_decrypt,
+            wrapping_keys=[],
+        ),
+    )
+
+    patch_iohandler.return_value.close.assert_called_once_with()
+    assert metadata.read() == "existing metadata"
+    out, _err = capsys.readouterr()
+    assert json.loads(out) == {"a": "plan"}
+
+
 def test_process_cli_request_invalid_source(tmpdir):
     target = os.path.join(str(tmpdir), "test_targets.*")
     with pytest.raises(BadUserArgumentError) as excinfo:
@@ -463,6 +880,18 @@ def test_process_cli_request_invalid_source(tmpdir):
                 recursive=False,
                 interactive=False,
                 no_overwrite=False,
+                dry_run=False,
+                watch=False,
+                source_filter=None,
+                state_index=None,
+                sync=False,
+                resume=None,
+                new_wrapping_keys=None,
+                durability=Durability.none,
+                metadata_timing=False,
+                stats=None,
+                metrics_file=None,
+                profile=None,
                 decode=False,
                 encode=False,
                 metadata_output=MetadataWriter(True)(),
@@ -474,6 +903,107 @@ def test_process_cli_request_invalid_source(tmpdir):
     excinfo.match(r"Invalid source.  Must be a valid pathname pattern or stdin \(-\)")
 
 
+def test_expand_sources_is_lazy(tmpdir):
+    tmpdir.join("a").write(b"")
+    tmpdir.join("b").write(b"")
+
+    test = aws_encryption_sdk_cli._expand_sources(os.path.join(str(tmpdir), "*"))
+
+    assert not isinstance(test, list)
+    assert sorted(test) == [str(tmpdir.join("a")), str(tmpdir.join("b"))]
+
+
+@pytest.mark.parametrize(
+    "source_list, expected",
+    (
+        (b"", []),
+        (b"a", ["a"]),
+        (b"a\nb c\n", ["a", "b c"]),
+        (b"a\r\nb\r\n", ["a", "b"]),
+        (b"a\x00b\nc\x00", ["a", "b\nc"]),
+        (b"a\x00\x00b", ["a", "b"]),
+        (b"a\n\nb", ["a", "b"]),
+        (b"first_path\x00second_path\x00third_path", ["first_path", "second_path", "third_path"]),
+    ),
+)
+@pytest.mark.parametrize("chunk_size", (1, 3, 65536))
+def test_split_source_list(monkeypatch, source_list, expected, chunk_size):
+    monkeypatch.setattr(aws_encryption_sdk_cli, "_SOURCE_LIST_CHUNK_SIZE", chunk_size)
+
+    test = aws_encryption_sdk_cli._split_source_list(six.BytesIO(source_list))
+
+    assert list(test) == expected
+
+
+def test_listed_sources_stdin(mocker):
+    mocker.patch.object(aws_encryption_sdk_cli, "_stdin")
+    aws_encryption_sdk_cli._stdin.return_value = six.BytesIO(b"a\x00b\x00")
+
+    assert list(aws_encryption_sdk_cli._listed_sources("-")) == ["a", "b"]
+
+
+def test_validated_sources_empty_list(tmpdir):
+    source_list = tmpdir.join("source_list")
+    source_list.write(b"")
+
+    with pytest.raises(BadUserArgumentError) as excinfo:
+        aws_encryption_sdk_cli._validated_sources(
+            MagicMock(input=None, input_from=str(source_list), output=str(tmpdir))
+        )
+
+    excinfo.match(r"Source list does not contain any paths")
+
+
+def test_process_cli_request_source_list(tmpdir, patch_iohandler):
+    plaintext_dir = tmpdir.mkdir("plaintext")
+    plaintext_dir.join("a").write(b"some data")
+    plaintext_dir.join("b").write(b"some data")
+    ciphertext_dir = tmpdir.mkdir("ciphertext")
+    source_list = tmpdir.join("source_list")
+    source_list.write(
+        b"\x00".join(six.b(str(plaintext_dir.join(name))) for name in ("a", "does_not_exist", "b")) + b"\x00"
+    )
+
+    aws_encryption_sdk_cli.process_cli_request(
+        stream_args={"mode": "encrypt"},
+        parsed_args=MagicMock(
+            input=None,
+            input_from=str(source_list),
+            output=str(ciphertext_dir),
+            recursive=False,
+            interactive=False,
+            no_overwrite=False,
+            dry_run=False,
+            watch=False,
+            source_filter=None,
+            state_index=None,
+            sync=False,
+            resume=None,
+            new_wrapping_keys=None,
+            durability=Durability.none,
+            metadata_timing=False,
+            stats=None,
+            metrics_file=None,
+            profile=None,
+            suffix=None,
+            metadata_output=MetadataWriter(True)(),
+            commitment_policy=CommitmentPolicyArgs.require_encrypt_require_decrypt,
+        ),
+    )
+
+    patch_iohandler.return_value.process_single_file.assert_has_calls(
+        [
+            call(
+                stream_args={"mode": "encrypt"},
+                source=str(plaintext_dir.join(name)),
+                destination=str(ciphertext_dir.join(name + ".encrypted")),
+            )
+            for name in ("a", "b")
+        ]
+    )
+    assert patch_iohandler.return_value.process_single_file.call_count == 2
+
+
 def test_process_cli_request_globbed_source_non_directory_target(tmpdir, patch_iohandler):
     plaintext_dir = tmpdir.mkdir("plaintext")
     test_file = plaintext_dir.join("testing.aa")
@@ -494,6 +1024,18 @@ def test_process_cli_request_globbed_source_non_directory_target(tmpdir, patch_i
                 recursive=False,
                 interactive=False,
                 no_overwrite=False,
+                dry_run=False,
+                watch=False,
+                source_filter=None,
+                state_index=None,
+                sync=False,
+                resume=None,
+                new_wrapping_keys=None,
+                durability=Durability.none,
+                metadata_timing=False,
+                stats=None,
+                metrics_file=None,
+                profile=None,
             ),
         )
 
@@ -520,6 +1062,18 @@ def test_process_cli_request_source_contains_directory_nonrecursive(tmpdir, patc
             recursive=False,
             interactive=False,
             no_overwrite=False,
+            dry_run=False,
+            watch=False,
+            source_filter=None,
+            state_index=None,
+            sync=False,
+            resume=None,
+            new_wrapping_keys=None,
+            durability=Durability.none,
+            metadata_timing=False,
+            stats=None,
+            metrics_file=None,
+            profile=None,
             encode=False,
             decode=False,
             metadata_output=MetadataWriter(True)(),
@@ -644,6 +1198,31 @@ def test_stream_kwargs_from_args(args, stream_args):
     assert aws_encryption_sdk_cli.stream_kwargs_from_args(args, sentinel.materials_manager) == stream_args
 
 
+def test_stream_kwargs_from_args_reencrypt():
+    args = MagicMock(
+        action="reencrypt",
+        encryption_context={"required": "context"},
+        algorithm="AES_256_GCM_IV12_TAG16_HKDF_SHA384_ECDSA_P384",
+        frame_length=sentinel.frame_length,
+        max_length=sentinel.max_length,
+    )
+
+    test = aws_encryption_sdk_cli.stream_kwargs_from_args(
+        args, sentinel.materials_manager, sentinel.reencrypt_materials_manager
+    )
+
+    assert test == {
+        "materials_manager": sentinel.materials_manager,
+        "mode": "reencrypt",
+        "max_body_length": sentinel.max_length,
+        "reencrypt_args": {
+            "materials_manager": sentinel.reencrypt_materials_manager,
+            "algorithm": aws_encryption_sdk.Algorithm.AES_256_GCM_IV12_TAG16_HKDF_SHA384_ECDSA_P384,
+            "frame_length": sentinel.frame_length,
+        },
+    }
+
+
 @pytest.fixture
 def patch_for_cli(mocker):
     mocker.patch.object(aws_encryption_sdk_cli, "parse_args")
@@ -658,12 +1237,22 @@ def patch_for_cli(mocker):
         recursive=sentinel.recursive,
         interactive=sentinel.interactive,
         no_overwrite=sentinel.no_overwrite,
+        dry_run=False,
+        watch=False,
+        source_filter=None,
+        state_index=None,
+        sync=False,
+        resume=None,
+        new_wrapping_keys=None,
+        durability=Durability.none,
         suffix=sentinel.suffix,
         discovery=sentinel.discovery,
         discovery_account=sentinel.discovery_account,
         discovery_partition=sentinel.discovery_partition,
         decode=sentinel.decode_input,
         encode=sentinel.encode_output,
+        profile=None,
+        trace=None,
     )
     mocker.patch.object(aws_encryption_sdk_cli, "setup_logger")
     mocker.patch.object(aws_encryption_sdk_cli, "build_crypto_materials_manager_from_args")
@@ -673,6 +1262,20 @@ def patch_for_cli(mocker):
     mocker.patch.object(aws_encryption_sdk_cli, "process_cli_request")
 
 
+def test_stream_kwargs_from_args_rewrap():
+    args = MagicMock(action="rewrap", encryption_context={}, algorithm=None, frame_length=None, max_length=None)
+
+    test = aws_encryption_sdk_cli.stream_kwargs_from_args(
+        args, sentinel.materials_manager, rewrap_key_provider=sentinel.rewrap_key_provider
+    )
+
+    assert test == {
+        "materials_manager": sentinel.materials_manager,
+        "mode": "rewrap",
+        "key_provider": sentinel.rewrap_key_provider,
+    }
+
+
 def test_cli(patch_for_cli):
     test = aws_encryption_sdk_cli.cli(sentinel.raw_args)
 
@@ -682,7 +1285,7 @@ def test_cli(patch_for_cli):
         key_providers_config=sentinel.wrapping_keys, caching_config=sentinel.caching_config
     )
     aws_encryption_sdk_cli.stream_kwargs_from_args.assert_called_once_with(
-        aws_encryption_sdk_cli.parse_args.return_value, sentinel.crypto_materials_manager
+        aws_encryption_sdk_cli.parse_args.return_value, sentinel.crypto_materials_manager, None, None
     )
     aws_encryption_sdk_cli.process_cli_request.assert_called_once_with(
         sentinel.stream_args, aws_encryption_sdk_cli.parse_args.return_value
@@ -690,6 +1293,114 @@ def test_cli(patch_for_cli):
     assert test is None
 
 
+def test_cli_profile(patch_for_cli):
+    profiler = aws_encryption_sdk_cli.parse_args.return_value.profile = MagicMock()
+
+    def _process_cli_request(stream_args, args):
+        profiler.__enter__.assert_called_once_with()
+        assert not profiler.__exit__.called
+
+    aws_encryption_sdk_cli.process_cli_request.side_effect = _process_cli_request
+
+    test = aws_encryption_sdk_cli.cli(sentinel.raw_args)
+
+    assert aws_encryption_sdk_cli.process_cli_request.called
+    assert profiler.__exit__.called
+    assert test is None
+
+
+def test_cli_trace(patch_for_cli):
+    tracer = aws_encryption_sdk_cli.parse_args.return_value.trace = MagicMock()
+    profiler = aws_encryption_sdk_cli.parse_args.return_value.profile = MagicMock()
+
+    def _process_cli_request(stream_args, args):
+        tracer.__enter__.assert_called_once_with()
+        profiler.__enter__.assert_called_once_with()
+        assert not tracer.__exit__.called
+
+    aws_encryption_sdk_cli.process_cli_request.side_effect = _process_cli_request
+
+    test = aws_encryption_sdk_cli.cli(sentinel.raw_args)
+
+    name, start, end = tracer.add_span.call_args[0]
+    assert name == "parse_args"
+    assert start <= end
+    assert aws_encryption_sdk_cli.process_cli_request.called
+    assert tracer.__exit__.called
+    assert test is None
+
+
+def test_cli_reencrypt(patch_for_cli):
+    aws_encryption_sdk_cli.parse_args.return_value.action = "reencrypt"
+    aws_encryption_sdk_cli.parse_args.return_value.new_wrapping_keys = sentinel.new_wrapping_keys
+    aws_encryption_sdk_cli.build_crypto_materials_manager_from_args.side_effect = (
+        sentinel.crypto_materials_manager,
+        sentinel.reencrypt_materials_manager,
+    )
+
+    aws_encryption_sdk_cli.cli(sentinel.raw_args)
+
+    aws_encryption_sdk_cli.build_crypto_materials_manager_from_args.assert_has_calls(
+        [
+            call(key_providers_config=sentinel.wrapping_keys, caching_config=sentinel.caching_config),
+            call(key_providers_config=sentinel.new_wrapping_keys, caching_config=sentinel.caching_config),
+        ]
+    )
+    aws_encryption_sdk_cli.stream_kwargs_from_args.assert_called_once_with(
+        aws_encryption_sdk_cli.parse_args.return_value,
+        sentinel.crypto_materials_manager,
+        sentinel.reencrypt_materials_manager,
+        None,
+    )
+
+
+def test_cli_inspect(patch_for_cli):
+    aws_encryption_sdk_cli.parse_args.return_value.action = "inspect"
+
+    aws_encryption_sdk_cli.cli(sentinel.raw_args)
+
+    assert not aws_encryption_sdk_cli.build_crypto_materials_manager_from_args.called
+    aws_encryption_sdk_cli.stream_kwargs_from_args.assert_called_once_with(
+        aws_encryption_sdk_cli.parse_args.return_value, None, None, None
+    )
+
+
+def test_cli_query_catalog(patch_for_cli, capsys):
+    aws_encryption_sdk_cli.parse_args.return_value.action = "query"
+    catalog = aws_encryption_sdk_cli.parse_args.return_value.catalog
+    catalog.find.return_value = ["/a", "/b"]
+
+    test = aws_encryption_sdk_cli.cli(sentinel.raw_args)
+
+    assert test is None
+    catalog.find.assert_called_once_with(
+        key_info=aws_encryption_sdk_cli.parse_args.return_value.wrapped_by,
+        encryption_context=aws_encryption_sdk_cli.parse_args.return_value.encryption_context,
+        encryption_context_keys=aws_encryption_sdk_cli.parse_args.return_value.required_encryption_context_keys,
+    )
+    catalog.close.assert_called_once_with()
+    assert capsys.readouterr().out == "/a" + os.linesep + "/b" + os.linesep
+    assert not aws_encryption_sdk_cli.build_crypto_materials_manager_from_args.called
+    assert not aws_encryption_sdk_cli.process_cli_request.called
+
+
+def test_cli_rewrap(patch_for_cli, mocker):
+    mocker.patch.object(aws_encryption_sdk_cli, "build_master_key_provider_from_args")
+    aws_encryption_sdk_cli.build_master_key_provider_from_args.return_value = sentinel.rewrap_key_provider
+    aws_encryption_sdk_cli.parse_args.return_value.action = "rewrap"
+    aws_encryption_sdk_cli.parse_args.return_value.new_wrapping_keys = sentinel.new_wrapping_keys
+
+    aws_encryption_sdk_cli.cli(sentinel.raw_args)
+
+    aws_encryption_sdk_cli.build_master_key_provider_from_args.assert_called_once_with(sentinel.new_wrapping_keys)
+    aws_encryption_sdk_cli.stream_kwargs_from_args.assert_called_once_with(
+        aws_encryption_sdk_cli.parse_args.return_value,
+        sentinel.crypto_materials_manager,
+        None,
+        sentinel.rewrap_key_provider,
+    )
+
+
 def test_cli_local_error(patch_for_cli):
     aws_encryption_sdk_cli.process_cli_request.side_effect = AWSEncryptionSDKCLIError(sentinel.error_message)
     test = aws_encryption_sdk_cli.cli()
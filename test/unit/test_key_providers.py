@@ -32,6 +32,8 @@ def patch_deepcopy(mocker):
 def patch_botocore_session(mocker):
     mocker.patch.object(key_providers.botocore.session, "Session")
     key_providers.botocore.session.Session.return_value = sentinel.botocore_session
+    mocker.patch.object(key_providers.stats, "instrument_botocore_session")
+    mocker.patch.object(key_providers.tracing, "instrument_botocore_session")
     yield key_providers.botocore.session.Session
 
 
@@ -77,6 +79,8 @@ def test_kms_master_key_provider_post_processing(
     test = key_providers.aws_kms_master_key_provider(**source)
 
     patch_kms_master_key_provider.assert_called_once_with(**expected)
+    key_providers.stats.instrument_botocore_session.assert_called_once_with(sentinel.botocore_session)
+    key_providers.tracing.instrument_botocore_session.assert_called_once_with(sentinel.botocore_session)
     assert test is patch_kms_master_key_provider.return_value
 
 
@@ -13,8 +13,34 @@
 """Utility functions to handle configuration, credentials setup, and test skip decision making for unit tests."""
 import platform
 
+import aws_encryption_sdk
+from aws_encryption_sdk.identifiers import EncryptionKeyType, WrappingAlgorithm
+from aws_encryption_sdk.internal.crypto.wrapping_keys import WrappingKey
+from aws_encryption_sdk.key_providers.raw import RawMasterKeyProvider
+
 WINDOWS_SKIP_MESSAGE = "Skipping test on Windows"
 
 
 def is_windows():
     return any(platform.win32_ver())
+
+
+class StaticRawMasterKeyProvider(RawMasterKeyProvider):
+    """Raw master key provider that returns a fixed wrapping key for any key ID."""
+
+    provider_id = "static-test-provider"
+
+    def _get_raw_key(self, key_id):
+        return WrappingKey(
+            wrapping_algorithm=WrappingAlgorithm.AES_256_GCM_IV12_TAG16_NO_PADDING,
+            wrapping_key=b"\x01" * 32,
+            wrapping_key_type=EncryptionKeyType.SYMMETRIC,
+        )
+
+
+def static_materials_manager(*key_ids):
+    """Builds a crypto materials manager backed by ``StaticRawMasterKeyProvider``."""
+    key_provider = StaticRawMasterKeyProvider()
+    for key_id in key_ids or ("static-key",):
+        key_provider.add_master_key(key_id)
+    return aws_encryption_sdk.DefaultCryptoMaterialsManager(key_provider)